@@ -1,14 +1,23 @@
+import os
 import re
 import eventlet
 import importlib
+import tempfile
 
 import boto.ec2
 import boto.route53
+import boto.route53.zone
 import boto.vpc
 
 from st2actions.runners.pythonrunner import Action
+from cache import FileTTLCache
 from ec2parsers import ResultSets
 
+# Route53 zones of an account are cached on disk and shared by all the action executions
+# on the node, so zone actions don't need to list all the hosted zones every time
+DEFAULT_R53_ZONE_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'st2-aws-route53-zones')
+DEFAULT_R53_ZONE_CACHE_TTL = 300
+
 
 class BaseAction(Action):
 
@@ -43,23 +52,47 @@ class BaseAction(Action):
 
         self.resultsets = ResultSets()
 
+        # Connections are only reused within a single action execution
+        self._connections = {}
+        self._r53_zones = FileTTLCache(
+            path=config.get('r53_zone_cache_path', None) or DEFAULT_R53_ZONE_CACHE_PATH,
+            ttl=config.get('r53_zone_cache_ttl', DEFAULT_R53_ZONE_CACHE_TTL))
+
     def ec2_connect(self):
         region = self.credentials['region']
-        del self.credentials['region']
-        return boto.ec2.connect_to_region(region, **self.credentials)
+        return self._get_connection('ec2', region,
+                                    lambda: boto.ec2.connect_to_region(
+                                        region, **self._get_connection_kwargs()))
 
     def vpc_connect(self):
         region = self.credentials['region']
-        del self.credentials['region']
-        return boto.vpc.connect_to_region(region, **self.credentials)
+        return self._get_connection('vpc', region,
+                                    lambda: boto.vpc.connect_to_region(
+                                        region, **self._get_connection_kwargs()))
 
     def r53_connect(self):
-        del self.credentials['region']
-        return boto.route53.connection.Route53Connection(**self.credentials)
+        return self._get_connection('route53', None,
+                                    lambda: boto.route53.connection.Route53Connection(
+                                        **self._get_connection_kwargs()))
 
     def get_r53zone(self, zone):
         conn = self.r53_connect()
-        return conn.get_zone(zone)
+        name = conn._make_qualified(zone)
+
+        key = self._get_credentials_key()
+        zones = self._r53_zones.get(key) or {}
+
+        if name not in zones:
+            # Zone could have been created since the zones were cached
+            response = conn.get_all_hosted_zones()
+            zones = dict((item['Name'], item) for item in
+                         response['ListHostedZonesResponse']['HostedZones'])
+            self._r53_zones.set(key, zones)
+
+        if name not in zones:
+            return None
+
+        return boto.route53.zone.Zone(conn, zones[name])
 
     def st2_user_data(self):
         return self.userdata
@@ -99,8 +132,7 @@ class BaseAction(Action):
             state_list[instance_id] = current_state
         return state_list
 
-    def do_method(self, module_path, cls, action, **kwargs):
-        module = importlib.import_module(module_path)
+    def do_method(self, module_path, cls, action, result_fields=None, **kwargs):
         # hack to connect to correct region
         if cls == 'EC2Connection':
             obj = self.ec2_connect()
@@ -111,17 +143,35 @@ class BaseAction(Action):
             del kwargs['zone']
             obj = self.get_r53zone(zone)
         else:
-            del self.credentials['region']
-            obj = getattr(module, cls)(**self.credentials)
+            cls_obj = getattr(importlib.import_module(module_path), cls)
+            obj = self._get_connection('%s.%s' % (module_path, cls), None,
+                                       lambda: cls_obj(**self._get_connection_kwargs()))
 
         if not obj:
             raise ValueError('Invalid or missing credentials (aws_access_key_id,'
                              'aws_secret_access_key) or region')
 
         resultset = getattr(obj, action)(**kwargs)
-        formatted = self.resultsets.formatter(resultset)
+        formatted = self.resultsets.formatter(resultset, fields=result_fields)
         return formatted if isinstance(formatted, list) else [formatted]
 
+    def _get_connection_kwargs(self):
+        kwargs = dict(self.credentials)
+        kwargs.pop('region', None)
+        return kwargs
+
+    def _get_credentials_key(self):
+        return (self.credentials.get('aws_access_key_id', None),
+                self.credentials.get('aws_secret_access_key', None))
+
+    def _get_connection(self, service, region, factory):
+        key = (service, region)
+
+        if not self._connections.get(key, None):
+            self._connections[key] = factory()
+
+        return self._connections[key]
+
     def do_function(self, module_path, action, **kwargs):
         module = __import__(module_path)
         return getattr(module, action)(**kwargs)
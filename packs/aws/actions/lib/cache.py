@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+__all__ = [
+    'FileTTLCache'
+]
+
+
+class FileTTLCache(object):
+    """
+    Cache of JSON serializable values stored on disk where each value expires ``ttl`` seconds
+    after it has been stored.
+
+    Python runner actions run in a new process every time, so the cache is kept on disk to be
+    shared by all the action executions on the same node. Each entry is stored in a separate
+    file so concurrent executions never have to lock the whole cache.
+    """
+
+    def __init__(self, path, ttl=300):
+        """
+        :param path: Directory where the entries are stored.
+        :type path: ``str``
+
+        :param ttl: Number of seconds after which entries expire.
+        :type ttl: ``int``
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        entry_path = self._get_entry_path(key)
+
+        try:
+            with open(entry_path, 'r') as fp:
+                entry = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return default
+
+        if entry.get('expires', 0) < time.time():
+            self._remove(entry_path)
+            return default
+
+        return entry.get('value', default)
+
+    def set(self, key, value):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                # Created by a concurrent execution
+                if not os.path.isdir(self.path):
+                    raise
+
+        entry = {
+            'value': value,
+            'expires': time.time() + self.ttl
+        }
+
+        # Written to a temporary file first so other executions never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.entry')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(entry, fp)
+        os.rename(tmp_path, self._get_entry_path(key))
+
+    def remove(self, key):
+        self._remove(self._get_entry_path(key))
+
+    def _get_entry_path(self, key):
+        # Keys can contain credentials so only their digest ends up in the file name
+        name = hashlib.sha1(json.dumps(key)).hexdigest()
+        return os.path.join(self.path, '%s.json' % (name))
+
+    @staticmethod
+    def _remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
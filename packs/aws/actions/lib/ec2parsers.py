@@ -1,3 +1,5 @@
+import operator
+
 import six
 
 from boto import ec2
@@ -159,112 +161,127 @@ class FieldLists():
 
 
 class ResultSets(object):
+    """
+    Formats boto result objects into JSON serializable structures.
+
+    Extractors are compiled once per boto class (and field projection) and then looked up by the
+    exact type of each result, so formatting large result sets doesn't go through the whole
+    ``isinstance`` chain and ``getattr`` calls for every object.
+    """
 
     def __init__(self):
-        self.foo = ''
-
-    def selector(self, output):
-        if isinstance(output, ec2.instance.Reservation):
-            return self.parseReservation(output)
-        elif isinstance(output, ec2.instance.Instance):
-            return self.parseInstance(output)
-        elif isinstance(output, ec2.volume.Volume):
-            return self.parseVolume(output)
-        elif isinstance(output, ec2.blockdevicemapping.BlockDeviceType):
-            return self.parseBlockDeviceType(output)
-        elif isinstance(output, ec2.zone.Zone):
-            return self.parseEC2Zone(output)
-        elif isinstance(output, ec2.address.Address):
-            return self.parseAddress(output)
-        elif isinstance(output, ec2.tag.Tag):
-            return self.parseTag(output)
-        elif isinstance(output, ec2.ec2object.EC2Object):
-            return self.parseEC2Object(output)
-        elif isinstance(output, route53.record.Record):
-            return self.parseRecord(output)
-        elif isinstance(output, route53.zone.Zone):
-            return self.parseR53Zone(output)
-        elif isinstance(output, route53.status.Status):
-            return self.parseR53Status(output)
-        elif isinstance(output, cloudformation.stack.Stack):
-            return self.parseStackObject(output)
-        elif isinstance(output, rds.dbinstance.DBInstance):
-            return self.parseDBInstanceObject(output)
-        else:
+        # Order matters, more specific classes need to come before their base classes
+        self._type_parsers = [
+            (ec2.instance.Reservation, self._reservation_parser),
+            (ec2.instance.Instance, self._field_parser(FieldLists.INSTANCE)),
+            (ec2.volume.Volume, self._field_parser(FieldLists.VOLUME)),
+            (ec2.blockdevicemapping.BlockDeviceType,
+             self._field_parser(FieldLists.BLOCK_DEVICE_TYPE)),
+            (ec2.zone.Zone, self._field_parser(FieldLists.EC2ZONE)),
+            (ec2.address.Address, self._field_parser(FieldLists.ADDRESS)),
+            (ec2.tag.Tag, self._field_parser(FieldLists.TAG)),
+            (ec2.ec2object.EC2Object, self._ec2object_parser),
+            (route53.record.Record, self._field_parser(FieldLists.RECORD)),
+            (route53.zone.Zone, self._field_parser(FieldLists.R53ZONE)),
+            (route53.status.Status, self._field_parser(FieldLists.R53STATUS)),
+            (cloudformation.stack.Stack, self._field_parser(FieldLists.STACK)),
+            (rds.dbinstance.DBInstance, self._field_parser(FieldLists.DBINSTANCE))
+        ]
+        # (type, fields) -> extractor
+        self._dispatch_table = {}
+
+    def selector(self, output, fields=None):
+        if fields is not None and not isinstance(fields, frozenset):
+            fields = frozenset(fields)
+
+        extractor = self._get_extractor(type(output), fields)
+        if extractor is None:
             return output
+        return extractor(output)
+
+    def formatter(self, output, fields=None):
+        """
+        :param fields: Optional list of fields to include in the formatted objects.
+        :type fields: ``list``
+        """
+        if fields is not None:
+            fields = frozenset(fields)
 
-    def formatter(self, output):
+        return self._format(output, fields)
+
+    def _format(self, output, fields):
         if isinstance(output, list):
-            return [self.formatter(item) for item in output]
+            return [self._format(item, fields) for item in output]
         elif isinstance(output, dict):
-            return {key: self.formatter(value) for key, value in six.iteritems(output)}
+            return {key: self._format(value, fields) for key, value in six.iteritems(output)}
         else:
-            return self.selector(output)
+            return self.selector(output, fields)
 
-    def parseReservation(self, output):
-        instance_list = []
-        for instance in output.instances:
-            instance_data = self.parseInstance(instance)
-            instance_data['owner_id'] = output.owner_id
-            instance_list.append(instance_data)
-        return instance_list
+    def _get_extractor(self, output_type, fields):
+        key = (output_type, fields)
 
-    def parseAddress(self, output):
-        instance_data = {field: getattr(output, field) for field in FieldLists.ADDRESS}
-        return instance_data
+        try:
+            return self._dispatch_table[key]
+        except KeyError:
+            pass
 
-    def parseInstance(self, output):
-        instance_data = {field: getattr(output, field) for field in FieldLists.INSTANCE}
-        return instance_data
+        extractor = None
+        for cls, parser in self._type_parsers:
+            if issubclass(output_type, cls):
+                extractor = parser(fields)
+                break
 
-    def parseVolume(self, output):
-        volume_data = {field: getattr(output, field) for field in FieldLists.VOLUME}
-        return volume_data
+        self._dispatch_table[key] = extractor
+        return extractor
 
-    def parseBlockDeviceType(self, output):
-        data = {field: getattr(output, field) for field in FieldLists.BLOCK_DEVICE_TYPE}
-        return data
+    def _field_parser(self, field_list):
+        def parser(fields):
+            names = [field for field in field_list if fields is None or field in fields]
 
-    def parseEC2Zone(self, output):
-        zone_data = {field: getattr(output, field) for field in FieldLists.EC2ZONE}
-        return zone_data
+            if not names:
+                return lambda output: {}
 
-    def parseRecord(self, output):
-        record_data = {field: getattr(output, field) for field in FieldLists.RECORD}
-        return record_data
+            if len(names) == 1:
+                name = names[0]
+                return lambda output: {name: getattr(output, name)}
 
-    def parseR53Zone(self, output):
-        zone_data = {field: getattr(output, field) for field in FieldLists.R53ZONE}
-        return zone_data
+            # attrgetter fetches all the fields in a single call instead of a getattr call per
+            # field
+            getter = operator.attrgetter(*names)
+            return lambda output: dict(six.moves.zip(names, getter(output)))
 
-    def parseR53Status(self, output):
-        status_data = {field: getattr(output, field) for field in FieldLists.R53STATUS}
-        return status_data
+        return parser
 
-    def parseBucket(self, output):
-        bucket_data = {field: getattr(output, field) for field in FieldLists.BUCKET}
-        return bucket_data
+    def _reservation_parser(self, fields):
+        instance_extractor = self._get_extractor(ec2.instance.Instance, fields)
+        include_owner_id = fields is None or 'owner_id' in fields
 
-    def parseTag(self, output):
-        tag_data = {field: getattr(output, field) for field in FieldLists.TAG}
-        return tag_data
+        def extractor(output):
+            instance_list = []
+            for instance in output.instances:
+                instance_data = instance_extractor(instance)
+                if include_owner_id:
+                    instance_data['owner_id'] = output.owner_id
+                instance_list.append(instance_data)
+            return instance_list
 
-    def parseStackObject(self, output):
-        stack_data = {field: getattr(output, field) for field in FieldLists.STACK}
-        return stack_data
+        return extractor
 
-    def parseDBInstanceObject(self, output):
-        dbinstance_data = {field: getattr(output, field) for field in FieldLists.DBINSTANCE}
-        return dbinstance_data
+    def _ec2object_parser(self, fields):
+        return lambda output: self.parseEC2Object(output, fields=fields)
 
-    def parseEC2Object(self, output):
+    def parseEC2Object(self, output, fields=None):
         # Looks like everything that is an EC2Object pretty much only has these extra
         # 'unparseable' properties so handle region and connection specially.
-        output = vars(output)
-        del output['connection']
+        output = dict(vars(output))
+        output.pop('connection', None)
         # special handling for region since name here is better than id.
         region = output.get('region', None)
         output['region'] = region.name if region else ''
+
+        if fields is not None:
+            output = {k: v for k, v in six.iteritems(output) if k in fields}
+
         # now anything that is an EC2Object get some special marshalling care.
         for k, v in six.iteritems(output):
             if isinstance(v, ec2.ec2object.EC2Object):
@@ -277,7 +294,7 @@ class ResultSets(object):
                 for item in v:
                     # avoid touching the basic types.
                     if isinstance(item, (basestring, bool, int, long, float)):
-                        v_list.append(v)
+                        v_list.append(item)
                     else:
                         v_list.append(str(item))
                 output[k] = v_list
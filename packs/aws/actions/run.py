@@ -15,6 +15,8 @@ class ActionManager(action.BaseAction):
         if 'cls' in kwargs.keys():
             cls = kwargs['cls']
             del kwargs['cls']
-            return self.do_method(module_path, cls, action, **kwargs)
+            result_fields = kwargs.pop('result_fields', None)
+            return self.do_method(module_path, cls, action, result_fields=result_fields,
+                                  **kwargs)
         else:
             return self.do_function(module_path, action, **kwargs)
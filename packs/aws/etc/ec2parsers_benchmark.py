@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark for formatting large describe_instances results with ResultSets.
+
+Builds synthetic reservations with the requested number of instances and measures how long
+``ResultSets.formatter`` takes to format them with and without a field projection.
+
+Usage: python etc/ec2parsers_benchmark.py --instances 10000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from boto.ec2.instance import Instance, Reservation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../actions/lib'))
+
+from ec2parsers import ResultSets  # noqa
+
+
+def build_reservations(instance_count, instances_per_reservation):
+    reservations = []
+    reservation = None
+
+    for index in range(instance_count):
+        if index % instances_per_reservation == 0:
+            reservation = Reservation()
+            reservation.id = 'r-%08x' % index
+            reservation.owner_id = '123456789012'
+            reservations.append(reservation)
+
+        instance = Instance()
+        instance.id = 'i-%08x' % index
+        instance.image_id = 'ami-12345678'
+        instance.instance_type = 'm4.large'
+        instance.private_ip_address = '10.0.%d.%d' % (index // 256 % 256, index % 256)
+        instance.launch_time = datetime.datetime(2016, 1, 1).isoformat()
+        instance.tags = {'Name': 'host-%d' % index, 'role': 'web'}
+        instance._state.name = 'running'
+        instance._state.code = 16
+        reservation.instances.append(instance)
+
+    return reservations
+
+
+def run(name, reservations, iterations, fields=None):
+    resultsets = ResultSets()
+    durations = []
+
+    for _ in range(iterations):
+        start = time.time()
+        resultsets.formatter(reservations, fields=fields)
+        durations.append(time.time() - start)
+
+    print('%-32s best: %8.2fms  mean: %8.2fms' % (name, min(durations) * 1000,
+                                                  sum(durations) / len(durations) * 1000))
+
+
+def main(instance_count, instances_per_reservation, iterations):
+    reservations = build_reservations(instance_count, instances_per_reservation)
+    print('%d instances in %d reservations, %d iterations' % (instance_count, len(reservations),
+                                                             iterations))
+
+    run('all fields', reservations, iterations)
+    run('projection (id, state, tags)', reservations, iterations,
+        fields=['id', 'state', 'tags'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ResultSets.formatter.')
+    parser.add_argument('--instances', type=int, default=10000,
+                        help='Total number of instances.')
+    parser.add_argument('--per-reservation', type=int, default=10,
+                        help='Number of instances per reservation.')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Number of iterations.')
+    args = parser.parse_args()
+    main(instance_count=args.instances, instances_per_reservation=args.per_reservation,
+         iterations=args.iterations)
@@ -8,6 +8,11 @@ following values in datastore:
     - aws.aws_secret_access_key
     - aws.region
     - aws.max_number_of_messages (must be between 1 - 10)
+    - aws.concurrent_polling (long-poll all the queues at once on a green thread pool)
+    - aws.wait_time_seconds (long polling wait time when concurrent polling is enabled, max 20)
+    - aws.pool_size (maximum number of queues which are polled at the same time)
+    - aws.deserialization_method (json, msgpack, yaml or auto to use content_type message attribute)
+    - aws.compression (gzip, zlib, base64 or auto to use content_encoding message attribute)
 For configuration in config.yaml with config like this
     setup:
       aws_access_key_id:
@@ -19,15 +24,40 @@ For configuration in config.yaml with config like this
         - second_queue
     sqs_other:
         max_number_of_messages: 1
+        concurrent_polling: true
+        wait_time_seconds: 20
+        pool_size: 10
+        deserialization_method: auto
+        compression: auto
 If any value exist in datastore it will be taken instead of any value in config.yaml
 """
 
+import time
+
+import eventlet
 import six
 from boto3.session import Session
+from botocore.exceptions import BotoCoreError
 from botocore.exceptions import ClientError
 
 from st2reactor.sensor.base import PollingSensor
 
+from lib.deserializers import BodyDeserializer
+
+eventlet.monkey_patch(
+    os=True,
+    select=True,
+    socket=True,
+    thread=True,
+    time=True)
+
+# Maximum number of entries SQS accepts in a single DeleteMessageBatch call
+DELETE_BATCH_SIZE = 10
+
+# Message attributes which are used to detect how to deserialize the message body
+CONTENT_TYPE_ATTRIBUTE = 'content_type'
+CONTENT_ENCODING_ATTRIBUTE = 'content_encoding'
+
 
 class AWSSQSSensor(PollingSensor):
     def __init__(self, sensor_service, config=None, poll_interval=5):
@@ -50,24 +80,64 @@ class AWSSQSSensor(PollingSensor):
 
         self.max_number_of_messages = self._get_config_entry('max_number_of_messages',
                                                              prefix='sqs_other')
+        concurrent_polling = self._get_config_entry('concurrent_polling', prefix='sqs_other',
+                                                    default=False)
+        # Values stored in the datastore are always strings
+        if isinstance(concurrent_polling, six.string_types):
+            concurrent_polling = concurrent_polling.lower() in ['true', '1', 'yes']
+        self.concurrent_polling = concurrent_polling
+        self.wait_time_seconds = int(self._get_config_entry('wait_time_seconds',
+                                                            prefix='sqs_other', default=20))
+        self.pool_size = int(self._get_config_entry('pool_size', prefix='sqs_other',
+                                                    default=10))
+
+        deserialization_method = self._get_config_entry('deserialization_method',
+                                                        prefix='sqs_other', default='')
+        compression = self._get_config_entry('compression', prefix='sqs_other', default='')
+        # One deserializer per queue so decode failures are counted per queue
+        self._deserializers = dict((queue, BodyDeserializer(method=deserialization_method or None,
+                                                            compression=compression or None))
+                                   for queue in self.input_queues)
 
         self._logger = self._sensor_service.get_logger(name=self.__class__.__name__)
 
         self.session = None
         self.sqs_res = None
 
+        # Queue objects are cached so GetQueueUrl is only called once per queue
+        self._queues = {}
+        self._queue_stats = {}
+        self._pool = None
+
         self._setup_sqs()
 
+        if self.concurrent_polling:
+            self._pool = eventlet.GreenPool(size=self.pool_size)
+
     def poll(self):
+        if self.concurrent_polling:
+            for _ in self._pool.imap(self._poll_queue, self.input_queues):
+                pass
+            return
+
         for queue in self.input_queues:
             msgs = self._receive_messages(queue=self._get_queue_by_name(queue),
                                           num_messages=self.max_number_of_messages)
             for msg in msgs:
                 if msg:
-                    payload = {"queue": queue, "body": msg.body}
+                    payload = {"queue": queue, "body": self._deserialize_body(queue, msg)}
                     self._sensor_service.dispatch(trigger="aws.sqs_new_message", payload=payload)
                     msg.delete()
 
+    def get_queue_stats(self):
+        ''' Return a copy of the per-queue throughput and latency counters. '''
+        result = dict((name, dict(stats)) for name, stats in six.iteritems(self._queue_stats))
+
+        for name, deserializer in six.iteritems(self._deserializers):
+            result.setdefault(name, {})['decode_failures'] = deserializer.failure_count
+
+        return result
+
     def cleanup(self):
         pass
 
@@ -82,15 +152,19 @@ class AWSSQSSensor(PollingSensor):
     def remove_trigger(self, trigger):
         pass
 
-    def _get_config_entry(self, key, prefix='setup'):
+    def _get_config_entry(self, key, prefix='setup', default=None):
         ''' Get configuration values either from Datastore or config file. '''
-        config = self._config.get(prefix, None)
+        config = self._config.get(prefix, None) or {}
 
+        # Values are only missing when they are None, falsy values (e.g. 0) are valid settings
         value = self._sensor_service.get_value('aws.%s' % (key), local=False)
-        if not value:
+        if value is None:
             value = config.get(key, None)
 
-        if not value:
+        if value is None and default is not None:
+            return default
+
+        if value is None:
             raise ValueError('[AWSSQSSensor]: Configuration for %s key is missing.' % (key))
 
         return value
@@ -103,6 +177,87 @@ class AWSSQSSensor(PollingSensor):
                                region_name=self.aws_region)
 
         self.sqs_res = self.session.resource('sqs')
+        self._queues = {}
+
+    def _get_cached_queue(self, queueName):
+        ''' Return a cached QUEUE object, fetching it on first use '''
+        queue = self._queues.get(queueName, None)
+        if queue is None:
+            queue = self._get_queue_by_name(queueName)
+            self._queues[queueName] = queue
+
+        return queue
+
+    def _poll_queue(self, queueName):
+        ''' Long-poll a single queue, dispatch its messages and delete them in batches '''
+        stats = self._queue_stats.setdefault(queueName, {
+            'polls': 0,
+            'received': 0,
+            'deleted': 0,
+            'errors': 0,
+            'last_receive_latency': 0.0,
+            'total_receive_latency': 0.0
+        })
+
+        try:
+            queue = self._get_cached_queue(queueName)
+
+            start = time.time()
+            msgs = self._receive_messages(queue=queue,
+                                          num_messages=self.max_number_of_messages,
+                                          wait_time=self.wait_time_seconds)
+            latency = time.time() - start
+        except (ClientError, BotoCoreError):
+            self._logger.exception('Failed to receive messages from SQS queue: %s', queueName)
+            stats['errors'] += 1
+            # Queue URL might be stale (e.g. queue was re-created), look it up again next time
+            self._queues.pop(queueName, None)
+            return
+
+        stats['polls'] += 1
+        stats['received'] += len(msgs)
+        stats['last_receive_latency'] = latency
+        stats['total_receive_latency'] += latency
+
+        processed = []
+        for msg in msgs:
+            if msg:
+                payload = {"queue": queueName, "body": self._deserialize_body(queueName, msg)}
+                self._sensor_service.dispatch(trigger="aws.sqs_new_message", payload=payload)
+                processed.append(msg)
+
+        deleted, failed = self._delete_messages(queue=queue, msgs=processed)
+        stats['deleted'] += deleted
+        stats['errors'] += failed
+
+        self._logger.debug('SQS queue %s: received %s message(s) in %.3fs',
+                           queueName, len(msgs), latency)
+
+    def _delete_messages(self, queue, msgs):
+        ''' Acknowledge messages using DeleteMessageBatch calls of up to 10 entries
+
+        Returns the number of deleted messages and the number of failed DeleteMessageBatch calls.
+        Messages which were not deleted become visible again after the visibility timeout.
+        '''
+        deleted = 0
+        failed = 0
+        for index in range(0, len(msgs), DELETE_BATCH_SIZE):
+            chunk = msgs[index:index + DELETE_BATCH_SIZE]
+            entries = [{'Id': str(i), 'ReceiptHandle': msg.receipt_handle}
+                       for i, msg in enumerate(chunk)]
+            try:
+                response = queue.delete_messages(Entries=entries)
+            except (ClientError, BotoCoreError):
+                self._logger.exception('Failed to delete messages from SQS queue: %s', queue.url)
+                failed += 1
+                continue
+
+            deleted += len(response.get('Successful', []))
+            for failure in response.get('Failed', []):
+                self._logger.warning('Failed to delete SQS message from %s: %s',
+                                     queue.url, failure.get('Message'))
+
+        return deleted, failed
 
     def _get_queue_by_name(self, queueName):
         ''' Fetch QUEUE by it's name create new one if queue doesn't exist '''
@@ -119,6 +274,17 @@ class AWSSQSSensor(PollingSensor):
 
     def _receive_messages(self, queue, num_messages, wait_time=2):
         ''' Receive a message from queue and return it. '''
-        msgs = queue.receive_messages(WaitTimeSeconds=wait_time, MaxNumberOfMessages=num_messages)
+        msgs = queue.receive_messages(WaitTimeSeconds=wait_time, MaxNumberOfMessages=num_messages,
+                                      MessageAttributeNames=[CONTENT_TYPE_ATTRIBUTE,
+                                                             CONTENT_ENCODING_ATTRIBUTE])
 
         return msgs
+
+    def _deserialize_body(self, queueName, msg):
+        ''' Decode message body using the content type / encoding message attributes. '''
+        attributes = msg.message_attributes or {}
+        content_type = attributes.get(CONTENT_TYPE_ATTRIBUTE, {}).get('StringValue', None)
+        content_encoding = attributes.get(CONTENT_ENCODING_ATTRIBUTE, {}).get('StringValue', None)
+
+        return self._deserializers[queueName].deserialize(msg.body, content_type=content_type,
+                                                          content_encoding=content_encoding)
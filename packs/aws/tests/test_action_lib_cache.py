@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+import time
+
+import mock
+import unittest2
+
+from lib.action import BaseAction
+from lib.cache import FileTTLCache
+
+__all__ = [
+    'FileTTLCacheTestCase',
+    'Route53ZoneCacheTestCase'
+]
+
+HOSTED_ZONES = {
+    'ListHostedZonesResponse': {
+        'HostedZones': [
+            {'Id': '/hostedzone/Z1', 'Name': 'example.com.', 'ResourceRecordSetCount': '2'},
+            {'Id': '/hostedzone/Z2', 'Name': 'example.org.', 'ResourceRecordSetCount': '4'}
+        ]
+    }
+}
+
+
+class FileTTLCacheTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(FileTTLCacheTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_values_are_shared_between_instances(self):
+        FileTTLCache(path=self.path).set(('key', 'secret'), {'a': 1})
+
+        cache = FileTTLCache(path=self.path)
+        self.assertEqual(cache.get(('key', 'secret')), {'a': 1})
+        self.assertEqual(cache.get(('key', 'other')), None)
+        self.assertEqual(cache.get(('key', 'other'), default={}), {})
+
+        cache.remove(('key', 'secret'))
+        self.assertEqual(cache.get(('key', 'secret')), None)
+
+    def test_values_expire(self):
+        cache = FileTTLCache(path=self.path, ttl=10)
+        cache.set('key', 'value')
+
+        with mock.patch('lib.cache.time.time', mock.Mock(return_value=time.time() + 11)):
+            self.assertEqual(cache.get('key'), None)
+
+    def test_key_is_not_stored_in_file_name(self):
+        cache = FileTTLCache(path=self.path)
+        cache.set(('access-key', 'secret-key'), 'value')
+
+        self.assertNotIn('secret-key', cache._get_entry_path(('access-key', 'secret-key')))
+
+
+class Route53ZoneCacheTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(Route53ZoneCacheTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.config = {
+            'st2_user_data': None,
+            'aws_access_key_id': 'access-key',
+            'aws_secret_access_key': 'secret-key',
+            'region': 'us-east-1',
+            'r53_zone_cache_path': self.path
+        }
+
+    def _get_action(self, conn):
+        action = BaseAction(config=self.config)
+        action.r53_connect = mock.Mock(return_value=conn)
+        return action
+
+    def _get_connection(self):
+        conn = mock.Mock()
+        conn._make_qualified = lambda name: name if name.endswith('.') else name + '.'
+        conn.get_all_hosted_zones.return_value = HOSTED_ZONES
+        return conn
+
+    def test_zones_are_cached_across_executions(self):
+        conn = self._get_connection()
+
+        zone = self._get_action(conn).get_r53zone('example.com')
+        self.assertEqual(zone.id, 'Z1')
+        self.assertEqual(zone.name, 'example.com.')
+        self.assertEqual(zone.route53connection, conn)
+
+        # A new action instance (i.e. a new execution) uses the cached zones
+        zone = self._get_action(conn).get_r53zone('example.org.')
+        self.assertEqual(zone.id, 'Z2')
+        self.assertEqual(conn.get_all_hosted_zones.call_count, 1)
+
+    def test_unknown_zone_refreshes_cache(self):
+        conn = self._get_connection()
+        action = self._get_action(conn)
+
+        self.assertEqual(action.get_r53zone('unknown.com'), None)
+        self.assertEqual(action.get_r53zone('example.com').id, 'Z1')
+        self.assertEqual(action.get_r53zone('unknown.com'), None)
+        self.assertEqual(conn.get_all_hosted_zones.call_count, 2)
+
+    def test_zones_are_cached_per_credentials(self):
+        conn = self._get_connection()
+        self._get_action(conn).get_r53zone('example.com')
+
+        self.config['aws_access_key_id'] = 'other-key'
+        self._get_action(conn).get_r53zone('example.com')
+        self.assertEqual(conn.get_all_hosted_zones.call_count, 2)
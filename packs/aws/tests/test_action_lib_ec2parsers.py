@@ -0,0 +1,141 @@
+import datetime
+
+import unittest2
+from boto.ec2.ec2object import EC2Object
+from boto.ec2.instance import Instance, Reservation
+from boto.ec2.regioninfo import RegionInfo
+from boto.ec2.volume import Volume
+
+from lib.ec2parsers import FieldLists, ResultSets
+
+__all__ = [
+    'ResultSetsTestCase'
+]
+
+
+def _get_instance(instance_id):
+    instance = Instance()
+    instance.id = instance_id
+    instance.image_id = 'ami-12345678'
+    instance.instance_type = 'm4.large'
+    instance.private_ip_address = '10.0.0.1'
+    instance.launch_time = datetime.datetime(2016, 1, 1).isoformat()
+    instance.tags = {'Name': 'host-%s' % instance_id}
+    instance._state.name = 'running'
+    instance._state.code = 16
+    return instance
+
+
+def _get_reservation():
+    reservation = Reservation()
+    reservation.id = 'r-1'
+    reservation.owner_id = '123456789012'
+    reservation.instances = [_get_instance('i-1'), _get_instance('i-2')]
+    return reservation
+
+
+def _get_volume():
+    volume = Volume()
+    volume.id = 'vol-1'
+    volume.size = 8
+    volume.status = 'in-use'
+    volume.zone = 'us-east-1a'
+    volume.type = 'gp2'
+    return volume
+
+
+def _get_old_format(output, field_list):
+    # Format produced by the per-type parse* methods before the dispatch table was introduced
+    return {field: getattr(output, field) for field in field_list}
+
+
+class ResultSetsTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(ResultSetsTestCase, self).setUp()
+        self.resultsets = ResultSets()
+
+    def test_instance_matches_old_format(self):
+        instance = _get_instance('i-1')
+
+        result = self.resultsets.formatter(instance)
+
+        self.assertEqual(result, _get_old_format(instance, FieldLists.INSTANCE))
+        self.assertEqual(result['id'], 'i-1')
+        self.assertEqual(result['state'], 'running')
+        self.assertEqual(result['state_code'], 16)
+
+    def test_reservation_matches_old_format(self):
+        reservation = _get_reservation()
+
+        result = self.resultsets.formatter([reservation])
+
+        expected = []
+        for instance in reservation.instances:
+            instance_data = _get_old_format(instance, FieldLists.INSTANCE)
+            instance_data['owner_id'] = '123456789012'
+            expected.append(instance_data)
+        self.assertEqual(result, [expected])
+
+    def test_volume_matches_old_format(self):
+        volume = _get_volume()
+
+        result = self.resultsets.formatter({'volumes': [volume]})
+
+        self.assertEqual(result, {'volumes': [_get_old_format(volume, FieldLists.VOLUME)]})
+        self.assertEqual(result['volumes'][0]['size'], 8)
+
+    def test_fields_projection(self):
+        result = self.resultsets.formatter([_get_instance('i-1'), _get_volume()],
+                                           fields=['id', 'state', 'size'])
+        self.assertEqual(result, [{'id': 'i-1', 'state': 'running'},
+                                  {'id': 'vol-1', 'size': 8}])
+
+        result = self.resultsets.formatter(_get_instance('i-1'), fields=['id'])
+        self.assertEqual(result, {'id': 'i-1'})
+
+        result = self.resultsets.formatter(_get_instance('i-1'), fields=['unknown'])
+        self.assertEqual(result, {})
+
+    def test_fields_projection_reservation_owner_id(self):
+        result = self.resultsets.formatter(_get_reservation(), fields=['id', 'owner_id'])
+        self.assertEqual(result, [{'id': 'i-1', 'owner_id': '123456789012'},
+                                  {'id': 'i-2', 'owner_id': '123456789012'}])
+
+        result = self.resultsets.formatter(_get_reservation(), fields=['id'])
+        self.assertEqual(result, [{'id': 'i-1'}, {'id': 'i-2'}])
+
+    def test_parse_ec2object_list_items(self):
+        output = self._get_ec2object()
+
+        result = self.resultsets.formatter(output)
+
+        self.assertEqual(result['region'], 'us-east-1')
+        self.assertNotIn('connection', result)
+        self.assertEqual(result['instance'], 'i-1')
+        # Basic types are kept as they are, anything else is turned into a string
+        self.assertEqual(result['items'], ['a', 1, True, str(output.items[3])])
+
+    def test_parse_ec2object_fields_projection(self):
+        result = self.resultsets.formatter(self._get_ec2object(), fields=['id', 'region'])
+        self.assertEqual(result, {'id': 'sg-1', 'region': 'us-east-1'})
+
+    def test_parse_ec2object_does_not_modify_input(self):
+        output = self._get_ec2object()
+        original = dict(vars(output))
+        original_items = list(output.items)
+
+        self.resultsets.formatter(output)
+
+        self.assertEqual(vars(output), original)
+        self.assertEqual(output.items, original_items)
+        self.assertIs(output.region, original['region'])
+        self.assertIs(output.instance, original['instance'])
+
+    def _get_ec2object(self):
+        output = EC2Object(connection=object())
+        output.region = RegionInfo(name='us-east-1')
+        output.id = 'sg-1'
+        output.instance = _get_instance('i-1')
+        output.items = ['a', 1, True, RegionInfo(name='us-west-2')]
+        return output
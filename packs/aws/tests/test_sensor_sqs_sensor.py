@@ -0,0 +1,225 @@
+import imp
+import os
+import sys
+
+import mock
+from botocore.exceptions import ClientError
+
+from st2tests.base import BaseSensorTestCase
+
+# Actions and sensors both have a "lib" package in this pack, so the sensor and its lib module
+# are loaded by path
+SENSORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../sensors')
+deserializers = imp.load_source('sqs_sensor_lib_deserializers',
+                                os.path.join(SENSORS_PATH, 'lib/deserializers.py'))
+
+sys.modules['lib.deserializers'] = deserializers
+try:
+    sqs_sensor = imp.load_source('sqs_sensor', os.path.join(SENSORS_PATH, 'sqs_sensor.py'))
+finally:
+    del sys.modules['lib.deserializers']
+
+AWSSQSSensor = sqs_sensor.AWSSQSSensor
+
+__all__ = [
+    'SQSSensorTestCase'
+]
+
+CONFIG = {
+    'setup': {
+        'aws_access_key_id': 'key',
+        'aws_secret_access_key': 'secret',
+        'region': 'us-east-1'
+    },
+    'sqs_sensor': {
+        'input_queues': ['first_queue', 'second_queue']
+    },
+    'sqs_other': {
+        'max_number_of_messages': 10
+    }
+}
+
+
+def _get_client_error(code, operation_name='GetQueueUrl'):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation_name)
+
+
+def _get_message(body, index=0):
+    msg = mock.Mock()
+    msg.body = body
+    msg.receipt_handle = 'handle-%s' % (index)
+    msg.message_attributes = None
+    return msg
+
+
+def _delete_messages(Entries):
+    return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+
+class SQSSensorTestCase(BaseSensorTestCase):
+    sensor_cls = AWSSQSSensor
+
+    def setUp(self):
+        super(SQSSensorTestCase, self).setUp()
+
+        patcher = mock.patch.object(sqs_sensor, 'Session')
+        self.session_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sqs_res = self.session_cls.return_value.resource.return_value
+        self.queues = {}
+        self.sqs_res.get_queue_by_name.side_effect = self._get_queue_by_name
+
+    def _get_queue_by_name(self, QueueName):
+        if QueueName not in self.queues:
+            queue = mock.Mock()
+            queue.url = 'https://queue.amazonaws.com/123456789012/%s' % (QueueName)
+            queue.receive_messages.return_value = []
+            queue.delete_messages.side_effect = _delete_messages
+            self.queues[QueueName] = queue
+
+        return self.queues[QueueName]
+
+    def _get_sensor(self, **sqs_other):
+        config = dict(CONFIG, sqs_other=dict(CONFIG['sqs_other'], **sqs_other))
+        sensor = self.get_sensor_instance(config=config)
+        sensor.setup()
+        return sensor
+
+    def test_concurrent_polling_config_parsing(self):
+        self.assertFalse(self._get_sensor().concurrent_polling)
+        self.assertTrue(self._get_sensor(concurrent_polling=True).concurrent_polling)
+        self.assertFalse(self._get_sensor(concurrent_polling=False).concurrent_polling)
+
+        # Values stored in the datastore are strings
+        for value, expected in [('true', True), ('True', True), ('1', True), ('yes', True),
+                                ('false', False), ('0', False), ('no', False)]:
+            self.sensor_service.set_value('aws.concurrent_polling', value)
+            self.assertEqual(self._get_sensor().concurrent_polling, expected)
+
+    def test_poll_dispatches_and_deletes_messages(self):
+        sensor = self._get_sensor()
+        msg = _get_message('{"a": 1}')
+        self._get_queue_by_name('first_queue').receive_messages.return_value = [msg]
+
+        sensor.poll()
+
+        self.assertEqual(self.get_dispatched_triggers(), [{
+            'trigger': 'aws.sqs_new_message',
+            'payload': {'queue': 'first_queue', 'body': '{"a": 1}'}
+        }])
+        msg.delete.assert_called_once_with()
+
+    def test_missing_queue_is_created(self):
+        queue = self._get_queue_by_name('first_queue')
+        self.sqs_res.get_queue_by_name.side_effect = \
+            _get_client_error('AWS.SimpleQueueService.NonExistentQueue')
+        self.sqs_res.create_queue.return_value = queue
+
+        sensor = self._get_sensor(concurrent_polling=True)
+        sensor.poll()
+
+        self.sqs_res.create_queue.assert_any_call(QueueName='first_queue')
+        self.sqs_res.create_queue.assert_any_call(QueueName='second_queue')
+        self.assertEqual(sensor.get_queue_stats()['first_queue']['errors'], 0)
+
+    def test_concurrent_polling_queue_lookup_error(self):
+        self.sqs_res.get_queue_by_name.side_effect = _get_client_error('AccessDenied')
+
+        sensor = self._get_sensor(concurrent_polling=True)
+        sensor.poll()
+
+        self.sqs_res.create_queue.assert_not_called()
+        stats = sensor.get_queue_stats()
+        self.assertEqual(stats['first_queue']['errors'], 1)
+        self.assertEqual(stats['first_queue']['polls'], 0)
+        self.assertEqual(stats['second_queue']['errors'], 1)
+
+        # Queue is looked up again on the next poll once it's available
+        self.sqs_res.get_queue_by_name.side_effect = self._get_queue_by_name
+        self._get_queue_by_name('first_queue').receive_messages.return_value = \
+            [_get_message('body')]
+        sensor.poll()
+
+        self.assertEqual(len(self.get_dispatched_triggers()), 1)
+        self.assertEqual(sensor.get_queue_stats()['first_queue']['deleted'], 1)
+
+    def test_concurrent_polling_caches_queues(self):
+        sensor = self._get_sensor(concurrent_polling=True, wait_time_seconds=5)
+
+        sensor.poll()
+        sensor.poll()
+
+        self.assertEqual(self.sqs_res.get_queue_by_name.call_count, 2)
+        self.queues['first_queue'].receive_messages.assert_called_with(
+            WaitTimeSeconds=5, MaxNumberOfMessages=10,
+            MessageAttributeNames=['content_type', 'content_encoding'])
+
+        stats = sensor.get_queue_stats()
+        self.assertEqual(stats['first_queue']['polls'], 2)
+        self.assertEqual(stats['first_queue']['received'], 0)
+        self.assertEqual(stats['second_queue']['polls'], 2)
+
+    def test_concurrent_polling_deletes_messages_in_batches(self):
+        sensor = self._get_sensor(concurrent_polling=True)
+        queue = self._get_queue_by_name('first_queue')
+        msgs = [_get_message('body %s' % (index), index) for index in range(23)]
+        queue.receive_messages.return_value = msgs
+
+        sensor.poll()
+
+        self.assertEqual(len(self.get_dispatched_triggers()), 23)
+        calls = queue.delete_messages.call_args_list
+        self.assertEqual([len(call[1]['Entries']) for call in calls], [10, 10, 3])
+        self.assertEqual(calls[1][1]['Entries'][0], {'Id': '0', 'ReceiptHandle': 'handle-10'})
+        for msg in msgs:
+            msg.delete.assert_not_called()
+
+        stats = sensor.get_queue_stats()['first_queue']
+        self.assertEqual(stats['received'], 23)
+        self.assertEqual(stats['deleted'], 23)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_concurrent_polling_failed_delete_batch(self):
+        sensor = self._get_sensor(concurrent_polling=True)
+        queue = self._get_queue_by_name('first_queue')
+        queue.receive_messages.return_value = [_get_message('body', index)
+                                               for index in range(15)]
+        queue.delete_messages.side_effect = [_get_client_error('InternalError',
+                                                               'DeleteMessageBatch'),
+                                             {'Successful': [{'Id': '0'}],
+                                              'Failed': [{'Id': '1', 'Message': 'error'}]}]
+        second_queue = self._get_queue_by_name('second_queue')
+        second_queue.receive_messages.return_value = [_get_message('other')]
+
+        sensor.poll()
+
+        self.assertEqual(queue.delete_messages.call_count, 2)
+        self.assertEqual(len(self.get_dispatched_triggers()), 16)
+        stats = sensor.get_queue_stats()
+        self.assertEqual(stats['first_queue']['deleted'], 1)
+        self.assertEqual(stats['first_queue']['errors'], 1)
+        self.assertEqual(stats['second_queue']['deleted'], 1)
+
+        # Polling continues on the next run
+        queue.receive_messages.return_value = [_get_message('body')]
+        queue.delete_messages.side_effect = _delete_messages
+        sensor.poll()
+
+        stats = sensor.get_queue_stats()
+        self.assertEqual(stats['first_queue']['polls'], 2)
+        self.assertEqual(stats['first_queue']['deleted'], 2)
+        self.assertEqual(len(self.get_dispatched_triggers()), 18)
+
+    def test_get_queue_stats_includes_decode_failures(self):
+        sensor = self._get_sensor(concurrent_polling=True, deserialization_method='json')
+        queue = self._get_queue_by_name('first_queue')
+        queue.receive_messages.return_value = [_get_message('{"a": 1}'), _get_message('{')]
+
+        sensor.poll()
+
+        payloads = [trigger['payload'] for trigger in self.get_dispatched_triggers()]
+        self.assertEqual(payloads[0], {'queue': 'first_queue', 'body': {'a': 1}})
+        stats = sensor.get_queue_stats()
+        self.assertEqual(stats['first_queue']['decode_failures'], 1)
+        self.assertEqual(stats['second_queue']['decode_failures'], 0)
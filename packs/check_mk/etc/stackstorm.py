@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 # StackStorm
 
+import json
 import requests
+import socket
 import time
 import os
 import uuid
@@ -19,6 +21,11 @@ ST2_API_BASE_URL = 'https://localhost/api/v1/'
 ST2_TRIGGERTYPE_REF = 'check_mk.event_handler'
 ST2_VERIFY_SSL = False
 
+# Path to the unix socket of the spool daemon (st2_spool.py). When set, events are
+# handed over to the daemon instead of being posted to StackStorm directly.
+SPOOL_SOCKET = None
+SPOOL_TIMEOUT = 1.0
+
 
 def main(config_file=CMK_CONFIG_FILE):
     config = read_config(config_file)
@@ -26,6 +33,7 @@ def main(config_file=CMK_CONFIG_FILE):
     st2_trigger = config.get('st2_triggertype_ref', ST2_TRIGGERTYPE_REF)
     st2_verify_ssl = config.get('st2_verify_ssl', ST2_VERIFY_SSL)
     cmk_env_prefix = config.get('cmk_env_prefix', CMK_ENV_PREFIX)
+    spool_socket = config.get('spool_socket', SPOOL_SOCKET)
 
     # gather all options from env
     context = dict([(key[len(cmk_env_prefix):], value.decode("utf-8"))
@@ -34,6 +42,13 @@ def main(config_file=CMK_CONFIG_FILE):
 
     trace_tag = uuid.uuid4()  # check_mk doesn't provide its own notification id
     payload = build_payload(context)
+
+    if spool_socket:
+        spool_headers = {'St2-Trace-Tag': str(trace_tag)}
+        if post_event_to_spool(spool_socket, st2_trigger, payload, spool_headers):
+            print "Spooled event to %s. TRACE_TAG: %s" % (spool_socket, trace_tag)
+            return
+
     headers = {
         'St2-Api-Key': config['api_key'],
         'St2-Trace-Tag': trace_tag
@@ -135,6 +150,30 @@ def to_epoch(cmk_ts):
     return int(time.mktime(time.strptime(cmk_ts, '%Y-%m-%d %H:%M:%S')))
 
 
+def post_event_to_spool(socket_path, trigger, payload, headers):
+    """Hand the event over to the local spool daemon, returns False if it is not reachable"""
+    event = {
+        'body': {
+            'trigger': trigger,
+            'payload': payload
+        },
+        'headers': headers
+    }
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(SPOOL_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(event) + '\n')
+    except socket.error as e:
+        print "Spool daemon is not reachable on %s: %s" % (socket_path, e)
+        return False
+    finally:
+        sock.close()
+
+    return True
+
+
 def post_event_to_st2(url, trigger, payload, headers, verify=False):
     body = {
         'trigger': trigger,
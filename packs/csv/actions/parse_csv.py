@@ -1,4 +1,8 @@
 import csv
+import itertools
+import json
+import math
+import re
 from StringIO import StringIO
 
 from st2actions.runners.pythonrunner import Action
@@ -7,14 +11,190 @@ __all__ = [
     'ParseCSVAction'
 ]
 
+BOOLEAN_VALUES = {
+    'true': True,
+    'false': False
+}
+
+# Only plain decimal numbers are converted, values such as "007", "nan" or "inf" are kept as
+# strings since they are usually identifiers or codes and not numbers
+NUMBER_RE = re.compile(r'^-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?$')
+
+
+class LineReader(object):
+    """
+    Line iterator which keeps track of the position in the underlying file.
+
+    Lines are read with ``readline()`` so the position is exact (file iteration uses a read
+    ahead buffer) and the csv reader only consumes the lines of the record it is parsing, so
+    once a row is returned ``position`` points to the beginning of the next row.
+    """
+
+    def __init__(self, fh):
+        self._fh = fh
+        self.position = fh.tell()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self._fh.readline()
+        if not line:
+            raise StopIteration()
+
+        self.position += len(line)
+        return line
+
+    def seek(self, position):
+        self._fh.seek(position)
+        self.position = position
+
 
 class ParseCSVAction(Action):
-    def run(self, data, delimiter=',', quote_char='"'):
-        fh = StringIO(data)
+    def run(self, data=None, delimiter=',', quote_char='"', file_path=None, with_header=False,
+            infer_types=False, columns=None, filters=None, offset=0, limit=None,
+            chunk_size=None, output_file=None, cursor=None):
+        """
+        Parse CSV data. When ``chunk_size`` or ``output_file`` is provided, rows are streamed so
+        memory usage doesn't depend on the size of the input.
 
-        reader = csv.reader(fh, delimiter=str(delimiter), quotechar=str(quote_char))
+        Chunks contain ``next_cursor`` which is the position right after the last returned row.
+        Passing it back as ``cursor`` resumes parsing from there instead of skipping all the
+        rows which have already been returned.
+        """
+        if not data and not file_path:
+            raise ValueError('Either "data" or "file_path" parameter needs to be provided')
+
+        if file_path:
+            fh = open(file_path, 'rb')
+        else:
+            fh = StringIO(data)
+
+        try:
+            lines = LineReader(fh)
+            reader = csv.reader(lines, delimiter=str(delimiter), quotechar=str(quote_char))
+            header = next(reader, None) if with_header else None
+
+            if cursor:
+                # Header is always read from the beginning of the document
+                lines.seek(cursor)
+
+            rows = self._iter_rows(reader=reader, with_header=with_header, header=header,
+                                   infer_types=infer_types, columns=columns, filters=filters)
+
+            if chunk_size:
+                limit = min(chunk_size, limit) if limit else chunk_size
+
+            stop = offset + limit if limit else None
+            rows = itertools.islice(rows, offset, stop)
+
+            if output_file:
+                row_count = self._write_rows(rows=rows, output_file=output_file)
+                return {
+                    'output_file': output_file,
+                    'row_count': row_count
+                }
+
+            result = list(rows)
+        finally:
+            fh.close()
+
+        if chunk_size:
+            # A full chunk means there might be more rows left
+            more = len(result) == limit
+            return {
+                'rows': result,
+                'next_offset': offset + len(result) if more else None,
+                'next_cursor': lines.position if more else None
+            }
 
-        result = []
-        for row in reader:
-            result.append(row)
         return result
+
+    def _iter_rows(self, reader, with_header=False, header=None, infer_types=False,
+                   columns=None, filters=None):
+        if with_header and header is None:
+            return
+
+        filters = [(self._get_column_index(column, header), str(value))
+                   for column, value in (filters or {}).items()]
+
+        if columns:
+            indexes = [self._get_column_index(column, header) for column in columns]
+        elif header:
+            indexes = range(len(header))
+        else:
+            indexes = None
+
+        keys = [header[index] for index in indexes] if header else None
+
+        for row in reader:
+            if not self._row_matches(row, filters):
+                continue
+
+            if indexes is not None:
+                values = [row[index] if index < len(row) else '' for index in indexes]
+            else:
+                values = row
+
+            if infer_types:
+                values = [self._convert_value(value) for value in values]
+
+            if keys:
+                yield dict(zip(keys, values))
+            else:
+                yield values
+
+    def _write_rows(self, rows, output_file):
+        row_count = 0
+
+        with open(output_file, 'w') as fp:
+            for row in rows:
+                fp.write(json.dumps(row, separators=(',', ':')))
+                fp.write('\n')
+                row_count += 1
+
+        return row_count
+
+    @staticmethod
+    def _get_column_index(column, header):
+        if header and column in header:
+            return header.index(column)
+
+        try:
+            index = int(column)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid column: %s' % (column))
+
+        if header and index >= len(header):
+            raise ValueError('Invalid column: %s' % (column))
+
+        return index
+
+    @staticmethod
+    def _row_matches(row, filters):
+        for index, value in filters:
+            if index >= len(row) or row[index] != value:
+                return False
+
+        return True
+
+    @staticmethod
+    def _convert_value(value):
+        if value == '':
+            return None
+
+        if value.lower() in BOOLEAN_VALUES:
+            return BOOLEAN_VALUES[value.lower()]
+
+        match = NUMBER_RE.match(value)
+        if not match:
+            return value
+
+        if not match.group(2) and not match.group(3):
+            return int(value)
+
+        number = float(value)
+        if math.isinf(number):
+            return value
+
+        return number
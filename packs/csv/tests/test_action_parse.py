@@ -1,3 +1,8 @@
+import json
+import os
+import shutil
+import tempfile
+
 from st2tests.base import BaseActionTestCase
 
 from parse_csv import ParseCSVAction
@@ -16,6 +21,23 @@ first|last|year
 name1|surename1|1990
 """.strip()
 
+MOCK_DATA_4 = """
+code,value
+007,nan
+1,inf
+-2,1e999
+0,2.5e3
+"multi
+line",0.5
+""".strip()
+
+MOCK_DATA_3 = """
+first,last,year,active
+name1,surename1,1990,true
+name2,surename2,1985,false
+name3,surename1,,true
+""".strip()
+
 
 class ParseCSVActionTestCase(BaseActionTestCase):
     action_cls = ParseCSVAction
@@ -35,3 +57,113 @@ class ParseCSVActionTestCase(BaseActionTestCase):
             ['name1', 'surename1', '1990']
         ]
         self.assertEqual(result, expected)
+
+    def test_run_with_header_and_infer_types(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_3, with_header=True,
+                                                infer_types=True)
+        expected = [
+            {'first': 'name1', 'last': 'surename1', 'year': 1990, 'active': True},
+            {'first': 'name2', 'last': 'surename2', 'year': 1985, 'active': False},
+            {'first': 'name3', 'last': 'surename1', 'year': None, 'active': True}
+        ]
+        self.assertEqual(result, expected)
+
+    def test_run_infer_types_only_plain_numbers(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_4, infer_types=True)
+        expected = [
+            ['code', 'value'],
+            ['007', 'nan'],
+            [1, 'inf'],
+            [-2, '1e999'],
+            [0, 2500.0],
+            ['multi\nline', 0.5]
+        ]
+        self.assertEqual(result, expected)
+
+    def test_run_columns_and_filters(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_3, with_header=True,
+                                                columns=['first', 'year'],
+                                                filters={'last': 'surename1'})
+        expected = [
+            {'first': 'name1', 'year': '1990'},
+            {'first': 'name3', 'year': ''}
+        ]
+        self.assertEqual(result, expected)
+
+        result = self.get_action_instance().run(data=MOCK_DATA_3, columns=[0, '2'],
+                                                filters={'3': 'false'})
+        self.assertEqual(result, [['name2', '1985']])
+
+    def test_run_invalid_column(self):
+        self.assertRaises(ValueError, self.get_action_instance().run, data=MOCK_DATA_3,
+                          with_header=True, columns=['unknown'])
+
+    def test_run_chunks(self):
+        action = self.get_action_instance()
+
+        result = action.run(data=MOCK_DATA_3, with_header=True, columns=['first'],
+                            chunk_size=2)
+        self.assertEqual(result['rows'], [{'first': 'name1'}, {'first': 'name2'}])
+        self.assertEqual(result['next_offset'], 2)
+
+        result = action.run(data=MOCK_DATA_3, with_header=True, columns=['first'],
+                            chunk_size=2, offset=result['next_offset'])
+        self.assertEqual(result, {'rows': [{'first': 'name3'}], 'next_offset': None,
+                                  'next_cursor': None})
+
+    def test_run_chunks_cursor(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'input.csv')
+        with open(file_path, 'w') as fp:
+            fp.write(MOCK_DATA_4)
+
+        action = self.get_action_instance()
+        rows = []
+        next_lines = []
+        cursor = None
+        while True:
+            result = action.run(file_path=file_path, with_header=True, chunk_size=2,
+                                cursor=cursor)
+            rows.extend(result['rows'])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+
+            with open(file_path, 'rb') as fp:
+                fp.seek(cursor)
+                next_lines.append(fp.readline())
+
+        self.assertEqual([row['code'] for row in rows], ['007', '1', '-2', '0', 'multi\nline'])
+        # Cursor points to the beginning of the row after the last returned one
+        self.assertEqual(next_lines, ['-2,1e999\n', '"multi\n'])
+
+        # Rows are filtered after resuming from the cursor
+        result = action.run(file_path=file_path, with_header=True, chunk_size=1,
+                            filters={'value': '1e999'})
+        self.assertEqual(result['rows'], [{'code': '-2', 'value': '1e999'}])
+        result = action.run(file_path=file_path, with_header=True, chunk_size=1,
+                            filters={'value': '1e999'}, cursor=result['next_cursor'])
+        self.assertEqual(result['rows'], [])
+
+    def test_run_file_path_and_output_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'input.csv')
+        output_file = os.path.join(temp_dir, 'output.json')
+        with open(file_path, 'w') as fp:
+            fp.write(MOCK_DATA_3)
+
+        result = self.get_action_instance().run(file_path=file_path, with_header=True,
+                                                infer_types=True, limit=2,
+                                                output_file=output_file)
+        self.assertEqual(result, {'output_file': output_file, 'row_count': 2})
+
+        with open(output_file) as fp:
+            rows = [json.loads(line) for line in fp]
+        self.assertEqual([row['year'] for row in rows], [1990, 1985])
+
+    def test_run_no_data(self):
+        self.assertRaises(ValueError, self.get_action_instance().run)
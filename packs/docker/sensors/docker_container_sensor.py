@@ -1,23 +1,43 @@
 # Requirements:
 # See ../requirements.txt
+import time
+
 import docker
 import six
 
 from st2reactor.sensor.base import PollingSensor
 
+# Container events the sensor subscribes to in the events mode
+EVENT_FILTERS = {
+    'type': 'container',
+    'event': ['start', 'die', 'oom', 'health_status']
+}
+
 
 class DockerSensor(PollingSensor):
     def __init__(self, sensor_service, config=None, poll_interval=5):
         super(DockerSensor, self).__init__(sensor_service=sensor_service,
                                            config=config,
                                            poll_interval=poll_interval)
+        self._logger = self._sensor_service.get_logger(__name__)
         self._running_containers = {}
         self._ps_opts = None
 
+        self._use_events = False
+        self._events_client = None
+        # Time of the last processed event, events are replayed from this time when the sensor
+        # re-subscribes to the events stream
+        self._events_since = None
+        self._last_event_time_nano = 0
+        self._reconcile = False
+        self._oom_killed = set()
+
         self._trigger_pack = 'docker'
 
         self._started_trigger_ref = '.'.join([self._trigger_pack, 'container_tracker.started'])
         self._stopped_trigger_ref = '.'.join([self._trigger_pack, 'container_tracker.stopped'])
+        self._health_status_trigger_ref = '.'.join([self._trigger_pack,
+                                                    'container_tracker.health_status'])
 
     def setup(self):
         docker_opts = self._config
@@ -34,12 +54,42 @@ class DockerSensor(PollingSensor):
         if docker_opts['timeout'] is not None:
             self._timeout = docker_opts['timeout']
         self._ps_opts = docker_opts['ps_options']
+        self._use_events = docker_opts.get('events', False)
         self._client = docker.Client(base_url=self._url,
                                      version=self._version,
                                      timeout=self._timeout)
+
+        if self._use_events:
+            # Events stream is idle while there is no container activity so it can't use a
+            # read timeout
+            self._events_client = docker.Client(base_url=self._url,
+                                                version=self._version,
+                                                timeout=None)
+            self._events_since = int(time.time())
+
         self._running_containers = self._get_active_containers()
 
     def poll(self):
+        if self._use_events:
+            self._watch_events()
+        else:
+            self._poll_containers()
+
+    def cleanup(self):
+        for client in [self._client, self._events_client]:
+            if client and getattr(client, 'close', None) is not None:
+                client.close()
+
+    def add_trigger(self, trigger):
+        pass
+
+    def update_trigger(self, trigger):
+        pass
+
+    def remove_trigger(self, trigger):
+        pass
+
+    def _poll_containers(self):
         containers = self._get_active_containers()
 
         # Stopped
@@ -56,22 +106,80 @@ class DockerSensor(PollingSensor):
 
         self._running_containers = containers
 
-    def cleanup(self):
-        if getattr(self._client, 'close') is not None:
-            self._client.close()
-
-    def add_trigger(self, trigger):
-        pass
-
-    def update_trigger(self, trigger):
-        pass
-
-    def remove_trigger(self, trigger):
-        pass
-
-    def _dispatch_trigger(self, trigger, container):
+    def _watch_events(self):
+        """
+        Process container events until the events stream is closed.
+
+        Containers are listed again after the stream has been interrupted, events which have
+        been emitted in the mean time are replayed from the time of the last processed event.
+        """
+        if self._reconcile:
+            self._poll_containers()
+            self._reconcile = False
+
+        try:
+            events = self._events_client.events(since=self._events_since,
+                                                filters=EVENT_FILTERS, decode=True)
+
+            for event in events:
+                self._handle_event(event)
+        except Exception as e:
+            self._logger.exception('Failed to read Docker events: %s' % (str(e)))
+
+        self._reconcile = True
+
+    def _handle_event(self, event):
+        # Older API versions only include "status" and "id" attributes
+        action = event.get('Action', event.get('status', ''))
+        id = event.get('id', event.get('Actor', {}).get('ID', None))
+
+        if not id or event.get('Type', 'container') != 'container':
+            return
+
+        # Events can only be requested since a particular second so some of the replayed
+        # events have already been processed
+        time_nano = event.get('timeNano', None)
+        if time_nano:
+            if time_nano <= self._last_event_time_nano:
+                return
+            self._last_event_time_nano = time_nano
+
+        self._events_since = max(self._events_since, event.get('time', 0))
+        key = self._get_key(id)
+
+        if action == 'start':
+            if key in self._running_containers:
+                # Event has been replayed after the containers have been listed
+                return
+
+            container = self._get_container(id)
+            if not container:
+                return
+
+            self._running_containers[key] = container
+            self._dispatch_trigger(trigger=self._started_trigger_ref, container=container)
+        elif action == 'die':
+            container = self._running_containers.pop(key, None)
+            oom_killed = key in self._oom_killed
+            self._oom_killed.discard(key)
+
+            if container:
+                self._dispatch_trigger(trigger=self._stopped_trigger_ref, container=container,
+                                       oom_killed=oom_killed)
+        elif action == 'oom':
+            self._oom_killed.add(key)
+        elif action.startswith('health_status'):
+            container = self._running_containers.get(key, None)
+            health_status = action.split(':', 1)[-1].strip()
+
+            if container:
+                self._dispatch_trigger(trigger=self._health_status_trigger_ref,
+                                       container=container, health_status=health_status)
+
+    def _dispatch_trigger(self, trigger, container, **kwargs):
         payload = {}
         payload['container_info'] = container
+        payload.update(kwargs)
         self._sensor_service.dispatch(trigger, payload)
 
     def _get_active_containers(self):
@@ -83,6 +191,17 @@ class DockerSensor(PollingSensor):
                                              limit=opts['limit'])
         return self._to_dict(containers)
 
+    def _get_container(self, id):
+        # Container could already be stopped when the event is processed
+        containers = self._client.containers(all=True, trunc=self._ps_opts['trunc'],
+                                             filters={'id': id})
+        return containers[0] if containers else None
+
+    def _get_key(self, id):
+        # Container listing can return truncated ids while events always contain full ids
+        return id[:12]
+
     def _to_dict(self, containers):
-        container_tuples = [(container['Id'], container) for container in containers]
+        container_tuples = [(self._get_key(container['Id']), container)
+                            for container in containers]
         return dict(container_tuples)
@@ -0,0 +1,214 @@
+"""
+Minimal local stand-in for the Docker Engine API listening on a unix socket used by the Docker
+sensor tests.
+
+It only implements the endpoints the sensor uses (GET /containers/json and a streaming
+GET /events) for a set of containers which are started and stopped by the tests.
+"""
+
+import json
+import re
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import queue
+from six.moves import socketserver
+from six.moves.urllib.parse import parse_qs
+from six.moves.urllib.parse import urlparse
+
+__all__ = [
+    'FakeDockerServer'
+]
+
+VERSION_PREFIX_RE = re.compile(r'^/v[\d.]+')
+
+# Sent to the event streams to close them
+CLOSE_STREAM = object()
+
+
+class FakeDockerRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Client address of a unix socket connection is an empty string
+        return 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = VERSION_PREFIX_RE.sub('', url.path)
+        query = dict([(key, values[-1]) for key, values in parse_qs(url.query).items()])
+        filters = json.loads(query.get('filters', '{}'))
+
+        if path == '/containers/json':
+            show_all = query.get('all', '0') in ['1', 'true', 'True']
+            self._write_json(self.server.list_containers(show_all=show_all, filters=filters))
+        elif path == '/events':
+            self._stream_events(since=int(query.get('since', 0)), filters=filters)
+        else:
+            self._write_json({'message': 'page not found'}, status=404)
+
+    def _write_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, since, filters):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+
+        events = self.server.subscribe(since=since)
+
+        try:
+            while True:
+                event = events.get()
+                if event is CLOSE_STREAM:
+                    break
+
+                if self.server.event_matches(event, filters):
+                    # Each event is sent in a separate chunk
+                    data = (json.dumps(event) + '\n').encode('utf-8')
+                    self.wfile.write(('%x\r\n' % (len(data))).encode('utf-8') + data + b'\r\n')
+                    self.wfile.flush()
+
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        finally:
+            self.server.unsubscribe(events)
+
+        self.close_connection = True
+
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, FakeDockerRequestHandler)
+
+        self.path = path
+        # id -> container
+        self.containers = {}
+        self.events = []
+        self.subscribers = []
+        self.lock = threading.RLock()
+
+    @property
+    def url(self):
+        return 'unix://%s' % (self.path)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def list_containers(self, show_all=False, filters=None):
+        ids = (filters or {}).get('id', [])
+
+        with self.lock:
+            containers = sorted(self.containers.values(), key=lambda container: container['Id'])
+
+        return [container for container in containers
+                if (show_all or container['State'] == 'running') and
+                (not ids or [id for id in ids if container['Id'].startswith(id)])]
+
+    def start_container(self, id, name=None, image='ubuntu:latest'):
+        with self.lock:
+            self.containers[id] = {
+                'Id': id,
+                'Names': ['/%s' % (name or id[:12])],
+                'Image': image,
+                'Command': 'sleep 3600',
+                'Created': int(time.time()),
+                'State': 'running',
+                'Status': 'Up Less than a second'
+            }
+            self.emit(id, 'start')
+
+    def stop_container(self, id, oom=False):
+        with self.lock:
+            self.containers[id]['State'] = 'exited'
+            self.containers[id]['Status'] = 'Exited (137) Less than a second ago'
+
+            if oom:
+                self.emit(id, 'oom')
+            self.emit(id, 'die')
+
+    def set_health_status(self, id, status):
+        self.emit(id, 'health_status: %s' % (status))
+
+    def emit(self, id, action):
+        """
+        Record a container event and send it to the clients which are subscribed to events.
+        """
+        with self.lock:
+            container = self.containers[id]
+            event = {
+                'status': action,
+                'id': id,
+                'from': container['Image'],
+                'Type': 'container',
+                'Action': action,
+                'Actor': {
+                    'ID': id,
+                    'Attributes': {
+                        'image': container['Image'],
+                        'name': container['Names'][0][1:]
+                    }
+                },
+                'time': int(time.time()),
+                'timeNano': int(time.time() * 1e9)
+            }
+            self.events.append(event)
+
+            for subscriber in self.subscribers:
+                subscriber.put(event)
+
+    def event_matches(self, event, filters):
+        if 'type' in filters and event['Type'] not in filters['type']:
+            return False
+
+        # Same as the Docker daemon, "health_status" matches all the health status events
+        actions = filters.get('event', [])
+        if actions and event['Action'].split(':')[0] not in actions:
+            return False
+
+        return True
+
+    def subscribe(self, since=0):
+        events = queue.Queue()
+
+        with self.lock:
+            for event in self.events:
+                if event['time'] >= since:
+                    events.put(event)
+
+            self.subscribers.append(events)
+
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+
+    def close_streams(self):
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.put(CLOSE_STREAM)
+
+    def wait_for_subscribers(self, count=1, timeout=1):
+        deadline = time.time() + timeout
+        while len(self.subscribers) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+        return len(self.subscribers) >= count
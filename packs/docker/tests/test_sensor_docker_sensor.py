@@ -1,8 +1,15 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
 import mock
 
 from st2tests.base import BaseSensorTestCase
 
 from docker_container_sensor import DockerSensor
+from docker_server import FakeDockerServer
 
 MOCK_CONTAINER_DATA = {
     "Id": "8dfafdbc3a40",
@@ -17,9 +24,63 @@ MOCK_CONTAINER_DATA = {
 }
 
 
+CONTAINER_ID_1 = '8dfafdbc3a40' + '0' * 52
+CONTAINER_ID_2 = '5b2e2d0a1c7f' + '1' * 52
+CONTAINER_ID_3 = 'c3f279d17e0a' + '2' * 52
+
+
 class DockerSensorTestCase(BaseSensorTestCase):
     sensor_cls = DockerSensor
 
+    def _start_server(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        server = FakeDockerServer(os.path.join(temp_dir, 'docker.sock'))
+        server.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _get_sensor(self, server):
+        config = {
+            'url': server.url,
+            'version': '1.24',
+            'timeout': 5,
+            'events': True,
+            'ps_options': {
+                'quiet': False,
+                'trunc': True,
+                'latest': False,
+                'since': None,
+                'before': None,
+                'limit': -1
+            }
+        }
+        sensor = self.get_sensor_instance(config=config)
+        self.addCleanup(sensor.cleanup)
+        return sensor
+
+    def _start_polling(self, sensor, server):
+        thread = threading.Thread(target=sensor.poll)
+        thread.daemon = True
+        thread.start()
+
+        self.assertTrue(server.wait_for_subscribers(count=1))
+        return thread
+
+    def _stop_polling(self, thread, server):
+        server.close_streams()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+    def _wait_for_triggers(self, count, timeout=1):
+        deadline = time.time() + timeout
+        while len(self.get_dispatched_triggers()) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+        return self.get_dispatched_triggers()
+
     def test_poll(self):
         sensor = self.get_sensor_instance()
 
@@ -46,3 +107,71 @@ class DockerSensorTestCase(BaseSensorTestCase):
         self.assertEqual(len(self.get_dispatched_triggers()), 2)
         self.assertTriggerDispatched(trigger='docker.container_tracker.stopped',
                                      payload={'container_info': MOCK_CONTAINER_DATA})
+
+    def test_events_mode_dispatches_triggers_for_container_events(self):
+        server = self._start_server()
+        server.start_container(CONTAINER_ID_1, name='running_before_start')
+
+        sensor = self._get_sensor(server)
+        sensor.setup()
+        self.assertEqual(list(sensor._running_containers.keys()), [CONTAINER_ID_1[:12]])
+
+        thread = self._start_polling(sensor, server)
+
+        # Start event of the already listed container is replayed and ignored
+        server.start_container(CONTAINER_ID_2, name='boring_feynman')
+        triggers = self._wait_for_triggers(count=1)
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers[0]['trigger'], 'docker.container_tracker.started')
+        self.assertEqual(triggers[0]['payload']['container_info']['Names'], ['/boring_feynman'])
+
+        server.set_health_status(CONTAINER_ID_2, 'unhealthy')
+        server.stop_container(CONTAINER_ID_2, oom=True)
+        server.stop_container(CONTAINER_ID_1)
+
+        triggers = self._wait_for_triggers(count=4)
+        self.assertEqual([trigger['trigger'] for trigger in triggers], [
+            'docker.container_tracker.started',
+            'docker.container_tracker.health_status',
+            'docker.container_tracker.stopped',
+            'docker.container_tracker.stopped'
+        ])
+        self.assertEqual(triggers[1]['payload']['health_status'], 'unhealthy')
+        self.assertTrue(triggers[2]['payload']['oom_killed'])
+        # Listing returns truncated ids
+        self.assertEqual(triggers[2]['payload']['container_info']['Id'], CONTAINER_ID_2[:12])
+        self.assertFalse(triggers[3]['payload']['oom_killed'])
+        self.assertEqual(triggers[3]['payload']['container_info']['Id'], CONTAINER_ID_1[:12])
+        self.assertEqual(sensor._running_containers, {})
+
+        self._stop_polling(thread, server)
+
+    def test_events_mode_reconciles_containers_after_stream_is_closed(self):
+        server = self._start_server()
+        server.start_container(CONTAINER_ID_1)
+
+        sensor = self._get_sensor(server)
+        sensor.setup()
+
+        thread = self._start_polling(sensor, server)
+        self._stop_polling(thread, server)
+
+        # Container activity while the sensor is not subscribed to events
+        server.stop_container(CONTAINER_ID_1)
+        server.start_container(CONTAINER_ID_2)
+        server.start_container(CONTAINER_ID_3)
+        server.stop_container(CONTAINER_ID_3)
+
+        thread = self._start_polling(sensor, server)
+        triggers = self._wait_for_triggers(count=4)
+        self._stop_polling(thread, server)
+
+        dispatched = sorted([(trigger['trigger'], trigger['payload']['container_info']['Id'])
+                             for trigger in triggers])
+        self.assertEqual(dispatched, [
+            ('docker.container_tracker.started', CONTAINER_ID_2[:12]),
+            ('docker.container_tracker.started', CONTAINER_ID_3[:12]),
+            ('docker.container_tracker.stopped', CONTAINER_ID_1[:12]),
+            ('docker.container_tracker.stopped', CONTAINER_ID_3[:12])
+        ])
+        self.assertEqual(list(sensor._running_containers.keys()), [CONTAINER_ID_2[:12]])
@@ -3,11 +3,18 @@ import base64
 
 import six
 import eventlet
-import easyimap
 from flanker import mime
 
 from st2reactor.sensor.base import PollingSensor
 
+from lib.imap import IMAPMailbox
+from lib.imap import DEFAULT_FETCH_BATCH_SIZE
+from lib.imap import DEFAULT_IDLE_TIMEOUT
+from lib.attachments import AttachmentStore
+from lib.attachments import DEFAULT_STORE_MAX_SIZE
+from lib.attachments import DEFAULT_STORE_PATH
+from lib.attachments import DEFAULT_STORE_TTL
+
 __all__ = [
     'IMAPSensor'
 ]
@@ -23,6 +30,16 @@ DEFAULT_DOWNLOAD_ATTACHMENTS = False
 DEFAULT_MAX_ATTACHMENT_SIZE = 1024
 DEFAULT_ATTACHMENT_DATASTORE_TTL = 1800
 
+# Attachments are stored in the local attachment store (deduplicated by their SHA256 digest)
+ATTACHMENT_STORAGE_LOCAL = 'local'
+# Each attachment is stored in the datastore under a per-message key
+ATTACHMENT_STORAGE_DATASTORE = 'datastore'
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE = False
+
+# How long to wait before re-connecting after an IDLE connection has failed (in seconds)
+IDLE_RECONNECT_DELAY = 5
+
 
 class IMAPSensor(PollingSensor):
     def __init__(self, sensor_service, config=None, poll_interval=30):
@@ -37,34 +54,62 @@ class IMAPSensor(PollingSensor):
                                                      DEFAULT_MAX_ATTACHMENT_SIZE)
         self._attachment_datastore_ttl = self._config.get('attachment_datastore_ttl',
                                                           DEFAULT_MAX_ATTACHMENT_SIZE)
+        self._attachment_storage = self._config.get('imap_attachment_storage',
+                                                    ATTACHMENT_STORAGE_LOCAL)
+        self._attachment_store = AttachmentStore(
+            path=self._config.get('attachment_store_path', DEFAULT_STORE_PATH),
+            ttl=self._config.get('attachment_store_ttl', DEFAULT_STORE_TTL),
+            max_size=self._config.get('attachment_store_max_size', DEFAULT_STORE_MAX_SIZE))
+
+        if self._attachment_storage not in [ATTACHMENT_STORAGE_LOCAL,
+                                            ATTACHMENT_STORAGE_DATASTORE]:
+            raise ValueError('Invalid attachment storage: %s' % (self._attachment_storage))
+
+        self._pool_size = self._config.get('imap_pool_size', DEFAULT_POOL_SIZE)
+        self._fetch_batch_size = self._config.get('imap_fetch_batch_size',
+                                                  DEFAULT_FETCH_BATCH_SIZE)
+        self._idle = self._config.get('imap_idle', DEFAULT_IDLE)
+        self._idle_timeout = self._config.get('imap_idle_timeout', DEFAULT_IDLE_TIMEOUT)
         self._mailboxes = {}
+        self._pool = None
+        self._idle_threads = []
+        self._running = False
 
     def setup(self):
         self._logger.debug('[IMAPSensor]: entering setup')
 
-    def poll(self):
-        self._logger.debug('[IMAPSensor]: entering poll')
-
         if 'imap_mailboxes' in self._config:
             self._parse_mailboxes(self._config['imap_mailboxes'])
 
+        self._pool = eventlet.GreenPool(self._pool_size)
+        self._running = True
+
+        # Mailboxes in IDLE mode are handled by their own green thread, the remaining ones are
+        # polled
         for name, values in self._mailboxes.items():
-            mailbox = values['connection']
-            download_attachments = values['download_attachments']
-            mailbox_metadata = values['mailbox_metadata']
+            if values['idle']:
+                self._idle_threads.append(eventlet.spawn(self._idle_loop, name))
 
-            self._poll_for_unread_messages(name=name, mailbox=mailbox,
-                                           download_attachments=download_attachments,
-                                           mailbox_metadata=mailbox_metadata)
-            mailbox.quit()
+    def poll(self):
+        self._logger.debug('[IMAPSensor]: entering poll')
+
+        names = [name for name, values in self._mailboxes.items() if not values['idle']]
+
+        # Mailboxes are polled concurrently over their persistent connections
+        for _ in self._pool.imap(self._poll_mailbox, names):
+            pass
 
     def cleanup(self):
         self._logger.debug('[IMAPSensor]: entering cleanup')
+        self._running = False
+
+        for thread in self._idle_threads:
+            thread.kill()
 
         for name, values in self._mailboxes.items():
             mailbox = values['connection']
             self._logger.debug('[IMAPSensor]: Disconnecting from {0}'.format(name))
-            mailbox.quit()
+            mailbox.close()
 
     def add_trigger(self, trigger):
         pass
@@ -84,6 +129,7 @@ class IMAPSensor(PollingSensor):
             folder = config.get('mailbox', 'INBOX')
             ssl = config.get('ssl', False)
             download_attachments = config.get('download_attachments', DEFAULT_DOWNLOAD_ATTACHMENTS)
+            idle = config.get('idle', self._idle)
 
             if not user or not password:
                 self._logger.debug("""[IMAPSensor]: Missing
@@ -95,16 +141,16 @@ class IMAPSensor(PollingSensor):
                     for {0}""".format(mailbox))
                 continue
 
-            try:
-                connection = easyimap.connect(server, user, password,
-                                              folder, ssl=ssl, port=port)
-            except Exception as e:
-                message = 'Failed to connect to mailbox "%s": %s' % (mailbox, str(e))
-                raise Exception(message)
+            # Connection is established on the first poll and re-used by the subsequent ones
+            connection = IMAPMailbox(server=server, port=port, user=user, password=password,
+                                     folder=folder, ssl=ssl,
+                                     fetch_batch_size=self._fetch_batch_size,
+                                     logger=self._logger)
 
             item = {
                 'connection': connection,
                 'download_attachments': download_attachments,
+                'idle': idle,
                 'mailbox_metadata': {
                     'server': server,
                     'port': port,
@@ -115,31 +161,77 @@ class IMAPSensor(PollingSensor):
             }
             self._mailboxes[mailbox] = item
 
+    def _poll_mailbox(self, name):
+        values = self._mailboxes[name]
+        mailbox = values['connection']
+
+        try:
+            self._poll_for_unread_messages(name=name, mailbox=mailbox,
+                                           download_attachments=values['download_attachments'],
+                                           mailbox_metadata=values['mailbox_metadata'])
+        except Exception as e:
+            self._logger.exception('[IMAPSensor]: Failed to poll mailbox "%s": %s' %
+                                   (name, str(e)))
+            # Connection will be re-established on the next poll
+            mailbox.close()
+
+    def _idle_loop(self, name):
+        """
+        Process new messages as soon as the server reports them using IMAP IDLE (RFC 2177).
+
+        Falls back to polling if the server doesn't support IDLE.
+        """
+        values = self._mailboxes[name]
+        mailbox = values['connection']
+
+        while self._running:
+            try:
+                # Also processes messages which have arrived while the connection was down
+                self._poll_for_unread_messages(name=name, mailbox=mailbox,
+                                               download_attachments=values['download_attachments'],
+                                               mailbox_metadata=values['mailbox_metadata'])
+
+                if not mailbox.supports_idle:
+                    self._logger.info('[IMAPSensor]: Server for mailbox "%s" doesn\'t support '
+                                      'IDLE, falling back to polling' % (name))
+                    values['idle'] = False
+                    return
+
+                self._logger.debug('[IMAPSensor]: waiting for new messages in mailbox '
+                                   '{0}'.format(name))
+                mailbox.idle(timeout=self._idle_timeout)
+            except Exception as e:
+                self._logger.exception('[IMAPSensor]: IDLE failed for mailbox "%s": %s' %
+                                       (name, str(e)))
+                mailbox.close()
+                eventlet.sleep(IDLE_RECONNECT_DELAY)
+
     def _poll_for_unread_messages(self, name, mailbox, mailbox_metadata,
                                   download_attachments=False):
         self._logger.debug('[IMAPSensor]: polling mailbox {0}'.format(name))
 
-        messages = mailbox.unseen()
+        uids = mailbox.get_new_uids()
 
-        self._logger.debug('[IMAPSensor]: Processing {0} new messages'.format(len(messages)))
-        for message in messages:
-            self._process_message(uid=message.uid, mailbox=mailbox,
+        self._logger.debug('[IMAPSensor]: Processing {0} new messages'.format(len(uids)))
+        for uid, raw_message in mailbox.fetch_messages(uids):
+            self._process_message(uid=uid, raw_message=raw_message,
                                   download_attachments=download_attachments,
                                   mailbox_metadata=mailbox_metadata)
 
-    def _process_message(self, uid, mailbox, mailbox_metadata,
+    def _process_message(self, uid, raw_message, mailbox_metadata,
                          download_attachments=DEFAULT_DOWNLOAD_ATTACHMENTS):
-        message = mailbox.mail(uid, include_raw=True)
-        mime_msg = mime.from_string(message.raw)
-
-        body = message.body
-        sent_from = message.from_addr
-        sent_to = message.to
-        subject = message.title
-        date = message.date
-        message_id = message.message_id
+        # Message is only parsed once, all the attributes are retrieved from the parsed message
+        mime_msg = mime.from_string(raw_message)
+
+        body = self._get_body(mime_msg=mime_msg)
+        sent_from = mime_msg.headers.get('From', None)
+        sent_to = mime_msg.headers.get('To', None)
+        subject = mime_msg.headers.get('Subject', None)
+        date = mime_msg.headers.get('Date', None)
+        message_id = mime_msg.headers.get('Message-Id', None)
         headers = mime_msg.headers.items()
-        has_attachments = bool(message.attachments)
+        attachments = self._get_attachments(mime_msg=mime_msg)
+        has_attachments = bool(attachments)
 
         # Flatten the headers so they can be unpickled
         headers = self._flattern_headers(headers=headers)
@@ -160,19 +252,76 @@ class IMAPSensor(PollingSensor):
 
         if has_attachments and download_attachments:
             self._logger.debug('[IMAPSensor]: Downloading attachments for message {}'.format(uid))
-            result = self._download_and_store_message_attachments(message=message)
+            result = self._download_and_store_message_attachments(uid=uid,
+                                                                  attachments=attachments)
             payload['attachments'] = result
 
         self._sensor_service.dispatch(trigger=self._trigger, payload=payload)
 
-    def _download_and_store_message_attachments(self, message):
+    def _get_body(self, mime_msg):
         """
-        Method which downloads the provided message attachments and stores them in a datasatore.
+        Return the first plain text part of the message (or html part if there is no plain
+        text part).
+        """
+        html_body = None
+
+        for part in mime_msg.walk(with_self=True):
+            if part.content_type.is_multipart() or part.is_attachment():
+                continue
+
+            content_type = part.content_type.value
+            if content_type == 'text/plain':
+                return part.body
+            elif content_type == 'text/html' and html_body is None:
+                html_body = part.body
+
+        return html_body
+
+    def _get_attachments(self, mime_msg):
+        """
+        :rtype: ``list`` of (file_name, content, content_type) ``tuple``
+        """
+        result = []
+
+        for part in mime_msg.walk():
+            if part.is_attachment():
+                result.append((part.detected_file_name, part.body,
+                               part.detected_content_type.value))
+
+        return result
+
+    def _download_and_store_message_attachments(self, uid, attachments):
+        """
+        Method which stores the provided message attachments in the local attachment store (or
+        in a datastore).
 
         :rtype: ``list`` of ``dict``
         """
-        attachments = message.attachments
+        if self._attachment_storage == ATTACHMENT_STORAGE_DATASTORE:
+            return self._store_attachments_in_datastore(uid=uid, attachments=attachments)
+
+        result = []
+        for (file_name, content, content_type) in attachments:
+            stored = self._attachment_store.store(content)
+
+            if not stored:
+                self._logger.debug(('[IMAPSensor]: Skipping attachment "{}" since its bigger '
+                                    'than maximum allowed size ({})'.format(file_name,
+                                                                            len(content))))
+                continue
+
+            item = {
+                'file_name': file_name,
+                'content_type': content_type,
+                'size': stored['size'],
+                'sha256': stored['sha256'],
+                'path': stored['path']
+            }
+            result.append(item)
+
+        return result
 
+    def _store_attachments_in_datastore(self, uid, attachments):
         result = []
         for (file_name, content, content_type) in attachments:
             attachment_size = len(content)
@@ -183,8 +332,7 @@ class IMAPSensor(PollingSensor):
                                                                             attachment_size)))
                 continue
 
-            datastore_key = self._get_attachment_datastore_key(message=message,
-                                                               file_name=file_name)
+            datastore_key = self._get_attachment_datastore_key(uid=uid, file_name=file_name)
 
             # Store attachment in the datastore
             if content_type == 'text/plain':
@@ -204,8 +352,8 @@ class IMAPSensor(PollingSensor):
 
         return result
 
-    def _get_attachment_datastore_key(self, message, file_name):
-        key = '%s-%s' % (message.uid, file_name)
+    def _get_attachment_datastore_key(self, uid, file_name):
+        key = '%s-%s' % (uid, file_name)
         key = 'attachments-%s' % (hashlib.md5(key).hexdigest())
         return key
 
@@ -0,0 +1,166 @@
+import errno
+import hashlib
+import os
+import tempfile
+import time
+
+__all__ = [
+    'AttachmentStore',
+    'hash_content'
+]
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'st2-email-attachments')
+DEFAULT_STORE_TTL = 1800
+# Attachments larger than this are not stored (in bytes)
+DEFAULT_STORE_MAX_SIZE = 50 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# How often to remove expired attachments from the store (in seconds)
+EVICTION_INTERVAL = 60
+
+TEMP_FILE_PREFIX = '.tmp-'
+
+
+def _iter_chunks(content):
+    if hasattr(content, 'read'):
+        while True:
+            chunk = content.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for index in range(0, len(content), CHUNK_SIZE):
+            yield content[index:index + CHUNK_SIZE]
+
+
+def hash_content(content, fp=None):
+    """
+    Calculate size and MD5, SHA1 and SHA256 digests of the provided content in a single pass and
+    optionally write the content to ``fp`` at the same time.
+
+    :param content: Content string or file-like object.
+
+    :rtype: ``dict``
+    """
+    digests = {
+        'md5': hashlib.md5(),
+        'sha1': hashlib.sha1(),
+        'sha256': hashlib.sha256()
+    }
+    size = 0
+
+    for chunk in _iter_chunks(content):
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+
+        for digest in digests.values():
+            digest.update(chunk)
+
+        if fp:
+            fp.write(chunk)
+
+        size += len(chunk)
+
+    result = dict((name, digest.hexdigest()) for name, digest in digests.items())
+    result['size'] = size
+    return result
+
+
+class AttachmentStore(object):
+    """
+    Local content-addressed attachment store.
+
+    Attachments are stored on disk under their SHA256 digest so identical attachments are only
+    stored once. Each time an attachment is stored its expiration is extended and attachments
+    which haven't been stored for ``ttl`` seconds are removed.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl=DEFAULT_STORE_TTL,
+                 max_size=DEFAULT_STORE_MAX_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._last_eviction = 0
+
+    def store(self, content):
+        """
+        Store the provided content.
+
+        :param content: Content string or file-like object.
+
+        :return: Dictionary with size, digests and path of the stored attachment or ``None`` if
+                 the attachment exceeds the maximum size.
+        :rtype: ``dict``
+        """
+        if self.max_size and not hasattr(content, 'read') and len(content) > self.max_size:
+            return None
+
+        self._ensure_directory(self.path)
+        self._maybe_evict_expired()
+
+        fd, temp_path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, dir=self.path)
+
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                result = hash_content(content, fp=fp)
+
+            if self.max_size and result['size'] > self.max_size:
+                return None
+
+            path = self.get_path(result['sha256'])
+
+            if os.path.exists(path):
+                # Same attachment has already been stored, just extend its expiration
+                os.utime(path, None)
+            else:
+                self._ensure_directory(os.path.dirname(path))
+                os.rename(temp_path, path)
+                temp_path = None
+        finally:
+            if temp_path:
+                os.unlink(temp_path)
+
+        result['path'] = path
+        return result
+
+    def get_path(self, sha256):
+        return os.path.join(self.path, sha256[:2], sha256)
+
+    def evict_expired(self):
+        """
+        Remove attachments which have expired.
+
+        :return: Number of removed attachments.
+        :rtype: ``int``
+        """
+        now = time.time()
+        removed = 0
+
+        for directory, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                file_path = os.path.join(directory, file_name)
+
+                try:
+                    if os.path.getmtime(file_path) + self.ttl < now:
+                        os.unlink(file_path)
+                        removed += 1
+                except OSError:
+                    # File has been removed in the mean time
+                    continue
+
+        self._last_eviction = now
+        return removed
+
+    def _maybe_evict_expired(self):
+        if time.time() - self._last_eviction >= EVICTION_INTERVAL:
+            self.evict_expired()
+
+    @staticmethod
+    def _ensure_directory(path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
@@ -0,0 +1,263 @@
+import imaplib
+import re
+import socket
+import time
+from ssl import SSLError
+
+__all__ = [
+    'IMAPMailbox'
+]
+
+DEFAULT_FETCH_BATCH_SIZE = 50
+
+# RFC 2177 recommends re-issuing IDLE at least every 29 minutes since servers may log out
+# clients which have been idle for longer
+DEFAULT_IDLE_TIMEOUT = 10 * 60
+
+# Errors after which the connection is re-established
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, socket.error, SSLError)
+
+UID_RE = re.compile(r'UID (\d+)')
+
+# Untagged responses which indicate new messages while in IDLE
+IDLE_EVENT_RE = re.compile(r'^\* \d+ (EXISTS|RECENT)', re.IGNORECASE)
+
+
+class IMAPMailbox(object):
+    """
+    Persistent connection to a single IMAP mailbox folder.
+
+    Keeps track of the highest UID which has been fetched so each poll only needs to search for
+    messages which have arrived since the previous poll. The state is reset when the server
+    reports a different UIDVALIDITY (e.g. the folder has been re-created).
+    """
+
+    def __init__(self, server, port, user, password, folder='INBOX', ssl=False,
+                 fetch_batch_size=DEFAULT_FETCH_BATCH_SIZE, logger=None):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.folder = folder
+        self.ssl = ssl
+        self.fetch_batch_size = fetch_batch_size
+
+        self._logger = logger
+        self._connection = None
+        self._uid_validity = None
+        self._last_uid = 0
+        self._idling = False
+
+    @property
+    def connected(self):
+        return self._connection is not None
+
+    @property
+    def supports_idle(self):
+        """
+        True if the server advertises IDLE capability, ``None`` if not connected yet.
+        """
+        if not self._connection:
+            return None
+
+        return 'IDLE' in self._connection.capabilities
+
+    def connect(self):
+        if self.ssl:
+            connection = imaplib.IMAP4_SSL(self.server, self.port)
+        else:
+            connection = imaplib.IMAP4(self.server, self.port)
+
+        try:
+            connection.login(self.user, self.password)
+            self._select(connection)
+        except Exception:
+            self._logout(connection)
+            raise
+
+        self._connection = connection
+
+    def close(self):
+        connection = self._connection
+        self._connection = None
+
+        if connection and self._idling:
+            # IDLE has been interrupted, connection is not in a state where it can process
+            # other commands
+            self._idling = False
+            self._shutdown(connection)
+        elif connection:
+            self._logout(connection)
+
+    def get_new_uids(self):
+        """
+        Return UIDs of the unread messages which have arrived since the last call.
+
+        :rtype: ``list`` of ``int``
+        """
+        if not self._connection:
+            self.connect()
+
+        try:
+            return self._search()
+        except CONNECTION_ERRORS as e:
+            # Server has closed an idle connection, reconnect and try again
+            self._log('Reconnecting to %s: %s' % (self.server, str(e)))
+            self.close()
+            self.connect()
+            return self._search()
+
+    def fetch_messages(self, uids):
+        """
+        Fetch raw messages for the provided UIDs, ``fetch_batch_size`` messages per round trip.
+
+        Fetched messages are marked as read.
+
+        :return: Generator which yields (uid, raw message) tuples.
+        """
+        for index in range(0, len(uids), self.fetch_batch_size):
+            batch = uids[index:index + self.fetch_batch_size]
+            message_set = ','.join([str(uid) for uid in batch])
+
+            status, data = self._connection.uid('FETCH', message_set, '(UID RFC822)')
+            if status != 'OK':
+                raise imaplib.IMAP4.error('Failed to fetch messages: %s' % (data))
+
+            for item in data:
+                if not isinstance(item, tuple):
+                    # Closing parenthesis of a message
+                    continue
+
+                match = UID_RE.search(item[0])
+                if not match:
+                    continue
+
+                uid = int(match.group(1))
+                self._last_uid = max(self._last_uid, uid)
+                yield uid, item[1]
+
+    def idle(self, timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        Issue IDLE command and wait until the server reports new messages or until timeout
+        expires.
+
+        :return: ``True`` if the server reported new messages.
+        :rtype: ``bool``
+        """
+        connection = self._connection
+        tag = connection._new_tag()
+        changed = False
+
+        try:
+            self._idling = True
+            connection.send('%s IDLE\r\n' % (tag))
+
+            line = connection.readline()
+            if not line.startswith('+'):
+                raise imaplib.IMAP4.error('IDLE failed: %s' % (line.strip()))
+
+            deadline = time.time() + timeout
+            while not changed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+                line = self._readline(connection, timeout=remaining)
+                if line is None:
+                    break
+
+                changed = self._handle_idle_response(line)
+
+            connection.send('DONE\r\n')
+
+            # Server can still send untagged responses before it completes the command
+            while True:
+                line = self._readline(connection)
+
+                if line.startswith(tag):
+                    if line.split()[1].upper() != 'OK':
+                        raise imaplib.IMAP4.error('IDLE failed: %s' % (line.strip()))
+                    break
+
+                changed = self._handle_idle_response(line) or changed
+
+            self._idling = False
+        finally:
+            connection.tagged_commands.pop(tag, None)
+
+        return changed
+
+    def _handle_idle_response(self, line):
+        if line.upper().startswith('* BYE'):
+            raise imaplib.IMAP4.abort('Server closed the connection: %s' % (line.strip()))
+
+        return bool(IDLE_EVENT_RE.match(line))
+
+    def _readline(self, connection, timeout=None):
+        """
+        Read a single response line, return ``None`` if timeout expires.
+        """
+        # Response file can wrap a duplicate of the connection socket (e.g. with eventlet)
+        sockets = [connection.socket(), getattr(connection, 'sslobj', None),
+                   getattr(connection.file, '_sock', None)]
+        sockets = [sock for sock in sockets if sock is not None]
+
+        for sock in sockets:
+            sock.settimeout(timeout)
+
+        try:
+            line = connection.readline()
+        except (socket.timeout, SSLError) as e:
+            if isinstance(e, SSLError) and 'timed out' not in str(e):
+                raise
+            return None
+        finally:
+            for sock in sockets:
+                sock.settimeout(None)
+
+        if not line:
+            raise imaplib.IMAP4.abort('Socket closed while waiting for IDLE response')
+
+        return line
+
+    def _select(self, connection):
+        status, data = connection.select(self.folder)
+        if status != 'OK':
+            raise imaplib.IMAP4.error('Failed to select folder "%s": %s' % (self.folder, data))
+
+        _, data = connection.response('UIDVALIDITY')
+        uid_validity = data[0] if data else None
+
+        if uid_validity != self._uid_validity:
+            if self._uid_validity is not None:
+                self._log('UIDVALIDITY of %s has changed, re-syncing' % (self.folder))
+
+            self._uid_validity = uid_validity
+            self._last_uid = 0
+
+    def _search(self):
+        # "n:*" always matches the message with the highest UID so the result needs to be
+        # filtered
+        criteria = '(UNSEEN UID %s:*)' % (self._last_uid + 1)
+        status, data = self._connection.uid('SEARCH', None, criteria)
+        if status != 'OK':
+            raise imaplib.IMAP4.error('Failed to search folder "%s": %s' % (self.folder, data))
+
+        uids = [int(uid) for uid in (data[0] or '').split()]
+        return sorted([uid for uid in uids if uid > self._last_uid])
+
+    def _logout(self, connection):
+        try:
+            connection.logout()
+        except Exception:
+            pass
+
+    def _shutdown(self, connection):
+        try:
+            connection.shutdown()
+        except Exception:
+            pass
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.debug('[IMAPSensor]: %s' % (message))
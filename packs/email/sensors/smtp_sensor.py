@@ -10,11 +10,21 @@ eventlet.monkey_patch(
 from eventlet.green import asyncore
 import smtpd_green as smtpd
 from flanker import mime
-import hashlib
 import base64
 
 from st2reactor.sensor.base import Sensor
 
+from lib.attachments import AttachmentStore
+from lib.attachments import hash_content
+from lib.attachments import DEFAULT_STORE_MAX_SIZE
+from lib.attachments import DEFAULT_STORE_PATH
+from lib.attachments import DEFAULT_STORE_TTL
+
+# Attachments are stored in the local attachment store and only referenced in the payload
+ATTACHMENT_STORAGE_LOCAL = 'local'
+# Attachments are base64 encoded and included in the payload
+ATTACHMENT_STORAGE_INLINE = 'inline'
+
 
 class SMTPSensor(Sensor):
     def __init__(self, sensor_service, config=None):
@@ -26,6 +36,15 @@ class SMTPSensor(Sensor):
         self._server = None
         self._listen_ip = self._config.get('smtp_listen_ip', '127.0.0.1')
         self._listen_port = self._config.get('smtp_listen_port', 1025)
+        self._attachment_storage = self._config.get('smtp_attachment_storage',
+                                                    ATTACHMENT_STORAGE_LOCAL)
+        self._attachment_store = AttachmentStore(
+            path=self._config.get('attachment_store_path', DEFAULT_STORE_PATH),
+            ttl=self._config.get('attachment_store_ttl', DEFAULT_STORE_TTL),
+            max_size=self._config.get('attachment_store_max_size', DEFAULT_STORE_MAX_SIZE))
+
+        if self._attachment_storage not in [ATTACHMENT_STORAGE_LOCAL, ATTACHMENT_STORAGE_INLINE]:
+            raise ValueError('Invalid attachment storage: %s' % (self._attachment_storage))
 
     def setup(self):
         self._logger.debug('[SMTPSensor]: entering setup')
@@ -33,7 +52,9 @@ class SMTPSensor(Sensor):
                                      remoteaddr=None,
                                      sensor_service=self._sensor_service,
                                      logger=self._logger,
-                                     trigger=self._trigger)
+                                     trigger=self._trigger,
+                                     attachment_storage=self._attachment_storage,
+                                     attachment_store=self._attachment_store)
 
     def run(self):
         self._logger.debug('[SMTPSensor]: entering run')
@@ -53,11 +74,14 @@ class SMTPSensor(Sensor):
 
 
 class St2SMTPServer(smtpd.SMTPServer):  # pylint: disable=no-member
-    def __init__(self, localaddr, remoteaddr, sensor_service, logger, trigger):
+    def __init__(self, localaddr, remoteaddr, sensor_service, logger, trigger,
+                 attachment_storage=ATTACHMENT_STORAGE_LOCAL, attachment_store=None):
         smtpd.SMTPServer.__init__(self, localaddr, remoteaddr)  # pylint: disable=no-member
         self._logger = logger
         self._trigger = trigger
         self._sensor_service = sensor_service
+        self._attachment_storage = attachment_storage
+        self._attachment_store = attachment_store or AttachmentStore()
 
     def process_message(self, peer, mailfrom, rcpttos, data):
         self._logger.debug('posting message from {} to {}'.format(mailfrom, rcpttos))
@@ -113,12 +137,33 @@ class St2SMTPServer(smtpd.SMTPServer):  # pylint: disable=no-member
                 elif part.is_attachment():
                     attachment = {
                         'filename': part.detected_file_name,
-                        'md5': hashlib.md5(part.body).hexdigest(),
-                        'sha1': hashlib.sha1(part.body).hexdigest(),
-                        'data': base64.b64encode(part.body),
                         'encoding': part.content_encoding[0],
                         'type': content_type,
                     }
+                    attachment.update(self._store_attachment(part.body))
                     payload['attachments'].append(attachment)
 
         return payload
+
+    def _store_attachment(self, content):
+        """
+        Store attachment content and return its size, digests and reference (path in the local
+        attachment store) or data (inline storage).
+
+        :rtype: ``dict``
+        """
+        if self._attachment_storage == ATTACHMENT_STORAGE_INLINE:
+            result = hash_content(content)
+            result['data'] = base64.b64encode(content)
+            return result
+
+        result = self._attachment_store.store(content)
+
+        if result is None:
+            # Attachment is too large to be stored, only include the metadata
+            self._logger.debug('Skipping attachment since it\'s bigger than maximum allowed '
+                               'size ({})'.format(len(content)))
+            result = hash_content(content)
+            result['path'] = None
+
+        return result
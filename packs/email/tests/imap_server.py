@@ -0,0 +1,135 @@
+"""
+Minimal local stand-in IMAP server used by the IMAP sensor tests.
+
+It only implements the commands the sensor uses (CAPABILITY, LOGIN, SELECT,
+UID SEARCH, UID FETCH, IDLE and LOGOUT) for a single folder.
+"""
+
+import re
+import SocketServer
+import threading
+
+__all__ = [
+    'FakeIMAPServer'
+]
+
+SEARCH_RE = re.compile(r'UID (\d+):\*')
+
+
+class FakeIMAPRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        self._write('* OK IMAP4rev1 stand-in server ready')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            tag, command, args = (line.rstrip('\r\n').split(' ', 2) + ['', ''])[:3]
+            command = command.upper()
+
+            if command == 'CAPABILITY':
+                self._write('* CAPABILITY %s' % (' '.join(self.server.capabilities)))
+                self._write('%s OK CAPABILITY completed' % (tag))
+            elif command == 'LOGIN':
+                self._write('%s OK LOGIN completed' % (tag))
+            elif command == 'SELECT':
+                self._write('* %s EXISTS' % (len(self.server.messages)))
+                self._write('* OK [UIDVALIDITY %s] UIDs valid' % (self.server.uid_validity))
+                self._write('* OK [UIDNEXT %s] Predicted next UID' % (self.server.next_uid))
+                self._write('%s OK [READ-WRITE] SELECT completed' % (tag))
+            elif command == 'UID':
+                self._handle_uid(tag, args)
+            elif command == 'IDLE':
+                self._handle_idle(tag)
+            elif command == 'LOGOUT':
+                self._write('* BYE Logging out')
+                self._write('%s OK LOGOUT completed' % (tag))
+                break
+            else:
+                self._write('%s BAD Unknown command' % (tag))
+
+    def _handle_uid(self, tag, args):
+        command, args = args.split(' ', 1)
+        command = command.upper()
+
+        if command == 'SEARCH':
+            start = int(SEARCH_RE.search(args).group(1))
+            uids = [str(uid) for uid, _, seen in self.server.messages if not seen and uid >= start]
+            self._write('* SEARCH %s' % (' '.join(uids)))
+            self._write('%s OK SEARCH completed' % (tag))
+        elif command == 'FETCH':
+            uids = [int(uid) for uid in args.split(' ', 1)[0].split(',')]
+
+            with self.server.lock:
+                for index, (uid, raw, _) in enumerate(self.server.messages):
+                    if uid not in uids:
+                        continue
+
+                    self.server.messages[index] = (uid, raw, True)
+                    self._write('* %s FETCH (UID %s RFC822 {%s}' % (index + 1, uid, len(raw)))
+                    self.wfile.write(raw)
+                    self._write(')')
+
+                self._write('%s OK FETCH completed' % (tag))
+
+    def _handle_idle(self, tag):
+        self._write('+ idling')
+
+        with self.server.lock:
+            self.server.idle_handlers.append(self)
+
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line or line.strip().upper() == 'DONE':
+                    break
+        finally:
+            with self.server.lock:
+                self.server.idle_handlers.remove(self)
+
+        self._write('%s OK IDLE terminated' % (tag))
+
+    def _write(self, line):
+        with self.server.lock:
+            self.wfile.write(line + '\r\n')
+            self.wfile.flush()
+
+
+class FakeIMAPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, capabilities=None, uid_validity=1):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', 0), FakeIMAPRequestHandler)
+
+        self.capabilities = capabilities or ['IMAP4rev1', 'IDLE']
+        self.uid_validity = uid_validity
+        self.next_uid = 1
+        # (uid, raw message, seen)
+        self.messages = []
+        self.idle_handlers = []
+        self.lock = threading.RLock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def add_message(self, raw):
+        """
+        Add a new unread message and notify the clients which are in IDLE.
+        """
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append((uid, raw, False))
+
+            for handler in self.idle_handlers:
+                handler._write('* %s EXISTS' % (len(self.messages)))
+
+        return uid
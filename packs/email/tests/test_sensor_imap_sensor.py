@@ -0,0 +1,233 @@
+import os
+import shutil
+import tempfile
+import time
+
+import eventlet
+
+from st2tests.base import BaseSensorTestCase
+
+from imap_sensor import IMAPSensor
+from lib.imap import IMAPMailbox
+from imap_server import FakeIMAPServer
+
+MOCK_MESSAGE = '\r\n'.join([
+    'From: Stanley <stanley@stackstorm.com>',
+    'To: StackStorm <info@stackstorm.com>',
+    'Subject: test message %s',
+    'Date: Wed, 10 Jun 2015 15:01:20 +0800',
+    'Message-Id: <%s@stackstorm.com>',
+    'Content-Type: text/plain',
+    '',
+    'hello from stackstorm!',
+    ''
+])
+
+MOCK_MESSAGE_WITH_ATTACHMENT = '\r\n'.join([
+    'From: Stanley <stanley@stackstorm.com>',
+    'To: StackStorm <info@stackstorm.com>',
+    'Subject: report %s',
+    'Message-Id: <report-%s@stackstorm.com>',
+    'MIME-Version: 1.0',
+    'Content-Type: multipart/mixed; boundary="BOUNDARY"',
+    '',
+    '--BOUNDARY',
+    'Content-Type: text/plain',
+    '',
+    'report attached',
+    '--BOUNDARY',
+    'Content-Type: application/pdf',
+    'Content-Disposition: attachment; filename="report.pdf"',
+    'Content-Transfer-Encoding: base64',
+    '',
+    'JVBERi0xLjQKc3RhY2tzdG9ybQo=',
+    '--BOUNDARY--',
+    ''
+])
+
+
+class IMAPSensorTestCase(BaseSensorTestCase):
+    sensor_cls = IMAPSensor
+
+    def setUp(self):
+        super(IMAPSensorTestCase, self).setUp()
+        self._sensor = None
+
+    def tearDown(self):
+        super(IMAPSensorTestCase, self).tearDown()
+
+        if self._sensor:
+            self._sensor.cleanup()
+
+    def _start_server(self, capabilities=None):
+        server = FakeIMAPServer(capabilities=capabilities)
+        server.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _get_sensor(self, server, idle=False, **kwargs):
+        config = {
+            'imap_idle': idle,
+            'imap_mailboxes': {
+                'test': {
+                    'server': '127.0.0.1',
+                    'port': server.port,
+                    'username': 'stanley',
+                    'password': 'password',
+                    'download_attachments': True
+                }
+            }
+        }
+        config.update(kwargs)
+        self._sensor = self.get_sensor_instance(config=config)
+        return self._sensor
+
+    def _wait_for_triggers(self, count, timeout=1):
+        deadline = time.time() + timeout
+        while len(self.get_dispatched_triggers()) < count and time.time() < deadline:
+            eventlet.sleep(0.01)
+
+        return self.get_dispatched_triggers()
+
+    def test_poll_only_fetches_new_messages(self):
+        server = self._start_server()
+        server.add_message(MOCK_MESSAGE % (1, 1))
+        server.add_message(MOCK_MESSAGE % (2, 2))
+
+        sensor = self._get_sensor(server)
+        sensor.setup()
+
+        sensor.poll()
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 2)
+        self.assertEqual([trigger['payload']['uid'] for trigger in triggers], [1, 2])
+        self.assertEqual(triggers[0]['payload']['subject'], 'test message 1')
+
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 2)
+
+        server.add_message(MOCK_MESSAGE % (3, 3))
+        sensor.poll()
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 3)
+        self.assertEqual(triggers[2]['payload']['uid'], 3)
+
+    def test_idle_returns_when_server_reports_new_message(self):
+        server = self._start_server()
+        mailbox = IMAPMailbox(server='127.0.0.1', port=server.port, user='stanley',
+                              password='password')
+        self.addCleanup(mailbox.close)
+
+        self.assertEqual(mailbox.get_new_uids(), [])
+        self.assertTrue(mailbox.supports_idle)
+
+        eventlet.spawn_after(0.1, server.add_message, MOCK_MESSAGE % (1, 1))
+
+        start = time.time()
+        self.assertTrue(mailbox.idle(timeout=5))
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(mailbox.get_new_uids(), [1])
+
+    def test_idle_timeout(self):
+        server = self._start_server()
+        mailbox = IMAPMailbox(server='127.0.0.1', port=server.port, user='stanley',
+                              password='password')
+        self.addCleanup(mailbox.close)
+        mailbox.get_new_uids()
+
+        self.assertFalse(mailbox.idle(timeout=0.1))
+
+        # Connection is usable after IDLE has been terminated
+        server.add_message(MOCK_MESSAGE % (1, 1))
+        self.assertEqual(mailbox.get_new_uids(), [1])
+
+    def test_idle_mode_dispatches_new_messages(self):
+        server = self._start_server()
+        server.add_message(MOCK_MESSAGE % (1, 1))
+
+        sensor = self._get_sensor(server, idle=True)
+        sensor.setup()
+
+        # Messages which arrived before the sensor started are processed right away
+        self.assertEqual(len(self._wait_for_triggers(count=1)), 1)
+
+        eventlet.sleep(0.1)
+        server.add_message(MOCK_MESSAGE % (2, 2))
+
+        triggers = self._wait_for_triggers(count=2, timeout=1)
+        self.assertEqual(len(triggers), 2)
+        self.assertEqual(triggers[1]['payload']['uid'], 2)
+
+        # Mailbox is not polled in IDLE mode
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 2)
+
+    def test_idle_mode_falls_back_to_polling(self):
+        server = self._start_server(capabilities=['IMAP4rev1'])
+
+        sensor = self._get_sensor(server, idle=True)
+        sensor.setup()
+
+        deadline = time.time() + 1
+        while sensor._mailboxes['test']['idle'] and time.time() < deadline:
+            eventlet.sleep(0.01)
+
+        self.assertFalse(sensor._mailboxes['test']['idle'])
+
+        server.add_message(MOCK_MESSAGE % (1, 1))
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 1)
+
+    def test_attachments_are_deduplicated_in_local_store(self):
+        store_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store_path)
+
+        server = self._start_server()
+        server.add_message(MOCK_MESSAGE_WITH_ATTACHMENT % (1, 1))
+        server.add_message(MOCK_MESSAGE_WITH_ATTACHMENT % (2, 2))
+
+        # max_attachment_size only applies to the datastore
+        sensor = self._get_sensor(server, attachment_store_path=store_path,
+                                  max_attachment_size=10)
+        sensor.setup()
+        sensor.poll()
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 2)
+
+        attachments = [trigger['payload']['attachments'] for trigger in triggers]
+        self.assertEqual(len(attachments[0]), 1)
+        self.assertEqual(attachments[0], attachments[1])
+
+        attachment = attachments[0][0]
+        self.assertEqual(attachment['file_name'], 'report.pdf')
+        self.assertEqual(attachment['content_type'], 'application/pdf')
+        self.assertEqual(attachment['size'], 20)
+        self.assertEqual(attachment['path'], os.path.join(store_path, attachment['sha256'][:2],
+                                                          attachment['sha256']))
+
+        with open(attachment['path'], 'rb') as fp:
+            self.assertEqual(fp.read(), '%PDF-1.4\nstackstorm\n')
+
+        # Only a single copy is stored and attachments are not stored in the datastore
+        stored = [name for _, _, names in os.walk(store_path) for name in names]
+        self.assertEqual(stored, [attachment['sha256']])
+        self.assertEqual(self.sensor_service.list_values(local=False), [])
+
+    def test_attachments_larger_than_store_max_size_are_skipped(self):
+        store_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store_path)
+
+        server = self._start_server()
+        server.add_message(MOCK_MESSAGE_WITH_ATTACHMENT % (1, 1))
+
+        sensor = self._get_sensor(server, attachment_store_path=store_path,
+                                  attachment_store_max_size=10)
+        sensor.setup()
+        sensor.poll()
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers[0]['payload']['attachments'], [])
+        self.assertEqual([name for _, _, names in os.walk(store_path) for name in names], [])
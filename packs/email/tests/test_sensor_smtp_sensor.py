@@ -0,0 +1,108 @@
+import base64
+import os
+import shutil
+import tempfile
+
+from st2tests.base import BaseSensorTestCase
+
+from smtp_sensor import SMTPSensor
+
+# Larger than max_attachment_size (which is only used for the datastore), but smaller than
+# the default attachment_store_max_size
+ATTACHMENT_CONTENT = '%PDF-1.4\n' + 'stackstorm\n' * 512
+
+MOCK_MESSAGE = '\r\n'.join([
+    'From: Stanley <stanley@stackstorm.com>',
+    'To: StackStorm <info@stackstorm.com>',
+    'Subject: report',
+    'Date: Wed, 10 Jun 2015 15:01:20 +0800',
+    'MIME-Version: 1.0',
+    'Content-Type: multipart/mixed; boundary="BOUNDARY"',
+    '',
+    '--BOUNDARY',
+    'Content-Type: text/plain',
+    '',
+    'report attached',
+    '--BOUNDARY',
+    'Content-Type: application/pdf',
+    'Content-Disposition: attachment; filename="report.pdf"',
+    'Content-Transfer-Encoding: base64',
+    '',
+    base64.encodestring(ATTACHMENT_CONTENT).strip(),
+    '--BOUNDARY--',
+    ''
+])
+
+
+class SMTPSensorTestCase(BaseSensorTestCase):
+    sensor_cls = SMTPSensor
+
+    def setUp(self):
+        super(SMTPSensorTestCase, self).setUp()
+
+        self.store_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_path)
+
+    def _process_message(self, **config):
+        config.setdefault('smtp_listen_port', 0)
+        config.setdefault('max_attachment_size', 1024)
+        config.setdefault('attachment_store_path', self.store_path)
+
+        sensor = self.get_sensor_instance(config=config)
+        sensor.setup()
+        self.addCleanup(sensor._server.close)
+
+        sensor._server.process_message(peer=('127.0.0.1', 1234),
+                                       mailfrom='stanley@stackstorm.com',
+                                       rcpttos=['info@stackstorm.com'], data=MOCK_MESSAGE)
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers[0]['trigger'], 'email.smtp.message')
+        return triggers[0]['payload']
+
+    def test_message_is_dispatched(self):
+        payload = self._process_message()
+
+        self.assertEqual(payload['from'], 'Stanley <stanley@stackstorm.com>')
+        self.assertEqual(payload['to'], 'StackStorm <info@stackstorm.com>')
+        self.assertEqual(payload['subject'], 'report')
+        self.assertEqual(payload['body_plain'], 'report attached')
+        self.assertEqual(len(payload['attachments']), 1)
+
+    def test_attachment_is_stored_locally(self):
+        payload = self._process_message()
+
+        attachment = payload['attachments'][0]
+        self.assertEqual(attachment['filename'], 'report.pdf')
+        self.assertEqual(attachment['type'], 'application/pdf')
+        self.assertEqual(attachment['size'], len(ATTACHMENT_CONTENT))
+        self.assertNotIn('data', attachment)
+        self.assertEqual(attachment['path'],
+                         os.path.join(self.store_path, attachment['sha256'][:2],
+                                      attachment['sha256']))
+
+        with open(attachment['path'], 'rb') as fp:
+            self.assertEqual(fp.read(), ATTACHMENT_CONTENT)
+
+    def test_attachment_larger_than_store_max_size_is_not_stored(self):
+        payload = self._process_message(attachment_store_max_size=1024)
+
+        attachment = payload['attachments'][0]
+        self.assertEqual(attachment['path'], None)
+        self.assertEqual(attachment['size'], len(ATTACHMENT_CONTENT))
+        self.assertTrue(attachment['sha256'])
+        self.assertEqual(os.listdir(self.store_path), [])
+
+    def test_attachment_inline_storage(self):
+        payload = self._process_message(smtp_attachment_storage='inline')
+
+        attachment = payload['attachments'][0]
+        self.assertEqual(base64.b64decode(attachment['data']), ATTACHMENT_CONTENT)
+        self.assertEqual(attachment['size'], len(ATTACHMENT_CONTENT))
+        self.assertNotIn('path', attachment)
+        self.assertEqual(os.listdir(self.store_path), [])
+
+    def test_invalid_attachment_storage(self):
+        self.assertRaises(ValueError, self.get_sensor_instance,
+                          config={'smtp_attachment_storage': 'datastore'})
@@ -6,11 +6,33 @@
 
 import os
 import datetime
+import hashlib
+import re
 
+import eventlet
+from eventlet.green import subprocess
+from git.exc import GitCommandError
 from git.repo import Repo
 
 from st2reactor.sensor.base import PollingSensor
 
+eventlet.monkey_patch(
+    os=True,
+    select=True,
+    socket=True,
+    thread=True,
+    time=True)
+
+# Maximum number of commits which are dispatched for a single branch update
+DEFAULT_MAX_COMMITS = 20
+
+# Maximum number of repositories which are checked concurrently
+DEFAULT_POOL_SIZE = 4
+
+BRANCH_REF_PREFIX = 'refs/heads/'
+
+UNSAFE_CHARS_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
 
 class GitCommitSensor(PollingSensor):
     def __init__(self, sensor_service, config=None, poll_interval=5):
@@ -19,63 +41,51 @@ class GitCommitSensor(PollingSensor):
                                               poll_interval=poll_interval)
 
         self._logger = self._sensor_service.get_logger(__name__)
-        self._old_head = None
-        self._remote = None
         self._trigger_name = 'head_sha_monitor'
         self._trigger_pack = 'git'
         self._trigger_ref = '.'.join([self._trigger_pack, self._trigger_name])
 
+        # url -> list of branches
+        self._repositories = {}
+        # (url, branch) -> sha of the last seen branch head
+        self._heads = {}
+
     def setup(self):
         git_opts = self._config
 
-        if git_opts['url'] is None:
-            raise Exception('Remote git URL not set.')
+        repositories = list(git_opts.get('repositories', None) or [])
+        if git_opts.get('url', None):
+            repositories.append({'url': git_opts['url'], 'branch': git_opts.get('branch', None)})
 
-        self._url = git_opts['url']
-        self._branch = git_opts['branch']
-        default_clone_dir = os.path.join(os.path.dirname(__file__), 'clones')
-        self._local_path = git_opts.get('local_clone_path', default_clone_dir)
-        self._poll_interval = git_opts.get('poll_interval', self._poll_interval)
+        for repository in repositories:
+            if not repository.get('url', None):
+                raise Exception('Remote git URL not set.')
 
-        if os.path.exists(self._local_path):
-            self._repo = Repo.init(self._local_path)
-        else:
-            try:
-                self._repo = Repo.clone_from(self._url, self._local_path, branch=self._branch)
-            except Exception:
-                self._logger.exception('Unable to clone remote repo from %s branch %s',
-                                       self._url, self._branch)
-                raise
+            branches = repository.get('branches', None) or [repository.get('branch', None) or
+                                                            'master']
+            # Repositories are grouped by URL so each of them is only queried once per poll
+            url_branches = self._repositories.setdefault(repository['url'], [])
+            url_branches.extend([branch for branch in branches if branch not in url_branches])
 
-        self._remote = self._repo.remote('origin')
+        if not self._repositories:
+            raise Exception('Remote git URL not set.')
 
-    def poll(self):
-        # Fetch new commits
-        try:
-            pulled = self._remote.pull()
-            if pulled:
-                self._logger.debug('Pulled info from remote repo. %s', pulled[0].commit)
-            else:
-                self._logger.debug('Nothing pulled from remote repo.')
-        except:
-            self._logger.exception('Failed git pull from remote repo.')
+        default_mirror_dir = os.path.join(os.path.dirname(__file__), 'mirrors')
+        self._mirror_path = git_opts.get('mirror_path', default_mirror_dir)
 
-        head = self._repo.commit()
-        head_sha = head.hexsha
+        if git_opts.get('local_clone_path', None):
+            # Working clones have been replaced by bare mirrors which are stored in mirror_path
+            self._logger.warning('"local_clone_path" option is not used anymore, repositories '
+                                 'are mirrored to %s. The old clone in %s can be deleted.',
+                                 self._mirror_path, git_opts['local_clone_path'])
 
-        if not self._old_head:
-            self._old_head = head_sha
-            if len(self._repo.heads) == 1:  # There is exactly one commit. Kick off a trigger.
-                self._dispatch_trigger(head)
-            return
+        self._max_commits = git_opts.get('max_commits', DEFAULT_MAX_COMMITS)
+        self._poll_interval = git_opts.get('poll_interval', self._poll_interval)
+        self._pool = eventlet.GreenPool(git_opts.get('pool_size', DEFAULT_POOL_SIZE))
 
-        if head_sha != self._old_head:
-            try:
-                self._dispatch_trigger(head)
-            except Exception:
-                self._logger.exception('Failed dispatching trigger.')
-            else:
-                self._old_head = head_sha
+    def poll(self):
+        for _ in self._pool.imap(self._check_repository, self._repositories.items()):
+            pass
 
     def cleanup(self):
         pass
@@ -89,10 +99,136 @@ class GitCommitSensor(PollingSensor):
     def remove_trigger(self, trigger):
         pass
 
-    def _dispatch_trigger(self, commit):
+    def _check_repository(self, repository):
+        url, branches = repository
+
+        # Retrieving remote refs is cheap compared to fetching, new commits are only fetched
+        # when one of the branches has moved
+        try:
+            heads = self._get_remote_heads(url, branches)
+        except Exception:
+            self._logger.exception('Failed to retrieve remote refs of %s', url)
+            return
+
+        updated = []
+        for branch in branches:
+            head_sha = heads.get(branch, None)
+            old_head_sha = self._heads.get((url, branch), None)
+
+            if not head_sha:
+                self._logger.debug('Branch %s does not exist in %s', branch, url)
+            elif not old_head_sha:
+                self._heads[(url, branch)] = head_sha
+            elif head_sha != old_head_sha:
+                updated.append((branch, old_head_sha, head_sha))
+
+        if not updated:
+            return
+
+        try:
+            mirror = self._fetch(url, [branch for branch, _, _ in updated])
+        except Exception:
+            self._logger.exception('Failed to fetch %s', url)
+            return
+
+        for branch, old_head_sha, head_sha in updated:
+            commits = self._get_new_commits(mirror, old_head_sha, head_sha)
+
+            try:
+                for commit in commits:
+                    self._dispatch_trigger(commit, url=url, branch=branch)
+            except Exception:
+                self._logger.exception('Failed dispatching trigger.')
+            else:
+                self._heads[(url, branch)] = head_sha
+
+    def _get_remote_heads(self, url, branches):
+        """
+        Retrieve commit SHAs of the branch heads using ``git ls-remote``.
+
+        :rtype: ``dict``
+        """
+        refs = [BRANCH_REF_PREFIX + branch for branch in branches]
+        output = self._run_git('ls-remote', url, *refs)
+        heads = {}
+
+        for line in output.splitlines():
+            sha, ref = line.split('\t', 1)
+
+            # Patterns also match refs which end with the same name (e.g. refs/heads/a/master)
+            if ref in refs:
+                heads[ref[len(BRANCH_REF_PREFIX):]] = sha
+
+        return heads
+
+    def _fetch(self, url, branches):
+        """
+        Fetch the provided branches into a local bare mirror of the repository.
+
+        :rtype: :class:`Repo`
+        """
+        path = self._get_mirror_path(url)
+
+        if not os.path.exists(path):
+            self._run_git('init', '--bare', path)
+
+        refspecs = ['+%s%s:%s%s' % (BRANCH_REF_PREFIX, branch, BRANCH_REF_PREFIX, branch)
+                    for branch in branches]
+        self._run_git('--git-dir', path, 'fetch', url, *refspecs)
+        return Repo(path)
+
+    def _run_git(self, *args):
+        """
+        Run a git command and return its output.
+
+        Commands which wait for the process to finish are run using green subprocess.
+        GitPython uses select.poll() for them which isn't available once select has been
+        monkey patched.
+
+        :rtype: ``str``
+        """
+        command = ['git'] + list(args)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+
+        if process.returncode != 0:
+            raise GitCommandError(command, process.returncode, stderr)
+
+        return stdout
+
+    def _get_mirror_path(self, url):
+        name = UNSAFE_CHARS_RE.sub('_', url.rstrip('/').split('/')[-1].split(':')[-1])
+        url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self._mirror_path, '%s-%s' % (name, url_hash))
+
+    def _get_new_commits(self, mirror, old_head_sha, head_sha):
+        """
+        Return up to ``max_commits`` most recent commits which are reachable from the new
+        branch head but not from the old one, oldest first.
+        """
+        try:
+            mirror.commit(old_head_sha)
+        except Exception:
+            # Old head is not available (e.g. history has been rewritten before it has been
+            # fetched), only the new head is reported
+            return [mirror.commit(head_sha)]
+
+        rev = '%s..%s' % (old_head_sha, head_sha)
+        commits = list(mirror.iter_commits(rev, max_count=self._max_commits + 1))
+
+        if len(commits) > self._max_commits:
+            commits = commits[:self._max_commits]
+            self._logger.info('More than %s new commits (%s), only the most recent ones are '
+                              'dispatched', self._max_commits, rev)
+
+        commits.reverse()
+        return commits
+
+    def _dispatch_trigger(self, commit, url, branch):
         trigger = self._trigger_ref
         payload = {}
-        payload['branch'] = self._repo.active_branch.name
+        payload['repository'] = url
+        payload['branch'] = branch
         payload['revision'] = str(commit)
         payload['author'] = commit.author.name
         payload['author_email'] = commit.author.email
@@ -0,0 +1,162 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from git_commit_sensor import GitCommitSensor
+
+__all__ = [
+    'GitCommitSensorTestCase'
+]
+
+
+class GitCommitSensorTestCase(BaseSensorTestCase):
+    sensor_cls = GitCommitSensor
+
+    def setUp(self):
+        super(GitCommitSensorTestCase, self).setUp()
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        # Bare "remote" repository and a working copy which pushes to it
+        self.remote_path = os.path.join(self.path, 'remote.git')
+        self.work_path = os.path.join(self.path, 'work')
+        self._git('init', '--bare', self.remote_path)
+        self._git('init', self.work_path)
+        self._git('remote', 'add', 'origin', self.remote_path, cwd=self.work_path)
+
+        self.commit_count = 0
+        self._push_commits(1)
+
+    def _git(self, *args, **kwargs):
+        command = ['git', '-c', 'user.name=Stanley', '-c', 'user.email=info@stackstorm.com']
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(command + list(args), cwd=kwargs.get('cwd', None),
+                                  stdout=devnull, stderr=devnull)
+
+    def _push_commits(self, count, force=False):
+        for _ in range(count):
+            self.commit_count += 1
+            self._git('commit', '--allow-empty', '-m', 'commit %s' % (self.commit_count),
+                      cwd=self.work_path)
+
+        args = ['push', 'origin', 'HEAD:refs/heads/master']
+        if force:
+            args.append('--force')
+        self._git(*args, cwd=self.work_path)
+
+    def _get_head(self):
+        with open(os.devnull, 'w') as devnull:
+            process = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=self.work_path,
+                                       stdout=subprocess.PIPE, stderr=devnull)
+            return process.stdout.read().strip()
+
+    def _get_sensor(self, **config):
+        config.setdefault('url', self.remote_path)
+        config.setdefault('mirror_path', os.path.join(self.path, 'mirrors'))
+
+        sensor = self.get_sensor_instance(config=config)
+        sensor.setup()
+        return sensor
+
+    def _get_dispatched_revisions(self):
+        return [trigger['payload']['revision'] for trigger in self.get_dispatched_triggers()]
+
+    def test_new_commits_are_dispatched_oldest_first(self):
+        sensor = self._get_sensor()
+
+        # First poll only records the current branch head
+        sensor.poll()
+        self.assertEqual(self.get_dispatched_triggers(), [])
+
+        self._push_commits(1)
+        first_sha = self._get_head()
+        self._push_commits(1)
+        second_sha = self._get_head()
+        sensor.poll()
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(self._get_dispatched_revisions(), [first_sha, second_sha])
+        self.assertEqual(triggers[0]['trigger'], 'git.head_sha_monitor')
+        self.assertEqual(triggers[0]['payload']['repository'], self.remote_path)
+        self.assertEqual(triggers[0]['payload']['branch'], 'master')
+        self.assertEqual(triggers[0]['payload']['author'], 'Stanley')
+        self.assertEqual(triggers[0]['payload']['committer_email'], 'info@stackstorm.com')
+
+    def test_repository_is_only_fetched_when_branch_has_moved(self):
+        sensor = self._get_sensor()
+
+        with mock.patch.object(sensor, '_fetch', mock.Mock(wraps=sensor._fetch)) as fetch:
+            sensor.poll()
+            sensor.poll()
+            self.assertEqual(fetch.call_count, 0)
+
+            self._push_commits(1)
+            sensor.poll()
+            sensor.poll()
+            self.assertEqual(fetch.call_count, 1)
+
+        self.assertEqual(len(self.get_dispatched_triggers()), 1)
+
+    def test_missing_branch_is_ignored(self):
+        sensor = self._get_sensor(url=None, repositories=[
+            {'url': self.remote_path, 'branches': ['master', 'unknown']}
+        ])
+        sensor.poll()
+
+        self._push_commits(1)
+        sensor.poll()
+        self.assertEqual(self._get_dispatched_revisions(), [self._get_head()])
+
+    def test_number_of_dispatched_commits_is_limited(self):
+        sensor = self._get_sensor(max_commits=3)
+        sensor.poll()
+
+        shas = []
+        for _ in range(5):
+            self._push_commits(1)
+            shas.append(self._get_head())
+        sensor.poll()
+
+        # Only the most recent commits are dispatched
+        self.assertEqual(self._get_dispatched_revisions(), shas[2:])
+
+    def test_only_new_head_is_dispatched_when_history_is_rewritten(self):
+        sensor = self._get_sensor()
+        sensor.poll()
+
+        # Replace the last commit, the old head is never fetched into the mirror
+        self._git('commit', '--amend', '--allow-empty', '-m', 'rewritten', cwd=self.work_path)
+        self._push_commits(2, force=True)
+        sensor.poll()
+
+        self.assertEqual(self._get_dispatched_revisions(), [self._get_head()])
+
+    def test_failed_remote_is_skipped(self):
+        sensor = self._get_sensor(url=None, repositories=[
+            {'url': os.path.join(self.path, 'unknown.git')},
+            {'url': self.remote_path}
+        ])
+        sensor.poll()
+
+        self._push_commits(1)
+        sensor.poll()
+        self.assertEqual(self._get_dispatched_revisions(), [self._get_head()])
+
+    def test_local_clone_path_is_ignored(self):
+        clone_path = os.path.join(self.path, 'clones')
+
+        with mock.patch('logging.Logger.warning') as warning:
+            sensor = self._get_sensor(local_clone_path=clone_path)
+
+        self.assertEqual(warning.call_count, 1)
+        self.assertEqual(warning.call_args[0][2], clone_path)
+        self.assertEqual(sensor._mirror_path, os.path.join(self.path, 'mirrors'))
+
+        sensor.poll()
+        self.assertFalse(os.path.exists(clone_path))
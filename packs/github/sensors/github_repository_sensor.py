@@ -1,5 +1,8 @@
+import time
+from datetime import datetime
+
 import eventlet
-from github import Github
+import requests
 
 from st2reactor.sensor.base import PollingSensor
 
@@ -11,6 +14,18 @@ eventlet.monkey_patch(
     time=True)
 
 DATE_FORMAT_STRING = '%Y-%m-%d %H:%M:%S'
+GITHUB_DATE_FORMAT_STRING = '%Y-%m-%dT%H:%M:%SZ'
+
+# Default Github API url
+DEFAULT_API_URL = 'https://api.github.com'
+
+# Maximum number of events Github returns per page
+MAX_PAGE_SIZE = 100
+
+DEFAULT_POOL_SIZE = 10
+
+# How long to cache actor (user) profiles for (in seconds)
+DEFAULT_ACTOR_CACHE_TTL = 60 * 60
 
 
 class GithubRepositorySensor(PollingSensor):
@@ -21,14 +36,36 @@ class GithubRepositorySensor(PollingSensor):
         self._trigger_ref = 'github.repository_event'
         self._logger = self._sensor_service.get_logger(__name__)
 
-        self._client = None
+        self._session = None
+        self._base_url = None
+        self._pool = None
         self._repositories = []
+
+        # Per repository cursor (id of the last processed event). Datastore is only read once
+        # per repository and only written when the cursor advances.
         self._last_event_ids = {}
+        self._loaded_last_event_ids = set()
+
+        # Per repository ETag of the last events response
+        self._etags = {}
+
+        # login -> (actor, expire timestamp)
+        self._actors = {}
+        self._actor_cache_ttl = DEFAULT_ACTOR_CACHE_TTL
+
         self.EVENT_TYPE_WHITELIST = []
 
     def setup(self):
+        self._base_url = self._config.get('base_url', None) or DEFAULT_API_URL
+        self._base_url = self._base_url.rstrip('/')
+
+        self._session = requests.Session()
+        self._session.headers['Accept'] = 'application/vnd.github.v3+json'
+
         # Empty string '' is not ok but None is fine. (Sigh)
-        self._client = Github(self._config.get('token', None) or None)
+        token = self._config.get('token', None) or None
+        if token:
+            self._session.headers['Authorization'] = 'token %s' % (token)
 
         repository_sensor = self._config.get('repository_sensor', None)
         if repository_sensor is None:
@@ -41,16 +78,28 @@ class GithubRepositorySensor(PollingSensor):
             raise ValueError('GithubRepositorySensor should have atleast 1 repository.')
 
         for repository_dict in repositories:
-            user = self._client.get_user(repository_dict['user'])
-            repository = user.get_repo(repository_dict['name'])
-            self._repositories.append((repository_dict['name'], repository))
+            full_name = '%s/%s' % (repository_dict['user'], repository_dict['name'])
+            self._repositories.append((repository_dict['name'], full_name))
+
+        pool_size = repository_sensor.get('pool_size', DEFAULT_POOL_SIZE)
+        self._pool = eventlet.GreenPool(pool_size)
+        self._actor_cache_ttl = repository_sensor.get('actor_cache_ttl',
+                                                      DEFAULT_ACTOR_CACHE_TTL)
 
     def poll(self):
-        for repository_name, repository_obj in self._repositories:
-            self._logger.debug('Processing repository "%s"' %
-                               (repository_name))
-            self._process_repository(name=repository_name,
-                                     repository=repository_obj)
+        # Repositories are processed concurrently, events for a single repository are still
+        # dispatched in order
+        for _ in self._pool.imap(self._poll_repository, self._repositories):
+            pass
+
+    def _poll_repository(self, repository):
+        name, full_name = repository
+        self._logger.debug('Processing repository "%s"' % (name))
+
+        try:
+            self._process_repository(name=name, repository=full_name)
+        except Exception:
+            self._logger.exception('Failed to process repository "%s"' % (name))
 
     def _process_repository(self, name, repository):
         """
@@ -60,8 +109,8 @@ class GithubRepositorySensor(PollingSensor):
         :param name: Repository name.
         :type name: ``str``
 
-        :param repository: Repository object.
-        :type repository: :class:`Repository`
+        :param repository: Repository full name (user/name).
+        :type repository: ``str``
         """
         assert(isinstance(name, basestring))
 
@@ -69,23 +118,65 @@ class GithubRepositorySensor(PollingSensor):
         # default value in this case rather than raise an exception.
         count = self._config['repository_sensor'].get('count', 30)
 
-        events = repository.get_events()[:count]
-        events = list(reversed(list(events)))
+        events, etag = self._get_events(repository=repository, count=count)
+        if events is None:
+            # Nothing has changed since the last poll
+            return
+
+        events = list(reversed(events[:count]))
 
         last_event_id = self._get_last_id(name=name)
 
         for event in events:
-            if last_event_id and int(event.id) <= int(last_event_id):
+            if last_event_id and int(event['id']) <= int(last_event_id):
                 # This event has already been processed
                 continue
 
             self._handle_event(repository=name, event=event)
 
-        if events:
-            self._set_last_id(name=name, last_id=events[-1].id)
+        if events and events[-1]['id'] != last_event_id:
+            self._set_last_id(name=name, last_id=events[-1]['id'])
+
+        # ETag is only stored once all the events have been processed, so events are retrieved
+        # again if dispatching fails half way through
+        if etag:
+            self._etags[repository] = etag
+
+    def _get_events(self, repository, count):
+        """
+        Retrieve the latest events for the provided repository.
+
+        Conditional request is used so unchanged repositories don't count against the rate
+        limit.
+
+        :return: List of events (or ``None`` if the events haven't changed since the last poll)
+                 and the ETag of the response.
+        :rtype: ``tuple``
+        """
+        url = '%s/repos/%s/events' % (self._base_url, repository)
+        params = {'per_page': min(count, MAX_PAGE_SIZE)}
+        headers = {}
+
+        etag = self._etags.get(repository, None)
+        if etag:
+            headers['If-None-Match'] = etag
+
+        response = self._session.get(url, params=params, headers=headers)
+
+        if response.status_code == 304:
+            return None, etag
+
+        if response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0':
+            self._logger.warning('Github rate limit exceeded, limit will be reset at %s' %
+                                 (response.headers.get('X-RateLimit-Reset')))
+
+        response.raise_for_status()
+
+        return response.json(), response.headers.get('ETag', None)
 
     def cleanup(self):
-        pass
+        if self._session:
+            self._session.close()
 
     def add_trigger(self, trigger):
         pass
@@ -101,9 +192,10 @@ class GithubRepositorySensor(PollingSensor):
         :param name: Repository name.
         :type name: ``str``
         """
-        if not self._last_event_ids.get(name, None) and hasattr(self._sensor_service, 'get_value'):
+        if name not in self._loaded_last_event_ids and hasattr(self._sensor_service, 'get_value'):
             key_name = 'last_id.%s' % (name)
             self._last_event_ids[name] = self._sensor_service.get_value(name=key_name)
+            self._loaded_last_event_ids.add(name)
 
         return self._last_event_ids.get(name, None)
 
@@ -118,9 +210,49 @@ class GithubRepositorySensor(PollingSensor):
             key_name = 'last_id.%s' % (name)
             self._sensor_service.set_value(name=key_name, value=last_id)
 
+    def _get_actor(self, actor):
+        """
+        Retrieve profile for the provided event actor. Profiles are cached for
+        ``actor_cache_ttl`` seconds.
+
+        :param actor: Actor attribute of the event.
+        :type actor: ``dict``
+        """
+        login = actor['login']
+        now = time.time()
+
+        cached = self._actors.get(login, None)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        url = '%s/users/%s' % (self._base_url, login)
+
+        try:
+            response = self._session.get(url)
+            response.raise_for_status()
+            user = response.json()
+        except Exception:
+            self._logger.exception('Failed to retrieve profile for user "%s"' % (login))
+            user = {}
+
+        result = {
+            'id': actor['id'],
+            'login': login,
+            'name': user.get('name', None),
+            'email': user.get('email', None),
+            'loaction': user.get('location', None),
+            'bio': user.get('bio', None),
+            'url': user.get('html_url', None)
+        }
+
+        if user:
+            self._actors[login] = (result, now + self._actor_cache_ttl)
+
+        return result
+
     def _handle_event(self, repository, event):
-        if event.type not in self.EVENT_TYPE_WHITELIST:
-            self._logger.debug('Skipping ignored event (type=%s)' % (event.type))
+        if event['type'] not in self.EVENT_TYPE_WHITELIST:
+            self._logger.debug('Skipping ignored event (type=%s)' % (event['type']))
             return
 
         self._dispatch_trigger_for_event(repository=repository, event=event)
@@ -128,26 +260,19 @@ class GithubRepositorySensor(PollingSensor):
     def _dispatch_trigger_for_event(self, repository, event):
         trigger = self._trigger_ref
 
-        created_at = event.created_at
+        created_at = event.get('created_at', None)
 
         if created_at:
+            created_at = datetime.strptime(created_at, GITHUB_DATE_FORMAT_STRING)
             created_at = created_at.strftime(DATE_FORMAT_STRING)
 
         # Common attributes
         payload = {
             'repository': repository,
-            'id': event.id,
+            'id': event['id'],
             'created_at': created_at,
-            'type': event.type,
-            'actor': {
-                'id': event.actor.id,
-                'login': event.actor.login,
-                'name': event.actor.name,
-                'email': event.actor.email,
-                'loaction': event.actor.location,
-                'bio': event.actor.bio,
-                'url': event.actor.html_url
-            },
+            'type': event['type'],
+            'actor': self._get_actor(actor=event['actor']),
             'payload': {}
         }
 
@@ -156,5 +281,5 @@ class GithubRepositorySensor(PollingSensor):
         self._sensor_service.dispatch(trigger=trigger, payload=payload)
 
     def _get_payload_for_event(self, event):
-        payload = event.payload or {}
+        payload = event.get('payload', None) or {}
         return payload
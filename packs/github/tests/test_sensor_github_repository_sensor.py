@@ -0,0 +1,171 @@
+import json
+
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from github_repository_sensor import GithubRepositorySensor
+
+__all__ = [
+    'GithubRepositorySensorTestCase'
+]
+
+CONFIG = {
+    'token': None,
+    'repository_sensor': {
+        'count': 30,
+        'event_type_whitelist': ['PushEvent'],
+        'repositories': [
+            {'user': 'StackStorm', 'name': 'st2'},
+            {'user': 'StackStorm', 'name': 'st2contrib'}
+        ]
+    }
+}
+
+
+def _get_event(event_id, login='user1'):
+    return {
+        'id': str(event_id),
+        'type': 'PushEvent',
+        'created_at': '2016-10-01T10:00:00Z',
+        'actor': {'id': 1, 'login': login},
+        'payload': {'ref': 'refs/heads/master'}
+    }
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._data = data
+
+    def json(self):
+        return json.loads(json.dumps(self._data))
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception('HTTP %s' % (self.status_code))
+
+
+class FakeSession(object):
+    """
+    Session which serves events per repository and honours If-None-Match.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.requests = []
+
+    def get(self, url, params=None, headers=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+
+        if '/users/' in url:
+            login = url.rsplit('/', 1)[1]
+            return FakeResponse(data={'name': login.upper(), 'html_url': url})
+
+        repository = url.split('/repos/')[1].rsplit('/events', 1)[0]
+        if repository not in self.events:
+            return FakeResponse(status_code=404)
+
+        events = self.events[repository]
+        etag = '"%s"' % (events[0]['id'] if events else '')
+        if headers.get('If-None-Match', None) == etag:
+            return FakeResponse(status_code=304)
+
+        return FakeResponse(data=events, headers={'ETag': etag})
+
+    def get_requests(self, path):
+        return [headers for url, headers in self.requests if url.endswith(path)]
+
+    def close(self):
+        pass
+
+
+class GithubRepositorySensorTestCase(BaseSensorTestCase):
+    sensor_cls = GithubRepositorySensor
+
+    def setUp(self):
+        super(GithubRepositorySensorTestCase, self).setUp()
+
+        self.session = FakeSession()
+        self.session.events['StackStorm/st2'] = [_get_event(2), _get_event(1)]
+        self.session.events['StackStorm/st2contrib'] = [_get_event(10, login='user2')]
+
+    def _get_sensor(self):
+        sensor = self.get_sensor_instance(config=CONFIG)
+        sensor.setup()
+        sensor._session = self.session
+        return sensor
+
+    def _get_dispatched_ids(self):
+        return [(trigger['payload']['repository'], trigger['payload']['id'])
+                for trigger in self.get_dispatched_triggers()]
+
+    def test_poll_repositories_concurrently(self):
+        # Failure of one repository doesn't affect the others
+        self.session.events.pop('StackStorm/st2contrib')
+        self.session.events['StackStorm/st2'].insert(0, _get_event(3))
+
+        sensor = self._get_sensor()
+        sensor.poll()
+
+        self.assertEqual(self._get_dispatched_ids(), [('st2', '1'), ('st2', '2'), ('st2', '3')])
+        self.assertEqual(self.sensor_service.get_value('last_id.st2'), '3')
+        self.assertEqual(self.sensor_service.get_value('last_id.st2contrib'), None)
+
+    def test_etag_is_used_for_conditional_requests(self):
+        sensor = self._get_sensor()
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 3)
+
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 3)
+
+        requests = self.session.get_requests('/repos/StackStorm/st2/events')
+        self.assertNotIn('If-None-Match', requests[0])
+        self.assertEqual(requests[1]['If-None-Match'], '"2"')
+
+        # New event changes the ETag
+        self.session.events['StackStorm/st2'].insert(0, _get_event(3))
+        sensor.poll()
+        self.assertEqual(self._get_dispatched_ids()[-1], ('st2', '3'))
+        self.assertEqual(len(self.get_dispatched_triggers()), 4)
+
+    def test_etag_is_not_stored_when_processing_fails(self):
+        sensor = self._get_sensor()
+
+        with mock.patch.object(self.sensor_service, 'dispatch',
+                               mock.Mock(side_effect=Exception('dispatch failed'))):
+            sensor.poll()
+
+        self.assertEqual(self.get_dispatched_triggers(), [])
+        self.assertEqual(sensor._etags, {})
+        self.assertEqual(self.sensor_service.get_value('last_id.st2'), None)
+
+        # Events are retrieved again on the next poll instead of getting a 304
+        sensor.poll()
+        self.assertEqual(sorted(self._get_dispatched_ids()),
+                         [('st2', '1'), ('st2', '2'), ('st2contrib', '10')])
+        self.assertEqual(sensor._etags['StackStorm/st2'], '"2"')
+        self.assertEqual(self.sensor_service.get_value('last_id.st2'), '2')
+
+    def test_actor_profiles_are_cached(self):
+        sensor = self._get_sensor()
+        sensor.poll()
+
+        self.assertEqual(len(self.session.get_requests('/users/user1')), 1)
+        self.assertEqual(len(self.session.get_requests('/users/user2')), 1)
+        actors = dict((trigger['payload']['actor']['login'], trigger['payload']['actor'])
+                      for trigger in self.get_dispatched_triggers())
+        self.assertEqual(actors['user1']['name'], 'USER1')
+
+        # Expired profiles are retrieved again
+        sensor._actors['user1'] = (sensor._actors['user1'][0], 0)
+        self.session.events['StackStorm/st2'].insert(0, _get_event(3))
+        self.session.events['StackStorm/st2'].insert(0, _get_event(4))
+        sensor.poll()
+
+        self.assertEqual(len(self.session.get_requests('/users/user1')), 2)
+        self.assertEqual(len(self.get_dispatched_triggers()), 5)
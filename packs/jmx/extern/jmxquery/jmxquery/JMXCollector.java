@@ -0,0 +1,862 @@
+package jmxquery;
+
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.util.ArrayList;
+import java.util.Collection;
+import java.util.HashMap;
+import java.util.Iterator;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.concurrent.Callable;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.Semaphore;
+import java.util.concurrent.ThreadFactory;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
+import java.util.regex.Matcher;
+import java.util.regex.Pattern;
+
+import javax.management.Attribute;
+import javax.management.AttributeList;
+import javax.management.JMException;
+import javax.management.MBeanServerConnection;
+import javax.management.MalformedObjectNameException;
+import javax.management.ObjectName;
+import javax.management.openmbean.CompositeData;
+import javax.management.remote.JMXConnector;
+import javax.management.remote.JMXConnectorFactory;
+import javax.management.remote.JMXServiceURL;
+
+
+/**
+ * Long running JMX collector.
+ *
+ * Keeps JMX connections to the configured targets open and collects the configured
+ * object / attribute pairs on request. Requests are read from stdin and responses are written
+ * to stdout, one JSON document per line:
+ *
+ *   {"id": 1, "command": "configure", "pool_size": 4, "timeout": 10000,
+ *    "targets": [{"name": "cassandra",
+ *    "url": "service:jmx:rmi:///jndi/rmi://localhost:7199/jmxrmi", "username": null,
+ *    "password": null, "queries": [{"object_name": "java.lang:type=Memory",
+ *    "attribute_name": "HeapMemoryUsage", "attribute_keys": ["used"]}]}]}
+ *   {"id": 2, "command": "collect", "timeout": 10000}
+ *   {"id": 3, "command": "shutdown"}
+ *
+ * Metrics are named the same way as by JMXQuery. Targets are collected concurrently, attributes
+ * of the same object are retrieved in a single request and connections are re-established after
+ * I/O errors.
+ *
+ * RMI connect and response timeouts are set to the "timeout" of the configure request, so a
+ * collection which has timed out eventually fails instead of hanging forever. A target is
+ * skipped while its previous collection is still running.
+ *
+ * It requires JRE 1.5 to be used for compilation and execution, it can also be executed
+ * without compilation using "java JMXCollector.java" on JRE 11 or later.
+ */
+public class JMXCollector {
+
+  private static final int MAX_MATCHING_OBJECTS = 15;
+
+  private static final int DEFAULT_POOL_SIZE = 4;
+
+  private static final long DEFAULT_TIMEOUT = 10000;
+
+  // RMI properties which are read when the RMI classes are initialized, i.e. before the first
+  // connection is established
+  private static final String[] RMI_TIMEOUT_PROPERTIES = {
+    "sun.rmi.transport.proxy.connectTimeout",
+    "sun.rmi.transport.tcp.handshakeTimeout",
+    "sun.rmi.transport.tcp.responseTimeout"
+  };
+
+  private final Map<String, Target> targets = new LinkedHashMap<String, Target>();
+
+  private ExecutorService executor;
+
+  @SuppressWarnings("unchecked")
+  public static void main(String[] args) throws IOException
+  {
+    BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+    PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+
+    // Only responses can be written to stdout
+    System.setOut(System.err);
+
+    JMXCollector collector = new JMXCollector();
+    boolean running = true;
+
+    while (running) {
+      String line = in.readLine();
+      if (line == null) {
+        break;
+      }
+
+      line = line.trim();
+      if (line.length() == 0) {
+        continue;
+      }
+
+      Map<String, Object> response = new LinkedHashMap<String, Object>();
+
+      try {
+        Map<String, Object> request = (Map<String, Object>) Json.parse(line);
+        String command = (String) request.get("command");
+        response.put("id", request.get("id"));
+
+        if ("configure".equals(command)) {
+          collector.configure(request);
+        }
+        else if ("collect".equals(command)) {
+          response.put("results", collector.collect(request));
+        }
+        else if ("shutdown".equals(command)) {
+          running = false;
+        }
+        else {
+          throw new IllegalArgumentException("Unknown command: " + command);
+        }
+      }
+      catch (Exception ex) {
+        response.put("error", message(ex));
+      }
+
+      out.println(Json.toString(response));
+    }
+
+    collector.shutdown();
+    System.exit(0);
+  }
+
+  @SuppressWarnings("unchecked")
+  private void configure(Map<String, Object> request)
+  {
+    shutdown();
+
+    if (request.get("timeout") != null) {
+      setRmiTimeouts(((Number) request.get("timeout")).longValue());
+    }
+
+    List<Object> targetConfigs = (List<Object>) request.get("targets");
+    for (Object targetConfig : targetConfigs) {
+      Target target = new Target((Map<String, Object>) targetConfig);
+      targets.put(target.name, target);
+    }
+
+    int poolSize = DEFAULT_POOL_SIZE;
+    if (request.get("pool_size") != null) {
+      poolSize = ((Number) request.get("pool_size")).intValue();
+    }
+
+    poolSize = Math.max(1, Math.min(poolSize, targets.size()));
+    executor = Executors.newFixedThreadPool(poolSize, new ThreadFactory() {
+      public Thread newThread(Runnable runnable) {
+        Thread thread = new Thread(runnable);
+        thread.setDaemon(true);
+        return thread;
+      }
+    });
+  }
+
+  private List<Object> collect(Map<String, Object> request) throws InterruptedException
+  {
+    if (executor == null) {
+      throw new IllegalStateException("Collector has not been configured");
+    }
+
+    long timeout = DEFAULT_TIMEOUT;
+    if (request.get("timeout") != null) {
+      timeout = ((Number) request.get("timeout")).longValue();
+    }
+
+    // Interrupting the thread doesn't abort blocking RMI calls, targets which are still being
+    // collected after a timeout are skipped instead of queuing up more collections behind them
+    List<Future<Map<String, Object>>> futures = new ArrayList<Future<Map<String, Object>>>();
+    for (final Target target : targets.values()) {
+      if (!target.collecting.tryAcquire()) {
+        futures.add(null);
+        continue;
+      }
+
+      futures.add(executor.submit(new Callable<Map<String, Object>>() {
+        public Map<String, Object> call() {
+          try {
+            return target.collect();
+          }
+          finally {
+            target.collecting.release();
+          }
+        }
+      }));
+    }
+
+    long deadline = System.currentTimeMillis() + timeout;
+    List<Object> results = new ArrayList<Object>();
+    Iterator<Target> targetIterator = targets.values().iterator();
+
+    for (Future<Map<String, Object>> future : futures) {
+      Target target = targetIterator.next();
+
+      if (future == null) {
+        results.add(target.error("Previous collection is still running"));
+        continue;
+      }
+
+      try {
+        long remaining = Math.max(0, deadline - System.currentTimeMillis());
+        results.add(future.get(remaining, TimeUnit.MILLISECONDS));
+      }
+      catch (TimeoutException ex) {
+        future.cancel(true);
+        results.add(target.error("Timed out after " + timeout + " ms"));
+      }
+      catch (Exception ex) {
+        results.add(target.error(message(ex)));
+      }
+    }
+
+    return results;
+  }
+
+  private void shutdown()
+  {
+    if (executor != null) {
+      executor.shutdownNow();
+      executor = null;
+    }
+
+    for (Target target : targets.values()) {
+      target.disconnect();
+    }
+
+    targets.clear();
+  }
+
+  private static void setRmiTimeouts(long timeout)
+  {
+    for (String property : RMI_TIMEOUT_PROPERTIES) {
+      // Values set on the command line take precedence
+      if (System.getProperty(property) == null) {
+        System.setProperty(property, String.valueOf(timeout));
+      }
+    }
+  }
+
+  private static String message(Throwable ex)
+  {
+    while (ex.getCause() != null) {
+      ex = ex.getCause();
+    }
+
+    return ex.getMessage() != null ? ex.getMessage() : ex.toString();
+  }
+
+  private static double millis(long startNanos)
+  {
+    return (System.nanoTime() - startNanos) / 1000000.0;
+  }
+
+  /**
+   * Object / attribute pair to be collected.
+   */
+  private static class Query {
+
+    private final String objectName;
+    private final String attributeName;
+    private final List<Object> attributeKeys;
+
+    @SuppressWarnings("unchecked")
+    Query(Map<String, Object> config)
+    {
+      objectName = (String) config.get("object_name");
+      attributeName = (String) config.get("attribute_name");
+
+      List<Object> keys = (List<Object>) config.get("attribute_keys");
+      attributeKeys = keys != null ? keys : new ArrayList<Object>();
+    }
+  }
+
+  /**
+   * JMX service with a persistent connection.
+   */
+  private static class Target {
+
+    private final String name;
+    private final String url;
+    private final String username;
+    private final String password;
+
+    // object name -> queries
+    private final Map<String, List<Query>> queries = new LinkedHashMap<String, List<Query>>();
+
+    private JMXConnector connector;
+    private MBeanServerConnection connection;
+
+    // Held while the target is being collected
+    private final Semaphore collecting = new Semaphore(1);
+
+    @SuppressWarnings("unchecked")
+    Target(Map<String, Object> config)
+    {
+      name = (String) config.get("name");
+      url = (String) config.get("url");
+      username = (String) config.get("username");
+      password = (String) config.get("password");
+
+      for (Object queryConfig : (List<Object>) config.get("queries")) {
+        Query query = new Query((Map<String, Object>) queryConfig);
+
+        if (!queries.containsKey(query.objectName)) {
+          queries.put(query.objectName, new ArrayList<Query>());
+        }
+        queries.get(query.objectName).add(query);
+      }
+    }
+
+    Map<String, Object> collect()
+    {
+      long start = System.nanoTime();
+      List<Object> metrics = new ArrayList<Object>();
+      List<Object> errors = new ArrayList<Object>();
+      Map<String, Object> result = result();
+
+      try {
+        if (connection == null) {
+          long connectStart = System.nanoTime();
+          connect();
+          result.put("connect_ms", millis(connectStart));
+        }
+
+        for (Map.Entry<String, List<Query>> entry : queries.entrySet()) {
+          try {
+            collectObject(entry.getKey(), entry.getValue(), metrics);
+          }
+          catch (JMException ex) {
+            errors.add(entry.getKey() + ": " + message(ex));
+          }
+        }
+      }
+      catch (IOException ex) {
+        // Connection is re-established on the next collection
+        disconnect();
+        errors.add(message(ex));
+      }
+
+      result.put("latency_ms", millis(start));
+      result.put("metrics", metrics);
+      result.put("errors", errors);
+      return result;
+    }
+
+    Map<String, Object> error(String message)
+    {
+      List<Object> errors = new ArrayList<Object>();
+      errors.add(message);
+
+      Map<String, Object> result = result();
+      result.put("metrics", new ArrayList<Object>());
+      result.put("errors", errors);
+      return result;
+    }
+
+    private Map<String, Object> result()
+    {
+      Map<String, Object> result = new LinkedHashMap<String, Object>();
+      result.put("target", name);
+      result.put("connect_ms", null);
+      result.put("latency_ms", null);
+      return result;
+    }
+
+    private void connect() throws IOException
+    {
+      JMXServiceURL jmxUrl = new JMXServiceURL(url);
+
+      if (username != null) {
+        Map<String, String[]> environment = new HashMap<String, String[]>();
+        environment.put(JMXConnector.CREDENTIALS, new String[] {username, password});
+        connector = JMXConnectorFactory.connect(jmxUrl, environment);
+      }
+      else {
+        connector = JMXConnectorFactory.connect(jmxUrl);
+      }
+
+      connection = connector.getMBeanServerConnection();
+    }
+
+    synchronized void disconnect()
+    {
+      if (connector != null) {
+        try {
+          connector.close();
+        }
+        catch (IOException ex) {
+          // Connection is already broken
+        }
+      }
+
+      connector = null;
+      connection = null;
+    }
+
+    private void collectObject(String objectName, List<Query> objectQueries, List<Object> metrics)
+      throws IOException, JMException
+    {
+      List<String> attributeNames = new ArrayList<String>();
+      for (Query query : objectQueries) {
+        if (!attributeNames.contains(query.attributeName)) {
+          attributeNames.add(query.attributeName);
+        }
+      }
+      String[] attributes = attributeNames.toArray(new String[attributeNames.size()]);
+
+      int globIndex = objectName.indexOf('*');
+      if (globIndex == -1) {
+        Map<String, Object> values = getAttributes(new ObjectName(objectName), attributes);
+        report(null, objectQueries, values, metrics);
+        return;
+      }
+
+      // Object name glob match
+      if (globIndex != objectName.lastIndexOf('*')) {
+        throw new JMException("You can only use a single glob in an object name");
+      }
+
+      Pattern pattern = Pattern.compile("^" + Pattern.quote(objectName.substring(0, globIndex)) +
+                                        "(.*)" +
+                                        Pattern.quote(objectName.substring(globIndex + 1)) + "$");
+      Set<ObjectName> names;
+      try {
+        names = connection.queryNames(new ObjectName(objectName), null);
+      }
+      catch (MalformedObjectNameException ex) {
+        // Not a valid JMX pattern, match against all the object names instead
+        names = connection.queryNames(null, null);
+      }
+
+      int matches = 0;
+      for (ObjectName name : names) {
+        Matcher matcher = pattern.matcher(name.toString());
+        if (!matcher.find()) {
+          continue;
+        }
+
+        if (++matches > MAX_MATCHING_OBJECTS) {
+          throw new JMException("More then " + MAX_MATCHING_OBJECTS + " matching objects found");
+        }
+
+        report(matcher.group(1), objectQueries, getAttributes(name, attributes), metrics);
+      }
+
+      if (matches == 0) {
+        throw new JMException("No matching objects found");
+      }
+    }
+
+    private Map<String, Object> getAttributes(ObjectName name, String[] attributes)
+      throws IOException, JMException
+    {
+      Map<String, Object> values = new HashMap<String, Object>();
+      AttributeList attributeList = connection.getAttributes(name, attributes);
+
+      for (Object item : attributeList) {
+        Attribute attribute = (Attribute) item;
+        values.put(attribute.getName(), attribute.getValue());
+      }
+
+      return values;
+    }
+
+    private void report(String prefix, List<Query> objectQueries, Map<String, Object> values,
+                        List<Object> metrics) throws JMException
+    {
+      for (Query query : objectQueries) {
+        if (!values.containsKey(query.attributeName)) {
+          throw new JMException("Attribute " + query.attributeName + " not found");
+        }
+
+        Object value = values.get(query.attributeName);
+
+        if (value instanceof CompositeData) {
+          CompositeData data = (CompositeData) value;
+          Collection<String> keys = data.getCompositeType().keySet();
+
+          for (String key : keys) {
+            if (query.attributeKeys.size() > 0 && !query.attributeKeys.contains(key)) {
+              continue;
+            }
+
+            reportRow(query, prefix, key, data.get(key), metrics);
+          }
+        }
+        else {
+          reportRow(query, prefix, query.attributeName, value, metrics);
+        }
+      }
+    }
+
+    private void reportRow(Query query, String prefix, String name, Object value,
+                           List<Object> metrics)
+    {
+      if (prefix != null) {
+        name = prefix + "." + name;
+      }
+
+      Map<String, Object> metric = new LinkedHashMap<String, Object>();
+      metric.put("object_name", query.objectName);
+      metric.put("attribute_name", query.attributeName);
+      metric.put("name", name.replace(' ', '_').toLowerCase());
+
+      if (value instanceof Number) {
+        Number number = (Number) value;
+        if (number.floatValue() != Math.floor(number.floatValue())) {
+          metric.put("type", "float");
+          metric.put("value", Double.valueOf(number.doubleValue()));
+        }
+        else {
+          metric.put("type", "int");
+          metric.put("value", Long.valueOf(number.longValue()));
+        }
+      }
+      else if (value instanceof String || value instanceof Boolean) {
+        metric.put("type", "string");
+        metric.put("value", value.toString());
+      }
+      else {
+        return;
+      }
+
+      metrics.add(metric);
+    }
+  }
+
+  /**
+   * Minimal JSON parser and serializer for the request and response documents.
+   */
+  static class Json {
+
+    private final String text;
+    private int position;
+
+    private Json(String text)
+    {
+      this.text = text;
+    }
+
+    static Object parse(String text)
+    {
+      Json json = new Json(text);
+      Object value = json.parseValue();
+
+      json.skipWhitespace();
+      if (json.position != text.length()) {
+        throw json.error("Unexpected trailing data");
+      }
+
+      return value;
+    }
+
+    static String toString(Object value)
+    {
+      StringBuilder builder = new StringBuilder();
+      write(value, builder);
+      return builder.toString();
+    }
+
+    @SuppressWarnings("unchecked")
+    private static void write(Object value, StringBuilder builder)
+    {
+      if (value == null) {
+        builder.append("null");
+      }
+      else if (value instanceof String) {
+        writeString((String) value, builder);
+      }
+      else if (value instanceof Double || value instanceof Float) {
+        double number = ((Number) value).doubleValue();
+        if (Double.isNaN(number) || Double.isInfinite(number)) {
+          builder.append("null");
+        }
+        else {
+          builder.append(number);
+        }
+      }
+      else if (value instanceof Number || value instanceof Boolean) {
+        builder.append(value.toString());
+      }
+      else if (value instanceof Map) {
+        builder.append('{');
+        boolean first = true;
+
+        for (Map.Entry<String, Object> entry : ((Map<String, Object>) value).entrySet()) {
+          if (!first) {
+            builder.append(", ");
+          }
+          first = false;
+
+          writeString(entry.getKey(), builder);
+          builder.append(": ");
+          write(entry.getValue(), builder);
+        }
+
+        builder.append('}');
+      }
+      else if (value instanceof List) {
+        builder.append('[');
+        boolean first = true;
+
+        for (Object item : (List<Object>) value) {
+          if (!first) {
+            builder.append(", ");
+          }
+          first = false;
+
+          write(item, builder);
+        }
+
+        builder.append(']');
+      }
+      else {
+        writeString(value.toString(), builder);
+      }
+    }
+
+    private static void writeString(String value, StringBuilder builder)
+    {
+      builder.append('"');
+
+      for (int i = 0; i < value.length(); i++) {
+        char c = value.charAt(i);
+
+        switch (c) {
+          case '"':
+            builder.append("\\\"");
+            break;
+          case '\\':
+            builder.append("\\\\");
+            break;
+          case '\n':
+            builder.append("\\n");
+            break;
+          case '\r':
+            builder.append("\\r");
+            break;
+          case '\t':
+            builder.append("\\t");
+            break;
+          default:
+            if (c < 0x20) {
+              builder.append(String.format("\\u%04x", Integer.valueOf(c)));
+            }
+            else {
+              builder.append(c);
+            }
+        }
+      }
+
+      builder.append('"');
+    }
+
+    private Object parseValue()
+    {
+      skipWhitespace();
+      if (position >= text.length()) {
+        throw error("Unexpected end of input");
+      }
+
+      char c = text.charAt(position);
+
+      if (c == '{') {
+        return parseObject();
+      }
+      else if (c == '[') {
+        return parseArray();
+      }
+      else if (c == '"') {
+        return parseString();
+      }
+      else if (text.startsWith("true", position)) {
+        position += 4;
+        return Boolean.TRUE;
+      }
+      else if (text.startsWith("false", position)) {
+        position += 5;
+        return Boolean.FALSE;
+      }
+      else if (text.startsWith("null", position)) {
+        position += 4;
+        return null;
+      }
+
+      return parseNumber();
+    }
+
+    private Map<String, Object> parseObject()
+    {
+      Map<String, Object> result = new LinkedHashMap<String, Object>();
+      position++;
+
+      skipWhitespace();
+      if (peek() == '}') {
+        position++;
+        return result;
+      }
+
+      while (true) {
+        skipWhitespace();
+        if (peek() != '"') {
+          throw error("Expected object key");
+        }
+
+        String key = parseString();
+
+        skipWhitespace();
+        expect(':');
+        result.put(key, parseValue());
+
+        skipWhitespace();
+        char c = next();
+        if (c == '}') {
+          return result;
+        }
+        else if (c != ',') {
+          throw error("Expected ',' or '}'");
+        }
+      }
+    }
+
+    private List<Object> parseArray()
+    {
+      List<Object> result = new ArrayList<Object>();
+      position++;
+
+      skipWhitespace();
+      if (peek() == ']') {
+        position++;
+        return result;
+      }
+
+      while (true) {
+        result.add(parseValue());
+
+        skipWhitespace();
+        char c = next();
+        if (c == ']') {
+          return result;
+        }
+        else if (c != ',') {
+          throw error("Expected ',' or ']'");
+        }
+      }
+    }
+
+    private String parseString()
+    {
+      StringBuilder builder = new StringBuilder();
+      position++;
+
+      while (true) {
+        char c = next();
+
+        if (c == '"') {
+          return builder.toString();
+        }
+        else if (c != '\\') {
+          builder.append(c);
+          continue;
+        }
+
+        c = next();
+        switch (c) {
+          case 'b':
+            builder.append('\b');
+            break;
+          case 'f':
+            builder.append('\f');
+            break;
+          case 'n':
+            builder.append('\n');
+            break;
+          case 'r':
+            builder.append('\r');
+            break;
+          case 't':
+            builder.append('\t');
+            break;
+          case 'u':
+            if (position + 4 > text.length()) {
+              throw error("Invalid unicode escape");
+            }
+            builder.append((char) Integer.parseInt(text.substring(position, position + 4), 16));
+            position += 4;
+            break;
+          default:
+            builder.append(c);
+        }
+      }
+    }
+
+    private Number parseNumber()
+    {
+      int start = position;
+      while (position < text.length() && "+-0123456789.eE".indexOf(text.charAt(position)) != -1) {
+        position++;
+      }
+
+      String number = text.substring(start, position);
+      if (number.length() == 0) {
+        throw error("Unexpected character");
+      }
+
+      if (number.indexOf('.') == -1 && number.indexOf('e') == -1 && number.indexOf('E') == -1) {
+        return Long.valueOf(number);
+      }
+
+      return Double.valueOf(number);
+    }
+
+    private void skipWhitespace()
+    {
+      while (position < text.length() && Character.isWhitespace(text.charAt(position))) {
+        position++;
+      }
+    }
+
+    private char peek()
+    {
+      if (position >= text.length()) {
+        throw error("Unexpected end of input");
+      }
+
+      return text.charAt(position);
+    }
+
+    private char next()
+    {
+      char c = peek();
+      position++;
+      return c;
+    }
+
+    private void expect(char expected)
+    {
+      if (next() != expected) {
+        throw error("Expected '" + expected + "'");
+      }
+    }
+
+    private IllegalArgumentException error(String message)
+    {
+      return new IllegalArgumentException(message + " at position " + position);
+    }
+  }
+}
@@ -1,16 +1,16 @@
-import os
-import re
-
 from st2common.util.shell import run_command
 from st2reactor.sensor.base import PollingSensor
 
+from lib.collector import DEFAULT_TIMEOUT
+from lib.collector import CollectorError
+from lib.collector import JMXCollector
+from lib.collector import JMXQueryCollector
+
 __all__ = [
     'JMXSensor'
 ]
 
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-JMXQUERY_PATH = os.path.join(CURRENT_DIR, '../extern/jmxquery/jmxquery.jar')
-JMXQUERY_PATH = os.path.abspath(JMXQUERY_PATH)
+JMX_URL = 'service:jmx:rmi:///jndi/rmi://%s:%s/jmxrmi'
 
 
 class JMXSensor(PollingSensor):
@@ -19,60 +19,96 @@ class JMXSensor(PollingSensor):
                                         config=config,
                                         poll_interval=poll_interval)
         self._trigger_ref = 'jmx.metric'
+        self._batch_trigger_ref = 'jmx.metrics'
         self._logger = self._sensor_service.get_logger(__name__)
-        self._args = None
+        self._collector = None
+
+        # name -> target config
+        self._targets = {}
+        # name -> latency stats
+        self._stats = {}
 
     def setup(self):
         self._check_for_java_binary()
 
         config = self._config
-        url = ('service:jmx:rmi:///jndi/rmi://' + config['hostname'] + ':' +
-               str(config['port']) + '/jmxrmi')
-
-        args = [
-            'java',
-            '-classpath',
-            JMXQUERY_PATH,
-            'jmxquery.JMXQuery',
-            '-U',
-            url,
-            '-O',
-            config['object_name'],
-            '-A',
-            config['attribute_name']
-        ]
-
-        if config['username']:
-            args.extend(['-username', config['username']])
-
-        if config['password']:
-            args.extend(['-password', config['password']])
-
-        attribute_keys = config.get('attribute_keys', None)
-        if attribute_keys:
-            attribute_keys = ','.join(attribute_keys)
-            args.extend(['-K', attribute_keys])
-
-        self._args = args
+        targets = list(config.get('targets', None) or [])
+
+        if config.get('hostname', None) and config.get('object_name', None):
+            targets.append({
+                'hostname': config['hostname'],
+                'port': config['port'],
+                'username': config.get('username', None),
+                'password': config.get('password', None),
+                'queries': [{
+                    'object_name': config['object_name'],
+                    'attribute_name': config['attribute_name'],
+                    'attribute_keys': config.get('attribute_keys', None)
+                }]
+            })
+
+        for target in targets:
+            name = target.get('name', None) or '%s:%s' % (target['hostname'], target['port'])
+            self._targets[name] = target
+            self._stats[name] = {
+                'polls': 0,
+                'failures': 0,
+                'connects': 0,
+                # Number of polls which have completed before the timeout
+                'completed': 0,
+                'last_latency_ms': None,
+                'avg_latency_ms': None,
+                'max_latency_ms': None
+            }
+
+        self._batch_metrics = config.get('batch_metrics', False)
+
+        collector_kwargs = {
+            'targets': [self._get_collector_target(target_name, target)
+                        for target_name, target in self._targets.items()],
+            'pool_size': config.get('pool_size', None),
+            'timeout': config.get('collect_timeout', DEFAULT_TIMEOUT),
+            'logger': self._logger
+        }
+
+        # Long running collector is experimental, JMXQuery is run on every poll by default
+        if not config.get('use_collector', False):
+            self._collector = JMXQueryCollector(**collector_kwargs)
+            return
+
+        self._collector = JMXCollector(**collector_kwargs)
+
+        try:
+            self._collector.start()
+        except CollectorError as e:
+            # E.g. collector hasn't been compiled and Java < 11 can't run the source file
+            self._logger.warn('Failed to start JMX collector, falling back to running JMXQuery '
+                              'on every poll: %s' % (str(e)))
+            self._collector = JMXQueryCollector(**collector_kwargs)
 
     def poll(self):
-        command = ' '.join(self._args)
-        self._logger.debug('Running command: "%s"' % (command))
+        try:
+            results = self._collector.collect()
+        except Exception as e:
+            self._logger.warn('Failed to retrieve metrics: %s' % (str(e)))
+            return
 
-        exit_code, stdout, _ = run_command(cmd=self._args)
+        for result in results:
+            name = result['target']
+            self._update_stats(name=name, result=result)
 
-        if 'status err' in stdout:
-            split = stdout.split(' ', 3)
-            error = split[-1]
-            self._logger.warn('Failed to retrieve metrics: %s' % (error))
-        else:
-            metrics = self._parse_output(output=stdout)
+            for error in result['errors']:
+                self._logger.warn('Failed to retrieve metrics from %s: %s' % (name, error))
 
-            for metric in metrics:
-                self._dispatch_trigger_for_metric(metric=metric)
+            if self._batch_metrics:
+                self._dispatch_trigger_for_result(name=name, result=result)
+            else:
+                for metric in result['metrics']:
+                    self._dispatch_trigger_for_metric(name=name, metric=metric)
 
     def cleanup(self):
-        pass
+        if self._collector:
+            self._collector.stop()
 
     def add_trigger(self, trigger):
         pass
@@ -83,53 +119,107 @@ class JMXSensor(PollingSensor):
     def remove_trigger(self, trigger):
         pass
 
+    def get_stats(self):
+        """
+        Return latency stats for each target.
+
+        :rtype: ``dict``
+        """
+        return dict([(name, dict(stats)) for name, stats in self._stats.items()])
+
     def _check_for_java_binary(self):
         try:
             run_command(cmd=['java'])
         except OSError:
             raise Exception('Java run time environment is not available, aborting...')
 
-    def _dispatch_trigger_for_metric(self, metric):
+    def _get_collector_target(self, name, target):
+        url = target.get('url', None) or JMX_URL % (target['hostname'], target['port'])
+        queries = [{
+            'object_name': query['object_name'],
+            'attribute_name': query['attribute_name'],
+            'attribute_keys': query.get('attribute_keys', None) or None
+        } for query in target['queries']]
+
+        return {
+            'name': name,
+            'url': url,
+            'username': target.get('username', None) or None,
+            'password': target.get('password', None) or None,
+            'queries': queries
+        }
+
+    def _update_stats(self, name, result):
+        stats = self._stats[name]
+        stats['polls'] += 1
+
+        if result['errors']:
+            stats['failures'] += 1
+
+        if result['connect_ms'] is not None:
+            stats['connects'] += 1
+
+        latency = result['latency_ms']
+        if latency is None:
+            return
+
+        stats['completed'] += 1
+        stats['last_latency_ms'] = latency
+        stats['max_latency_ms'] = max(stats['max_latency_ms'] or 0.0, latency)
+
+        average = stats['avg_latency_ms'] or 0.0
+        stats['avg_latency_ms'] = average + (latency - average) / stats['completed']
+
+    def _get_query(self, name, metric):
+        for query in self._targets[name]['queries']:
+            if (query['object_name'] == metric['object_name'] and
+                    query['attribute_name'] == metric['attribute_name']):
+                return query
+
+        return {}
+
+    def _dispatch_trigger_for_metric(self, name, metric):
         assert isinstance(metric, dict)
 
-        config = self._config
+        target = self._targets[name]
+        query = self._get_query(name=name, metric=metric)
+        value = metric['value']
+
+        # Values are formatted the same way as by JMXQuery
+        if metric['type'] == 'float':
+            value = '%f' % (value)
+        else:
+            value = str(value)
+
         trigger = self._trigger_ref
         payload = {
-            'jmx_hostname': config['hostname'],
-            'jmx_port': config['port'],
-            'object_name': self._config['object_name'],
-            'attribute_name': self._config['attribute_name'],
-            'attribute_keys': self._config.get('attribute_keys', None),
+            'jmx_hostname': target.get('hostname', None),
+            'jmx_port': target.get('port', None),
+            'object_name': metric['object_name'],
+            'attribute_name': metric['attribute_name'],
+            'attribute_keys': query.get('attribute_keys', None),
             'metric': {
                 'name': metric['name'],
                 'type': metric['type'],
-                'value': metric['value']
+                'value': value
             }
         }
         self._sensor_service.dispatch(trigger=trigger, payload=payload)
 
-    def _parse_output(self, output):
-        """
-        Parse metrics from the provided jmx query output.
-
-        :rtype: ``list``
-        """
-        lines = re.split('\n', output)
-
-        metrics = []
-        for line in lines:
-            if 'metric' not in line:
-                continue
-
-            split = line.split(' ')
-            if len(split) != 4:
-                continue
+    def _dispatch_trigger_for_result(self, name, result):
+        target = self._targets[name]
+        stats = self._stats[name]
 
-            metric = {
-                'name': split[1],
-                'type': split[2],
-                'value': split[3]
-            }
-            metrics.append(metric)
-
-        return metrics
+        trigger = self._batch_trigger_ref
+        payload = {
+            'target': name,
+            'jmx_hostname': target.get('hostname', None),
+            'jmx_port': target.get('port', None),
+            'metrics': result['metrics'],
+            'errors': result['errors'],
+            'latency_ms': result['latency_ms'],
+            'connect_ms': result['connect_ms'],
+            'avg_latency_ms': stats['avg_latency_ms'],
+            'max_latency_ms': stats['max_latency_ms']
+        }
+        self._sensor_service.dispatch(trigger=trigger, payload=payload)
@@ -0,0 +1,269 @@
+import itertools
+import json
+import os
+import time
+
+import eventlet
+from eventlet.green import subprocess
+
+__all__ = [
+    'JMXCollector',
+    'JMXQueryCollector',
+    'CollectorError',
+
+    'get_collector_command',
+    'get_jmxquery_command'
+]
+
+EXTERN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../extern/jmxquery'))
+
+# Compiled collector (see README), the source file is executed directly if it doesn't exist
+JMXCOLLECTOR_JAR_PATH = os.path.join(EXTERN_DIR, 'jmxcollector.jar')
+JMXCOLLECTOR_SOURCE_PATH = os.path.join(EXTERN_DIR, 'jmxquery/JMXCollector.java')
+
+# Used if the collector can't be started (e.g. on Java < 11 without the compiled collector)
+JMXQUERY_JAR_PATH = os.path.join(EXTERN_DIR, 'jmxquery.jar')
+
+DEFAULT_POOL_SIZE = 4
+
+DEFAULT_TIMEOUT = 10
+
+# Additional time the collector process has to respond after the collection timeout
+RESPONSE_TIMEOUT_MARGIN = 5
+
+# Time to wait for the collector process to start (includes compilation of the source file)
+START_TIMEOUT = 60
+
+
+class CollectorError(Exception):
+    pass
+
+
+def get_collector_command(java_options=None):
+    args = ['java'] + list(java_options or [])
+
+    if os.path.exists(JMXCOLLECTOR_JAR_PATH):
+        args.extend(['-classpath', JMXCOLLECTOR_JAR_PATH, 'jmxquery.JMXCollector'])
+    else:
+        # Requires Java 11 or later
+        args.append(JMXCOLLECTOR_SOURCE_PATH)
+
+    return args
+
+
+def get_jmxquery_command(java_options=None):
+    return ['java'] + list(java_options or []) + ['-classpath', JMXQUERY_JAR_PATH,
+                                                  'jmxquery.JMXQuery']
+
+
+class JMXCollector(object):
+    """
+    Long running JMX collector process which keeps connections to the targets open.
+
+    Requests and responses are exchanged over stdin / stdout pipes, one JSON document per line.
+    The process is (re)started on demand.
+    """
+
+    def __init__(self, targets, command=None, pool_size=None, timeout=DEFAULT_TIMEOUT,
+                 logger=None):
+        """
+        :param targets: List of targets, each one with ``name``, ``url``, ``username``,
+                        ``password`` and ``queries`` (list of dicts with ``object_name``,
+                        ``attribute_name`` and ``attribute_keys``).
+        :type targets: ``list``
+
+        :param timeout: Collection timeout (in seconds).
+        :type timeout: ``int``
+        """
+        self.targets = targets
+        self.command = command or get_collector_command()
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._logger = logger
+        self._process = None
+        self._request_ids = itertools.count(1)
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        self._log('Starting JMX collector: %s' % (' '.join(self.command)))
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, close_fds=True)
+
+        self._request('configure', response_timeout=START_TIMEOUT, targets=self.targets,
+                      pool_size=self.pool_size, timeout=int(self.timeout * 1000))
+
+    def stop(self):
+        process = self._process
+        self._process = None
+
+        if not process or process.poll() is not None:
+            return
+
+        try:
+            process.stdin.write(json.dumps({'command': 'shutdown'}) + '\n')
+            process.stdin.flush()
+            with eventlet.Timeout(RESPONSE_TIMEOUT_MARGIN):
+                process.wait()
+        except (Exception, eventlet.Timeout):
+            process.kill()
+            process.wait()
+
+    def collect(self):
+        """
+        Collect metrics from all the targets.
+
+        :return: One result per target with ``target``, ``metrics``, ``errors``, ``latency_ms``
+                 and ``connect_ms`` (``None`` if an existing connection has been used) keys.
+        :rtype: ``list``
+        """
+        if not self.running:
+            self.start()
+
+        response = self._request('collect',
+                                 response_timeout=self.timeout + RESPONSE_TIMEOUT_MARGIN,
+                                 timeout=int(self.timeout * 1000))
+        return response['results']
+
+    def _request(self, command, response_timeout, **kwargs):
+        request = dict(kwargs)
+        request['id'] = next(self._request_ids)
+        request['command'] = command
+
+        try:
+            error = CollectorError('Collector has not responded in %s seconds' %
+                                   (response_timeout))
+            with eventlet.Timeout(response_timeout, error):
+                self._process.stdin.write(json.dumps(request) + '\n')
+                self._process.stdin.flush()
+                line = self._process.stdout.readline()
+        except (CollectorError, IOError, OSError) as e:
+            # State of the process is unknown, it's re-started on the next request
+            self.stop()
+            raise CollectorError(str(e))
+
+        if not line:
+            self.stop()
+            raise CollectorError('Collector process has exited')
+
+        response = json.loads(line)
+
+        if response.get('id', None) != request['id']:
+            self.stop()
+            raise CollectorError('Unexpected response: %s' % (line.strip()))
+
+        if response.get('error', None):
+            raise CollectorError(response['error'])
+
+        return response
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.debug(message)
+
+
+class JMXQueryCollector(object):
+    """
+    Collector which runs JMXQuery for every target and query on each collection.
+
+    It's slower than :class:`JMXCollector` (each run pays for the JVM start up and JMX
+    connection), but it works with any Java version and doesn't need the collector to be
+    compiled. Results have the same format as the :class:`JMXCollector` ones.
+    """
+
+    def __init__(self, targets, command=None, pool_size=None, timeout=DEFAULT_TIMEOUT,
+                 logger=None):
+        self.targets = targets
+        self.command = command or get_jmxquery_command()
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.timeout = timeout
+
+        self._logger = logger
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def collect(self):
+        pool = eventlet.GreenPool(self.pool_size)
+        return list(pool.imap(self._collect_target, self.targets))
+
+    def _collect_target(self, target):
+        start = time.time()
+        metrics = []
+        errors = []
+
+        timeout = eventlet.Timeout(self.timeout)
+        try:
+            for query in target['queries']:
+                self._run_query(target=target, query=query, metrics=metrics, errors=errors)
+        except eventlet.Timeout as e:
+            if e is not timeout:
+                raise
+
+            errors.append('Timed out after %s ms' % (int(self.timeout * 1000)))
+        finally:
+            timeout.cancel()
+
+        return {
+            'target': target['name'],
+            'metrics': metrics,
+            'errors': errors,
+            'latency_ms': (time.time() - start) * 1000,
+            'connect_ms': None
+        }
+
+    def _run_query(self, target, query, metrics, errors):
+        args = list(self.command) + ['-U', target['url'], '-O', query['object_name'],
+                                     '-A', query['attribute_name']]
+
+        if target['username']:
+            args.extend(['-username', target['username']])
+
+        if target['password']:
+            args.extend(['-password', target['password']])
+
+        if query['attribute_keys']:
+            args.extend(['-K', ','.join(query['attribute_keys'])])
+
+        self._log('Running command: "%s"' % (' '.join(args)))
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   close_fds=True)
+        try:
+            stdout, _ = process.communicate()
+        except (Exception, eventlet.Timeout):
+            process.kill()
+            process.wait()
+            raise
+
+        if 'status err' in stdout:
+            errors.append('%s: %s' % (query['object_name'], stdout.split(' ', 3)[-1].strip()))
+            return
+
+        for line in stdout.splitlines():
+            split = line.split(' ', 3)
+            if len(split) != 4 or split[0] != 'metric':
+                continue
+
+            _, name, type, value = split
+            if type == 'int':
+                value = int(value)
+            elif type == 'float':
+                value = float(value)
+
+            metrics.append({
+                'object_name': query['object_name'],
+                'attribute_name': query['attribute_name'],
+                'name': name,
+                'type': type,
+                'value': value
+            })
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.debug(message)
@@ -0,0 +1,68 @@
+"""
+Fake JMX collector which speaks the JMXCollector line protocol.
+
+The value of every metric is the number of collections done by the process so the tests can
+tell whether the process has been re-used. Collections of targets with "hang" in the URL never
+finish and the process exits on a collection of targets with "crash" in the URL.
+"""
+import json
+import sys
+import time
+
+
+def main():
+    config = {}
+    collections = 0
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+
+        request = json.loads(line)
+        response = {'id': request.get('id', None)}
+
+        if request['command'] == 'configure':
+            config = request
+        elif request['command'] == 'collect':
+            collections += 1
+            results = []
+
+            for target in config['targets']:
+                if 'hang' in target['url']:
+                    time.sleep(60)
+                elif 'crash' in target['url']:
+                    return 1
+
+                metrics = [{
+                    'object_name': query['object_name'],
+                    'attribute_name': query['attribute_name'],
+                    'name': query['attribute_name'],
+                    'type': 'int',
+                    'value': collections
+                } for query in target['queries']]
+
+                results.append({
+                    'target': target['name'],
+                    'metrics': metrics,
+                    'errors': [],
+                    'latency_ms': 1.0,
+                    'connect_ms': 10.0 if collections == 1 else None,
+                    'timeout': config['timeout'],
+                    'pool_size': config['pool_size']
+                })
+
+            response['results'] = results
+        elif request['command'] == 'shutdown':
+            break
+        else:
+            response['error'] = 'Unknown command: %s' % (request['command'])
+
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+Fake JMXQuery which reports the requested attribute (or attribute keys) of any object.
+
+Services with "refused" in the URL fail and services with "hang" in the URL never respond.
+"""
+import sys
+import time
+
+
+def main(args):
+    options = dict(zip(args[::2], args[1::2]))
+    url = options['-U']
+
+    if 'hang' in url:
+        time.sleep(60)
+
+    if 'refused' in url:
+        print('status err JMX: Connection refused to host: localhost')
+        return 2
+
+    print('status ok JMX Check successful')
+
+    keys = options['-K'].split(',') if '-K' in options else [options['-A']]
+    for index, key in enumerate(keys):
+        print('metric %s int %s' % (key, index + 1))
+
+    print('metric %s float 0.500000' % (options['-A'] + 'Ratio'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
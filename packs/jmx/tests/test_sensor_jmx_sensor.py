@@ -0,0 +1,167 @@
+import os
+import sys
+
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from jmx_sensor import JMXSensor
+from lib.collector import JMXCollector
+from lib.collector import JMXQueryCollector
+
+__all__ = [
+    'JMXSensorTestCase'
+]
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FAKE_JMXQUERY_COMMAND = [sys.executable, os.path.join(FIXTURES_DIR, 'fake_jmxquery.py')]
+
+FAKE_COLLECTOR_COMMAND = [sys.executable, os.path.join(FIXTURES_DIR, 'fake_jmxcollector.py')]
+
+# Exits right away like "java JMXCollector.java" on Java < 11
+FAILING_COLLECTOR_COMMAND = [sys.executable, '-c', 'import sys; sys.exit(1)']
+
+CONFIG = {
+    'hostname': 'localhost',
+    'port': 7199,
+    'username': None,
+    'password': None,
+    'object_name': 'java.lang:type=Memory',
+    'attribute_name': 'HeapMemoryUsage',
+    'attribute_keys': ['used', 'max'],
+    'collect_timeout': 5
+}
+
+
+class JMXSensorTestCase(BaseSensorTestCase):
+    sensor_cls = JMXSensor
+
+    def setUp(self):
+        super(JMXSensorTestCase, self).setUp()
+
+        for name, command in [('get_collector_command', FAILING_COLLECTOR_COMMAND),
+                              ('get_jmxquery_command', FAKE_JMXQUERY_COMMAND)]:
+            patcher = mock.patch('lib.collector.%s' % (name), mock.Mock(return_value=command))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(JMXSensor, '_check_for_java_binary', mock.Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _use_collector(self):
+        patcher = mock.patch('lib.collector.get_collector_command',
+                             mock.Mock(return_value=FAKE_COLLECTOR_COMMAND))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_sensor(self, **config):
+        sensor_config = dict(CONFIG)
+        sensor_config.update(config)
+
+        sensor = self.get_sensor_instance(config=sensor_config)
+        sensor.setup()
+        self.addCleanup(sensor.cleanup)
+        return sensor
+
+    def test_jmxquery_is_used_by_default(self):
+        self._use_collector()
+        sensor = self._get_sensor()
+        self.assertTrue(isinstance(sensor._collector, JMXQueryCollector))
+
+    def test_falls_back_to_jmxquery_when_collector_fails_to_start(self):
+        sensor = self._get_sensor(use_collector=True)
+        self.assertTrue(isinstance(sensor._collector, JMXQueryCollector))
+
+        sensor.poll()
+
+        payloads = [trigger['payload'] for trigger in self.get_dispatched_triggers()]
+        self.assertEqual([(payload['metric']['name'], payload['metric']['value'])
+                          for payload in payloads],
+                         [('used', '1'), ('max', '2'), ('HeapMemoryUsageRatio', '0.500000')])
+        self.assertEqual(payloads[0]['jmx_hostname'], 'localhost')
+        self.assertEqual(payloads[0]['object_name'], 'java.lang:type=Memory')
+        self.assertEqual(payloads[0]['attribute_keys'], ['used', 'max'])
+
+    def test_jmxquery_fallback_batch_metrics(self):
+        sensor = self._get_sensor(hostname=None, batch_metrics=True, targets=[
+            {'name': 'ok', 'hostname': 'localhost', 'port': 7199,
+             'queries': [{'object_name': 'java.lang:type=Threading',
+                          'attribute_name': 'ThreadCount'}]},
+            {'name': 'refused', 'url': 'service:jmx:rmi://refused', 'hostname': 'localhost',
+             'port': 7200, 'queries': [{'object_name': 'java.lang:type=Threading',
+                                        'attribute_name': 'ThreadCount'}]}
+        ])
+        sensor.poll()
+
+        payloads = dict((trigger['payload']['target'], trigger['payload'])
+                        for trigger in self.get_dispatched_triggers())
+        self.assertEqual(payloads['ok']['metrics'][0], {
+            'object_name': 'java.lang:type=Threading',
+            'attribute_name': 'ThreadCount',
+            'name': 'ThreadCount',
+            'type': 'int',
+            'value': 1
+        })
+        self.assertEqual(payloads['ok']['errors'], [])
+        self.assertEqual(payloads['refused']['metrics'], [])
+        self.assertEqual(payloads['refused']['errors'],
+                         ['java.lang:type=Threading: Connection refused to host: localhost'])
+
+    def test_jmxquery_fallback_timeout(self):
+        sensor = self._get_sensor(hostname=None, collect_timeout=0.5, batch_metrics=True,
+                                  targets=[{'name': 'hang', 'url': 'service:jmx:rmi://hang',
+                                            'hostname': 'localhost', 'port': 7199,
+                                            'queries': [{'object_name': 'java.lang:type=Memory',
+                                                         'attribute_name': 'HeapMemoryUsage'}]}])
+        sensor.poll()
+
+        payload = self.get_dispatched_triggers()[0]['payload']
+        self.assertEqual(payload['errors'], ['Timed out after 500 ms'])
+        self.assertLess(payload['latency_ms'], 5000)
+
+    def test_metrics_are_collected_by_collector(self):
+        self._use_collector()
+        sensor = self._get_sensor(use_collector=True)
+        self.assertTrue(isinstance(sensor._collector, JMXCollector))
+
+        sensor.poll()
+        sensor.poll()
+
+        payloads = [trigger['payload'] for trigger in self.get_dispatched_triggers()]
+        self.assertEqual([payload['metric']['value'] for payload in payloads], ['1', '2'])
+        self.assertEqual(payloads[0]['jmx_port'], 7199)
+        self.assertEqual(payloads[0]['attribute_keys'], ['used', 'max'])
+
+        stats = sensor.get_stats()['localhost:7199']
+        self.assertEqual((stats['polls'], stats['connects'], stats['completed']), (2, 1, 2))
+        self.assertEqual(stats['avg_latency_ms'], 1.0)
+
+    def test_collector_batch_metrics(self):
+        self._use_collector()
+        sensor = self._get_sensor(use_collector=True, batch_metrics=True)
+        sensor.poll()
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers[0]['trigger'], 'jmx.metrics')
+
+        payload = triggers[0]['payload']
+        self.assertEqual(payload['target'], 'localhost:7199')
+        self.assertEqual(payload['metrics'][0]['value'], 1)
+        self.assertEqual((payload['latency_ms'], payload['connect_ms']), (1.0, 10.0))
+        self.assertEqual((payload['avg_latency_ms'], payload['max_latency_ms']), (1.0, 1.0))
+
+    def test_collector_failure_skips_poll(self):
+        self._use_collector()
+        sensor = self._get_sensor(use_collector=True, hostname=None, targets=[
+            {'name': 'crash', 'url': 'crash', 'hostname': 'localhost', 'port': 7199,
+             'queries': [{'object_name': 'java.lang:type=Memory',
+                          'attribute_name': 'HeapMemoryUsage'}]}
+        ])
+
+        sensor.poll()
+        self.assertEqual(self.get_dispatched_triggers(), [])
+        # Collector is re-started on the next poll instead of falling back to JMXQuery
+        self.assertTrue(isinstance(sensor._collector, JMXCollector))
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+
+import mock
+import unittest2
+
+from lib.collector import CollectorError
+from lib.collector import JMXCollector
+
+__all__ = [
+    'JMXCollectorTestCase'
+]
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FAKE_COLLECTOR_COMMAND = [sys.executable, os.path.join(FIXTURES_DIR, 'fake_jmxcollector.py')]
+
+
+def _get_target(name, url=None):
+    return {
+        'name': name,
+        'url': url or 'service:jmx:rmi:///jndi/rmi://%s:7199/jmxrmi' % (name),
+        'username': None,
+        'password': None,
+        'queries': [{'object_name': 'java.lang:type=Threading', 'attribute_name': 'ThreadCount',
+                     'attribute_keys': None}]
+    }
+
+
+class JMXCollectorTestCase(unittest2.TestCase):
+
+    def _get_collector(self, targets, timeout=5):
+        collector = JMXCollector(targets=targets, command=FAKE_COLLECTOR_COMMAND, pool_size=2,
+                                 timeout=timeout)
+        self.addCleanup(collector.stop)
+        return collector
+
+    def test_process_is_reused_between_collections(self):
+        collector = self._get_collector(targets=[_get_target('a'), _get_target('b')])
+        collector.start()
+        pid = collector._process.pid
+
+        results = collector.collect()
+        self.assertEqual([result['target'] for result in results], ['a', 'b'])
+        self.assertEqual(results[0]['metrics'][0]['value'], 1)
+        self.assertEqual(results[0]['connect_ms'], 10.0)
+
+        results = collector.collect()
+        self.assertEqual(results[0]['metrics'][0]['value'], 2)
+        self.assertEqual(results[0]['connect_ms'], None)
+        self.assertEqual(collector._process.pid, pid)
+
+    def test_timeout_and_pool_size_are_passed_to_process(self):
+        collector = self._get_collector(targets=[_get_target('a')], timeout=2.5)
+
+        result = collector.collect()[0]
+        self.assertEqual(result['timeout'], 2500)
+        self.assertEqual(result['pool_size'], 2)
+
+    def test_process_is_restarted_after_exit(self):
+        collector = self._get_collector(targets=[_get_target('a')])
+        collector.start()
+        collector.collect()
+
+        collector._process.kill()
+        collector._process.wait()
+
+        # Collection count starts from scratch in a new process
+        results = collector.collect()
+        self.assertEqual(results[0]['metrics'][0]['value'], 1)
+
+    def test_process_which_exits_during_collection_is_stopped(self):
+        collector = self._get_collector(targets=[_get_target('a', url='crash')])
+
+        self.assertRaisesRegexp(CollectorError, 'Collector process has exited',
+                                collector.collect)
+        self.assertFalse(collector.running)
+
+    def test_process_which_does_not_respond_is_stopped(self):
+        collector = self._get_collector(targets=[_get_target('a', url='hang')], timeout=0.1)
+        collector.start()
+        process = collector._process
+
+        start = time.time()
+        with mock.patch('lib.collector.RESPONSE_TIMEOUT_MARGIN', 0.2):
+            self.assertRaisesRegexp(CollectorError, 'has not responded in 0.3 seconds',
+                                    collector.collect)
+
+        self.assertLess(time.time() - start, 5)
+        self.assertFalse(collector.running)
+        self.assertNotEqual(process.poll(), None)
+
+    def test_error_response(self):
+        collector = self._get_collector(targets=[_get_target('a')])
+        collector.start()
+
+        self.assertRaisesRegexp(CollectorError, 'Unknown command: unknown', collector._request,
+                                'unknown', response_timeout=5)
+        # Process is still usable after an error response
+        self.assertTrue(collector.running)
+        self.assertEqual(len(collector.collect()), 1)
@@ -0,0 +1,170 @@
+import json
+
+try:
+    import ujson as fast_json
+except ImportError:
+    try:
+        import simplejson as fast_json
+    except ImportError:
+        fast_json = json
+
+__all__ = [
+    'ResourceWatch',
+    'ResourceVersionExpired',
+    'WatchError',
+
+    'decode_line'
+]
+
+# Server closes the watch after this many seconds and the client re-connects
+DEFAULT_WATCH_TIMEOUT = 300
+
+CONNECT_TIMEOUT = 10
+
+# How long to wait for data in addition to the watch timeout before assuming the connection is
+# dead
+READ_TIMEOUT_MARGIN = 30
+
+# Status code which is returned when the requested resource version is not available anymore
+HTTP_GONE = 410
+
+
+class WatchError(Exception):
+    pass
+
+
+class ResourceVersionExpired(WatchError):
+    pass
+
+
+def decode_line(line):
+    """
+    Decode a single line (watch event) of the API response.
+
+    :rtype: ``dict``
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+
+    return fast_json.loads(line)
+
+
+class ResourceWatch(object):
+    """
+    Watch of a single resource collection (optionally in a single namespace).
+
+    Keeps track of the resource version of the last received event so the watch can be resumed
+    from it after the connection has been closed.
+    """
+
+    def __init__(self, session, api_url, api=None, resource=None, namespace=None,
+                 watch_path=None, timeout=DEFAULT_WATCH_TIMEOUT, logger=None):
+        """
+        :param api: API group path (e.g. ``/api/v1`` or ``/apis/extensions/v1beta1``).
+        :type api: ``str``
+
+        :param resource: Resource name (e.g. ``pods``).
+        :type resource: ``str``
+
+        :param watch_path: Legacy watch path (e.g.
+                           ``/apis/extensions/v1beta1/watch/thirdpartyresources``) which is used
+                           instead of ``api``, ``resource`` and ``namespace``.
+        :type watch_path: ``str``
+        """
+        self.session = session
+        self.timeout = timeout
+        self.resource_version = None
+
+        self._logger = logger
+
+        if watch_path:
+            self.watch_url = api_url + watch_path
+            self.list_url = api_url + watch_path.replace('/watch/', '/', 1)
+            self._params = {}
+        else:
+            path = api.rstrip('/')
+            if namespace:
+                path += '/namespaces/%s' % (namespace)
+            path += '/%s' % (resource)
+
+            self.watch_url = api_url + path
+            self.list_url = self.watch_url
+            self._params = {'watch': 'true'}
+
+    def __repr__(self):
+        return '<ResourceWatch url=%s resource_version=%s>' % (self.watch_url,
+                                                               self.resource_version)
+
+    def stream(self):
+        """
+        Issue a watch request and yield received events until the server closes the watch.
+
+        Events which can't be decoded are skipped, bookmark events only update the resource
+        version.
+
+        :raises ResourceVersionExpired: If the watch can't be resumed from the current resource
+                                        version.
+        """
+        params = dict(self._params)
+        params['timeoutSeconds'] = self.timeout
+        params['allowWatchBookmarks'] = 'true'
+
+        if self.resource_version:
+            params['resourceVersion'] = self.resource_version
+
+        response = self.session.get(self.watch_url, params=params, stream=True,
+                                    timeout=(CONNECT_TIMEOUT, self.timeout + READ_TIMEOUT_MARGIN))
+
+        try:
+            if response.status_code == HTTP_GONE:
+                raise ResourceVersionExpired('Resource version %s is too old' %
+                                             (self.resource_version))
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+
+                try:
+                    event = decode_line(line)
+                except ValueError:
+                    self._log('Failed to decode watch event: %s' % (line))
+                    continue
+
+                event_type = event.get('type', None)
+                k8s_object = event.get('object', None) or {}
+
+                if event_type == 'ERROR':
+                    if k8s_object.get('code', None) == HTTP_GONE:
+                        raise ResourceVersionExpired(k8s_object.get('message', ''))
+                    raise WatchError('Watch failed: %s' % (k8s_object.get('message', '')))
+
+                resource_version = k8s_object.get('metadata', {}).get('resourceVersion', None)
+                if resource_version:
+                    self.resource_version = resource_version
+
+                if event_type == 'BOOKMARK':
+                    continue
+
+                yield event
+        finally:
+            response.close()
+
+    def relist(self):
+        """
+        Retrieve the current resource version of the collection so the watch can be resumed
+        from it.
+
+        Note: Changes which happened between the expired and the current resource version are
+        not replayed.
+        """
+        response = self.session.get(self.list_url, params={'limit': 1},
+                                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT_MARGIN))
+        response.raise_for_status()
+
+        data = decode_line(response.content)
+        self.resource_version = data.get('metadata', {}).get('resourceVersion', None)
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.warning(message)
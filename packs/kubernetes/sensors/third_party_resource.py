@@ -1,12 +1,27 @@
-import ast
-import json
-import sys
-
+import eventlet
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 from st2reactor.sensor.base import Sensor
 
+from lib.watch import DEFAULT_WATCH_TIMEOUT
+from lib.watch import ResourceVersionExpired
+from lib.watch import ResourceWatch
+from lib.watch import decode_line
+
+eventlet.monkey_patch(
+    os=True,
+    select=True,
+    socket=True,
+    thread=True,
+    time=True)
+
+# Delay before re-connecting after a failed watch request, doubled after each consecutive
+# failure
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
 
 class ThirdPartyResource(Sensor):
     def __init__(self, sensor_service, config=None):
@@ -14,55 +29,99 @@ class ThirdPartyResource(Sensor):
                                                  config=config)
         self._log = self._sensor_service.get_logger(__name__)
         self.TRIGGER_REF = 'kubernetes.thirdpartyobject'
-        self.client = None
+        self.session = None
+
+        self._watches = []
+        self._threads = []
+        self._running = False
 
     def setup(self):
         try:
-            extension = self._config['extension_url']
-            KUBERNETES_API_URL = self._config['kubernetes_api_url'] + extension
+            kubernetes_api_url = self._config['kubernetes_api_url']
             user = self._config['user']
             password = self._config['password']
             verify = self._config['verify']
+            watches = self._config.get('watches', None) or [
+                {'watch_path': self._config['extension_url']}
+            ]
         except KeyError:
             self._log.exception('Configuration file does not contain required fields.')
             raise
-        self._log.debug('Connecting to Kubernetes endpoint %s via api_client.' %
-                        KUBERNETES_API_URL)
-        self.client = requests.get(KUBERNETES_API_URL, auth=HTTPBasicAuth(user, password),
-                                   verify=verify, stream=True)
+
+        timeout = self._config.get('watch_timeout', DEFAULT_WATCH_TIMEOUT)
+
+        # All the watches share a single connection pool
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(user, password)
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_maxsize=max(len(watches) * 2, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        for watch in watches:
+            for namespace in watch.get('namespaces', None) or [None]:
+                self._watches.append(ResourceWatch(session=self.session,
+                                                   api_url=kubernetes_api_url,
+                                                   api=watch.get('api', None),
+                                                   resource=watch.get('resource', None),
+                                                   namespace=namespace,
+                                                   watch_path=watch.get('watch_path', None),
+                                                   timeout=timeout,
+                                                   logger=self._log))
 
     def run(self):
         self._log.debug('Watch Kubernetes for thirdpartyresource information')
-        r = self.client
-        lines = r.iter_lines()
-        # Save the first line for later or just skip it
-        # first_line = next(lines)
+        self._running = True
+        self._threads = [eventlet.spawn(self._watch, watch) for watch in self._watches]
+
+        for thread in self._threads:
+            thread.wait()
 
-        for line in lines:
+    def _watch(self, watch):
+        self._log.debug('Connecting to Kubernetes endpoint %s.' % watch.watch_url)
+        delay = RECONNECT_DELAY
+
+        while self._running:
             try:
-                trigger_payload = self._get_trigger_payload_from_line(line)
-            except:
-                msg = ('Failed generating trigger payload from line %s. Aborting sensor!!!' %
-                    line)
-                self._log.exception(msg)
-                sys.exit(1)
-            else:
-                self._log.debug('Triggering Dispatch Now')
-                self._sensor_service.dispatch(trigger=self.TRIGGER_REF, payload=trigger_payload)
+                for event in watch.stream():
+                    delay = RECONNECT_DELAY
+                    self._handle_event(event)
+
+                # Watch has timed out, resume it from the last resource version
+                delay = RECONNECT_DELAY
+            except ResourceVersionExpired as e:
+                self._log.warning('Failed to resume %s, changes since the last event are lost: '
+                                  '%s' % (watch, str(e)))
+                self._relist(watch)
+            except Exception as e:
+                self._log.exception('Watch %s failed, re-connecting in %s seconds: %s' %
+                                    (watch, delay, str(e)))
+                eventlet.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _relist(self, watch):
+        try:
+            watch.relist()
+        except Exception as e:
+            self._log.exception('Failed to list %s: %s' % (watch.list_url, str(e)))
+            watch.resource_version = None
+
+    def _handle_event(self, k8s_object):
+        try:
+            trigger_payload = self._k8s_object_to_st2_trigger(k8s_object)
+        except KeyError:
+            # Error has already been logged
+            return
+
+        self._log.debug('Triggering Dispatch Now')
+        self._sensor_service.dispatch(trigger=self.TRIGGER_REF, payload=trigger_payload)
 
     def _get_trigger_payload_from_line(self, line):
-        k8s_object = self._fix_utf8_enconding_and_eval(line)
+        k8s_object = decode_line(line)
         self._log.debug('Incoming k8s object (from API response): %s', k8s_object)
         payload = self._k8s_object_to_st2_trigger(k8s_object)
         return payload
 
-    def _fix_utf8_enconding_and_eval(self, line):
-        # need to perform a json dump due to uft8 error prior to performing a json.load
-        io = json.dumps(line)
-        n = json.loads(io)
-        line = ast.literal_eval(n)
-        return line
-
     def _k8s_object_to_st2_trigger(self, k8s_object):
         # Define some variables
         try:
@@ -97,7 +156,13 @@ class ThirdPartyResource(Sensor):
         return payload
 
     def cleanup(self):
-        pass
+        self._running = False
+
+        for thread in self._threads:
+            thread.kill()
+
+        if self.session:
+            self.session.close()
 
     def add_trigger(self, trigger):
         pass
@@ -0,0 +1,201 @@
+"""
+Minimal local stand-in for the Kubernetes API server used by the sensor tests.
+
+It implements list and watch requests (both ``?watch=true`` and legacy ``/watch/`` paths) for
+collections of objects which are added by the tests. Watches stream events until they are
+closed by the test (e.g. to simulate a watch timeout).
+"""
+
+import BaseHTTPServer
+import json
+import Queue
+import SocketServer
+import threading
+import time
+import urlparse
+
+__all__ = [
+    'FakeKubernetesServer'
+]
+
+# Sent to the watches to close them
+CLOSE_WATCH = object()
+
+
+class FakeKubernetesRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+        watch = params.get('watch', None) == 'true' or '/watch/' in url.path
+        collection = url.path.replace('/watch/', '/', 1)
+
+        self.server.requests.append((url.path, params))
+
+        if watch:
+            self._watch(collection, params.get('resourceVersion', None))
+        else:
+            self._write_json(self.server.list_objects(collection))
+
+    def _write_json(self, data):
+        body = json.dumps(data)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _watch(self, collection, resource_version):
+        # Same as the API server, events are sent in separate chunks
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+
+        try:
+            self._stream_events(collection, resource_version)
+        finally:
+            self.wfile.write('0\r\n\r\n')
+            self.wfile.flush()
+
+    def _stream_events(self, collection, resource_version):
+        if resource_version and int(resource_version) < self.server.min_resource_version:
+            self._write_line({
+                'type': 'ERROR',
+                'object': {
+                    'kind': 'Status',
+                    'status': 'Failure',
+                    'message': 'too old resource version: %s' % (resource_version),
+                    'reason': 'Expired',
+                    'code': 410
+                }
+            })
+            return
+
+        events = self.server.subscribe(collection, resource_version)
+
+        try:
+            while True:
+                event = events.get()
+                if event is CLOSE_WATCH:
+                    break
+                self._write_line(event)
+        finally:
+            self.server.unsubscribe(collection, events)
+
+    def _write_line(self, event):
+        line = (event if isinstance(event, str) else json.dumps(event)) + '\n'
+        self.wfile.write('%x\r\n%s\r\n' % (len(line), line))
+        self.wfile.flush()
+
+
+class FakeKubernetesServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), FakeKubernetesRequestHandler)
+
+        self.resource_version = 0
+        # Watches can't be resumed from older resource versions
+        self.min_resource_version = 0
+        # collection -> list of events
+        self.events = {}
+        # collection -> list of event queues
+        self.subscribers = {}
+        # (path, params) of all the requests
+        self.requests = []
+        self.lock = threading.RLock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % (self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def add_object(self, collection, name, namespace='default', event_type='ADDED',
+                   kind='ThirdPartyResource'):
+        with self.lock:
+            self.resource_version += 1
+            event = {
+                'type': event_type,
+                'object': {
+                    'kind': kind,
+                    'metadata': {
+                        'name': name,
+                        'namespace': namespace,
+                        'uid': 'uid-%s' % (name),
+                        'labels': {'resource': 'database'},
+                        'resourceVersion': str(self.resource_version)
+                    }
+                }
+            }
+            self.events.setdefault(collection, []).append(event)
+
+            for subscriber in self.subscribers.get(collection, []):
+                subscriber.put(event)
+
+        return self.resource_version
+
+    def add_raw_line(self, collection, line):
+        """
+        Send a raw line to all the watches of a collection.
+        """
+        with self.lock:
+            for subscriber in self.subscribers.get(collection, []):
+                subscriber.put(line)
+
+    def list_objects(self, collection):
+        with self.lock:
+            return {
+                'kind': 'List',
+                'metadata': {'resourceVersion': str(self.resource_version)},
+                'items': [event['object'] for event in self.events.get(collection, [])]
+            }
+
+    def subscribe(self, collection, resource_version=None):
+        events = Queue.Queue()
+
+        with self.lock:
+            for event in self.events.get(collection, []):
+                event_resource_version = int(event['object']['metadata']['resourceVersion'])
+                if not resource_version or event_resource_version > int(resource_version):
+                    events.put(event)
+
+            self.subscribers.setdefault(collection, []).append(events)
+
+        return events
+
+    def unsubscribe(self, collection, events):
+        with self.lock:
+            if events in self.subscribers.get(collection, []):
+                self.subscribers[collection].remove(events)
+
+    def close_watches(self):
+        with self.lock:
+            for subscribers in self.subscribers.values():
+                for subscriber in subscribers:
+                    subscriber.put(CLOSE_WATCH)
+
+    def get_watch_requests(self):
+        return [(path, params) for path, params in self.requests
+                if params.get('watch', None) == 'true' or '/watch/' in path]
+
+    def wait_for_watches(self, count, timeout=1):
+        """
+        Wait until the server has received ``count`` watch requests.
+        """
+        deadline = time.time() + timeout
+        while len(self.get_watch_requests()) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+        return len(self.get_watch_requests()) >= count
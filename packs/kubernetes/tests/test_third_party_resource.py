@@ -1,11 +1,53 @@
+import time
+
+import eventlet
+
 from st2tests.base import BaseSensorTestCase
 
 from third_party_resource import ThirdPartyResource
+from kubernetes_server import FakeKubernetesServer
+
+TPR_COLLECTION = '/apis/extensions/v1beta1/thirdpartyresources'
+TPR_WATCH_PATH = '/apis/extensions/v1beta1/watch/thirdpartyresources'
 
 
 class ThirdPartyResourceTestCase(BaseSensorTestCase):
     sensor_cls = ThirdPartyResource
 
+    def _start_server(self):
+        server = FakeKubernetesServer()
+        server.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(server.close_watches)
+        return server
+
+    def _start_sensor(self, server, **kwargs):
+        config = {
+            'user': 'stanley',
+            'password': 'password',
+            'kubernetes_api_url': server.url,
+            'extension_url': TPR_WATCH_PATH,
+            'verify': False
+        }
+        config.update(kwargs)
+
+        sensor = self.get_sensor_instance(config=config)
+        sensor.setup()
+        eventlet.spawn(sensor.run)
+        self.addCleanup(sensor.cleanup)
+        return sensor
+
+    def _wait_for_triggers(self, count, timeout=1):
+        deadline = time.time() + timeout
+        while len(self.get_dispatched_triggers()) < count and time.time() < deadline:
+            eventlet.sleep(0.01)
+
+        return self.get_dispatched_triggers()
+
+    def _get_names(self):
+        return [trigger['payload']['name'] for trigger in self.get_dispatched_triggers()]
+
     def test_k8s_object_to_st2_trigger_bad_object(self):
         k8s_obj = {
             'type': 'kanye',
@@ -64,3 +106,71 @@ class ThirdPartyResourceTestCase(BaseSensorTestCase):
         self.assertTrue('labels' in payload)
         self.assertTrue('namespace' in payload)
         self.assertTrue('uid' in payload)
+
+    def test_watch_is_resumed_from_last_resource_version(self):
+        server = self._start_server()
+        server.add_object(TPR_COLLECTION, 'db1')
+
+        self._start_sensor(server)
+        self.assertEqual(len(self._wait_for_triggers(count=1)), 1)
+
+        server.add_object(TPR_COLLECTION, 'db2')
+        self.assertEqual(len(self._wait_for_triggers(count=2)), 2)
+
+        # Watch has timed out
+        server.close_watches()
+        self.assertTrue(server.wait_for_watches(count=2))
+
+        server.add_object(TPR_COLLECTION, 'db3')
+        self._wait_for_triggers(count=3)
+        eventlet.sleep(0.1)
+
+        self.assertEqual(self._get_names(), ['db1', 'db2', 'db3'])
+        watch_requests = server.get_watch_requests()
+        self.assertEqual(watch_requests[0][1].get('resourceVersion', None), None)
+        self.assertEqual(watch_requests[1][1]['resourceVersion'], '2')
+
+        # Resources are not listed again when the watch is resumed
+        self.assertEqual(len(server.requests), 2)
+
+    def test_watch_is_resumed_after_resource_version_has_expired(self):
+        server = self._start_server()
+        server.add_object(TPR_COLLECTION, 'db1')
+
+        self._start_sensor(server)
+        self.assertEqual(len(self._wait_for_triggers(count=1)), 1)
+
+        server.close_watches()
+        server.add_object(TPR_COLLECTION, 'db2')
+        server.min_resource_version = 2
+        self.assertTrue(server.wait_for_watches(count=3))
+
+        server.add_object(TPR_COLLECTION, 'db3')
+        self._wait_for_triggers(count=2)
+
+        self.assertEqual(self._get_names(), ['db1', 'db3'])
+        self.assertEqual([params.get('resourceVersion', None) for _, params in server.requests],
+                         [None, '1', None, '2'])
+        self.assertEqual(server.requests[2], (TPR_COLLECTION, {'limit': '1'}))
+
+    def test_multiple_namespaces_are_watched_and_invalid_lines_are_skipped(self):
+        server = self._start_server()
+        self._start_sensor(server, watches=[
+            {'api': '/api/v1', 'resource': 'pods', 'namespaces': ['default', 'kube-system']}
+        ])
+        self.assertTrue(server.wait_for_watches(count=2))
+        self.assertEqual(sorted([path for path, _ in server.get_watch_requests()]), [
+            '/api/v1/namespaces/default/pods',
+            '/api/v1/namespaces/kube-system/pods'
+        ])
+
+        server.add_raw_line('/api/v1/namespaces/default/pods', '{"type": "ADDED", "obj')
+        server.add_object('/api/v1/namespaces/default/pods', 'web', kind='Pod')
+        server.add_object('/api/v1/namespaces/kube-system/pods', 'dns', namespace='kube-system',
+                          kind='Pod')
+
+        triggers = self._wait_for_triggers(count=2)
+        self.assertEqual(sorted([(trigger['payload']['namespace'], trigger['payload']['name'])
+                                 for trigger in triggers]),
+                         [('default', 'web'), ('kube-system', 'dns')])
+        self.assertEqual(triggers[0]['payload']['object_kind'], 'Pod')
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import tempfile
+
+from lib import actions
+from lib.harvester import Backoff
+from lib.harvester import Checkpoint
+from lib.harvester import ResultHarvester
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(tempfile.gettempdir(), 'st2-lastline-harvester')
+
+# Keeps the result of a single run (which is stored with the execution) reasonably small, the
+# next run continues from the checkpoint
+DEFAULT_MAX_TASKS = 500
+
+
+class HarvestCompleted(actions.BaseAction):
+    def run(self, after=None, before=None, fetch='summary', workers=None,
+            max_tasks=DEFAULT_MAX_TASKS, checkpoint=True, checkpoint_path=None,
+            full_report_score=None, report_version=None, score_only=False, max_retries=5,
+            max_backoff=60):
+
+        fetch_kwargs = {}
+        if fetch == 'result':
+            fetch_kwargs['full_report_score'] = full_report_score
+            fetch_kwargs['report_version'] = report_version
+        elif fetch == 'summary':
+            fetch_kwargs['score_only'] = score_only
+
+        if checkpoint:
+            checkpoint = Checkpoint(checkpoint_path or self._get_default_checkpoint_path())
+        else:
+            checkpoint = None
+
+        harvester = ResultHarvester(self.client,
+                                    workers=workers or self._pool_size,
+                                    fetch=fetch,
+                                    fetch_kwargs=fetch_kwargs,
+                                    max_retries=max_retries,
+                                    backoff=Backoff(max_delay=max_backoff),
+                                    checkpoint=checkpoint,
+                                    logger=self.logger)
+        return harvester.harvest(after=after, before=before, max_tasks=max_tasks)
+
+    def _get_default_checkpoint_path(self):
+        # Separate checkpoint for every API endpoint and key
+        name = hashlib.sha1('%s:%s' % (self._url, self._key)).hexdigest()[:16]
+        return os.path.join(DEFAULT_CHECKPOINT_DIR, '%s.json' % (name))
@@ -9,6 +9,7 @@ class BaseAction(Action):
         self._url = self.config.get('url', 'https://analysis.lastline.com')
         self._key = self.config.get('key')
         self._api_token = self.config.get('api_token')
+        self._pool_size = self.config.get('pool_size', 10)
 
         self.client = self._init_client()
 
@@ -18,4 +19,5 @@ class BaseAction(Action):
         if not self._api_token:
             raise ValueError('Missing "api_token" config option')
 
-        return AnalysisClient(self._url, self._key, self._api_token)  # noqa
+        return AnalysisClient(self._url, self._key, self._api_token,  # noqa
+                              pool_maxsize=self._pool_size)
@@ -1730,6 +1730,9 @@ class AnalysisClient(AnalysisClientBase):
         (e.g. { 'http': 'localhost:3128', 'https': 'localhost:3128' }
     :param timeout: default timeout (in seconds) to use for network requests.
         Set to None to disable timeouts
+    :param pool_maxsize: if provided, maximum number of connections kept
+        open per host, should be at least the number of threads sharing
+        the client
     """
     def __init__(self,
                  base_url,
@@ -1741,7 +1744,8 @@ class AnalysisClient(AnalysisClientBase):
                  use_curl=False,
                  timeout=60,
                  proxies=None,
-                 config=None):
+                 config=None,
+                 pool_maxsize=None):
         AnalysisClientBase.__init__(self, base_url, logger, config)
         self.__key = key
         self.__api_token = api_token
@@ -1756,6 +1760,10 @@ class AnalysisClient(AnalysisClientBase):
         else:
             self.__proxies = proxies
         self.__session = requests.session()
+        if pool_maxsize:
+            for prefix in ('http://', 'https://'):
+                self.__session.mount(prefix, requests.adapters.HTTPAdapter(
+                    pool_maxsize=pool_maxsize))
 
     def set_key(self, key):
         self.__key = key
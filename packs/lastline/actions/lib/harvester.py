@@ -0,0 +1,279 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from analysis_apiclient import AnalysisAPIError
+from analysis_apiclient import InvalidAnalysisAPIResponse
+from analysis_apiclient import SubmissionLimitExceededError
+from analysis_apiclient import TemporarilyUnavailableError
+
+__all__ = [
+    'Backoff',
+    'Checkpoint',
+    'ResultHarvester'
+]
+
+# Errors after which the request is retried once the API is available again
+RETRY_ERRORS = (TemporarilyUnavailableError, SubmissionLimitExceededError)
+
+FETCH_RESULT = 'result'
+FETCH_SUMMARY = 'summary'
+FETCH_NONE = 'none'
+
+FETCH_TYPES = [FETCH_RESULT, FETCH_SUMMARY, FETCH_NONE]
+
+DEFAULT_WORKERS = 10
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_MIN_BACKOFF = 1
+DEFAULT_MAX_BACKOFF = 60
+
+
+class Backoff(object):
+    """
+    Delay which is shared by all the workers of a harvester.
+
+    The delay doubles every time the API reports it is (temporarily) unavailable or the
+    request limit is exceeded and halves after every successful request, so all the workers
+    slow down together instead of each of them hammering the API on its own.
+    """
+
+    def __init__(self, min_delay=DEFAULT_MIN_BACKOFF, max_delay=DEFAULT_MAX_BACKOFF):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = 0
+        self.throttled = 0
+
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+    def failure(self):
+        with self._lock:
+            self.throttled += 1
+            self.delay = min(max(self.delay * 2, self.min_delay), self.max_delay)
+
+    def success(self):
+        if not self.delay:
+            return
+
+        with self._lock:
+            self.delay /= 2.0
+            if self.delay < self.min_delay:
+                self.delay = 0
+
+
+class Checkpoint(object):
+    """
+    File which stores the ``after`` cursor of the last fully harvested page.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r') as fp:
+            return json.load(fp).get('after', None)
+
+    def save(self, after):
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Written to a temporary file first so the checkpoint is never left half written
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'after': after}, fp)
+        os.rename(tmp_path, self.path)
+
+
+class ResultHarvester(object):
+    """
+    Page through tasks completed in a time frame and fetch their results concurrently.
+
+    Results are retrieved by a bounded pool of threads which share the client (and its
+    requests session) while the next page of completed tasks is already being requested.
+
+    Sample usage:
+
+    harvester = ResultHarvester(client, workers=20, fetch='summary')
+    for task in harvester.harvest(after='2016-01-01 00:00:00')['tasks']:
+        print task['task_uuid'], task['score'], task['result']
+    """
+
+    def __init__(self, client, workers=DEFAULT_WORKERS, fetch=FETCH_RESULT, fetch_kwargs=None,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=None, checkpoint=None, logger=None):
+        """
+        :param client: Analysis API client.
+        :type client: :class:`AnalysisClientBase`
+
+        :param fetch: What to fetch for every completed task (``result``, ``summary`` or
+                      ``none``).
+        :type fetch: ``str``
+
+        :param fetch_kwargs: Additional arguments for ``get_result`` / ``get_result_summary``.
+        :type fetch_kwargs: ``dict``
+
+        :param checkpoint: Checkpoint to resume from and to store the cursor to.
+        :type checkpoint: :class:`Checkpoint`
+        """
+        if fetch not in FETCH_TYPES:
+            raise ValueError('Invalid fetch type "%s", valid types are: %s' %
+                             (fetch, ', '.join(FETCH_TYPES)))
+
+        self._client = client
+        self._workers = workers
+        self._fetch = fetch
+        self._fetch_kwargs = fetch_kwargs or {}
+        self._max_retries = max_retries
+        self._backoff = backoff or Backoff()
+        self._checkpoint = checkpoint
+        self._logger = logger
+
+    def harvest(self, after=None, before=None, max_tasks=None):
+        """
+        Harvest tasks completed after ``after`` (or after the checkpoint) and before ``before``.
+
+        Pages are processed until there are no more results or at least ``max_tasks`` tasks
+        have been harvested. The cursor only advances past pages for which all the results
+        have been fetched (or failed with a non-retryable error).
+
+        :return: Dictionary with the harvested ``tasks``, ``after`` cursor to continue from and
+                 ``more_results_available`` flag.
+        :rtype: ``dict``
+        """
+        if self._checkpoint:
+            after = self._checkpoint.load() or after
+
+        if not after:
+            raise ValueError('"after" is required when there is no checkpoint to resume from')
+
+        harvested = []
+        seen = set()
+        pool = ThreadPool(self._workers)
+        more = False
+
+        try:
+            page = pool.apply_async(self._get_completed_page, (after, before))
+
+            while True:
+                tasks, more, next_after = page.get()
+
+                # Tasks at the page boundary can be returned again on the next page
+                tasks = [(uuid, score) for uuid, score in tasks if uuid not in seen]
+                seen.update([uuid for uuid, _ in tasks])
+
+                if more:
+                    # Next page is requested while the results of this one are fetched
+                    page = pool.apply_async(self._get_completed_page, (next_after, before))
+
+                results = pool.map(self._fetch_task, tasks) if tasks else []
+                harvested.extend(results)
+
+                if [result for result in results if result.get('retry', False)]:
+                    self._log('Results of some tasks could not be fetched, stopping at %s' %
+                              (after))
+                    more = True
+                    break
+
+                if next_after:
+                    after = next_after
+                    if self._checkpoint:
+                        self._checkpoint.save(after)
+
+                if not more:
+                    break
+
+                if max_tasks and len(harvested) >= max_tasks:
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+
+        for result in harvested:
+            result.pop('retry', None)
+
+        return {
+            'tasks': harvested,
+            'after': after,
+            'more_results_available': more,
+            'throttled': self._backoff.throttled
+        }
+
+    def _get_completed_page(self, after, before):
+        """
+        :return: (task_uuid, score) tuples, whether more results are available and the cursor
+                 of the next page.
+        :rtype: ``tuple``
+        """
+        result = self._call(self._client.get_completed, after=after, before=before,
+                            include_score=True)
+
+        try:
+            data = result['data']
+            tasks = data['tasks'] or {}
+            more = bool(int(data.get('more_results_available', 0)))
+            next_after = data.get('before', None)
+
+            if more and (not next_after or next_after == after):
+                raise ValueError('Page cursor did not advance')
+
+            return sorted(tasks.items()), more, next_after
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            raise InvalidAnalysisAPIResponse('Unable to parse response to get_completed(): %s' %
+                                             (e))
+
+    def _fetch_task(self, task):
+        task_uuid, score = task
+        result = {'task_uuid': task_uuid, 'score': score}
+
+        if self._fetch == FETCH_NONE:
+            return result
+
+        if self._fetch == FETCH_SUMMARY:
+            func = self._client.get_result_summary
+        else:
+            func = self._client.get_result
+
+        try:
+            result['result'] = self._call(func, task_uuid, **self._fetch_kwargs)
+        except RETRY_ERRORS as e:
+            result['error'] = str(e)
+            result['retry'] = True
+        except AnalysisAPIError as e:
+            result['error'] = str(e)
+
+        return result
+
+    def _call(self, func, *args, **kwargs):
+        retries = 0
+
+        while True:
+            self._backoff.wait()
+
+            try:
+                result = func(*args, **kwargs)
+            except RETRY_ERRORS as e:
+                self._backoff.failure()
+                retries += 1
+                if retries > self._max_retries:
+                    raise
+
+                self._log('Request failed (%s), retrying in %.1f seconds' %
+                          (e, self._backoff.delay))
+                continue
+
+            self._backoff.success()
+            return result
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.warning(message)
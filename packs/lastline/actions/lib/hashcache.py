@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+__all__ = [
+    'HashCache',
+
+    'hash_stream'
+]
+
+CHUNK_SIZE = 64 * 1024
+
+# Streams which can't be rewound are spooled to disk once they are larger than this
+SPOOL_MAX_SIZE = 1024 * 1024
+
+DEFAULT_TTL = 24 * 60 * 60
+
+SHA1_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Compute MD5 and SHA1 digests of a stream in a single pass.
+
+    Streams which can't be rewound (e.g. pipes and sockets) are spooled to a temporary file
+    while they are being hashed so they can be uploaded afterwards without reading the source
+    again or keeping the whole content in memory.
+
+    :return: (md5, sha1, size, stream) tuple, ``stream`` is positioned at the beginning and
+             is either the original stream or the spooled copy.
+    :rtype: ``tuple``
+    """
+    md5 = hashlib.md5()
+    sha1 = hashlib.sha1()
+    size = 0
+
+    try:
+        start = stream.tell()
+        stream.seek(start)
+        spool = None
+    except (AttributeError, IOError, OSError):
+        start = 0
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+
+        md5.update(chunk)
+        sha1.update(chunk)
+        size += len(chunk)
+
+        if spool:
+            spool.write(chunk)
+
+    if spool:
+        stream = spool
+    stream.seek(start)
+
+    return md5.hexdigest(), sha1.hexdigest(), size, stream
+
+
+class HashCache(object):
+    """
+    Persistent cache of file hash -> analysis task (UUID and score) which is shared by all the
+    action runs on the same node.
+
+    Each entry is stored in a separate JSON file named after the SHA1 digest of the file, so
+    concurrent runs never have to lock the whole cache.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        """
+        :param path: Directory where the entries are stored.
+        :type path: ``str``
+
+        :param ttl: Number of seconds after which entries expire.
+        :type ttl: ``int``
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def get(self, sha1):
+        """
+        Retrieve a non-expired entry for the provided SHA1 digest.
+
+        :rtype: ``dict`` or ``None``
+        """
+        entry_path = self._get_entry_path(sha1)
+
+        try:
+            with open(entry_path, 'r') as fp:
+                entry = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry.get('expires', 0) < time.time():
+            self._remove(entry_path)
+            return None
+
+        return entry
+
+    def set(self, md5, sha1, task_uuid, score=None):
+        """
+        Store the analysis task of the file with the provided digests.
+
+        :rtype: ``dict``
+        """
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                # Created by a concurrent run
+                if not os.path.isdir(self.path):
+                    raise
+
+        entry = {
+            'md5': md5,
+            'sha1': sha1,
+            'task_uuid': task_uuid,
+            'score': score,
+            'expires': int(time.time() + self.ttl)
+        }
+
+        # Written to a temporary file first so other runs never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.entry')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(entry, fp)
+        os.rename(tmp_path, self._get_entry_path(sha1))
+
+        return entry
+
+    def purge(self):
+        """
+        Remove all the expired entries.
+        """
+        if not os.path.isdir(self.path):
+            return
+
+        now = time.time()
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+
+            try:
+                # Entries are never modified so the expiry time can be derived from mtime
+                if os.path.getmtime(entry_path) + self.ttl < now:
+                    self._remove(entry_path)
+            except OSError:
+                continue
+
+    def _get_entry_path(self, sha1):
+        sha1 = sha1.lower()
+        if not SHA1_RE.match(sha1):
+            raise ValueError('Invalid SHA1 digest: %s' % (sha1))
+
+        return os.path.join(self.path, '%s.json' % (sha1))
+
+    def _remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
@@ -1,9 +1,36 @@
+import os
+import tempfile
+
 from lib import actions
+from lib.analysis_apiclient import AnalysisAPIError
+from lib.hashcache import HashCache
+from lib.hashcache import hash_stream
+
+DEFAULT_HASH_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'st2-lastline-hash-cache')
+DEFAULT_HASH_CACHE_TTL = 24 * 60 * 60
+
+# Parameters which change how the file is analyzed or what the response contains. Existing tasks
+# haven't necessarily been created with the same values, so files submitted with any of them
+# set are always uploaded
+ANALYSIS_PARAMETERS = [
+    'full_report_score',
+    'backend',
+    'analysis_timeout',
+    'analysis_env',
+    'allow_network_traffic',
+    'keep_file_dumps',
+    'keep_memory_dumps',
+    'keep_behavior_log',
+    'push_to_portal_account',
+    'apk_package_name',
+    'password',
+    'report_version'
+]
 
 
 class SubmitFileAction(actions.BaseAction):
-    def run(self, file_stream, download_ip=None, download_port=None,
-            download_url=None, download_host=None, download_path=None,
+    def run(self, file_stream=None, file_path=None, dedup=True, download_ip=None,
+            download_port=None, download_url=None, download_host=None, download_path=None,
             download_agent=None, download_referer=None, download_request=None,
             full_report_score=None, bypass_cache=None,
             delete_after_analysis=None, backend=None, analysis_timeout=None,
@@ -15,19 +42,105 @@ class SubmitFileAction(actions.BaseAction):
             is_download=True, protocol='http', apk_package_name=None,
             password=None, report_version=None):
 
-        response = self.client.submit_file(file_stream, download_ip, download_port,
-                                      download_url, download_host,
-                                      download_path, download_agent,
-                                      download_referer, download_request,
-                                      full_report_score, bypass_cache,
-                                      delete_after_analysis, backend,
-                                      analysis_timeout, analysis_env,
-                                      allow_network_traffic, filename,
-                                      keep_file_dumps, keep_memory_dumps,
-                                      keep_behavior_log, push_to_portal_account,
-                                      raw, verify, server_ip, server_port,
-                                      server_host, client_ip, client_port,
-                                      is_download, protocol, apk_package_name,
-                                      password, report_version)
+        submit_kwargs = dict(download_ip=download_ip, download_port=download_port,
+                             download_url=download_url, download_host=download_host,
+                             download_path=download_path, download_agent=download_agent,
+                             download_referer=download_referer,
+                             download_request=download_request,
+                             full_report_score=full_report_score, bypass_cache=bypass_cache,
+                             delete_after_analysis=delete_after_analysis, backend=backend,
+                             analysis_timeout=analysis_timeout, analysis_env=analysis_env,
+                             allow_network_traffic=allow_network_traffic, filename=filename,
+                             keep_file_dumps=keep_file_dumps,
+                             keep_memory_dumps=keep_memory_dumps,
+                             keep_behavior_log=keep_behavior_log,
+                             push_to_portal_account=push_to_portal_account,
+                             raw=raw, verify=verify, server_ip=server_ip,
+                             server_port=server_port, server_host=server_host,
+                             client_ip=client_ip, client_port=client_port,
+                             is_download=is_download, protocol=protocol,
+                             apk_package_name=apk_package_name, password=password,
+                             report_version=report_version)
+
+        if file_path:
+            if not filename:
+                submit_kwargs['filename'] = os.path.basename(file_path)
+
+            # File is uploaded straight from disk instead of being read into memory first
+            with open(file_path, 'rb') as fp:
+                return self._submit(fp, dedup, submit_kwargs)
+
+        if file_stream is None:
+            raise ValueError('Either "file_stream" or "file_path" parameter is required')
+
+        return self._submit(file_stream, dedup, submit_kwargs)
+
+    def _submit(self, file_stream, dedup, submit_kwargs):
+        # Results of raw requests and requests which bypass the cache can't be de-duplicated
+        if not dedup or submit_kwargs['raw'] or submit_kwargs['bypass_cache']:
+            return self.client.submit_file(file_stream, **submit_kwargs)
+
+        parameters = [name for name in ANALYSIS_PARAMETERS if submit_kwargs[name] is not None]
+        if parameters:
+            self.logger.debug('Not de-duplicating submission with %s set' %
+                              (', '.join(parameters)))
+            return self.client.submit_file(file_stream, **submit_kwargs)
+
+        md5, sha1, size, file_stream = hash_stream(file_stream)
+        cache = self._get_hash_cache()
+
+        entry = cache.get(sha1)
+        if entry:
+            self.logger.debug('Found task %s for %s in the local cache' %
+                              (entry['task_uuid'], sha1))
+            return self._get_result(entry, 'local')
+
+        entry = self._query_file_hash(cache, md5, sha1)
+        if entry:
+            self.logger.debug('Found task %s for %s using the API' % (entry['task_uuid'], sha1))
+            return self._get_result(entry, 'remote')
+
+        response = self.client.submit_file(file_stream, **submit_kwargs)
+
+        data = response.get('data', {})
+        if data.get('task_uuid'):
+            cache.set(md5, sha1, data['task_uuid'], data.get('score'))
+            cache.purge()
 
         return response
+
+    def _query_file_hash(self, cache, md5, sha1):
+        try:
+            response = self.client.query_file_hash(sha1=sha1)
+        except AnalysisAPIError as e:
+            # Hash lookups can require additional permissions, the file is uploaded instead
+            self.logger.warning('Failed to query file hash %s: %s' % (sha1, e))
+            return None
+
+        tasks = response.get('data', {}).get('tasks') or []
+
+        # Prefer tasks which are already scored, most recent ones first
+        tasks = [task for task in tasks if task.get('task_uuid')]
+        tasks.sort(key=lambda task: (task.get('score') is not None, task.get('expires')),
+                   reverse=True)
+        if not tasks:
+            return None
+
+        return cache.set(md5, sha1, tasks[0]['task_uuid'], tasks[0].get('score'))
+
+    def _get_hash_cache(self):
+        return HashCache(self.config.get('hash_cache_path', DEFAULT_HASH_CACHE_PATH),
+                         self.config.get('hash_cache_ttl', DEFAULT_HASH_CACHE_TTL))
+
+    def _get_result(self, entry, cache):
+        # Same structure as the submit_file response
+        return {
+            'success': 1,
+            'data': {
+                'task_uuid': entry['task_uuid'],
+                'score': entry['score'],
+                'md5': entry['md5'],
+                'sha1': entry['sha1'],
+                'cache': cache
+            }
+        }
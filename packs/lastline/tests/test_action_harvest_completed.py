@@ -0,0 +1,44 @@
+import mock
+
+from st2tests.base import BaseActionTestCase
+
+from harvest_completed import HarvestCompleted
+
+__all__ = [
+    'HarvestCompletedTestCase'
+]
+
+CONFIG = {
+    'key': 'key',
+    'api_token': 'token',
+    'pool_size': 4
+}
+
+
+class HarvestCompletedTestCase(BaseActionTestCase):
+    action_cls = HarvestCompleted
+
+    def _run(self, **kwargs):
+        action = self.get_action_instance(config=CONFIG)
+
+        with mock.patch('harvest_completed.ResultHarvester') as harvester_cls:
+            action.run(after='2016-01-01 00:00:00', checkpoint=False, **kwargs)
+
+        return harvester_cls.call_args[1], harvester_cls.return_value.harvest.call_args[1]
+
+    def test_summaries_of_limited_number_of_tasks_are_harvested_by_default(self):
+        harvester_kwargs, harvest_kwargs = self._run()
+
+        self.assertEqual(harvester_kwargs['fetch'], 'summary')
+        self.assertEqual(harvester_kwargs['fetch_kwargs'], {'score_only': False})
+        self.assertEqual(harvester_kwargs['workers'], 4)
+        self.assertEqual(harvest_kwargs['max_tasks'], 500)
+
+    def test_full_results(self):
+        harvester_kwargs, harvest_kwargs = self._run(fetch='result', max_tasks=0,
+                                                     full_report_score=70)
+
+        self.assertEqual(harvester_kwargs['fetch'], 'result')
+        self.assertEqual(harvester_kwargs['fetch_kwargs'],
+                         {'full_report_score': 70, 'report_version': None})
+        self.assertEqual(harvest_kwargs['max_tasks'], 0)
@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import unittest2
+
+from lib.analysis_apiclient import NoResultFoundError
+from lib.analysis_apiclient import TemporarilyUnavailableError
+from lib.harvester import Backoff
+from lib.harvester import Checkpoint
+from lib.harvester import ResultHarvester
+
+__all__ = [
+    'BackoffTestCase',
+    'ResultHarvesterTestCase'
+]
+
+
+class FakeClient(object):
+    """
+    Client which serves pages of completed tasks keyed by their ``after`` cursor.
+
+    ``failures`` maps task UUIDs to the number of times (or ``True`` for always) fetching their
+    result fails with the given error.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.failures = {}
+        self.requests = []
+
+        self._lock = threading.Lock()
+
+    def get_completed(self, after, before=None, include_score=False):
+        self.requests.append(('get_completed', after))
+        tasks, next_after = self.pages[after]
+
+        return {
+            'success': 1,
+            'data': {
+                'tasks': dict((uuid, 10) for uuid in tasks),
+                'more_results_available': int(next_after in self.pages),
+                'before': next_after
+            }
+        }
+
+    def get_result(self, uuid, **kwargs):
+        return self._get(uuid, 'get_result', kwargs)
+
+    def get_result_summary(self, uuid, **kwargs):
+        return self._get(uuid, 'get_result_summary', kwargs)
+
+    def _get(self, uuid, method, kwargs):
+        with self._lock:
+            self.requests.append((method, uuid))
+
+            count, error = self.failures.get(uuid, (0, None))
+            if count:
+                if count is not True:
+                    self.failures[uuid] = (count - 1, error)
+                raise error('Failed to fetch %s' % (uuid))
+
+        return {'success': 1, 'data': {'uuid': uuid, 'kwargs': kwargs}}
+
+    def get_fetched(self, method='get_result'):
+        return [uuid for name, uuid in self.requests if name == method]
+
+
+PAGES = {
+    '2016-01-01 00:00:00': (['a', 'b'], '2016-01-02 00:00:00'),
+    # Task at the page boundary is returned again
+    '2016-01-02 00:00:00': (['b', 'c'], '2016-01-03 00:00:00'),
+    '2016-01-03 00:00:00': (['d'], '2016-01-04 00:00:00')
+}
+
+
+class BackoffTestCase(unittest2.TestCase):
+
+    def test_delay_doubles_on_failure_and_halves_on_success(self):
+        backoff = Backoff(min_delay=1, max_delay=3)
+
+        backoff.failure()
+        self.assertEqual(backoff.delay, 1)
+        backoff.failure()
+        self.assertEqual(backoff.delay, 2)
+        backoff.failure()
+        self.assertEqual(backoff.delay, 3)
+        self.assertEqual(backoff.throttled, 3)
+
+        backoff.success()
+        self.assertEqual(backoff.delay, 1.5)
+        backoff.success()
+        self.assertEqual(backoff.delay, 0)
+
+
+class ResultHarvesterTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(ResultHarvesterTestCase, self).setUp()
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.checkpoint = Checkpoint(os.path.join(self.path, 'checkpoint.json'))
+
+        self.client = FakeClient(pages=PAGES)
+
+    def _get_harvester(self, **kwargs):
+        kwargs.setdefault('workers', 2)
+        kwargs.setdefault('max_retries', 2)
+        kwargs.setdefault('backoff', Backoff(min_delay=0.01, max_delay=0.02))
+        kwargs.setdefault('checkpoint', self.checkpoint)
+        return ResultHarvester(self.client, **kwargs)
+
+    def test_tasks_returned_on_multiple_pages_are_harvested_once(self):
+        result = self._get_harvester(fetch_kwargs={'report_version': 'll-int-win'}).harvest(
+            after='2016-01-01 00:00:00')
+
+        self.assertEqual([task['task_uuid'] for task in result['tasks']], ['a', 'b', 'c', 'd'])
+        self.assertEqual(sorted(self.client.get_fetched()), ['a', 'b', 'c', 'd'])
+        self.assertEqual(result['tasks'][0]['score'], 10)
+        self.assertEqual(result['tasks'][0]['result']['data']['kwargs'],
+                         {'report_version': 'll-int-win'})
+        self.assertEqual(result['after'], '2016-01-04 00:00:00')
+        self.assertFalse(result['more_results_available'])
+        self.assertEqual(self.checkpoint.load(), '2016-01-04 00:00:00')
+
+    def test_fetch_summary_and_none(self):
+        result = self._get_harvester(fetch='summary').harvest(after='2016-01-03 00:00:00')
+        self.assertEqual(result['tasks'][0]['result']['data']['uuid'], 'd')
+        self.assertEqual(self.client.get_fetched('get_result_summary'), ['d'])
+
+        result = self._get_harvester(fetch='none', checkpoint=None).harvest(
+            after='2016-01-03 00:00:00')
+        self.assertEqual(result['tasks'], [{'task_uuid': 'd', 'score': 10}])
+        self.assertEqual(self.client.get_fetched('get_result_summary'), ['d'])
+
+        self.assertRaises(ValueError, self._get_harvester, fetch='report')
+
+    def test_temporary_errors_are_retried_with_backoff(self):
+        self.client.failures['b'] = (2, TemporarilyUnavailableError)
+
+        harvester = self._get_harvester()
+        result = harvester.harvest(after='2016-01-01 00:00:00')
+
+        self.assertEqual([task.get('error', None) for task in result['tasks']], [None] * 4)
+        self.assertEqual(self.client.get_fetched().count('b'), 3)
+        self.assertEqual(result['throttled'], 2)
+        self.assertFalse(result['more_results_available'])
+
+    def test_checkpoint_is_not_advanced_past_page_with_retry_failures(self):
+        self.client.failures['c'] = (True, TemporarilyUnavailableError)
+
+        result = self._get_harvester().harvest(after='2016-01-01 00:00:00')
+
+        # First page is complete, the second one is not and is harvested again by the next run
+        self.assertEqual(result['after'], '2016-01-02 00:00:00')
+        self.assertTrue(result['more_results_available'])
+        self.assertEqual(self.checkpoint.load(), '2016-01-02 00:00:00')
+        self.assertEqual(self.client.get_fetched().count('c'), 3)
+        self.assertNotIn('d', self.client.get_fetched())
+
+        errors = dict((task['task_uuid'], task.get('error', None)) for task in result['tasks'])
+        self.assertIn('Failed to fetch c', errors['c'])
+        self.assertNotIn('retry', result['tasks'][-1])
+
+        # Next run resumes from the checkpoint, "after" is ignored
+        self.client.failures.clear()
+        result = self._get_harvester().harvest(after='2016-01-01 00:00:00')
+
+        self.assertEqual([task['task_uuid'] for task in result['tasks']], ['b', 'c', 'd'])
+        self.assertEqual(self.checkpoint.load(), '2016-01-04 00:00:00')
+
+    def test_other_errors_are_reported_and_not_retried(self):
+        self.client.failures['c'] = (True, NoResultFoundError)
+
+        result = self._get_harvester().harvest(after='2016-01-01 00:00:00')
+
+        errors = dict((task['task_uuid'], task.get('error', None)) for task in result['tasks'])
+        self.assertTrue(errors['c'])
+        self.assertEqual(self.client.get_fetched().count('c'), 1)
+        self.assertEqual(self.checkpoint.load(), '2016-01-04 00:00:00')
+
+    def test_max_tasks_stops_after_page(self):
+        result = self._get_harvester().harvest(after='2016-01-01 00:00:00', max_tasks=1)
+
+        self.assertEqual([task['task_uuid'] for task in result['tasks']], ['a', 'b'])
+        self.assertEqual(result['after'], '2016-01-02 00:00:00')
+        self.assertTrue(result['more_results_available'])
+
+    def test_after_is_required_without_checkpoint(self):
+        self.assertRaises(ValueError, self._get_harvester().harvest)
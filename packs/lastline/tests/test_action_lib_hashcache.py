@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from StringIO import StringIO
+
+import mock
+import unittest2
+
+from lib.hashcache import HashCache
+from lib.hashcache import hash_stream
+
+__all__ = [
+    'HashStreamTestCase',
+    'HashCacheTestCase'
+]
+
+CONTENT = 'MZ' + 'stackstorm' * 10000
+MD5 = hashlib.md5(CONTENT).hexdigest()
+SHA1 = hashlib.sha1(CONTENT).hexdigest()
+
+
+class UnseekableStream(object):
+    """
+    Stream which can only be read once, like a pipe or a socket.
+    """
+
+    def __init__(self, content):
+        self._stream = StringIO(content)
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+class HashStreamTestCase(unittest2.TestCase):
+
+    def test_seekable_stream_is_rewound(self):
+        stream = StringIO('header' + CONTENT)
+        stream.seek(len('header'))
+
+        md5, sha1, size, result_stream = hash_stream(stream, chunk_size=1000)
+
+        self.assertEqual((md5, sha1, size), (MD5, SHA1, len(CONTENT)))
+        self.assertTrue(result_stream is stream)
+        self.assertEqual(result_stream.read(), CONTENT)
+
+    def test_unseekable_stream_is_spooled(self):
+        md5, sha1, size, result_stream = hash_stream(UnseekableStream(CONTENT))
+
+        self.assertEqual((md5, sha1, size), (MD5, SHA1, len(CONTENT)))
+        self.assertEqual(result_stream.read(), CONTENT)
+
+
+class HashCacheTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(HashCacheTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_entries_are_shared_between_instances(self):
+        HashCache(os.path.join(self.path, 'cache')).set(MD5, SHA1, 'uuid1', score=70)
+
+        entry = HashCache(os.path.join(self.path, 'cache')).get(SHA1.upper())
+        self.assertEqual((entry['md5'], entry['sha1'], entry['task_uuid'], entry['score']),
+                         (MD5, SHA1, 'uuid1', 70))
+        self.assertEqual(HashCache(self.path).get(hashlib.sha1('other').hexdigest()), None)
+
+    def test_expired_entries_are_removed(self):
+        cache = HashCache(self.path, ttl=10)
+        cache.set(MD5, SHA1, 'uuid1')
+
+        with mock.patch('lib.hashcache.time.time', mock.Mock(return_value=time.time() + 11)):
+            self.assertEqual(cache.get(SHA1), None)
+
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_purge(self):
+        cache = HashCache(self.path, ttl=10)
+        cache.set(MD5, SHA1, 'uuid1')
+        other_sha1 = hashlib.sha1('other').hexdigest()
+        cache.set(MD5, other_sha1, 'uuid2')
+
+        entry_path = os.path.join(self.path, '%s.json' % (SHA1))
+        os.utime(entry_path, (time.time() - 11, time.time() - 11))
+        cache.purge()
+
+        self.assertEqual(os.listdir(self.path), ['%s.json' % (other_sha1)])
+
+    def test_invalid_sha1(self):
+        cache = HashCache(self.path)
+        self.assertRaises(ValueError, cache.get, '../../etc/passwd')
+        self.assertRaises(ValueError, cache.set, MD5, 'invalid', 'uuid1')
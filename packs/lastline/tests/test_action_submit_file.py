@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import mock
+
+from st2tests.base import BaseActionTestCase
+
+from lib.analysis_apiclient import PermissionDeniedError
+from lib.hashcache import HashCache
+from submit_file import SubmitFileAction
+
+__all__ = [
+    'SubmitFileActionTestCase'
+]
+
+CONTENT = 'MZ' + 'stackstorm' * 1000
+MD5 = hashlib.md5(CONTENT).hexdigest()
+SHA1 = hashlib.sha1(CONTENT).hexdigest()
+
+
+class SubmitFileActionTestCase(BaseActionTestCase):
+    action_cls = SubmitFileAction
+
+    def setUp(self):
+        super(SubmitFileActionTestCase, self).setUp()
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.cache = HashCache(os.path.join(self.path, 'cache'))
+
+        self.client = mock.Mock()
+        self.client.query_file_hash.return_value = {'success': 1, 'data': {'tasks': []}}
+        self.client.submit_file.side_effect = self._submit_file
+        self.uploaded = []
+
+    def _submit_file(self, file_stream, **kwargs):
+        self.uploaded.append((file_stream.read(), kwargs))
+        return {'success': 1, 'data': {'task_uuid': 'uuid-new', 'score': None}}
+
+    def _run(self, **kwargs):
+        action = self.get_action_instance(config={
+            'key': 'key',
+            'api_token': 'token',
+            'hash_cache_path': self.cache.path
+        })
+        action.client = self.client
+
+        kwargs.setdefault('file_stream', StringIO(CONTENT))
+        return action.run(**kwargs)
+
+    def test_file_is_uploaded_and_cached(self):
+        result = self._run()
+
+        self.assertEqual(result['data']['task_uuid'], 'uuid-new')
+        self.assertEqual(len(self.uploaded), 1)
+        self.assertEqual(self.uploaded[0][0], CONTENT)
+        self.client.query_file_hash.assert_called_once_with(sha1=SHA1)
+        self.assertEqual(self.cache.get(SHA1)['task_uuid'], 'uuid-new')
+
+    def test_file_path_is_uploaded_from_disk(self):
+        file_path = os.path.join(self.path, 'sample.exe')
+        with open(file_path, 'wb') as fp:
+            fp.write(CONTENT)
+
+        self._run(file_stream=None, file_path=file_path)
+
+        self.assertEqual(self.uploaded[0][0], CONTENT)
+        self.assertEqual(self.uploaded[0][1]['filename'], 'sample.exe')
+
+    def test_local_cache_hit(self):
+        self.cache.set(MD5, SHA1, 'uuid-local', score=70)
+
+        result = self._run()
+
+        self.assertEqual(result, {'success': 1, 'data': {
+            'task_uuid': 'uuid-local', 'score': 70, 'md5': MD5, 'sha1': SHA1, 'cache': 'local'
+        }})
+        self.assertEqual(self.uploaded, [])
+        self.assertFalse(self.client.query_file_hash.called)
+
+    def test_remote_query_hit(self):
+        self.client.query_file_hash.return_value = {'success': 1, 'data': {'tasks': [
+            {'task_uuid': 'uuid-pending', 'score': None, 'expires': '2016-01-03 00:00:00'},
+            {'task_uuid': 'uuid-old', 'score': 10, 'expires': '2016-01-01 00:00:00'},
+            {'task_uuid': 'uuid-scored', 'score': 30, 'expires': '2016-01-02 00:00:00'}
+        ]}}
+
+        result = self._run()
+
+        # Most recent scored task is preferred
+        self.assertEqual(result['data']['task_uuid'], 'uuid-scored')
+        self.assertEqual(result['data']['cache'], 'remote')
+        self.assertEqual(self.uploaded, [])
+        self.assertEqual(self.cache.get(SHA1)['task_uuid'], 'uuid-scored')
+
+    def test_failed_hash_query_uploads_file(self):
+        self.client.query_file_hash.side_effect = PermissionDeniedError('denied')
+
+        result = self._run()
+
+        self.assertEqual(result['data']['task_uuid'], 'uuid-new')
+        self.assertEqual(len(self.uploaded), 1)
+
+    def test_analysis_parameters_disable_dedup(self):
+        self.cache.set(MD5, SHA1, 'uuid-local', score=70)
+
+        for kwargs in [{'analysis_env': 'windows7:office2003'}, {'backend': 'llama'},
+                       {'password': 'infected'}, {'full_report_score': 0},
+                       {'allow_network_traffic': False}, {'dedup': False}, {'raw': True}]:
+            result = self._run(**kwargs)
+            self.assertEqual(result['data']['task_uuid'], 'uuid-new')
+
+        self.assertEqual(len(self.uploaded), 7)
+        self.assertEqual(self.uploaded[0][1]['analysis_env'], 'windows7:office2003')
+        self.assertFalse(self.client.query_file_hash.called)
+
+    def test_download_metadata_does_not_disable_dedup(self):
+        self.cache.set(MD5, SHA1, 'uuid-local', score=70)
+
+        result = self._run(download_url='http://example.com/sample.exe', filename='sample.exe')
+
+        self.assertEqual(result['data']['cache'], 'local')
+        self.assertEqual(self.uploaded, [])
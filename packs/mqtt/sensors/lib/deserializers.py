@@ -0,0 +1,269 @@
+"""
+Message body deserialization shared by the message queue sensors.
+
+Bodies are first decoded according to the content encoding (e.g. ``gzip``,
+``deflate``, ``base64`` or a comma separated list of them) and then
+deserialized according to the content type (e.g. ``application/json``,
+``application/msgpack`` or ``application/x-yaml``). Both can be detected from
+the message properties or fixed in the sensor config.
+
+``pickle`` is only used when it's explicitly configured, it's never selected
+based on the content type of a message.
+"""
+
+import base64
+import json
+import pickle
+import zlib
+
+try:
+    import ujson as fast_json
+except ImportError:
+    try:
+        import simplejson as fast_json
+    except ImportError:
+        fast_json = json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+__all__ = [
+    'BodyDeserializer',
+    'DeserializationError',
+
+    'register_deserializer',
+    'register_decoder',
+    'get_deserializer',
+    'get_decoder'
+]
+
+AUTO = 'auto'
+
+# Decompressed bodies larger than this are rejected (protects against compression bombs)
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Content encodings which don't require decoding (some clients such as Celery put the
+# charset in the content encoding property)
+IDENTITY_ENCODINGS = ['identity', 'binary', 'utf-8', 'utf8', '7bit', '8bit']
+
+
+class DeserializationError(Exception):
+    pass
+
+
+def _json_loads(body):
+    return fast_json.loads(body)
+
+
+def _msgpack_loads(body):
+    if msgpack is None:
+        raise DeserializationError('Missing "msgpack" library, please install it using pip:\n'
+                                   'pip install msgpack')
+
+    if msgpack.version < (0, 5, 2):
+        # "raw" argument is only supported since msgpack 0.5.2
+        return msgpack.unpackb(body, encoding='utf-8')
+
+    return msgpack.unpackb(body, raw=False)
+
+
+def _yaml_loads(body):
+    if yaml is None:
+        raise DeserializationError('Missing "pyyaml" library, please install it using pip:\n'
+                                   'pip install pyyaml')
+
+    return yaml.safe_load(body)
+
+
+def _decompress(body, wbits, max_size):
+    decompressor = zlib.decompressobj(wbits)
+    result = decompressor.decompress(body, max_size + 1 if max_size else 0)
+
+    if max_size and (len(result) > max_size or decompressor.unconsumed_tail):
+        raise DeserializationError('Decompressed body is larger than %s bytes' % (max_size))
+
+    return result
+
+
+def _gzip_decode(body, max_size):
+    return _decompress(body, wbits=16 + zlib.MAX_WBITS, max_size=max_size)
+
+
+def _zlib_decode(body, max_size):
+    return _decompress(body, wbits=zlib.MAX_WBITS, max_size=max_size)
+
+
+def _base64_decode(body, max_size):
+    return base64.b64decode(body)
+
+
+# name -> (function, content types)
+DESERIALIZERS = {
+    'json': (_json_loads, ['application/json', 'text/json']),
+    'msgpack': (_msgpack_loads, ['application/msgpack', 'application/x-msgpack']),
+    'yaml': (_yaml_loads, ['application/x-yaml', 'application/yaml', 'text/yaml']),
+    'pickle': (pickle.loads, [])
+}
+
+# name -> (function, content encodings)
+DECODERS = {
+    'gzip': (_gzip_decode, ['gzip', 'x-gzip']),
+    'zlib': (_zlib_decode, ['zlib', 'deflate']),
+    'base64': (_base64_decode, ['base64'])
+}
+
+
+def register_deserializer(name, func, content_types=None):
+    """
+    Register a new deserialization method.
+
+    :param func: Function which receives a (decoded) body and returns a deserialized object.
+    :type func: ``callable``
+
+    :param content_types: Content types this method is used for when it's detected from the
+                          message properties.
+    :type content_types: ``list``
+    """
+    DESERIALIZERS[name] = (func, content_types or [])
+
+
+def register_decoder(name, func, content_encodings=None):
+    """
+    Register a new content encoding decoder.
+
+    :param func: Function which receives a body and maximum size and returns a decoded body.
+    :type func: ``callable``
+    """
+    DECODERS[name] = (func, content_encodings or [])
+
+
+def get_deserializer(content_type):
+    content_type = content_type.split(';', 1)[0].strip().lower()
+
+    for func, content_types in DESERIALIZERS.values():
+        if content_type in content_types:
+            return func
+
+    return None
+
+
+def get_decoder(content_encoding):
+    content_encoding = content_encoding.strip().lower()
+
+    for func, content_encodings in DECODERS.values():
+        if content_encoding in content_encodings:
+            return func
+
+    return None
+
+
+class BodyDeserializer(object):
+    """
+    Decodes and deserializes message bodies and keeps track of the failures.
+    """
+
+    def __init__(self, method=None, compression=None, max_size=DEFAULT_MAX_SIZE, strict=False):
+        """
+        :param method: Deserialization method (e.g. ``json``, ``msgpack``) or ``auto`` to
+                       detect it from the message content type. ``None`` leaves the body as is.
+        :type method: ``str``
+
+        :param compression: Content encoding (e.g. ``gzip``) or ``auto`` to detect it from the
+                            message content encoding or gzip header.
+        :type compression: ``str``
+
+        :param strict: Raise :class:`DeserializationError` instead of returning the raw body
+                       if a body can't be decoded.
+        :type strict: ``bool``
+        """
+        if method and method != AUTO and method not in DESERIALIZERS:
+            raise ValueError('Invalid deserialization method specified: %s' % (method))
+
+        if compression and compression != AUTO and compression not in DECODERS:
+            raise ValueError('Invalid compression specified: %s' % (compression))
+
+        self.method = method
+        self.compression = compression
+        self.max_size = max_size
+        self.strict = strict
+
+        self.decoded_count = 0
+        self.failure_count = 0
+
+    def deserialize(self, body, content_type=None, content_encoding=None):
+        """
+        :param content_type: Content type from the message properties.
+        :type content_type: ``str``
+
+        :param content_encoding: Content encoding from the message properties.
+        :type content_encoding: ``str``
+        """
+        if not self.method and not self.compression:
+            return body
+
+        try:
+            result = self._decode(body, content_encoding=content_encoding)
+
+            func = self._get_deserializer(content_type=content_type)
+            if func:
+                result = func(result)
+        except Exception as e:
+            self.failure_count += 1
+
+            if self.strict:
+                if isinstance(e, DeserializationError):
+                    raise
+                raise DeserializationError('Failed to deserialize body: %s' % (str(e)))
+
+            return body
+
+        self.decoded_count += 1
+        return result
+
+    def _decode(self, body, content_encoding=None):
+        if not self.compression:
+            return body
+
+        if self.compression != AUTO:
+            return DECODERS[self.compression][0](body, self.max_size)
+
+        if content_encoding:
+            # Encodings are listed in the order they have been applied
+            encodings = [value for value in content_encoding.split(',') if value.strip()]
+
+            for encoding in reversed(encodings):
+                if encoding.strip().lower() in IDENTITY_ENCODINGS:
+                    continue
+
+                decoder = get_decoder(encoding)
+                if not decoder:
+                    raise DeserializationError('Unsupported content encoding: %s' % (encoding))
+                body = decoder(body, self.max_size)
+
+            return body
+
+        if isinstance(body, bytes) and body[:2] == GZIP_MAGIC:
+            return _gzip_decode(body, self.max_size)
+
+        return body
+
+    def _get_deserializer(self, content_type=None):
+        if not self.method:
+            return None
+
+        if self.method != AUTO:
+            return DESERIALIZERS[self.method][0]
+
+        if not content_type:
+            return None
+
+        return get_deserializer(content_type)
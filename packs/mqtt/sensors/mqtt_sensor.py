@@ -10,6 +10,8 @@ eventlet.monkey_patch(
 from st2reactor.sensor.base import Sensor
 import paho.mqtt.client as mqtt
 
+from lib.deserializers import BodyDeserializer
+
 
 class MQTTSensor(Sensor):
     def __init__(self, sensor_service, config=None):
@@ -32,6 +34,9 @@ class MQTTSensor(Sensor):
         self._ssl_cacert = self._config.get('ssl_cacert', None)
         self._ssl_cert = self._config.get('ssl_cert', None)
         self._ssl_key = self._config.get('ssl_key', None)
+        self._deserializer = BodyDeserializer(
+            method=self._config.get('deserialization_method', None),
+            compression=self._config.get('compression', None))
 
     def setup(self):
         self._logger.debug('[MQTTSensor]: setting up sensor...')
@@ -93,8 +98,25 @@ class MQTTSensor(Sensor):
         payload = {
             'userdata': userdata,
             'topic': msg.topic,
-            'message': str(msg.payload),
+            'message': self._deserialize_message(msg),
             'retain': msg.retain,
             'qos': msg.qos,
         }
         self._sensor_service.dispatch(trigger=self._trigger, payload=payload)
+
+    def _deserialize_message(self, msg):
+        if not self._deserializer.method and not self._deserializer.compression:
+            return str(msg.payload)
+
+        # Content type is only available with MQTT v5
+        properties = getattr(msg, 'properties', None)
+        content_type = getattr(properties, 'ContentType', None)
+
+        message = self._deserializer.deserialize(msg.payload, content_type=content_type)
+        if isinstance(message, bytes):
+            message = str(message)
+
+        return message
+
+    def get_decode_failure_count(self):
+        return self._deserializer.failure_count
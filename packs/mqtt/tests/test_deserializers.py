@@ -0,0 +1,152 @@
+import base64
+import gzip
+import json
+import zlib
+from StringIO import StringIO
+
+import mock
+import unittest2
+
+from lib import deserializers
+from lib.deserializers import BodyDeserializer
+from lib.deserializers import DeserializationError
+
+__all__ = [
+    'BodyDeserializerTestCase'
+]
+
+DATA = {'key': 'value', 'items': [1, 2, 3]}
+
+
+def _gzip(body):
+    buf = StringIO()
+    fp = gzip.GzipFile(fileobj=buf, mode='wb')
+    fp.write(body)
+    fp.close()
+    return buf.getvalue()
+
+
+class BodyDeserializerTestCase(unittest2.TestCase):
+
+    def test_invalid_method_and_compression(self):
+        self.assertRaises(ValueError, BodyDeserializer, method='unknown')
+        self.assertRaises(ValueError, BodyDeserializer, compression='unknown')
+
+    def test_no_method_leaves_body_as_is(self):
+        deserializer = BodyDeserializer()
+        self.assertEqual(deserializer.deserialize('{"a": 1}'), '{"a": 1}')
+
+    def test_json(self):
+        deserializer = BodyDeserializer(method='json')
+        self.assertEqual(deserializer.deserialize(json.dumps(DATA)), DATA)
+        self.assertEqual((deserializer.decoded_count, deserializer.failure_count), (1, 0))
+
+    def test_yaml(self):
+        deserializer = BodyDeserializer(method='auto')
+        body = 'key: value\nitems:\n  - 1\n  - 2\n  - 3\n'
+        self.assertEqual(deserializer.deserialize(body, content_type='application/x-yaml'),
+                         DATA)
+
+        # Only safe YAML is loaded
+        body = '!!python/object/apply:os.system ["true"]'
+        self.assertEqual(deserializer.deserialize(body, content_type='text/yaml'), body)
+        self.assertEqual(deserializer.failure_count, 1)
+
+    def test_msgpack(self):
+        if deserializers.msgpack is None:
+            self.skipTest('msgpack is not installed')
+
+        body = deserializers.msgpack.packb(DATA, use_bin_type=True)
+        deserializer = BodyDeserializer(method='msgpack')
+        self.assertEqual(deserializer.deserialize(body), DATA)
+
+    def test_msgpack_old_version(self):
+        fake_msgpack = mock.Mock(version=(0, 4, 6))
+        fake_msgpack.unpackb.return_value = DATA
+
+        with mock.patch.object(deserializers, 'msgpack', fake_msgpack):
+            deserializer = BodyDeserializer(method='msgpack')
+            self.assertEqual(deserializer.deserialize('body'), DATA)
+
+        fake_msgpack.unpackb.assert_called_once_with('body', encoding='utf-8')
+
+    def test_auto_method_uses_content_type(self):
+        deserializer = BodyDeserializer(method='auto')
+        body = json.dumps(DATA)
+
+        content_type = 'application/json; charset=utf-8'
+        self.assertEqual(deserializer.deserialize(body, content_type=content_type), DATA)
+        self.assertEqual(deserializer.deserialize(body, content_type='text/plain'), body)
+        self.assertEqual(deserializer.deserialize(body), body)
+
+    def test_pickle_is_never_detected(self):
+        deserializer = BodyDeserializer(method='auto')
+        body = 'cos\nsystem\n(S"true"\ntR.'
+        self.assertEqual(deserializer.deserialize(body, content_type='application/pickle'),
+                         body)
+
+    def test_gzip_is_detected(self):
+        deserializer = BodyDeserializer(method='json', compression='auto')
+        body = _gzip(json.dumps(DATA))
+
+        # From the gzip header
+        self.assertEqual(deserializer.deserialize(body), DATA)
+        # From the content encoding
+        self.assertEqual(deserializer.deserialize(body, content_encoding='gzip'), DATA)
+
+    def test_deflate_and_multiple_encodings(self):
+        deserializer = BodyDeserializer(method='json', compression='auto')
+        body = zlib.compress(json.dumps(DATA))
+
+        self.assertEqual(deserializer.deserialize(body, content_encoding='deflate'), DATA)
+        self.assertEqual(deserializer.deserialize(base64.b64encode(body),
+                                                  content_encoding='deflate, base64'), DATA)
+        self.assertEqual(deserializer.deserialize(json.dumps(DATA),
+                                                  content_encoding='utf-8'), DATA)
+
+        # Deflate bodies don't have a header so they are not detected without content encoding
+        self.assertEqual(deserializer.deserialize(body), body)
+        self.assertEqual(deserializer.failure_count, 1)
+
+    def test_fixed_compression(self):
+        deserializer = BodyDeserializer(method='json', compression='zlib')
+        body = zlib.compress(json.dumps(DATA))
+        self.assertEqual(deserializer.deserialize(body, content_encoding='gzip'), DATA)
+
+    def test_decompressed_size_is_limited(self):
+        body = _gzip('a' * 1024)
+
+        deserializer = BodyDeserializer(compression='auto', max_size=1023)
+        self.assertEqual(deserializer.deserialize(body), body)
+        self.assertEqual(deserializer.failure_count, 1)
+
+        deserializer = BodyDeserializer(compression='auto', max_size=1024)
+        self.assertEqual(deserializer.deserialize(body), 'a' * 1024)
+
+        deserializer = BodyDeserializer(compression='auto', max_size=1023, strict=True)
+        self.assertRaisesRegexp(DeserializationError, 'larger than 1023 bytes',
+                                deserializer.deserialize, body)
+
+    def test_failures_return_raw_body(self):
+        deserializer = BodyDeserializer(method='json', compression='auto')
+
+        self.assertEqual(deserializer.deserialize('{invalid'), '{invalid')
+        self.assertEqual(deserializer.deserialize('body', content_encoding='br'), 'body')
+        self.assertEqual(deserializer.deserialize('{}'), {})
+        self.assertEqual((deserializer.decoded_count, deserializer.failure_count), (1, 2))
+
+    def test_strict_raises(self):
+        deserializer = BodyDeserializer(method='json', strict=True)
+        self.assertRaises(DeserializationError, deserializer.deserialize, '{invalid')
+
+        deserializer = BodyDeserializer(method='json', compression='auto', strict=True)
+        self.assertRaisesRegexp(DeserializationError, 'Unsupported content encoding',
+                                deserializer.deserialize, 'body', content_encoding='br')
+
+    def test_register_deserializer(self):
+        self.addCleanup(deserializers.DESERIALIZERS.pop, 'upper')
+        deserializers.register_deserializer('upper', lambda body: body.upper(),
+                                            content_types=['text/x-upper'])
+
+        deserializer = BodyDeserializer(method='auto')
+        self.assertEqual(deserializer.deserialize('body', content_type='text/x-upper'), 'BODY')
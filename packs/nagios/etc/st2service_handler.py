@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 
+import errno
+import fcntl
 import httplib
 try:
     import simplejson as json
 except ImportError:
     import json
 import os
+import socket
 import sys
+import time
 import traceback
 from urlparse import urljoin
 import argparse
@@ -34,6 +38,7 @@ ST2_AUTH_TOKEN = None
 ST2_SSL_VERIFY = False
 
 ST2_AUTH_PATH = 'tokens'
+ST2_AUTH_TOKEN_TTL = 5 * 60
 ST2_WEBHOOKS_PATH = 'webhooks/st2'
 ST2_TRIGGERS_PATH = 'triggertypes'
 ST2_TRIGGERTYPE_PACK = 'nagios'
@@ -47,6 +52,19 @@ STATE_MESSAGE = {
     'CRITICAL': 'Critical!'
 }
 
+# Path to the unix socket of the spool daemon (st2_spool.py). When set, events are
+# handed over to the daemon instead of being posted to st2 directly.
+SPOOL_SOCKET = None
+SPOOL_TIMEOUT = 1.0
+
+# Path to the on-disk state file shared by all the handler processes. When
+# set, the auth token and the trigger type registration are cached across
+# invocations.
+STATE_FILE = None
+# Cached tokens are not used if they expire in less than this many seconds
+STATE_TOKEN_EXPIRY_MARGIN = 30
+AUTH_TOKEN_FROM_STATE = False
+
 REGISTERED_WITH_ST2 = False
 UNAUTHED = False
 IS_API_KEY_AUTH = False
@@ -58,6 +76,94 @@ TOKEN_AUTH_HEADER = 'X-Auth-Token'
 API_KEY_AUTH_HEADER = 'St2-Api-Key'
 
 
+def _read_state(f):
+    f.seek(0)
+    content = f.read()
+
+    if not content:
+        return {}
+
+    try:
+        return json.loads(content)
+    except ValueError:
+        # Corrupted state file, it will be overwritten on next update
+        return {}
+
+
+def _load_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return _read_state(f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            traceback.print_exc(limit=20)
+        return {}
+
+
+def _update_state(update_func):
+    try:
+        fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                state = _read_state(f)
+                update_func(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except (IOError, OSError):
+        # State file is only a cache, failing to write it shouldn't fail the
+        # handler
+        traceback.print_exc(limit=20)
+
+
+def _get_token_state_key():
+    return '{0}|{1}'.format(_get_auth_url(), ST2_USERNAME)
+
+
+def _get_cached_auth_token():
+    tokens = _load_state().get('tokens', {})
+    token = tokens.get(_get_token_state_key(), None)
+
+    if not token or \
+            token['expiry'] - STATE_TOKEN_EXPIRY_MARGIN < time.time():
+        return None
+
+    return token['token']
+
+
+def _cache_auth_token(token):
+    def update(state):
+        tokens = state.setdefault('tokens', {})
+        if token:
+            tokens[_get_token_state_key()] = {
+                'token': token,
+                'expiry': time.time() + ST2_AUTH_TOKEN_TTL
+            }
+        else:
+            tokens.pop(_get_token_state_key(), None)
+
+    _update_state(update)
+
+
+def _is_trigger_registered_cached():
+    return _get_st2_triggers_url() in _load_state().get('triggers', {})
+
+
+def _cache_trigger_registered():
+    def update(state):
+        state.setdefault('triggers', {})[_get_st2_triggers_url()] = time.time()
+
+    _update_state(update)
+
+
 def _create_trigger_type(verbose=False):
     try:
         url = _get_st2_triggers_base_url()
@@ -107,7 +213,7 @@ def _get_auth_token(verbose=False):
         print('Will POST to URL {0} to get auth token.\n'.format(auth_url))
 
     try:
-        resp = requests.post(auth_url, json.dumps({'ttl': 5 * 60}),
+        resp = requests.post(auth_url, json.dumps({'ttl': ST2_AUTH_TOKEN_TTL}),
                              auth=(ST2_USERNAME, ST2_PASSWORD),
                              verify=ST2_SSL_VERIFY)
     except:
@@ -146,12 +252,22 @@ def _get_st2_request_headers():
 def _register_with_st2(verbose=False):
     global REGISTERED_WITH_ST2
     try:
+        if not REGISTERED_WITH_ST2 and STATE_FILE and \
+                _is_trigger_registered_cached():
+            if verbose:
+                print('Trigger "{0}" registration found in {1}.'
+                      .format(ST2_TRIGGERTYPE_REF, STATE_FILE))
+            REGISTERED_WITH_ST2 = True
+
         if not REGISTERED_WITH_ST2:
             if verbose:
                 print('Checking if trigger "{0}" registered with st2.'
                       .format(ST2_TRIGGERTYPE_REF))
             _register_trigger_with_st2(verbose=verbose)
             REGISTERED_WITH_ST2 = True
+
+            if STATE_FILE:
+                _cache_trigger_registered()
     except:
         traceback.print_exc(limit=20)
         sys.stderr.write(
@@ -203,7 +319,48 @@ def _get_st2_webhooks_url():
     return url
 
 
+def _post_to_spool(body, verbose=False):
+    event = {
+        'body': body,
+        'headers': {
+            'X-ST2-Integration': 'nagios.'
+        },
+        'trigger_type': {
+            'name': ST2_TRIGGERTYPE_NAME,
+            'pack': ST2_TRIGGERTYPE_PACK,
+            'description': 'Trigger type for nagios event handler.'
+        }
+    }
+
+    if verbose:
+        print('Spooling event to {0}: {1}\n'.format(SPOOL_SOCKET, event))
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(SPOOL_TIMEOUT)
+    try:
+        sock.connect(SPOOL_SOCKET)
+        sock.sendall(json.dumps(event) + '\n')
+    except socket.error:
+        traceback.print_exc(limit=20)
+        sys.stderr.write('Spool daemon is not reachable on {0}.\n'
+                         .format(SPOOL_SOCKET))
+        return False
+    finally:
+        sock.close()
+
+    sys.stdout.write('Spooled nagios event to {0}.\n'.format(SPOOL_SOCKET))
+    return True
+
+
 def _post_webhook(url, body, verbose=False):
+    if SPOOL_SOCKET:
+        if _post_to_spool(body, verbose=verbose):
+            return
+
+        # Spool daemon is not running, fall back to posting the event directly
+        _set_auth_token(verbose=verbose)
+        _register_with_st2(verbose=verbose)
+
     headers = _get_st2_request_headers()
     headers['X-ST2-Integration'] = 'nagios.'
     headers['Content-Type'] = 'application/json; charset=utf-8'
@@ -225,6 +382,10 @@ def _post_webhook(url, body, verbose=False):
                 'installation!'.format(url)
             raise Exception(msg)
 
+        if status == httplib.UNAUTHORIZED and \
+                _refresh_auth_token_from_state(verbose=verbose):
+            return _post_webhook(url=url, body=body, verbose=verbose)
+
         if status not in OK_CODES:
             sys.stderr.write('Failed posting nagio event to st2. HTTP_CODE: '
                              '{0}\n'.format(status))
@@ -255,6 +416,8 @@ def _set_config_opts(config_file, verbose=False):
     global ST2_API_BASE_URL
     global ST2_AUTH_BASE_URL
     global ST2_SSL_VERIFY
+    global SPOOL_SOCKET
+    global STATE_FILE
     global UNAUTHED
     global IS_API_KEY_AUTH
     if not os.path.exists(config_file):
@@ -279,6 +442,8 @@ def _set_config_opts(config_file, verbose=False):
             ST2_AUTH_BASE_URL += '/'
         UNAUTHED = config['unauthed']
         ST2_SSL_VERIFY = config['ssl_verify']
+        SPOOL_SOCKET = config.get('spool_socket', None)
+        STATE_FILE = config.get('state_file', None)
 
     if ST2_API_KEY:
         IS_API_KEY_AUTH = True
@@ -286,20 +451,67 @@ def _set_config_opts(config_file, verbose=False):
     if verbose:
         print('Unauthed? : {0}\nAPI key auth?: {1}\nSSL Verify? : {2}\n'
               .format(UNAUTHED, IS_API_KEY_AUTH, ST2_SSL_VERIFY))
+        print('Spool socket: {0}\nState file: {1}\n'
+              .format(SPOOL_SOCKET, STATE_FILE))
+
+    # With the spool daemon the token is only needed if the daemon is not
+    # reachable
+    if not SPOOL_SOCKET:
+        _set_auth_token(verbose=verbose)
+
+
+def _set_auth_token(verbose=False):
+    global ST2_AUTH_TOKEN
+    global AUTH_TOKEN_FROM_STATE
 
     if not UNAUTHED and not IS_API_KEY_AUTH:
         try:
+            if not ST2_AUTH_TOKEN and STATE_FILE:
+                ST2_AUTH_TOKEN = _get_cached_auth_token()
+                AUTH_TOKEN_FROM_STATE = bool(ST2_AUTH_TOKEN)
+                if verbose and ST2_AUTH_TOKEN:
+                    print('Using cached auth token from {0}.'
+                          .format(STATE_FILE))
+
             if not ST2_AUTH_TOKEN:
                 if verbose:
                     print('No auth token found. Let\'s get one from'
                           'StackStorm!')
                 ST2_AUTH_TOKEN = _get_auth_token(verbose=verbose)
+
+                if STATE_FILE:
+                    _cache_auth_token(ST2_AUTH_TOKEN)
         except:
             traceback.print_exc(limit=20)
             print('Unable to negotiate an auth token. Exiting!')
             sys.exit(1)
 
 
+def _refresh_auth_token_from_state(verbose=False):
+    """
+    Replace a cached auth token which has been rejected by st2 (e.g. revoked)
+    with a new one.
+
+    Returns True if the token has been refreshed and the request should be
+    retried.
+    """
+    global ST2_AUTH_TOKEN
+    global AUTH_TOKEN_FROM_STATE
+
+    if not AUTH_TOKEN_FROM_STATE:
+        return False
+
+    if verbose:
+        print('Cached auth token was rejected by st2, getting a new one.\n')
+
+    AUTH_TOKEN_FROM_STATE = False
+    ST2_AUTH_TOKEN = None
+    _cache_auth_token(None)
+    _set_auth_token(verbose=verbose)
+
+    return True
+
+
 def _from_arg_to_payload(nagios_args):
     try:
         event_id = nagios_args[0]
@@ -329,7 +541,8 @@ def _from_arg_to_payload(nagios_args):
 def main(config_file, payload, verbose=False):
 
     _set_config_opts(config_file=config_file, verbose=verbose)
-    _register_with_st2(verbose=verbose)
+    if not SPOOL_SOCKET:
+        _register_with_st2(verbose=verbose)
     _post_event_to_st2(payload, verbose=verbose)
 
 
@@ -1,4 +1,7 @@
 import json
+import os
+import shutil
+import tempfile
 
 import mock
 import requests
@@ -137,3 +140,85 @@ class NagiosHandlerTestCase(unittest2.TestCase):
         with self.assertRaises(SystemExit) as cm:
             nagios_handler._post_event_to_st2(json.dumps(trigger_payload))
         self.assertTrue(cm.exception.code > 0)
+
+    @mock.patch.object(nagios_handler, 'SPOOL_SOCKET', '/tmp/st2_spool.sock')
+    @mock.patch('st2service_handler._post_to_spool', mock.MagicMock(return_value=True))
+    @mock.patch.object(requests, 'post', mock.MagicMock())
+    def test_post_webhook_spooled(self):
+        body = {'trigger': 'nagios.service_state_change', 'payload': {'host': 'foo'}}
+        nagios_handler._post_webhook('https://localhost/api/v1/webhooks/st2', body)
+        nagios_handler._post_to_spool.assert_called_once_with(body, verbose=False)
+        self.assertFalse(requests.post.called)
+
+    @mock.patch.object(nagios_handler, 'SPOOL_SOCKET', '/tmp/st2_spool.sock')
+    @mock.patch('st2service_handler._post_to_spool', mock.MagicMock(return_value=False))
+    @mock.patch('st2service_handler._register_with_st2')
+    @mock.patch('st2service_handler._set_auth_token')
+    @responses.activate
+    def test_post_webhook_spool_unavailable(self, mock_set_auth_token, mock_register):
+        responses.add(
+            responses.POST, 'https://localhost/api/v1/webhooks/st2',
+            json={}, status=202
+        )
+        body = {'trigger': 'nagios.service_state_change', 'payload': {'host': 'foo'}}
+        nagios_handler._post_webhook('https://localhost/api/v1/webhooks/st2', body)
+        self.assertTrue(mock_set_auth_token.called)
+        self.assertTrue(mock_register.called)
+        self.assertEqual(len(responses.calls), 1)
+
+    def _setup_state_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        nagios_handler.STATE_FILE = os.path.join(temp_dir, 'state.json')
+        self.addCleanup(setattr, nagios_handler, 'STATE_FILE', None)
+
+    @responses.activate
+    def test_auth_token_cached_in_state_file(self):
+        self._setup_state_file()
+        nagios_handler.ST2_AUTH_BASE_URL = 'https://localhost/auth/v1/'
+        nagios_handler.ST2_USERNAME = 'foo'
+        nagios_handler.UNAUTHED = False
+        nagios_handler.IS_API_KEY_AUTH = False
+        self.addCleanup(setattr, nagios_handler, 'ST2_AUTH_TOKEN', None)
+        self.addCleanup(setattr, nagios_handler, 'AUTH_TOKEN_FROM_STATE', False)
+        responses.add(
+            responses.POST, 'https://localhost/auth/v1/tokens',
+            json={'token': 'your_auth_token'}, status=201
+        )
+
+        # Simulate two separate handler invocations
+        for _ in range(2):
+            nagios_handler.ST2_AUTH_TOKEN = None
+            nagios_handler._set_auth_token()
+            self.assertEqual(nagios_handler.ST2_AUTH_TOKEN, 'your_auth_token')
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertTrue(nagios_handler.AUTH_TOKEN_FROM_STATE)
+
+    @mock.patch('st2service_handler.time.time', mock.MagicMock(return_value=1000))
+    def test_expired_auth_token_not_used(self):
+        self._setup_state_file()
+        nagios_handler.ST2_AUTH_BASE_URL = 'https://localhost/auth/v1/'
+        nagios_handler.ST2_USERNAME = 'foo'
+        nagios_handler._cache_auth_token('your_auth_token')
+        self.assertEqual(nagios_handler._get_cached_auth_token(), 'your_auth_token')
+
+        nagios_handler.time.time.return_value = 1000 + nagios_handler.ST2_AUTH_TOKEN_TTL
+        self.assertEqual(nagios_handler._get_cached_auth_token(), None)
+
+    @responses.activate
+    def test_trigger_registration_cached_in_state_file(self):
+        self._setup_state_file()
+        nagios_handler.ST2_API_BASE_URL = 'https://localhost/api/v1/'
+        responses.add(
+            responses.GET, 'https://localhost/api/v1/triggertypes/nagios.service_state_change',
+            json={'type': 'nagios.service_state_change'}, status=200
+        )
+
+        # Simulate two separate handler invocations
+        for _ in range(2):
+            nagios_handler.REGISTERED_WITH_ST2 = False
+            nagios_handler._register_with_st2()
+            self.assertTrue(nagios_handler.REGISTERED_WITH_ST2)
+
+        self.assertEqual(len(responses.calls), 1)
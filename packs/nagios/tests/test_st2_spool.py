@@ -0,0 +1,144 @@
+import json
+import Queue
+
+import mock
+import responses
+import unittest2
+
+import st2_spool
+
+
+__all__ = [
+    'St2SpoolTestCase'
+]
+
+CONFIG = {
+    'st2_username': 'foo',
+    'st2_password': 'bar',
+    'st2_api_key': '',
+    'st2_api_base_url': 'https://localhost/api/v1/',
+    'st2_auth_base_url': 'https://localhost/auth/v1/'
+}
+
+TRIGGER_TYPE = {
+    'name': 'service_state_change',
+    'pack': 'nagios',
+    'description': 'Trigger type for nagios service state change.'
+}
+
+
+def _get_event(event_id):
+    return {
+        'body': {'trigger': 'nagios.service_state_change', 'payload': {'id': event_id}},
+        'headers': {'X-ST2-Integration': 'nagios.', 'St2-Trace-Tag': event_id},
+        'trigger_type': TRIGGER_TYPE
+    }
+
+
+class FakeClient(object):
+
+    def __init__(self, failing):
+        self.failing = failing
+
+    def post_events(self, events):
+        return [event for event in events if event['body']['payload']['id'] in self.failing]
+
+
+class St2SpoolTestCase(unittest2.TestCase):
+
+    @responses.activate
+    def test_token_and_trigger_type_are_cached(self):
+        responses.add(
+            responses.POST, 'https://localhost/auth/v1/tokens',
+            json={'token': 'your_auth_token'}, status=201
+        )
+        responses.add(
+            responses.GET, 'https://localhost/api/v1/triggertypes/nagios.service_state_change',
+            json={'ref': 'nagios.service_state_change'}, status=200
+        )
+        responses.add(
+            responses.POST, 'https://localhost/api/v1/webhooks/st2',
+            json={}, status=202
+        )
+
+        client = st2_spool.St2Client(config=CONFIG)
+        self.assertEqual(client.post_events([_get_event('1'), _get_event('2')]), [])
+        self.assertEqual(client.post_events([_get_event('3')]), [])
+
+        urls = [call.request.url for call in responses.calls]
+        self.assertEqual(urls.count('https://localhost/auth/v1/tokens'), 1)
+        self.assertEqual(
+            urls.count('https://localhost/api/v1/triggertypes/nagios.service_state_change'), 1)
+        self.assertEqual(urls.count('https://localhost/api/v1/webhooks/st2'), 3)
+        self.assertEqual(responses.calls[-1].request.headers['X-Auth-Token'], 'your_auth_token')
+
+    @responses.activate
+    def test_failed_events_are_returned(self):
+        responses.add(
+            responses.POST, 'https://localhost/api/v1/webhooks/st2',
+            json={}, status=500
+        )
+
+        client = st2_spool.St2Client(config=dict(CONFIG, st2_api_key='dummy-api-key'))
+        event = {'body': {'trigger': 'nagios.service_state_change', 'payload': {'id': '1'}}}
+        self.assertEqual(client.post_events([event]), [event])
+        self.assertEqual(responses.calls[0].request.headers['St2-Api-Key'], 'dummy-api-key')
+
+    def test_get_batch_coalesces_events(self):
+        events = Queue.Queue()
+        for event_id in range(5):
+            events.put(_get_event(str(event_id)))
+
+        spooler = st2_spool.Spooler(client=None, events=events, batch_size=3,
+                                    flush_interval=0.1)
+        self.assertEqual(len(spooler._get_batch()), 3)
+        self.assertEqual(len(spooler._get_batch()), 2)
+        self.assertEqual(spooler._get_batch(), [])
+
+    @responses.activate
+    def test_batch_posts_keep_trace_headers(self):
+        responses.add(
+            responses.GET, 'https://localhost/api/v1/triggertypes/nagios.service_state_change',
+            json={'ref': 'nagios.service_state_change'}, status=200
+        )
+        responses.add(
+            responses.POST, 'https://localhost/api/v1/webhooks/st2',
+            json={}, status=202
+        )
+
+        config = dict(CONFIG, st2_api_key='dummy-api-key', spool_batch_posts=True)
+        client = st2_spool.St2Client(config=config)
+        untraced = {'body': {'trigger': 'nagios.service_state_change', 'payload': {'id': '3'}}}
+        events = [_get_event('1'), untraced, _get_event('2'), dict(untraced)]
+        self.assertEqual(client.post_events(events), [])
+
+        requests = [call.request for call in responses.calls if call.request.method == 'POST']
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(requests[0].headers['St2-Trace-Tag'], '1')
+        self.assertEqual(len(json.loads(requests[0].body)), 1)
+        self.assertNotIn('St2-Trace-Tag', requests[1].headers)
+        self.assertEqual(len(json.loads(requests[1].body)), 2)
+        self.assertEqual(requests[2].headers['St2-Trace-Tag'], '2')
+        # Integration set by the handler is kept, events without it are posted as "spool."
+        self.assertEqual([request.headers['X-ST2-Integration'] for request in requests],
+                         ['nagios.', 'spool.', 'nagios.'])
+
+    @mock.patch('st2_spool.time.sleep', mock.Mock())
+    def test_retries_are_counted_per_event(self):
+        events = Queue.Queue()
+        client = FakeClient(failing=['1', '2'])
+        spooler = st2_spool.Spooler(client=client, events=events, batch_size=10,
+                                    flush_interval=0.1)
+
+        failing = _get_event('1')
+        for _ in range(st2_spool.MAX_POST_RETRIES):
+            spooler.flush([failing, _get_event('3')])
+            self.assertEqual(events.get_nowait(), failing)
+            self.assertTrue(events.empty())
+
+        # Another failing event doesn't inherit the retry count of the first one
+        other = _get_event('2')
+        spooler.flush([failing, other])
+        self.assertEqual(events.get_nowait(), other)
+        self.assertEqual(other[st2_spool.RETRIES_KEY], 1)
+        self.assertTrue(events.empty())
@@ -1,17 +1,154 @@
-import json
-import pickle
+import collections
+import functools
+import time
 
 import eventlet
 import pika
+from eventlet.queue import Empty
+from eventlet.queue import LightQueue
 
 from pika.credentials import PlainCredentials
 
 from st2reactor.sensor.base import Sensor
 
-DESERIALIZATION_FUNCTIONS = {
-    'json': json.loads,
-    'pickle': pickle.loads
-}
+from lib.deserializers import BodyDeserializer
+
+eventlet.monkey_patch(
+    os=True,
+    select=True,
+    socket=True,
+    thread=True,
+    time=True)
+
+DEFAULT_PREFETCH_COUNT = 1
+DEFAULT_DISPATCH_POOL_SIZE = 1
+
+# Maximum time dispatched messages stay unacknowledged while waiting for new messages (in
+# seconds)
+DEFAULT_ACK_INTERVAL = 0.1
+
+# How often to log consumption metrics (in seconds), 0 disables logging
+DEFAULT_METRICS_INTERVAL = 60
+
+
+class QueueConsumer(object):
+    """
+    Consumes messages from one or more queues on a dedicated connection and channel.
+
+    Messages are handed to the dispatch pool and acknowledged with a single ``basic_ack``
+    (``multiple=True``) once a contiguous batch of them has been dispatched. All the channel
+    operations happen in the consumer green thread.
+
+    Once ``prefetch_count`` messages are unacknowledged the broker doesn't deliver any more
+    messages, so instead of waiting for new messages the consumer waits for a dispatch to
+    finish and acknowledges it right away.
+    """
+
+    def __init__(self, connection_params, queues, prefetch_count, ack_interval, pool,
+                 dispatch_func, metrics, logger):
+        self._connection_params = connection_params
+        self._queues = queues
+        self._prefetch_count = prefetch_count
+        self._ack_interval = ack_interval
+        self._pool = pool
+        self._dispatch_func = dispatch_func
+        self._metrics = metrics
+        self._logger = logger
+
+        self.conn = None
+        self.channel = None
+
+        # (delivery tag, queue) of the received messages in order
+        self._pending = collections.deque()
+        # delivery tags of the messages which have been dispatched, but not acknowledged yet
+        self._dispatched = set()
+        # Notifies the consumer green thread about finished dispatches
+        self._dispatch_finished = LightQueue()
+        self._running = False
+
+    def setup(self):
+        self.conn = pika.BlockingConnection(self._connection_params)
+        self.channel = self.conn.channel()
+        self.channel.basic_qos(prefetch_count=self._prefetch_count)
+
+        # Setup Qs for listening
+        for queue in self._queues:
+            self.channel.queue_declare(queue=queue, durable=True)
+            callback = functools.partial(self._on_message, queue=queue)
+            self.channel.basic_consume(callback, queue=queue)
+
+    def run(self):
+        self._running = True
+
+        try:
+            while self._running:
+                if self._prefetch_count and len(self._pending) >= self._prefetch_count:
+                    self._wait_for_dispatch(timeout=self._ack_interval)
+                else:
+                    self.conn.process_data_events(time_limit=self._ack_interval)
+                    # Messages which are dispatched without blocking are acknowledged right away
+                    eventlet.sleep(0)
+
+                self._ack_dispatched()
+
+            # Don't leave messages which have already been dispatched unacknowledged
+            self._pool.waitall()
+            self._ack_dispatched()
+        finally:
+            self._running = False
+            self.close()
+
+    def stop(self):
+        if self._running:
+            # Connection is closed by the consumer thread once it stops
+            self._running = False
+        else:
+            self.close()
+
+    def close(self):
+        if self.conn and self.conn.is_open:
+            self.conn.close()
+
+    def _on_message(self, ch, method, properties, body, queue):
+        self._metrics[queue]['consumed'] += 1
+        self._pending.append((method.delivery_tag, queue))
+
+        # Blocks when all the workers are busy, prefetch_count bounds the number of
+        # messages which are buffered by the broker for this channel
+        self._pool.spawn_n(self._dispatch, method.delivery_tag, queue, properties, body)
+
+    def _dispatch(self, delivery_tag, queue, properties, body):
+        try:
+            self._dispatch_func(queue=queue, properties=properties, body=body)
+            self._metrics[queue]['dispatched'] += 1
+        except Exception:
+            self._logger.exception('Failed to dispatch message from queue %s', queue)
+        finally:
+            self._dispatched.add(delivery_tag)
+            self._dispatch_finished.put(delivery_tag)
+
+    def _wait_for_dispatch(self, timeout):
+        try:
+            self._dispatch_finished.get(timeout=timeout)
+        except Empty:
+            # Keep servicing the connection (e.g. heartbeats) while the dispatches are slow
+            self.conn.process_data_events(time_limit=0)
+            return
+
+        # Notifications are only used to wake up the consumer, the state is in _dispatched
+        while self._dispatch_finished.qsize():
+            self._dispatch_finished.get_nowait()
+
+    def _ack_dispatched(self):
+        last_delivery_tag = None
+
+        while self._pending and self._pending[0][0] in self._dispatched:
+            last_delivery_tag, queue = self._pending.popleft()
+            self._dispatched.remove(last_delivery_tag)
+            self._metrics[queue]['acked'] += 1
+
+        if last_delivery_tag is not None:
+            self.channel.basic_ack(delivery_tag=last_delivery_tag, multiple=True)
 
 
 class RabbitMQQueueSensor(Sensor):
@@ -36,25 +173,44 @@ class RabbitMQQueueSensor(Sensor):
         if not isinstance(self.queues, list):
             self.queues = [self.queues]
         self.deserialization_method = queue_sensor_config['deserialization_method']
+        self.compression = queue_sensor_config.get('compression', None)
 
-        supported_methods = DESERIALIZATION_FUNCTIONS.keys()
-        if self.deserialization_method and self.deserialization_method not in supported_methods:
-            raise ValueError('Invalid deserialization method specified: %s' %
-                             (self.deserialization_method))
+        # One deserializer per queue so decode failures are counted per queue
+        self._deserializers = dict((queue, BodyDeserializer(method=self.deserialization_method,
+                                                            compression=self.compression))
+                                   for queue in self.queues)
 
-        self.conn = None
-        self.channel = None
+        self.prefetch_count = (queue_sensor_config.get('prefetch_count', None) or
+                               DEFAULT_PREFETCH_COUNT)
+        self.dispatch_pool_size = (queue_sensor_config.get('dispatch_pool_size', None) or
+                                   DEFAULT_DISPATCH_POOL_SIZE)
+        self.ack_interval = (queue_sensor_config.get('ack_interval', None) or
+                             DEFAULT_ACK_INTERVAL)
+        self.connection_per_queue = queue_sensor_config.get('connection_per_queue', False)
+        self.metrics_interval = queue_sensor_config.get('metrics_interval',
+                                                        DEFAULT_METRICS_INTERVAL)
+
+        self._consumers = []
+        self._metrics = dict((queue, {'consumed': 0, 'dispatched': 0, 'acked': 0})
+                             for queue in self.queues)
+        self._metrics_start_time = None
 
     def run(self):
         self._logger.info('Starting to consume messages from RabbitMQ for %s', self.queues)
-        # run in an eventlet in-order to yield correctly
-        gt = eventlet.spawn(self.channel.start_consuming)
+        self._metrics_start_time = time.time()
+
+        threads = [eventlet.spawn(consumer.run) for consumer in self._consumers]
+
+        if self.metrics_interval:
+            eventlet.spawn_n(self._log_metrics_loop)
+
         # wait else the sensor will quit
-        gt.wait()
+        for thread in threads:
+            thread.wait()
 
     def cleanup(self):
-        if self.conn:
-            self.conn.close()
+        for consumer in self._consumers:
+            consumer.stop()
 
     def setup(self):
         if self.username and self.password:
@@ -63,28 +219,60 @@ class RabbitMQQueueSensor(Sensor):
         else:
             connection_params = pika.ConnectionParameters(host=self.host)
 
-        self.conn = pika.BlockingConnection(connection_params)
-        self.channel = self.conn.channel()
-        self.channel.basic_qos(prefetch_count=1)
+        if self.connection_per_queue:
+            queue_groups = [[queue] for queue in self.queues]
+        else:
+            queue_groups = [self.queues]
 
-        # Setup Qs for listening
-        for queue in self.queues:
-            self.channel.queue_declare(queue=queue, durable=True)
+        for queues in queue_groups:
+            # Each connection gets its own pool so the queues don't compete for the workers
+            pool = eventlet.GreenPool(self.dispatch_pool_size)
+            consumer = QueueConsumer(connection_params=connection_params, queues=queues,
+                                     prefetch_count=self.prefetch_count,
+                                     ack_interval=self.ack_interval, pool=pool,
+                                     dispatch_func=self._dispatch_trigger,
+                                     metrics=self._metrics, logger=self._logger)
+            consumer.setup()
+            self._consumers.append(consumer)
 
-            def callback(ch, method, properties, body):
-                self._dispatch_trigger(ch, method, properties, body, queue)
+    def get_metrics(self):
+        """
+        Return number of consumed, dispatched and acknowledged messages and the average rate
+        (messages per second) for each queue.
 
-            self.channel.basic_consume(callback, queue=queue)
+        :rtype: ``dict``
+        """
+        elapsed = time.time() - self._metrics_start_time if self._metrics_start_time else 0
+        result = {}
+
+        for queue, counters in self._metrics.items():
+            result[queue] = dict(counters)
+
+            for name, value in counters.items():
+                result[queue]['%s_rate' % (name)] = (value / elapsed) if elapsed else 0.0
+
+            result[queue]['decode_failures'] = self._deserializers[queue].failure_count
+
+        return result
+
+    def _log_metrics_loop(self):
+        while True:
+            eventlet.sleep(self.metrics_interval)
 
-    def _dispatch_trigger(self, ch, method, properties, body, queue):
-        body = self._deserialize_body(body=body)
+            for queue, metrics in sorted(self.get_metrics().items()):
+                self._logger.info('Queue %s: consumed=%s (%.2f/s) dispatched=%s (%.2f/s) '
+                                  'acked=%s (%.2f/s) decode_failures=%s', queue,
+                                  metrics['consumed'], metrics['consumed_rate'],
+                                  metrics['dispatched'], metrics['dispatched_rate'],
+                                  metrics['acked'], metrics['acked_rate'],
+                                  metrics['decode_failures'])
+
+    def _dispatch_trigger(self, queue, properties, body):
+        body = self._deserialize_body(queue=queue, properties=properties, body=body)
         self._logger.debug('Received message for queue %s with body %s', queue, body)
 
         payload = {"queue": queue, "body": body}
-        try:
-            self._sensor_service.dispatch(trigger="rabbitmq.new_message", payload=payload)
-        finally:
-            self.channel.basic_ack(delivery_tag=method.delivery_tag)
+        self._sensor_service.dispatch(trigger="rabbitmq.new_message", payload=payload)
 
     def update_trigger(self, trigger):
         pass
@@ -95,15 +283,8 @@ class RabbitMQQueueSensor(Sensor):
     def remove_trigger(self, trigger):
         pass
 
-    def _deserialize_body(self, body):
-        if not self.deserialization_method:
-            return body
-
-        deserialization_func = DESERIALIZATION_FUNCTIONS[self.deserialization_method]
-
-        try:
-            body = deserialization_func(body)
-        except Exception:
-            pass
-
-        return body
+    def _deserialize_body(self, queue, properties, body):
+        return self._deserializers[queue].deserialize(
+            body,
+            content_type=getattr(properties, 'content_type', None),
+            content_encoding=getattr(properties, 'content_encoding', None))
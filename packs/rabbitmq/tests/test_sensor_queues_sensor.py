@@ -0,0 +1,158 @@
+import json
+import time
+
+import eventlet
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from queues_sensor import RabbitMQQueueSensor
+
+__all__ = [
+    'RabbitMQQueueSensorTestCase'
+]
+
+
+def _get_config(**kwargs):
+    queue_sensor_config = {
+        'queues': ['queue1'],
+        'deserialization_method': 'json',
+        'metrics_interval': 0
+    }
+    queue_sensor_config.update(kwargs)
+
+    return {
+        'sensor_config': {
+            'host': 'localhost',
+            'username': None,
+            'password': None,
+            'rabbitmq_queue_sensor': queue_sensor_config
+        }
+    }
+
+
+class FakeMethod(object):
+
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class FakeProperties(object):
+    content_type = None
+    content_encoding = None
+
+
+class FakeChannel(object):
+    """
+    Channel which delivers the messages of the connection honouring prefetch_count and
+    records the acknowledgements.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.prefetch_count = 0
+        self.callbacks = []
+        self.acks = []
+        self.acked = 0
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch_count = prefetch_count
+
+    def queue_declare(self, queue, durable):
+        pass
+
+    def basic_consume(self, callback, queue):
+        self.callbacks.append(callback)
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple, time.time()))
+        self.acked = delivery_tag if multiple else self.acked + 1
+        self.connection.on_ack(self.acked)
+
+
+class FakeConnection(object):
+
+    def __init__(self, messages, on_all_acked):
+        self.messages = list(messages)
+        self.total = len(self.messages)
+        self.on_all_acked = on_all_acked
+        self.delivered = 0
+        self.is_open = True
+        self._channel = FakeChannel(connection=self)
+
+    def __call__(self, params):
+        return self
+
+    def channel(self):
+        return self._channel
+
+    def process_data_events(self, time_limit=0):
+        channel = self._channel
+        unacked = self.delivered - channel.acked
+
+        if self.messages and (not channel.prefetch_count or unacked < channel.prefetch_count):
+            self.delivered += 1
+            channel.callbacks[0](channel, FakeMethod(self.delivered), FakeProperties(),
+                                 self.messages.pop(0))
+            return
+
+        # Nothing to deliver, wait for the time limit like BlockingConnection does
+        eventlet.sleep(time_limit)
+
+    def on_ack(self, acked):
+        if acked == self.total:
+            self.on_all_acked()
+
+    def close(self):
+        self.is_open = False
+
+
+class RabbitMQQueueSensorTestCase(BaseSensorTestCase):
+    sensor_cls = RabbitMQQueueSensor
+
+    def _run_sensor(self, config, count):
+        messages = [json.dumps({'id': index}) for index in range(count)]
+        sensor = self.get_sensor_instance(config=config)
+        connection = FakeConnection(messages=messages, on_all_acked=sensor.cleanup)
+
+        with mock.patch('queues_sensor.pika.BlockingConnection', connection):
+            sensor.setup()
+
+        start = time.time()
+        timeout = eventlet.Timeout(5)
+        try:
+            sensor.run()
+        finally:
+            timeout.cancel()
+
+        return sensor, connection, time.time() - start
+
+    def test_default_settings_ack_every_message_right_away(self):
+        sensor, connection, duration = self._run_sensor(config=_get_config(), count=10)
+
+        self.assertEqual([trigger['payload']['body']['id']
+                          for trigger in self.get_dispatched_triggers()], list(range(10)))
+        self.assertEqual([(tag, multiple) for tag, multiple, _ in connection.channel().acks],
+                         [(tag, True) for tag in range(1, 11)])
+
+        # Acknowledgements don't wait for ack_interval (0.1 seconds) after every message
+        self.assertLess(duration, 0.5)
+
+        metrics = sensor.get_metrics()['queue1']
+        self.assertEqual((metrics['consumed'], metrics['dispatched'], metrics['acked']),
+                         (10, 10, 10))
+
+    def test_slow_dispatches_are_acked_once_finished(self):
+        config = _get_config(prefetch_count=5, dispatch_pool_size=5, ack_interval=0.5)
+
+        with mock.patch.object(self.sensor_service, 'dispatch',
+                               mock.Mock(side_effect=lambda **kwargs: eventlet.sleep(0.01))):
+            sensor, connection, duration = self._run_sensor(config=config, count=20)
+
+        acks = connection.channel().acks
+        self.assertEqual(acks[-1][0], 20)
+        self.assertTrue(all(multiple for _, multiple, _ in acks))
+        # Full prefetch window doesn't wait for ack_interval (0.5 seconds), only the last
+        # messages are acknowledged after waiting for new messages
+        self.assertLess(duration, 1)
+        self.assertEqual(sensor.get_metrics()['queue1']['acked'], 20)
@@ -2,13 +2,17 @@
 
 import argparse
 import base64
+import errno
+import fcntl
 import httplib
 try:
     import simplejson as json
 except ImportError:
     import json
 import os
+import socket
 import sys
+import time
 import traceback
 from urlparse import urljoin
 
@@ -36,6 +40,7 @@ ST2_AUTH_TOKEN = None
 ST2_SSL_VERIFY = False
 
 ST2_AUTH_PATH = 'tokens'
+ST2_AUTH_TOKEN_TTL = 5 * 60
 ST2_WEBHOOKS_PATH = 'webhooks/st2'
 ST2_TRIGGERS_PATH = 'triggertypes'
 ST2_TRIGGERTYPE_PACK = 'sensu'
@@ -49,6 +54,18 @@ SENSU_PORT = 4567
 SENSU_USER = ''
 SENSU_PASS = ''
 
+# Path to the unix socket of the spool daemon (st2_spool.py). When set, events are
+# handed over to the daemon instead of being posted to st2 directly.
+SPOOL_SOCKET = None
+SPOOL_TIMEOUT = 1.0
+
+# Path to the on-disk state file shared by all the handler processes. When set, the
+# auth token and the trigger type registration are cached across invocations.
+STATE_FILE = None
+# Cached tokens are not used if they expire in less than this many seconds
+STATE_TOKEN_EXPIRY_MARGIN = 30
+AUTH_TOKEN_FROM_STATE = False
+
 REGISTERED_WITH_ST2 = False
 UNAUTHED = False
 IS_API_KEY_AUTH = False
@@ -60,6 +77,91 @@ TOKEN_AUTH_HEADER = 'X-Auth-Token'
 API_KEY_AUTH_HEADER = 'St2-Api-Key'
 
 
+def _read_state(f):
+    f.seek(0)
+    content = f.read()
+
+    if not content:
+        return {}
+
+    try:
+        return json.loads(content)
+    except ValueError:
+        # Corrupted state file, it will be overwritten on next update
+        return {}
+
+
+def _load_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return _read_state(f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            traceback.print_exc(limit=20)
+        return {}
+
+
+def _update_state(update_func):
+    try:
+        fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                state = _read_state(f)
+                update_func(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except (IOError, OSError):
+        # State file is only a cache, failing to write it shouldn't fail the handler
+        traceback.print_exc(limit=20)
+
+
+def _get_token_state_key():
+    return '%s|%s' % (_get_auth_url(), ST2_USERNAME)
+
+
+def _get_cached_auth_token():
+    token = _load_state().get('tokens', {}).get(_get_token_state_key(), None)
+
+    if not token or token['expiry'] - STATE_TOKEN_EXPIRY_MARGIN < time.time():
+        return None
+
+    return token['token']
+
+
+def _cache_auth_token(token):
+    def update(state):
+        tokens = state.setdefault('tokens', {})
+        if token:
+            tokens[_get_token_state_key()] = {
+                'token': token,
+                'expiry': time.time() + ST2_AUTH_TOKEN_TTL
+            }
+        else:
+            tokens.pop(_get_token_state_key(), None)
+
+    _update_state(update)
+
+
+def _is_trigger_registered_cached():
+    return _get_st2_triggers_url() in _load_state().get('triggers', {})
+
+
+def _cache_trigger_registered():
+    def update(state):
+        state.setdefault('triggers', {})[_get_st2_triggers_url()] = time.time()
+
+    _update_state(update)
+
+
 def _get_sensu_request_headers():
     b64auth = base64.b64encode(
         "%s:%s" %
@@ -163,7 +265,7 @@ def _get_auth_token(verbose=False):
         print('Will POST to URL %s to get auth token.' % auth_url)
 
     try:
-        resp = requests.post(auth_url, json.dumps({'ttl': 5 * 60}),
+        resp = requests.post(auth_url, json.dumps({'ttl': ST2_AUTH_TOKEN_TTL}),
                              auth=(ST2_USERNAME, ST2_PASSWORD), verify=ST2_SSL_VERIFY)
     except:
         traceback.print_exc(limit=20)
@@ -224,7 +326,48 @@ def _get_st2_webhooks_url():
     return url
 
 
+def _post_to_spool(body, verbose=False):
+    event = {
+        'body': body,
+        'headers': {
+            'X-ST2-Integration': 'sensu.',
+            'St2-Trace-Tag': body['payload']['id']
+        },
+        'trigger_type': {
+            'name': ST2_TRIGGERTYPE_NAME,
+            'pack': ST2_TRIGGERTYPE_PACK,
+            'description': 'Trigger type for sensu event handler.'
+        }
+    }
+
+    if verbose:
+        print('Spooling event to %s: %s' % (SPOOL_SOCKET, event))
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(SPOOL_TIMEOUT)
+    try:
+        sock.connect(SPOOL_SOCKET)
+        sock.sendall(json.dumps(event) + '\n')
+    except socket.error:
+        traceback.print_exc(limit=20)
+        sys.stderr.write('Spool daemon is not reachable on %s.\n' % SPOOL_SOCKET)
+        return False
+    finally:
+        sock.close()
+
+    sys.stdout.write('Spooled sensu event to %s.\n' % SPOOL_SOCKET)
+    return True
+
+
 def _post_webhook(url, body, verbose=False):
+    if SPOOL_SOCKET:
+        if _post_to_spool(body, verbose=verbose):
+            return
+
+        # Spool daemon is not running, fall back to posting the event directly
+        _set_auth_token(verbose=verbose)
+        _register_with_st2(verbose=verbose)
+
     headers = _get_st2_request_headers()
     headers['X-ST2-Integration'] = 'sensu.'
     headers['St2-Trace-Tag'] = body['payload']['id']
@@ -243,6 +386,9 @@ def _post_webhook(url, body, verbose=False):
             msg = 'Webhook URL %s does not exist. Check StackStorm installation!' % (url)
             raise Exception(msg)
 
+        if status == httplib.UNAUTHORIZED and _refresh_auth_token_from_state(verbose=verbose):
+            return _post_webhook(url=url, body=body, verbose=verbose)
+
         if status not in OK_CODES:
             sys.stderr.write('Failed posting sensu event to st2. HTTP_CODE: \
                 %d\n' % status)
@@ -281,11 +427,19 @@ def _post_event_to_st2(payload, verbose=False):
 def _register_with_st2(verbose=False):
     global REGISTERED_WITH_ST2
     try:
+        if not REGISTERED_WITH_ST2 and STATE_FILE and _is_trigger_registered_cached():
+            if verbose:
+                print('Trigger %s registration found in %s.' % (ST2_TRIGGERTYPE_REF, STATE_FILE))
+            REGISTERED_WITH_ST2 = True
+
         if not REGISTERED_WITH_ST2:
             if verbose:
                 print('Checking if trigger %s registered with st2.' % ST2_TRIGGERTYPE_REF)
             _register_trigger_with_st2(verbose=verbose)
             REGISTERED_WITH_ST2 = True
+
+            if STATE_FILE:
+                _cache_trigger_registered()
     except:
         traceback.print_exc(limit=20)
         sys.stderr.write(
@@ -306,6 +460,8 @@ def _set_config_opts(config_file, verbose=False, unauthed=False, ssl_verify=Fals
     global SENSU_PORT
     global SENSU_USER
     global SENSU_PASS
+    global SPOOL_SOCKET
+    global STATE_FILE
     global UNAUTHED
     global IS_API_KEY_AUTH
 
@@ -335,6 +491,8 @@ def _set_config_opts(config_file, verbose=False, unauthed=False, ssl_verify=Fals
         SENSU_PORT = config.get('sensu_port', '4567')
         SENSU_USER = config.get('sensu_user', None)
         SENSU_PASS = config.get('sensu_pass', None)
+        SPOOL_SOCKET = config.get('spool_socket', None)
+        STATE_FILE = config.get('state_file', None)
 
     if ST2_API_KEY:
         IS_API_KEY_AUTH = True
@@ -343,23 +501,67 @@ def _set_config_opts(config_file, verbose=False, unauthed=False, ssl_verify=Fals
         print('Unauthed? : %s' % UNAUTHED)
         print('API key auth?: %s' % IS_API_KEY_AUTH)
         print('SSL_VERIFY? : %s' % ST2_SSL_VERIFY)
+        print('Spool socket: %s' % SPOOL_SOCKET)
+        print('State file: %s' % STATE_FILE)
+
+    # With the spool daemon the token is only needed if the daemon is not reachable
+    if not SPOOL_SOCKET:
+        _set_auth_token(verbose=verbose)
+
+
+def _set_auth_token(verbose=False):
+    global ST2_AUTH_TOKEN
+    global AUTH_TOKEN_FROM_STATE
 
     if not UNAUTHED and not IS_API_KEY_AUTH:
         try:
+            if not ST2_AUTH_TOKEN and STATE_FILE:
+                ST2_AUTH_TOKEN = _get_cached_auth_token()
+                AUTH_TOKEN_FROM_STATE = bool(ST2_AUTH_TOKEN)
+                if verbose and ST2_AUTH_TOKEN:
+                    print('Using cached auth token from %s.' % STATE_FILE)
+
             if not ST2_AUTH_TOKEN:
                 if verbose:
                     print('No auth token found. Let\'s get one from StackStorm!')
                 ST2_AUTH_TOKEN = _get_auth_token(verbose=verbose)
+
+                if STATE_FILE:
+                    _cache_auth_token(ST2_AUTH_TOKEN)
         except:
             traceback.print_exc(limit=20)
             print('Unable to negotiate an auth token. Exiting!')
             sys.exit(1)
 
 
+def _refresh_auth_token_from_state(verbose=False):
+    """
+    Replace a cached auth token which has been rejected by st2 (e.g. revoked) with a new one.
+
+    Returns True if the token has been refreshed and the request should be retried.
+    """
+    global ST2_AUTH_TOKEN
+    global AUTH_TOKEN_FROM_STATE
+
+    if not AUTH_TOKEN_FROM_STATE:
+        return False
+
+    if verbose:
+        print('Cached auth token was rejected by st2, getting a new one.')
+
+    AUTH_TOKEN_FROM_STATE = False
+    ST2_AUTH_TOKEN = None
+    _cache_auth_token(None)
+    _set_auth_token(verbose=verbose)
+
+    return True
+
+
 def main(config_file, payload, verbose=False, unauthed=False, ssl_verify=False):
     _set_config_opts(config_file=config_file, unauthed=unauthed, verbose=verbose,
                      ssl_verify=ssl_verify)
-    _register_with_st2(verbose=verbose)
+    if not SPOOL_SOCKET:
+        _register_with_st2(verbose=verbose)
     _post_event_to_st2(payload, verbose=verbose)
 
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Benchmark which compares cold and warm st2_handler.py invocation latency.
+
+A "cold" invocation starts without a state file, so the handler has to get a
+new auth token and check the trigger type registration. A "warm" invocation
+reuses the token and registration cached in the state file by the previous
+invocations.
+
+The handler talks to a local fake st2 / Sensu API server which adds a
+configurable latency to every request to simulate a remote st2 installation.
+"""
+
+import argparse
+import BaseHTTPServer
+import json
+import os
+import shutil
+import SocketServer
+import tempfile
+import threading
+import time
+
+import yaml
+
+import st2_handler
+
+EVENT = json.dumps({
+    'client': {'name': 'benchmark_client'},
+    'check': {'name': 'benchmark_check'},
+    'id': 'benchmark-event-id'
+})
+
+
+class FakeAPIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/api/v1/triggertypes/'):
+            self._respond(200, {'ref': st2_handler.ST2_TRIGGERTYPE_REF})
+        else:
+            # Sensu stashes, nothing is silenced
+            self._respond(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader('content-length', 0)))
+
+        if self.path == '/auth/v1/tokens':
+            self._respond(201, {'token': 'benchmark-token'})
+        else:
+            self._respond(202, {})
+
+    def _respond(self, status, body):
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+
+        content = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAPIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), FakeAPIRequestHandler)
+        self.latency = latency
+        self.requests = 0
+
+
+def _reset_handler():
+    # Every handler invocation is a new process in production
+    st2_handler.ST2_AUTH_TOKEN = None
+    st2_handler.AUTH_TOKEN_FROM_STATE = False
+    st2_handler.REGISTERED_WITH_ST2 = False
+
+
+def _run(config_file, state_file, iterations, cold, server):
+    durations = []
+    requests = server.requests
+
+    for _ in range(iterations):
+        if cold and os.path.exists(state_file):
+            os.unlink(state_file)
+        _reset_handler()
+
+        start = time.time()
+        st2_handler.main(config_file=config_file, payload=EVENT)
+        durations.append(time.time() - start)
+
+    return {
+        'mean_ms': sum(durations) / len(durations) * 1000,
+        'max_ms': max(durations) * 1000,
+        'requests': float(server.requests - requests) / iterations
+    }
+
+
+def main(iterations, latency):
+    server = FakeAPIServer(latency=latency / 1000.0)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    base_url = 'http://127.0.0.1:%s' % server.server_address[1]
+    temp_dir = tempfile.mkdtemp()
+    config_file = os.path.join(temp_dir, 'st2_handler.conf')
+    state_file = os.path.join(temp_dir, 'st2_handler.state')
+
+    with open(config_file, 'w') as f:
+        yaml.safe_dump({
+            'st2_username': 'benchmark',
+            'st2_password': 'benchmark',
+            'st2_api_key': '',
+            'st2_api_base_url': base_url + '/api/v1/',
+            'st2_auth_base_url': base_url + '/auth/v1/',
+            'sensu_host': '127.0.0.1',
+            'sensu_port': server.server_address[1],
+            'state_file': state_file
+        }, f)
+
+    try:
+        results = [
+            ('cold', _run(config_file, state_file, iterations, cold=True, server=server)),
+            ('warm', _run(config_file, state_file, iterations, cold=False, server=server))
+        ]
+    finally:
+        server.shutdown()
+        shutil.rmtree(temp_dir)
+
+    print('%d iterations, %dms simulated latency per request' % (iterations, latency))
+    print('%-6s %12s %12s %16s' % ('mode', 'mean (ms)', 'max (ms)', 'requests/event'))
+    for mode, result in results:
+        print('%-6s %12.2f %12.2f %16.1f' % (mode, result['mean_ms'], result['max_ms'],
+                                             result['requests']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark st2_handler.py state caching.')
+    parser.add_argument('--iterations', '-n', type=int, default=50,
+                        help='Number of handler invocations per mode.')
+    parser.add_argument('--latency', '-l', type=int, default=20,
+                        help='Simulated latency of each API request in milliseconds.')
+    args = parser.parse_args()
+    main(iterations=args.iterations, latency=args.latency)
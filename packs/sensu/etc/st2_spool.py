@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+"""
+Long-running spool daemon for the StackStorm monitoring event handlers.
+
+Handlers write events as line-delimited JSON to a local unix socket and exit
+immediately. The daemon keeps a pooled keep-alive HTTP session to st2, caches
+the auth token until its TTL expires, remembers which trigger types are
+already registered and coalesces events into batches which are posted to the
+st2 webhook.
+
+Each line written to the socket is a JSON object of the following form:
+
+    {
+        "body": {"trigger": "pack.name", "payload": {...}},
+        "headers": {"St2-Trace-Tag": "..."},
+        "trigger_type": {"pack": "pack", "name": "name", "description": "..."}
+    }
+
+"headers" and "trigger_type" are optional. When "trigger_type" is provided,
+the daemon makes sure the trigger type is registered before posting events.
+"""
+
+import argparse
+import httplib
+try:
+    import simplejson as json
+except ImportError:
+    import json
+import os
+import Queue
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+from urlparse import urljoin
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    requests.packages.urllib3.disable_warnings()
+except ImportError:
+    raise ImportError('Missing dependency "requests". \
+        Do ``pip install requests``.')
+
+try:
+    import yaml
+except ImportError:
+    raise ImportError('Missing dependency "pyyaml". \
+        Do ``pip install pyyaml``.')
+
+ST2_AUTH_PATH = 'tokens'
+ST2_WEBHOOKS_PATH = 'webhooks/st2'
+ST2_TRIGGERS_PATH = 'triggertypes'
+
+DEFAULT_SOCKET_PATH = '/var/run/st2_spool.sock'
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_TOKEN_TTL = 60 * 60
+# Refresh the token this many seconds before it actually expires
+TOKEN_EXPIRY_MARGIN = 60
+MAX_POST_RETRIES = 3
+# Key under which the number of failed delivery attempts is stored in a spooled event
+RETRIES_KEY = '_spool_retries'
+
+OK_CODES = [httplib.OK, httplib.CREATED, httplib.ACCEPTED, httplib.CONFLICT]
+UNAUTHORIZED_CODES = [httplib.UNAUTHORIZED]
+
+TOKEN_AUTH_HEADER = 'X-Auth-Token'
+API_KEY_AUTH_HEADER = 'St2-Api-Key'
+
+
+class St2Client(object):
+    """
+    Keep-alive st2 API client which caches the auth token and the registered
+    trigger types for the whole lifetime of the daemon.
+    """
+
+    def __init__(self, config, verbose=False):
+        self._verbose = verbose
+        self._api_base_url = self._with_trailing_slash(config['st2_api_base_url'])
+        self._auth_base_url = self._with_trailing_slash(config.get('st2_auth_base_url', ''))
+        self._username = config.get('st2_username', None)
+        self._password = config.get('st2_password', None)
+        self._api_key = config.get('st2_api_key', None) or config.get('api_key', None)
+        self._unauthed = config.get('unauthed', False)
+        self._ssl_verify = config.get('ssl_verify', config.get('st2_verify_ssl', False))
+        self._token_ttl = config.get('spool_token_ttl', DEFAULT_TOKEN_TTL)
+        self._batch_posts = config.get('spool_batch_posts', False)
+
+        self._token = None
+        self._token_expiry = 0
+        self._registered_triggers = set()
+
+        pool_size = config.get('spool_pool_size', 4)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.verify = self._ssl_verify
+
+    def post_events(self, events):
+        """
+        Post a batch of spooled events to the st2 webhook.
+
+        Returns the list of events which could not be delivered.
+        """
+        for event in events:
+            trigger_type = event.get('trigger_type', None)
+            if trigger_type:
+                self._ensure_trigger_type(trigger_type)
+
+        url = urljoin(self._api_base_url, ST2_WEBHOOKS_PATH)
+
+        if self._batch_posts:
+            # Headers (e.g. St2-Trace-Tag) apply to a whole request, so only events with the
+            # same headers are posted together
+            failed = []
+            for headers, group in self._group_by_headers(events):
+                # Integration set by the handler (e.g. "sensu.") is kept
+                request_headers = {'X-ST2-Integration': 'spool.'}
+                request_headers.update(headers)
+                if not self._post(url, [event['body'] for event in group], request_headers):
+                    failed.extend(group)
+            return failed
+
+        failed = []
+        for event in events:
+            if not self._post(url, event['body'], event.get('headers', {})):
+                failed.append(event)
+
+        return failed
+
+    @staticmethod
+    def _group_by_headers(events):
+        groups = []
+        index = {}
+
+        for event in events:
+            headers = event.get('headers', None) or {}
+            key = tuple(sorted(headers.items()))
+            if key not in index:
+                index[key] = len(groups)
+                groups.append((headers, []))
+            groups[index[key]][1].append(event)
+
+        return groups
+
+    def _post(self, url, body, extra_headers):
+        headers = self._get_request_headers()
+        headers.update(extra_headers)
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        resp = self._session.post(url, data=json.dumps(body), headers=headers)
+
+        if resp.status_code in UNAUTHORIZED_CODES and self._token:
+            # Token was revoked or expired server side, get a new one and retry once
+            self._token = None
+            headers.update(self._get_request_headers())
+            resp = self._session.post(url, data=json.dumps(body), headers=headers)
+
+        if resp.status_code not in OK_CODES:
+            sys.stderr.write('Failed posting event to st2. HTTP_CODE: %d\n' % resp.status_code)
+            return False
+
+        if self._verbose:
+            print('Sent event to st2. HTTP_CODE: %d' % resp.status_code)
+
+        return True
+
+    def _get_request_headers(self):
+        headers = {}
+
+        if self._unauthed:
+            return headers
+
+        if self._api_key:
+            headers[API_KEY_AUTH_HEADER] = self._api_key
+        else:
+            headers[TOKEN_AUTH_HEADER] = self._get_auth_token()
+
+        return headers
+
+    def _get_auth_token(self):
+        if self._token and time.time() < self._token_expiry:
+            return self._token
+
+        auth_url = urljoin(self._auth_base_url, ST2_AUTH_PATH)
+        if self._verbose:
+            print('Will POST to URL %s to get auth token.' % auth_url)
+
+        resp = self._session.post(auth_url, json.dumps({'ttl': self._token_ttl}),
+                                  auth=(self._username, self._password))
+        if resp.status_code not in OK_CODES:
+            raise Exception('Cannot get a valid auth token from %s. HTTP_CODE: %s' % (
+                auth_url, resp.status_code))
+
+        self._token = resp.json()['token']
+        self._token_expiry = time.time() + self._token_ttl - TOKEN_EXPIRY_MARGIN
+
+        return self._token
+
+    def _ensure_trigger_type(self, trigger_type):
+        ref = '.'.join([trigger_type['pack'], trigger_type['name']])
+        if ref in self._registered_triggers:
+            return
+
+        triggers_url = urljoin(self._api_base_url, ST2_TRIGGERS_PATH)
+        headers = self._get_request_headers()
+
+        resp = self._session.get(urljoin(triggers_url + '/', ref), headers=headers)
+        if resp.status_code != httplib.OK or len(resp.json()) == 0:
+            headers['Content-Type'] = 'application/json; charset=utf-8'
+            resp = self._session.post(triggers_url, data=json.dumps(trigger_type),
+                                      headers=headers)
+            if resp.status_code not in OK_CODES:
+                raise Exception('Failed to register trigger type %s with st2. HTTP_CODE: %s' %
+                                (ref, resp.status_code))
+            print('Registered trigger type %s with st2.' % ref)
+
+        self._registered_triggers.add(ref)
+
+    @staticmethod
+    def _with_trailing_slash(url):
+        if url and not url.endswith('/'):
+            url += '/'
+        return url
+
+
+class SpoolRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                event = json.loads(line)
+            except ValueError:
+                sys.stderr.write('Ignoring invalid spool event: %s\n' % line)
+                continue
+
+            try:
+                self.server.events.put_nowait(event)
+            except Queue.Full:
+                sys.stderr.write('Spool queue is full, dropping event.\n')
+
+
+class SpoolServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, events):
+        self.events = events
+        SocketServer.UnixStreamServer.__init__(self, socket_path, SpoolRequestHandler)
+
+
+class Spooler(object):
+    """
+    Drains the event queue and posts coalesced batches of events to st2.
+    """
+
+    def __init__(self, client, events, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self._client = client
+        self._events = events
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+    def run(self):
+        while True:
+            batch = self._get_batch()
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch):
+        try:
+            failed = self._client.post_events(batch)
+        except Exception:
+            traceback.print_exc(limit=20)
+            failed = batch
+
+        if not failed:
+            return
+
+        # Each event has its own retry count so events which keep failing don't cause
+        # other events to be dropped (and vice versa)
+        retry = []
+        for event in failed:
+            event[RETRIES_KEY] = event.get(RETRIES_KEY, 0) + 1
+            if event[RETRIES_KEY] > MAX_POST_RETRIES:
+                sys.stderr.write('Dropping event after %d attempts.\n' % MAX_POST_RETRIES)
+                continue
+            retry.append(event)
+
+        if not retry:
+            return
+
+        # Back off before putting undelivered events back to the queue
+        retries = max([event[RETRIES_KEY] for event in retry])
+        time.sleep(self._flush_interval * (2 ** retries))
+        for event in retry:
+            try:
+                self._events.put_nowait(event)
+            except Queue.Full:
+                sys.stderr.write('Spool queue is full, dropping event.\n')
+
+    def _get_batch(self):
+        batch = []
+        deadline = time.time() + self._flush_interval
+
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(self._events.get(timeout=timeout))
+            except Queue.Empty:
+                break
+
+        return batch
+
+
+def main(config_file, socket_path=None, verbose=False):
+    if not os.path.exists(config_file):
+        print('Configuration file %s not found. Exiting!!!' % config_file)
+        sys.exit(1)
+
+    with open(config_file) as f:
+        config = yaml.safe_load(f)
+
+    socket_path = socket_path or config.get('spool_socket', None) or DEFAULT_SOCKET_PATH
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    events = Queue.Queue(maxsize=config.get('spool_queue_size', DEFAULT_QUEUE_SIZE))
+    client = St2Client(config=config, verbose=verbose)
+    spooler = Spooler(client=client, events=events,
+                      batch_size=config.get('spool_batch_size', DEFAULT_BATCH_SIZE),
+                      flush_interval=config.get('spool_flush_interval', DEFAULT_FLUSH_INTERVAL))
+
+    server = SpoolServer(socket_path, events)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    print('Spooling events from %s' % socket_path)
+    try:
+        spooler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        os.unlink(socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='StackStorm event handler spool daemon.')
+    parser.add_argument('config_path',
+                        help='Path to the handler configuration file.')
+    parser.add_argument('--socket', '-s', required=False,
+                        help='Path to the unix socket to listen on.')
+    parser.add_argument('--verbose', '-v', required=False, action='store_true',
+                        help='Verbose mode.')
+    args = parser.parse_args()
+    main(config_file=args.config_path, socket_path=args.socket, verbose=args.verbose)
@@ -1,4 +1,7 @@
 import json
+import os
+import shutil
+import tempfile
 
 import mock
 import requests
@@ -194,3 +197,90 @@ class SensuHandlerTestCase(unittest2.TestCase):
         with self.assertRaises(SystemExit) as cm:
             sensu_handler._post_event_to_st2(json.dumps(trigger_payload))
         self.assertEqual(cm.exception.code, 0)
+
+    @mock.patch.object(sensu_handler, 'SPOOL_SOCKET', '/tmp/st2_spool.sock')
+    @mock.patch('st2_handler._post_to_spool', mock.MagicMock(return_value=True))
+    @mock.patch.object(requests, 'post', mock.MagicMock())
+    def test_post_webhook_spooled(self):
+        body = {'trigger': 'sensu.event_handler', 'payload': {'id': 'foo-check-id'}}
+        sensu_handler._post_webhook('https://localhost/api/v1/webhooks/st2', body)
+        sensu_handler._post_to_spool.assert_called_once_with(body, verbose=False)
+        self.assertFalse(requests.post.called)
+
+    @mock.patch.object(sensu_handler, 'SPOOL_SOCKET', '/tmp/st2_spool.sock')
+    @mock.patch('st2_handler._post_to_spool', mock.MagicMock(return_value=False))
+    @mock.patch('st2_handler._register_with_st2')
+    @mock.patch('st2_handler._set_auth_token')
+    @responses.activate
+    def test_post_webhook_spool_unavailable(self, mock_set_auth_token, mock_register):
+        responses.add(
+            responses.POST, 'https://localhost/api/v1/webhooks/st2',
+            json={}, status=202
+        )
+        body = {'trigger': 'sensu.event_handler', 'payload': {'id': 'foo-check-id'}}
+        sensu_handler._post_webhook('https://localhost/api/v1/webhooks/st2', body)
+        self.assertTrue(mock_set_auth_token.called)
+        self.assertTrue(mock_register.called)
+        self.assertEqual(len(responses.calls), 1)
+
+    @mock.patch.object(sensu_handler, 'SPOOL_SOCKET', '/tmp/does-not-exist.sock')
+    def test_post_to_spool_daemon_not_running(self):
+        body = {'trigger': 'sensu.event_handler', 'payload': {'id': 'foo-check-id'}}
+        self.assertFalse(sensu_handler._post_to_spool(body))
+
+    def _setup_state_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        sensu_handler.STATE_FILE = os.path.join(temp_dir, 'state.json')
+        self.addCleanup(setattr, sensu_handler, 'STATE_FILE', None)
+
+    @responses.activate
+    def test_auth_token_cached_in_state_file(self):
+        self._setup_state_file()
+        sensu_handler.ST2_AUTH_BASE_URL = 'https://localhost/auth/v1/'
+        sensu_handler.ST2_USERNAME = 'foo'
+        sensu_handler.UNAUTHED = False
+        sensu_handler.IS_API_KEY_AUTH = False
+        self.addCleanup(setattr, sensu_handler, 'ST2_AUTH_TOKEN', None)
+        self.addCleanup(setattr, sensu_handler, 'AUTH_TOKEN_FROM_STATE', False)
+        responses.add(
+            responses.POST, 'https://localhost/auth/v1/tokens',
+            json={'token': 'your_auth_token'}, status=201
+        )
+
+        # Simulate two separate handler invocations
+        for _ in range(2):
+            sensu_handler.ST2_AUTH_TOKEN = None
+            sensu_handler._set_auth_token()
+            self.assertEqual(sensu_handler.ST2_AUTH_TOKEN, 'your_auth_token')
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertTrue(sensu_handler.AUTH_TOKEN_FROM_STATE)
+
+    @mock.patch('st2_handler.time.time', mock.MagicMock(return_value=1000))
+    def test_expired_auth_token_not_used(self):
+        self._setup_state_file()
+        sensu_handler.ST2_AUTH_BASE_URL = 'https://localhost/auth/v1/'
+        sensu_handler.ST2_USERNAME = 'foo'
+        sensu_handler._cache_auth_token('your_auth_token')
+        self.assertEqual(sensu_handler._get_cached_auth_token(), 'your_auth_token')
+
+        sensu_handler.time.time.return_value = 1000 + sensu_handler.ST2_AUTH_TOKEN_TTL
+        self.assertEqual(sensu_handler._get_cached_auth_token(), None)
+
+    @responses.activate
+    def test_trigger_registration_cached_in_state_file(self):
+        self._setup_state_file()
+        sensu_handler.ST2_API_BASE_URL = 'https://localhost/api/v1/'
+        responses.add(
+            responses.GET, 'https://localhost/api/v1/triggertypes/sensu.event_handler',
+            json={'type': 'sensu.event_handler'}, status=200
+        )
+
+        # Simulate two separate handler invocations
+        for _ in range(2):
+            sensu_handler.REGISTERED_WITH_ST2 = False
+            sensu_handler._register_with_st2()
+            self.assertTrue(sensu_handler.REGISTERED_WITH_ST2)
+
+        self.assertEqual(len(responses.calls), 1)
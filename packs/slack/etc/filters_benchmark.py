@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark for the Slack sensor message filter and formatting stripping.
+
+Builds a synthetic corpus of RTM message events (short chat messages, messages with links, long
+pasted logs and messages in ignored channels) and measures how long it takes to filter the
+corpus and to strip formatting from the message text compared to the previous per-call
+``re.sub`` implementation.
+
+Usage: python etc/filters_benchmark.py --messages 20000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../sensors'))
+
+from lib.filters import MessageFilter  # noqa
+from lib.filters import strip_formatting  # noqa
+
+WORDS = ['deploy', 'build', 'failed', 'prod', 'staging', 'rollback', 'ok', 'thanks', 'lunch',
+         'st2', 'please', 'check', 'the', 'logs', 'alert', 'server', 'restart', 'done']
+
+CHANNELS = ['C0000001', 'C0000002', 'C0000003', 'G0000001']
+
+
+def legacy_strip_formatting(text):
+    return re.sub("<http.*[|](.*)>", "\\1", text)
+
+
+def build_message(index):
+    kind = index % 10
+    words = [random.choice(WORDS) for _ in range(random.randint(3, 20))]
+
+    if kind in (0, 1):
+        # Message with links
+        words.insert(1, '<https://ci.example.com/job/%d|build #%d>' % (index, index))
+        words.append('<https://example.com/docs/%d|docs>' % (index))
+    elif kind == 2:
+        # Long pasted log output
+        words = ['%s <http://example.com/%d' % (' '.join(words), line)
+                 for line in range(random.randint(50, 200))]
+
+    return {
+        'type': 'message',
+        'user': 'U%07d' % (index % 50),
+        'channel': CHANNELS[index % len(CHANNELS)],
+        'ts': '%d.000%d' % (1450000000 + index, index % 10),
+        'text': ' '.join(words)
+    }
+
+
+def build_corpus(message_count):
+    random.seed(42)
+    corpus = [build_message(index) for index in range(message_count)]
+
+    # Events which are not messages or are message edits / joins
+    for index in range(0, message_count, 20):
+        corpus[index] = dict(corpus[index], subtype='message_changed')
+
+    return corpus
+
+
+def run(name, func, items, iterations):
+    durations = []
+
+    for _ in range(iterations):
+        start = time.time()
+        for item in items:
+            func(item)
+        durations.append(time.time() - start)
+
+    print('%-40s best: %8.2fms  mean: %8.2fms' % (name, min(durations) * 1000,
+                                                  sum(durations) / len(durations) * 1000))
+
+
+def main(message_count, iterations):
+    corpus = build_corpus(message_count)
+    texts = [item['text'] for item in corpus]
+    print('%d messages (%d bytes of text), %d iterations' % (
+        len(corpus), sum([len(text) for text in texts]), iterations))
+
+    run('strip formatting (re.sub per call)', legacy_strip_formatting, texts, iterations)
+    run('strip formatting (precompiled)', strip_formatting, texts, iterations)
+
+    filters = [
+        ('filter (event type only)', {}),
+        ('filter (channels)', {'channels_deny': ['C0000003']}),
+        ('filter (channels, size, patterns)', {'channels_allow': CHANNELS[:3],
+                                               'max_length': 4000,
+                                               'patterns': [r'\bdeploy\b', r'\bfailed\b',
+                                                            r'^st2 ']})
+    ]
+
+    for name, config in filters:
+        message_filter = MessageFilter.from_config(event_types=['message'], config=config)
+        run(name, message_filter.match, corpus, iterations)
+
+    filtered = dict([(reason, count / iterations) for reason, count
+                     in message_filter.filtered_counts.items()])
+    print('passed: %d filtered: %s' % (message_filter.passed_count / iterations, filtered))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Slack sensor message filtering.')
+    parser.add_argument('--messages', type=int, default=20000,
+                        help='Number of messages in the corpus.')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Number of iterations.')
+    args = parser.parse_args()
+    main(message_count=args.messages, iterations=args.iterations)
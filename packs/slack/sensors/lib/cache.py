@@ -0,0 +1,155 @@
+import time
+from collections import OrderedDict
+
+from eventlet.event import Event
+
+__all__ = [
+    'LRUCache',
+    'ResourceCache'
+]
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL = 3600
+DEFAULT_NEGATIVE_TTL = 60
+
+# Headroom on top of the number of resources returned by populate() so resources created
+# after the warm-up don't immediately evict the existing ones
+POPULATE_HEADROOM = 1.1
+
+# Cached value for ids which don't exist
+MISSING = object()
+
+
+class LRUCache(object):
+    """
+    Bounded cache which evicts the least recently used items once it's full and items which
+    haven't been updated for ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # key -> (expiration time, value)
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at and expires_at < time.time():
+            return None
+
+        # Re-insert the item so it becomes the most recently used one
+        self._items[key] = item
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        :param ttl: Number of seconds after which the item expires. Defaults to ``self.ttl``.
+        :type ttl: ``int``
+        """
+        ttl = ttl or self.ttl
+
+        self._items.pop(key, None)
+        self._items[key] = (time.time() + ttl if ttl else None, value)
+
+        while self.max_size and len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def delete(self, key):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+class ResourceCache(object):
+    """
+    LRU cache of API resources (users, channels, ...) which are retrieved by id.
+
+    Concurrent misses for the same id are coalesced so only a single API request is made and
+    the other callers wait for its result. Ids which don't exist are cached for
+    ``negative_ttl`` seconds so repeated lookups of them don't hit the API every time.
+    """
+
+    def __init__(self, fetch_func, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        """
+        :param fetch_func: Function which receives an id and returns a resource or ``None`` if
+                           the resource doesn't exist.
+        :type fetch_func: ``callable``
+
+        :param max_size: Minimum number of cached resources. The cache grows to fit all the
+                         resources passed to :meth:`populate`.
+        :type max_size: ``int``
+
+        :param negative_ttl: Number of seconds for which ids which don't exist are cached. Set
+                             it to 0 to disable caching of such ids.
+        :type negative_ttl: ``int``
+        """
+        self._fetch_func = fetch_func
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._min_size = max_size
+        self._negative_ttl = negative_ttl
+
+        # id -> Event which is sent when the request in progress completes
+        self._pending = {}
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, id):
+        value = self._cache.get(id)
+        if value is not None:
+            self.hit_count += 1
+            return value if value is not MISSING else None
+
+        event = self._pending.get(id)
+        if event:
+            return event.wait()
+
+        self.miss_count += 1
+        event = Event()
+        self._pending[id] = event
+
+        value = None
+        try:
+            value = self._fetch_func(id)
+
+            if value is not None:
+                self._cache.set(id, value)
+            elif self._negative_ttl:
+                self._cache.set(id, MISSING, ttl=self._negative_ttl)
+        finally:
+            del self._pending[id]
+            event.send(value)
+
+        return value
+
+    def populate(self, resources, id_attribute='id'):
+        """
+        Add or refresh multiple resources (e.g. from a list API call).
+
+        If there are more resources than the cache can hold, the cache is grown so all of them
+        (plus some headroom) fit and the warm-up isn't immediately evicted.
+        """
+        resources = list(resources)
+
+        if self._cache.max_size:
+            size = int(len(resources) * POPULATE_HEADROOM)
+            self._cache.max_size = max(self._min_size, size)
+
+        for resource in resources:
+            self._cache.set(resource[id_attribute], resource)
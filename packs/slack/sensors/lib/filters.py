@@ -0,0 +1,123 @@
+import re
+
+__all__ = [
+    'MessageFilter',
+    'strip_formatting'
+]
+
+# Links are formatted as <http://example.com|example.com>. URLs can't contain whitespace and
+# "<" and ">" are always escaped in the message text so a match attempt never scans past the
+# current link.
+LINK_RE = re.compile(r'<(?:https?|mailto):[^|<>\s]*\|([^<>]*)>')
+
+# Reasons messages are filtered out (used as metric names)
+REASON_EVENT_TYPE = 'event_type'
+REASON_CHANNEL = 'channel'
+REASON_SIZE = 'size'
+REASON_PATTERN = 'pattern'
+
+REASONS = [
+    REASON_EVENT_TYPE,
+    REASON_CHANNEL,
+    REASON_SIZE,
+    REASON_PATTERN
+]
+
+
+def strip_formatting(text):
+    """
+    Replace formatted links with their labels.
+    """
+    if '<' not in text:
+        return text
+
+    return LINK_RE.sub(r'\1', text)
+
+
+class MessageFilter(object):
+    """
+    Decides which messages are dispatched before any users and channels are looked up and the
+    trigger payload is constructed.
+
+    All the patterns are compiled once into a single regular expression when the filter is
+    created.
+    """
+
+    def __init__(self, event_types, channels_allow=None, channels_deny=None, patterns=None,
+                 max_length=None):
+        """
+        :param channels_allow: Only messages posted to these channel ids are dispatched.
+        :type channels_allow: ``list``
+
+        :param channels_deny: Messages posted to these channel ids are never dispatched.
+        :type channels_deny: ``list``
+
+        :param patterns: Regular expressions, only messages which text matches at least one of
+                         them are dispatched.
+        :type patterns: ``list``
+
+        :param max_length: Messages with longer text are not dispatched.
+        :type max_length: ``int``
+        """
+        self._event_types = frozenset(event_types)
+        self._channels_allow = frozenset(channels_allow) if channels_allow else None
+        self._channels_deny = frozenset(channels_deny or [])
+        self._max_length = max_length
+
+        if patterns:
+            pattern = '|'.join(['(?:%s)' % (pattern) for pattern in patterns])
+            self._pattern = re.compile(pattern, re.UNICODE)
+        else:
+            self._pattern = None
+
+        self.passed_count = 0
+        self.filtered_counts = dict([(reason, 0) for reason in REASONS])
+
+    @classmethod
+    def from_config(cls, event_types, config):
+        config = config or {}
+        return cls(event_types=event_types,
+                   channels_allow=config.get('channels_allow', None),
+                   channels_deny=config.get('channels_deny', None),
+                   patterns=config.get('patterns', None),
+                   max_length=config.get('max_length', None))
+
+    @property
+    def filtered_count(self):
+        return sum(self.filtered_counts.values())
+
+    def match(self, data):
+        """
+        :param data: Event returned by the RTM API.
+        :type data: ``dict``
+
+        :rtype: ``bool``
+        """
+        reason = self._get_filter_reason(data)
+
+        if reason:
+            self.filtered_counts[reason] += 1
+            return False
+
+        self.passed_count += 1
+        return True
+
+    def _get_filter_reason(self, data):
+        if data.get('type') not in self._event_types or 'subtype' in data:
+            return REASON_EVENT_TYPE
+
+        channel_id = data.get('channel', '')
+        if channel_id in self._channels_deny:
+            return REASON_CHANNEL
+
+        if self._channels_allow is not None and channel_id not in self._channels_allow:
+            return REASON_CHANNEL
+
+        text = data.get('text', '')
+        if self._max_length and len(text) > self._max_length:
+            return REASON_SIZE
+
+        if self._pattern and not self._pattern.search(text):
+            return REASON_PATTERN
+
+        return None
@@ -1,11 +1,15 @@
 import json
-import re
+import time
 
 import eventlet
 from slackclient import SlackClient
 
 from st2reactor.sensor.base import PollingSensor
 
+from lib.cache import ResourceCache
+from lib.filters import MessageFilter
+from lib.filters import strip_formatting
+
 eventlet.monkey_patch(
     os=True,
     select=True,
@@ -17,6 +21,18 @@ EVENT_TYPE_WHITELIST = [
     'message'
 ]
 
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_CACHE_NEGATIVE_TTL = 60
+DEFAULT_CACHE_REFRESH_INTERVAL = 900
+DEFAULT_CHECKPOINT_INTERVAL = 5
+
+# Number of items requested per page when warming up the caches
+LIST_PAGE_SIZE = 200
+
+# Maximum number of concurrent API requests for users and channels which are not cached
+PREFETCH_POOL_SIZE = 10
+
 
 class SlackSensor(PollingSensor):
     DATASTORE_KEY_NAME = 'last_message_timestamp'
@@ -29,15 +45,37 @@ class SlackSensor(PollingSensor):
         self._token = self._config['sensor']['token']
         self._strip_formatting = self._config['sensor'].get('strip_formatting',
                                                             False)
+        self._cache_refresh_interval = self._config['sensor'].get(
+            'cache_refresh_interval', DEFAULT_CACHE_REFRESH_INTERVAL)
+        self._checkpoint_interval = self._config['sensor'].get('checkpoint_interval',
+                                                               DEFAULT_CHECKPOINT_INTERVAL)
         self._handlers = {
             'message': self._handle_message_ignore_errors,
         }
-
-        self._user_info_cache = {}
-        self._channel_info_cache = {}
-        self._group_info_cache = {}
+        self._filter = MessageFilter.from_config(event_types=EVENT_TYPE_WHITELIST,
+                                                 config=self._config['sensor'].get('filters'))
+        self._dispatched_count = 0
+
+        cache_size = self._config['sensor'].get('cache_size', DEFAULT_CACHE_SIZE)
+        cache_ttl = self._config['sensor'].get('cache_ttl', DEFAULT_CACHE_TTL)
+        cache_negative_ttl = self._config['sensor'].get('cache_negative_ttl',
+                                                        DEFAULT_CACHE_NEGATIVE_TTL)
+
+        self._user_info_cache = ResourceCache(fetch_func=self._fetch_user_info,
+                                              max_size=cache_size, ttl=cache_ttl,
+                                              negative_ttl=cache_negative_ttl)
+        self._channel_info_cache = ResourceCache(fetch_func=self._fetch_channel_info,
+                                                 max_size=cache_size, ttl=cache_ttl,
+                                                 negative_ttl=cache_negative_ttl)
+        self._group_info_cache = ResourceCache(fetch_func=self._fetch_group_info,
+                                               max_size=cache_size, ttl=cache_ttl,
+                                               negative_ttl=cache_negative_ttl)
+        self._prefetch_pool = eventlet.GreenPool(PREFETCH_POOL_SIZE)
+        self._refresh_thread = None
 
         self._last_message_timestamp = None
+        self._persisted_message_timestamp = None
+        self._last_checkpoint_time = 0
 
     def setup(self):
         self._client = SlackClient(self._token)
@@ -47,14 +85,18 @@ class SlackSensor(PollingSensor):
             msg = 'Failed to connect to the Slack API. Invalid token?'
             raise Exception(msg)
 
-        self._populate_cache(user_data=self._api_call('users.list'),
-                             channel_data=self._api_call('channels.list'),
-                             group_data=self._api_call('groups.list'),)
+        self._populate_cache()
+
+        if self._cache_refresh_interval:
+            self._refresh_thread = eventlet.spawn(self._refresh_cache_loop)
 
     def poll(self):
         result = self._client.rtm_read()
 
         if not result:
+            # Persist the timestamp which wasn't checkpointed yet because of the debounce, so
+            # it isn't lost (or delayed until the next message) when the channels go quiet
+            self._checkpoint()
             return
 
         last_message_timestamp = self._handle_result(result=result)
@@ -64,7 +106,11 @@ class SlackSensor(PollingSensor):
                 last_message_timestamp=last_message_timestamp)
 
     def cleanup(self):
-        pass
+        if self._refresh_thread:
+            self._refresh_thread.kill()
+            self._refresh_thread = None
+
+        self._checkpoint(force=True)
 
     def add_trigger(self, trigger):
         pass
@@ -75,6 +121,19 @@ class SlackSensor(PollingSensor):
     def remove_trigger(self, trigger):
         pass
 
+    def get_metrics(self):
+        """
+        Return number of dispatched messages and number of messages which have been filtered
+        out for each of the reasons.
+
+        :rtype: ``dict``
+        """
+        return {
+            'dispatched': self._dispatched_count,
+            'filtered': self._filter.filtered_count,
+            'filtered_by_reason': dict(self._filter.filtered_counts)
+        }
+
     def _get_last_message_timestamp(self):
         """
         :rtype: ``int``
@@ -83,30 +142,82 @@ class SlackSensor(PollingSensor):
             name = self.DATASTORE_KEY_NAME
             value = self._sensor_service.get_value(name=name)
             self._last_message_timestamp = int(value) if value else 0
+            self._persisted_message_timestamp = self._last_message_timestamp
 
         return self._last_message_timestamp
 
     def _set_last_message_timestamp(self, last_message_timestamp):
         self._last_message_timestamp = last_message_timestamp
+        self._checkpoint()
+        return last_message_timestamp
+
+    def _checkpoint(self, force=False):
+        """
+        Persist the last message timestamp in the datastore, at most once every
+        ``checkpoint_interval`` seconds unless ``force`` is True.
+        """
+        if self._last_message_timestamp == self._persisted_message_timestamp:
+            return
+
+        now = time.time()
+        if not force and now - self._last_checkpoint_time < self._checkpoint_interval:
+            return
+
         name = self.DATASTORE_KEY_NAME
-        value = str(last_message_timestamp)
+        value = str(self._last_message_timestamp)
         self._sensor_service.set_value(name=name, value=value)
-        return last_message_timestamp
 
-    def _populate_cache(self, user_data, channel_data, group_data):
+        self._persisted_message_timestamp = self._last_message_timestamp
+        self._last_checkpoint_time = now
+
+    def _populate_cache(self):
+        """
+        Populate users, channels and group cache using (paginated) list API calls.
+        """
+        self._user_info_cache.populate(self._api_call_paginated('users.list', 'members'))
+        self._channel_info_cache.populate(self._api_call_paginated('channels.list',
+                                                                   'channels'))
+        self._group_info_cache.populate(self._api_call_paginated('groups.list', 'groups'))
+
+    def _refresh_cache_loop(self):
+        while True:
+            eventlet.sleep(self._cache_refresh_interval)
+
+            try:
+                self._populate_cache()
+            except Exception as exc:
+                self._logger.warn('Failed to refresh Slack user and channel cache: %s' % exc)
+
+    def _prefetch(self, items):
         """
-        Populate users, channels and group cache from info which is returned on
-        rtm.start
+        Retrieve users and channels referenced in the messages which are not cached yet
+        concurrently so the messages can be dispatched without blocking on each of them.
         """
+        lookups = set()
 
-        for user in user_data.get('members', []):
-            self._user_info_cache[user['id']] = user
+        for item in items:
+            if item.get('user'):
+                lookups.add((self._user_info_cache, item['user']))
 
-        for channel in channel_data.get('channels', []):
-            self._channel_info_cache[channel['id']] = channel
+            channel_id = item.get('channel', '')
+            if channel_id.startswith('C'):
+                lookups.add((self._channel_info_cache, channel_id))
+            elif channel_id.startswith('G'):
+                lookups.add((self._group_info_cache, channel_id))
+
+        if len(lookups) < 2:
+            return
 
-        for group in group_data.get('groups', []):
-            self._group_info_cache[group['id']] = group
+        for cache, id in lookups:
+            self._prefetch_pool.spawn_n(self._prefetch_ignore_errors, cache, id)
+
+        self._prefetch_pool.waitall()
+
+    def _prefetch_ignore_errors(self, cache, id):
+        try:
+            cache.get(id)
+        except Exception as exc:
+            self._logger.debug('Failed to retrieve info for %s: %s' % (id, exc))
 
     def _handle_result(self, result):
         """
@@ -114,9 +225,9 @@ class SlackSensor(PollingSensor):
         """
         existing_last_message_timestamp = self._get_last_message_timestamp()
         new_last_message_timestamp = existing_last_message_timestamp
+        items = []
 
         for item in result:
-            item_type = item['type']
             item_timestamp = int(float(item.get('ts', 0)))
 
             if (existing_last_message_timestamp and
@@ -127,18 +238,21 @@ class SlackSensor(PollingSensor):
             if item_timestamp > new_last_message_timestamp:
                 new_last_message_timestamp = item_timestamp
 
-            handler_func = self._handlers.get(item_type, lambda data: data)
+            # Drop messages which shouldn't be dispatched before resolving any user or
+            # channel information
+            if self._filter.match(item):
+                items.append(item)
+
+        self._prefetch(items=items)
+
+        for item in items:
+            handler_func = self._handlers.get(item['type'], lambda data: data)
             handler_func(data=item)
 
         return new_last_message_timestamp
 
     def _handle_message(self, data):
         trigger = 'slack.message'
-        event_type = data['type']
-
-        if event_type not in EVENT_TYPE_WHITELIST or 'subtype' in data:
-            # Skip unsupported event
-            return
 
         # Note: We resolve user and channel information to provide more context
         user_info = self._get_user_info(user_id=data['user'])
@@ -156,7 +270,7 @@ class SlackSensor(PollingSensor):
 
         # Removes formatting from messages if enabled by the user in config
         if self._strip_formatting:
-            text = re.sub("<http.*[|](.*)>", "\\1", data['text'])
+            text = strip_formatting(data['text'])
         else:
             text = data['text']
 
@@ -185,6 +299,7 @@ class SlackSensor(PollingSensor):
         }
 
         self._sensor_service.dispatch(trigger=trigger, payload=payload)
+        self._dispatched_count += 1
 
     def _handle_message_ignore_errors(self, data):
         try:
@@ -195,45 +310,55 @@ class SlackSensor(PollingSensor):
             pass
 
     def _get_user_info(self, user_id):
-        if user_id not in self._user_info_cache:
-            result = self._api_call('users.info', user=user_id)
-
-            if 'user' not in result:
-                # User doesn't exist or other error
-                return None
-
-            result = result['user']
-            self._user_info_cache[user_id] = result
-
-        return self._user_info_cache[user_id]
+        return self._user_info_cache.get(user_id)
 
     def _get_channel_info(self, channel_id):
-        if channel_id not in self._channel_info_cache:
-            result = self._api_call('channels.info', channel=channel_id)
+        return self._channel_info_cache.get(channel_id)
 
-            if 'channel' not in result:
-                # Channel doesn't exist or other error
-                return None
+    def _get_group_info(self, group_id):
+        return self._group_info_cache.get(group_id)
 
-            result = result['channel']
-            self._channel_info_cache[channel_id] = result
+    def _fetch_user_info(self, user_id):
+        result = self._api_call('users.info', user=user_id)
 
-        return self._channel_info_cache[channel_id]
+        # User doesn't exist or other error
+        return result.get('user', None)
 
-    def _get_group_info(self, group_id):
-        if group_id not in self._group_info_cache:
-            result = self._api_call('groups.info', channel=group_id)
-            self._logger.warn('GROUP DATA: %s' % result)
-            if 'group' not in result:
-                # Group doesn't exist or other error
-                return None
+    def _fetch_channel_info(self, channel_id):
+        result = self._api_call('channels.info', channel=channel_id)
 
-            result = result['group']
-            self._group_info_cache[group_id] = result
+        # Channel doesn't exist or other error
+        return result.get('channel', None)
 
-        return self._group_info_cache[group_id]
+    def _fetch_group_info(self, group_id):
+        result = self._api_call('groups.info', channel=group_id)
+
+        # Group doesn't exist or other error
+        return result.get('group', None)
 
     def _api_call(self, method, **kwargs):
         result = self._client.api_call(method, **kwargs)
         result = json.loads(result)
         return result
+
+    def _api_call_paginated(self, method, key, **kwargs):
+        """
+        Retrieve all the pages of a list API call.
+
+        :param key: Name of the response attribute which contains the items.
+        """
+        items = []
+        cursor = None
+
+        while True:
+            if cursor:
+                kwargs['cursor'] = cursor
+
+            result = self._api_call(method, limit=LIST_PAGE_SIZE, **kwargs)
+            items.extend(result.get(key, []))
+
+            cursor = result.get('response_metadata', {}).get('next_cursor', None)
+            if not cursor:
+                break
+
+        return items
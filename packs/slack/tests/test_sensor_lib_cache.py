@@ -0,0 +1,109 @@
+import time
+
+import eventlet
+import mock
+import unittest2
+
+from lib.cache import LRUCache
+from lib.cache import ResourceCache
+
+__all__ = [
+    'LRUCacheTestCase',
+    'ResourceCacheTestCase'
+]
+
+
+class LRUCacheTestCase(unittest2.TestCase):
+
+    def test_least_recently_used_item_is_evicted(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_items_expire(self):
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=100)
+
+        with mock.patch('lib.cache.time.time', mock.Mock(return_value=time.time() + 11)):
+            self.assertEqual(cache.get('a'), None)
+            self.assertEqual(cache.get('b'), 2)
+
+
+class ResourceCacheTestCase(unittest2.TestCase):
+
+    def setUp(self):
+        super(ResourceCacheTestCase, self).setUp()
+        self.resources = {'U1': {'id': 'U1'}, 'U2': {'id': 'U2'}}
+        self.fetched = []
+
+    def _fetch(self, id):
+        self.fetched.append(id)
+        eventlet.sleep(0)
+        return self.resources.get(id, None)
+
+    def test_resources_are_cached(self):
+        cache = ResourceCache(fetch_func=self._fetch)
+
+        self.assertEqual(cache.get('U1'), {'id': 'U1'})
+        self.assertEqual(cache.get('U1'), {'id': 'U1'})
+        self.assertEqual(self.fetched, ['U1'])
+        self.assertEqual((cache.hit_count, cache.miss_count), (1, 1))
+
+    def test_concurrent_misses_are_coalesced(self):
+        cache = ResourceCache(fetch_func=self._fetch)
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(cache.get, ['U1'] * 5))
+
+        self.assertEqual(results, [{'id': 'U1'}] * 5)
+        self.assertEqual(self.fetched, ['U1'])
+
+    def test_missing_resources_are_cached_for_negative_ttl(self):
+        cache = ResourceCache(fetch_func=self._fetch, ttl=3600, negative_ttl=60)
+
+        self.assertEqual(cache.get('U3'), None)
+        self.assertEqual(cache.get('U3'), None)
+        self.assertEqual(self.fetched, ['U3'])
+
+        self.resources['U3'] = {'id': 'U3'}
+        with mock.patch('lib.cache.time.time', mock.Mock(return_value=time.time() + 61)):
+            self.assertEqual(cache.get('U3'), {'id': 'U3'})
+        self.assertEqual(self.fetched, ['U3', 'U3'])
+
+    def test_missing_resources_are_not_cached_without_negative_ttl(self):
+        cache = ResourceCache(fetch_func=self._fetch, negative_ttl=0)
+
+        self.assertEqual(cache.get('U3'), None)
+        self.assertEqual(cache.get('U3'), None)
+        self.assertEqual(self.fetched, ['U3', 'U3'])
+
+    def test_populate_grows_cache_to_fit_all_resources(self):
+        cache = ResourceCache(fetch_func=self._fetch, max_size=10)
+        cache.populate({'id': 'U%s' % (index)} for index in range(20000))
+
+        self.assertEqual(len(cache), 20000)
+        self.assertEqual(cache.get('U0'), {'id': 'U0'})
+        self.assertEqual(self.fetched, [])
+
+        # Resources created after the warm-up don't evict the existing ones
+        for index in range(20000, 20100):
+            self.resources['U%s' % (index)] = {'id': 'U%s' % (index)}
+            cache.get('U%s' % (index))
+        self.assertEqual(len(cache), 20100)
+        self.assertEqual(cache.get('U1'), {'id': 'U1'})
+
+    def test_populate_keeps_configured_minimum_size(self):
+        cache = ResourceCache(fetch_func=self._fetch, max_size=10)
+        cache.populate([{'id': 'U1'}])
+
+        for index in range(10):
+            cache.get('U%s' % (index))
+        self.assertEqual(len(cache), 10)
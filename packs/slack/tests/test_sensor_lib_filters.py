@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import unittest2
+
+from lib.filters import MessageFilter
+from lib.filters import strip_formatting
+
+__all__ = [
+    'StripFormattingTestCase',
+    'MessageFilterTestCase'
+]
+
+
+def _get_message(text='hello', channel='C1', **kwargs):
+    data = {'type': 'message', 'channel': channel, 'user': 'U1', 'text': text}
+    data.update(kwargs)
+    return data
+
+
+class StripFormattingTestCase(unittest2.TestCase):
+
+    def test_text_without_links_is_returned_as_is(self):
+        self.assertEqual(strip_formatting('plain text'), 'plain text')
+        self.assertEqual(strip_formatting('a < b and c > d'), 'a < b and c > d')
+        self.assertEqual(strip_formatting(''), '')
+
+    def test_links_are_replaced_with_labels(self):
+        self.assertEqual(strip_formatting('see <http://example.com|example.com>'),
+                         'see example.com')
+        self.assertEqual(strip_formatting('mail <mailto:a@example.com|a@example.com> now'),
+                         'mail a@example.com now')
+
+    def test_multiple_links_are_stripped(self):
+        text = ('<https://a.example.com/x?y=1|first> and <http://b.example.com|second>, '
+                '<mailto:c@example.com|third>')
+        self.assertEqual(strip_formatting(text), 'first and second, third')
+
+        text = '<http://a.example.com|a><http://b.example.com|b>'
+        self.assertEqual(strip_formatting(text), 'ab')
+
+    def test_links_without_labels_and_mentions_are_kept(self):
+        self.assertEqual(strip_formatting('<http://example.com>'), '<http://example.com>')
+        self.assertEqual(strip_formatting('hi <@U123|bob>'), 'hi <@U123|bob>')
+        self.assertEqual(strip_formatting('<#C123|general> <http://example.com|x>'),
+                         '<#C123|general> x')
+
+
+class MessageFilterTestCase(unittest2.TestCase):
+
+    def test_event_type_filter(self):
+        message_filter = MessageFilter(event_types=['message'])
+
+        self.assertTrue(message_filter.match(_get_message()))
+        self.assertFalse(message_filter.match({'type': 'presence_change'}))
+        self.assertFalse(message_filter.match(_get_message(subtype='bot_message')))
+
+        self.assertEqual(message_filter.passed_count, 1)
+        self.assertEqual(message_filter.filtered_counts['event_type'], 2)
+
+    def test_channels_allow(self):
+        message_filter = MessageFilter(event_types=['message'], channels_allow=['C1', 'C2'])
+
+        self.assertTrue(message_filter.match(_get_message(channel='C1')))
+        self.assertTrue(message_filter.match(_get_message(channel='C2')))
+        self.assertFalse(message_filter.match(_get_message(channel='C3')))
+        self.assertFalse(message_filter.match({'type': 'message', 'text': 'no channel'}))
+
+        self.assertEqual(message_filter.filtered_counts['channel'], 2)
+
+    def test_channels_deny_takes_precedence_over_allow(self):
+        message_filter = MessageFilter(event_types=['message'], channels_allow=['C1', 'C2'],
+                                       channels_deny=['C2', 'C3'])
+
+        self.assertTrue(message_filter.match(_get_message(channel='C1')))
+        self.assertFalse(message_filter.match(_get_message(channel='C2')))
+        self.assertFalse(message_filter.match(_get_message(channel='C3')))
+        self.assertFalse(message_filter.match(_get_message(channel='C4')))
+
+        self.assertEqual(message_filter.passed_count, 1)
+        self.assertEqual(message_filter.filtered_counts['channel'], 3)
+
+    def test_empty_allow_list_allows_all_channels(self):
+        message_filter = MessageFilter(event_types=['message'], channels_allow=[],
+                                       channels_deny=['C2'])
+
+        self.assertTrue(message_filter.match(_get_message(channel='C1')))
+        self.assertFalse(message_filter.match(_get_message(channel='C2')))
+
+    def test_max_length(self):
+        message_filter = MessageFilter(event_types=['message'], max_length=5)
+
+        self.assertTrue(message_filter.match(_get_message(text='12345')))
+        self.assertFalse(message_filter.match(_get_message(text='123456')))
+        self.assertTrue(message_filter.match(_get_message(text=u'é' * 5)))
+
+        self.assertEqual(message_filter.filtered_counts['size'], 1)
+
+    def test_combined_pattern(self):
+        message_filter = MessageFilter(event_types=['message'],
+                                       patterns=[r'\bdeploy\b', r'^st2 ', u'café'])
+
+        self.assertTrue(message_filter.match(_get_message(text='please deploy now')))
+        self.assertTrue(message_filter.match(_get_message(text='st2 run core.local')))
+        self.assertTrue(message_filter.match(_get_message(text=u'at the café')))
+        self.assertFalse(message_filter.match(_get_message(text='deployment started')))
+        self.assertFalse(message_filter.match(_get_message(text='ask st2 something')))
+        self.assertFalse(message_filter.match(_get_message(text='')))
+
+        self.assertEqual(message_filter.passed_count, 3)
+        self.assertEqual(message_filter.filtered_counts['pattern'], 3)
+
+    def test_alternatives_inside_patterns_are_grouped(self):
+        # Each pattern is wrapped in a group so an alternative doesn't leak into the others
+        message_filter = MessageFilter(event_types=['message'], patterns=[r'^a|b$', r'^c'])
+
+        self.assertTrue(message_filter.match(_get_message(text='ax')))
+        self.assertTrue(message_filter.match(_get_message(text='xb')))
+        self.assertTrue(message_filter.match(_get_message(text='cx')))
+        self.assertFalse(message_filter.match(_get_message(text='xc')))
+
+    def test_filter_reasons_are_checked_in_order(self):
+        message_filter = MessageFilter(event_types=['message'], channels_deny=['C2'],
+                                       patterns=['deploy'], max_length=10)
+
+        # Size is checked before the pattern and the channel before the size
+        self.assertFalse(message_filter.match(_get_message(text='x' * 20)))
+        self.assertFalse(message_filter.match(_get_message(text='x' * 20, channel='C2')))
+        self.assertFalse(message_filter.match(_get_message(text='x' * 20, subtype='me')))
+        self.assertFalse(message_filter.match(_get_message(text='hello')))
+        self.assertTrue(message_filter.match(_get_message(text='deploy')))
+
+        self.assertEqual(message_filter.filtered_counts, {
+            'event_type': 1,
+            'channel': 1,
+            'size': 1,
+            'pattern': 1
+        })
+        self.assertEqual(message_filter.filtered_count, 4)
+        self.assertEqual(message_filter.passed_count, 1)
+
+    def test_from_config(self):
+        message_filter = MessageFilter.from_config(event_types=['message'], config=None)
+        self.assertTrue(message_filter.match(_get_message()))
+
+        config = {
+            'channels_allow': ['C1'],
+            'channels_deny': ['C2'],
+            'patterns': ['deploy'],
+            'max_length': 10
+        }
+        message_filter = MessageFilter.from_config(event_types=['message'], config=config)
+        self.assertTrue(message_filter.match(_get_message(text='deploy')))
+        self.assertFalse(message_filter.match(_get_message(text='deploy', channel='C3')))
+        self.assertFalse(message_filter.match(_get_message(text='deploy it now please')))
+        self.assertFalse(message_filter.match(_get_message(text='hello')))
+        self.assertEqual(message_filter.filtered_count, 3)
@@ -0,0 +1,130 @@
+import json
+
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from slack_sensor import SlackSensor
+
+__all__ = [
+    'SlackSensorTestCase'
+]
+
+CONFIG = {
+    'sensor': {
+        'token': 'token',
+        'cache_refresh_interval': 0,
+        'checkpoint_interval': 5
+    }
+}
+
+USER = {
+    'id': 'U1',
+    'name': 'stanley',
+    'profile': {},
+    'is_admin': False,
+    'is_owner': False
+}
+
+CHANNEL = {
+    'id': 'C1',
+    'name': 'general',
+    'topic': {'value': 'topic'}
+}
+
+
+class FakeSlackClient(object):
+
+    def __init__(self):
+        self.messages = []
+        self.api_calls = []
+
+    def rtm_connect(self):
+        return True
+
+    def rtm_read(self):
+        messages, self.messages = self.messages, []
+        return messages
+
+    def api_call(self, method, **kwargs):
+        self.api_calls.append((method, kwargs))
+
+        if method == 'users.list':
+            return json.dumps({'members': [USER]})
+        elif method == 'channels.list':
+            return json.dumps({'channels': [CHANNEL]})
+        elif method == 'groups.list':
+            return json.dumps({'groups': []})
+
+        return json.dumps({'ok': False, 'error': 'not_found'})
+
+
+class SlackSensorTestCase(BaseSensorTestCase):
+    sensor_cls = SlackSensor
+
+    def setUp(self):
+        super(SlackSensorTestCase, self).setUp()
+
+        self.client = FakeSlackClient()
+        self.time = mock.Mock(return_value=1000.0)
+
+        patcher = mock.patch('slack_sensor.time.time', self.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_sensor(self):
+        sensor = self.get_sensor_instance(config=CONFIG)
+        with mock.patch('slack_sensor.SlackClient', mock.Mock(return_value=self.client)):
+            sensor.setup()
+        return sensor
+
+    def _get_message(self, ts, user='U1', channel='C1'):
+        return {'type': 'message', 'user': user, 'channel': channel, 'text': 'hello',
+                'ts': '%s.000100' % (ts)}
+
+    def test_pending_checkpoint_is_flushed_without_new_messages(self):
+        sensor = self._get_sensor()
+
+        self.client.messages = [self._get_message(ts=100)]
+        sensor.poll()
+        self.assertEqual(self.sensor_service.get_value('last_message_timestamp'), '100')
+
+        # Checkpoint is debounced
+        self.time.return_value = 1001.0
+        self.client.messages = [self._get_message(ts=101)]
+        sensor.poll()
+        self.assertEqual(len(self.get_dispatched_triggers()), 2)
+        self.assertEqual(self.sensor_service.get_value('last_message_timestamp'), '100')
+
+        sensor.poll()
+        self.assertEqual(self.sensor_service.get_value('last_message_timestamp'), '100')
+
+        # Pending timestamp is persisted once the interval has passed, without waiting for a
+        # new message
+        self.time.return_value = 1006.0
+        sensor.poll()
+        self.assertEqual(self.sensor_service.get_value('last_message_timestamp'), '101')
+
+    def test_unknown_users_are_not_looked_up_for_every_message(self):
+        sensor = self._get_sensor()
+
+        self.client.messages = [self._get_message(ts=100 + index, user='U2')
+                                for index in range(3)]
+        sensor.poll()
+
+        self.assertEqual(self.get_dispatched_triggers(), [])
+        self.assertEqual([method for method, _ in self.client.api_calls
+                          if method == 'users.info'], ['users.info'])
+
+    def test_message_is_dispatched_from_cache(self):
+        sensor = self._get_sensor()
+
+        self.client.messages = [self._get_message(ts=100)]
+        sensor.poll()
+
+        triggers = self.get_dispatched_triggers()
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers[0]['payload']['user']['name'], 'stanley')
+        self.assertEqual(triggers[0]['payload']['channel']['name'], 'general')
+        self.assertEqual([method for method, _ in self.client.api_calls],
+                         ['users.list', 'channels.list', 'groups.list'])
@@ -1,14 +1,40 @@
+import hashlib
+
 import dateutil.parser
+import eventlet
 from trello import TrelloClient
 from st2reactor.sensor.base import PollingSensor
 
+eventlet.monkey_patch(
+    os=True,
+    select=True,
+    socket=True,
+    thread=True,
+    time=True)
+
+# Maximum number of boards which are polled concurrently
+DEFAULT_POOL_SIZE = 10
+
+# Maximum number of actions Trello returns in a single request
+MAX_ACTIONS_LIMIT = 1000
+
+# Number of actions Trello returns by default, used for lists which are polled for the first time
+DEFAULT_ACTIONS_LIMIT = 50
+
+# Action data fields which reference the list(s) the action occurred in
+ACTION_LIST_FIELDS = ['list', 'listBefore', 'listAfter']
+
 
 class TrelloListSensor(PollingSensor):
     """
     Sensor which monitors Trello list for a new actions (events).
 
+    Lists on the same board (and with the same credentials) are polled with a single request
+    for the board actions, boards are polled concurrently.
+
     For reference see Trello API Docs:
     https://trello.com/docs/api/list/index.html#get-1-lists-idlist-actions
+    https://trello.com/docs/api/board/index.html#get-1-boards-board-id-actions
     """
     TRIGGER = 'trello.new_action'
 
@@ -28,39 +54,92 @@ class TrelloListSensor(PollingSensor):
             raise ValueError('[TrelloListSensor]'
                              '"lists" config value should have at least one entry!')
 
+        self._pool = eventlet.GreenPool(list_actions_sensor.get('pool_size', DEFAULT_POOL_SIZE))
+        # (api_key, token) -> TrelloClient
+        self._clients = {}
+        # (board_id, api_key, token) -> TrelloBoard
+        self._boards = {}
+
     def setup(self):
         """
-        Run the sensor initialization / setup code (if any).
+        Validate Trello lists from sensor config and group them by board.
         """
-        pass
+        for trello_list_config in self._lists:
+            self._update_credentials_by_precedence(trello_list_config)
+            self._add_list(TrelloList(**trello_list_config))
 
     def poll(self):
         """
-        Iterate through all Trello lists from sensor config.
-        Fetch latest actions for each Trello List, filter by type.
+        Iterate through all Trello boards with lists from sensor config.
+        Fetch latest actions for each Trello board, split them by list and filter by type.
         Start reading feed where we stopped last time
         by passing `since` date parameter to Trello API.
-        Save latest event `date` in st2 key-value storage for each Trello list.
+        Save latest event `date` in st2 key-value storage for each Trello board and list.
         """
         self._logger.debug('[TrelloListSensor]: Entering into listen mode ...')
-        for trello_list_config in self._lists:
-            self._update_credentials_by_precedence(trello_list_config)
+        for _ in self._pool.imap(self._poll_board, self._boards.values()):
+            pass
 
-            l = TrelloList(**trello_list_config)
-            self._logger.debug("[TrelloListSensor]: Processing queue for Trello list: '%s'"
-                           % l.list_id)
-
-            actions = l.fetch_actions(
-                filter=trello_list_config.get('filter') or None,
-                since=self._sensor_service.get_value(l.key_name)
-            )
+    def _add_list(self, trello_list):
+        """
+        Add list to the board it is located on, boards and clients are re-used across polls.
 
-            for action in reversed(actions):
+        :param trello_list: Trello list to monitor
+        :type trello_list: :class:`TrelloList`
+        """
+        credentials = (trello_list.api_key, trello_list.token)
+        if credentials not in self._clients:
+            self._clients[credentials] = TrelloClient(api_key=trello_list.api_key,
+                                                      token=trello_list.token)
+
+        board_key = (trello_list.board_id,) + credentials
+        if board_key not in self._boards:
+            self._boards[board_key] = TrelloBoard(board_id=trello_list.board_id,
+                                                  client=self._clients[credentials],
+                                                  api_key=trello_list.api_key,
+                                                  token=trello_list.token)
+
+        self._boards[board_key].add_list(trello_list)
+
+    def _poll_board(self, board):
+        self._logger.debug("[TrelloListSensor]: Processing queue for Trello board: '%s'"
+                           % board.board_id)
+
+        if board.since is None:
+            board.since = self._sensor_service.get_value(board.key_name)
+
+        for trello_list in board.lists:
+            if trello_list.since is None:
+                trello_list.since = self._sensor_service.get_value(trello_list.key_name)
+
+        try:
+            actions = board.fetch_actions()
+        except Exception:
+            self._logger.exception("[TrelloListSensor]: Failed to fetch actions for Trello "
+                                   "board: '%s'" % board.board_id)
+            return
+
+        for trello_list, list_actions in board.split_actions(actions):
+            if not list_actions:
+                continue
+
+            for action in reversed(list_actions):
                 self._logger.debug("[TrelloListSensor]: Found new action for Trello list: '%r'"
-                           % action)
+                                   % action)
                 self._sensor_service.dispatch(trigger=self.TRIGGER, payload=action)
-                if is_date(action.get('date')):
-                    self._sensor_service.set_value(l.key_name, action.get('date'))
+
+            # Only the latest date is stored, once per list and poll
+            dates = [action.get('date') for action in list_actions if is_date(action.get('date'))]
+            if dates:
+                trello_list.since = max(dates)
+                self._sensor_service.set_value(trello_list.key_name, trello_list.since)
+
+        # Board date is only updated once the actions have been dispatched, so they are fetched
+        # again if dispatching fails
+        dates = [action.get('date') for action in actions if is_date(action.get('date'))]
+        if dates and max(dates) > (board.since or ''):
+            board.since = max(dates)
+            self._sensor_service.set_value(board.key_name, board.since)
 
     def _update_credentials_by_precedence(self, trello_list_config):
         """
@@ -108,13 +187,106 @@ class TrelloListSensor(PollingSensor):
         pass
 
 
+class TrelloBoard(object):
+    """
+    Group of monitored Trello Lists located on the same board.
+    """
+    def __init__(self, board_id, client, api_key, token=None):
+        """
+        :param board_id: Trello board ID
+        :type board_id: ``str``
+
+        :param client: Trello API client which is used for all lists on the board
+        :type client: :class:`TrelloClient`
+
+        :param api_key: Trello API key the board is polled with
+        :type api_key: ``str``
+
+        :param token: Trello API token the board is polled with
+        :type token: ``str``
+        """
+        self.board_id = board_id
+        self.api_key = api_key
+        self.token = token
+        self.lists = []
+
+        # Date of the latest seen action on the board (in any list), loaded from the datastore
+        # on the first poll
+        self.since = None
+
+        self._client = client
+
+    def add_list(self, trello_list):
+        self.lists.append(trello_list)
+
+    @property
+    def filter(self):
+        """
+        Union of the action types all lists are filtered by.
+
+        :rtype: ``str`` or ``None``
+        """
+        types = set()
+        for trello_list in self.lists:
+            if not trello_list.types:
+                return None
+            types.update(trello_list.types)
+
+        return ','.join(sorted(types))
+
+    @property
+    def key_name(self):
+        """
+        Generate unique key name for built-in storage based on the board ID and credentials.
+
+        The same board can be polled with different credentials (which might not see the same
+        actions), so a short hash of the credentials is included in the key name.
+
+        :rtype: ``str``
+        """
+        credentials = '{}:{}'.format(self.api_key, self.token or '')
+        return '{}.{}.date'.format(self.board_id, hashlib.sha1(credentials).hexdigest()[:8])
+
+    def fetch_actions(self):
+        """
+        Fetch actions for all lists on the board since the latest seen action on the board with
+        a single request.
+        Example API request:
+        https://api.trello.com/1/boards/{board_id}/actions?filter=createCard
+        &since=2015-09-14T21:45:56.850Z&limit=1000&key={key_id}&token={token_id}
+
+        :return: Board actions (newest first).
+        :rtype: ``list`` of ``dict``
+        """
+        return self._client.fetch_json(
+            '/boards/' + self.board_id + '/actions',
+            query_params={
+                'filter': self.filter,
+                'since': self.since,
+                'limit': MAX_ACTIONS_LIMIT,
+            })
+
+    def split_actions(self, actions):
+        """
+        Split board actions by the list they occurred in. Each list only gets the actions newer
+        than the latest action it has seen.
+
+        :param actions: Board actions (newest first).
+        :type actions: ``list`` of ``dict``
+
+        :return: Actions occurred in each Trello list (newest first).
+        :rtype: ``list`` of (:class:`TrelloList`, ``list`` of ``dict``) tuples
+        """
+        return [(trello_list, trello_list.filter_actions(actions)) for trello_list in self.lists]
+
+
 class TrelloList(object):
     """
     Sugar class to work with Trello Lists.
     """
-    def __init__(self, board_id, list_id, api_key, token=None, **kwargs):
+    def __init__(self, board_id, list_id, api_key, token=None, filter=None, **kwargs):
         """
-        Validate inputs and connect to Trello API.
+        Validate inputs.
         Exception is thrown if input details are not correct.
 
         :param board_id: Trello board ID where the List is located
@@ -128,6 +300,9 @@ class TrelloList(object):
 
         :param token: Trello API token
         :type token: ``str``
+
+        :param filter: Action types to filter, separated by comma or as a sequence.
+        :type filter: ``str`` or ``list``
         """
         self.board_id = board_id
         self.list_id = list_id
@@ -135,10 +310,14 @@ class TrelloList(object):
         # assume empty string '' as None
         self.token = token or None
 
-        self.validate()
+        if isinstance(filter, basestring):
+            filter = filter.split(',')
+        self.types = set([action_type.strip() for action_type in filter or []])
 
-        self._client = TrelloClient(api_key=self.api_key, token=self.token)
-        self._list = self._client.get_board(self.board_id).get_list(self.list_id)
+        # Date of the latest seen action, loaded from the datastore on the first poll
+        self.since = None
+
+        self.validate()
 
     def validate(self):
         """
@@ -169,27 +348,33 @@ class TrelloList(object):
         """
         return '{}.{}.date'.format(self.board_id, self.list_id)
 
-    def fetch_actions(self, filter=None, since=None):
+    def filter_actions(self, actions):
         """
-        Fetch actions for Trello List with possibility to specify filters.
-        Example API request:
-        https://api.trello.com/1/lists/{list_id}/actions?filter=createCard&since=2015-09-14T21:45:56.850Z&key={key_id}&token={token_id}
+        Select actions which occurred in this list since the latest seen action.
 
-        :param filter: Action types to filter, separated by comma or as a sequence.
-        :type filter: ``str`` or ``list``
-
-        :param since: Filter actions since specified date.
-        :type since: ``str``
+        :param actions: Board actions (newest first).
+        :type actions: ``list`` of ``dict``
 
-        :return: Events occurred in Trello list.
         :rtype: ``list`` of ``dict``
         """
-        return self._client.fetch_json(
-            '/lists/' + self._list.id + '/actions',
-            query_params={
-                'filter': filter,
-                'since': since,
-            })
+        result = []
+        for action in actions:
+            if self.since and action.get('date', '') <= self.since:
+                continue
+
+            if self.types and action.get('type') not in self.types:
+                continue
+
+            data = action.get('data') or {}
+            list_ids = [(data.get(field) or {}).get('id') for field in ACTION_LIST_FIELDS]
+            if self.list_id in list_ids:
+                result.append(action)
+
+        if not self.since:
+            # Same as the lists API, only the latest actions are returned on the first poll
+            result = result[:DEFAULT_ACTIONS_LIMIT]
+
+        return result
 
 
 def is_date(string):
@@ -0,0 +1,194 @@
+import hashlib
+
+import mock
+
+from st2tests.base import BaseSensorTestCase
+
+from list_actions_sensor import TrelloBoard
+from list_actions_sensor import TrelloList
+from list_actions_sensor import TrelloListSensor
+
+__all__ = [
+    'TrelloBoardTestCase',
+    'TrelloListSensorTestCase'
+]
+
+CONFIG = {
+    'api_key': 'key',
+    'token': 'token',
+    'list_actions_sensor': {
+        'lists': [
+            {'board_id': 'board1', 'list_id': 'list1'},
+            {'board_id': 'board1', 'list_id': 'list2', 'filter': 'updateCard'}
+        ]
+    }
+}
+
+BOARD_KEY_NAME = 'board1.%s.date' % (hashlib.sha1('key:token').hexdigest()[:8])
+
+
+def _get_action(id, date, type='createCard', **lists):
+    return {
+        'id': id,
+        'type': type,
+        'date': '2016-10-01T10:00:%02d.000Z' % (date),
+        'data': dict((field, {'id': list_id}) for field, list_id in lists.items())
+    }
+
+
+class FakeClient(object):
+    """
+    Client which serves the board actions newer than ``since``.
+    """
+
+    def __init__(self):
+        self.actions = []
+        self.requests = []
+
+    def fetch_json(self, uri_path, query_params):
+        self.requests.append((uri_path, query_params))
+
+        since = query_params['since']
+        types = query_params['filter'].split(',') if query_params['filter'] else None
+        actions = [action for action in self.actions
+                   if (not since or action['date'] > since) and
+                   (not types or action['type'] in types)]
+
+        return sorted(actions, key=lambda action: action['date'], reverse=True)
+
+    def get_requested_since(self):
+        return [query_params['since'] for _, query_params in self.requests]
+
+
+class TrelloBoardTestCase(BaseSensorTestCase):
+    sensor_cls = TrelloListSensor
+
+    def test_split_actions(self):
+        board = TrelloBoard(board_id='board1', client=None, api_key='key')
+        list1 = TrelloList(board_id='board1', list_id='list1', api_key='key')
+        list2 = TrelloList(board_id='board1', list_id='list2', api_key='key',
+                           filter='createCard, updateCard')
+        list3 = TrelloList(board_id='board1', list_id='list3', api_key='key')
+        for trello_list in [list1, list2, list3]:
+            board.add_list(trello_list)
+
+        list2.since = _get_action('old', date=2)['date']
+
+        actions = [
+            _get_action('move', date=4, type='updateCard', listBefore='list1', listAfter='list2'),
+            _get_action('comment', date=3, type='commentCard', list='list2'),
+            _get_action('create2', date=2, list='list2'),
+            _get_action('create1', date=1, list='list1'),
+            _get_action('other', date=1, list='list4')
+        ]
+        result = dict((trello_list.list_id, [action['id'] for action in list_actions])
+                      for trello_list, list_actions in board.split_actions(actions))
+
+        self.assertEqual(result['list1'], ['move', 'create1'])
+        # Filtered by type and by the date of the latest seen action of the list
+        self.assertEqual(result['list2'], ['move'])
+        self.assertEqual(result['list3'], [])
+
+    def test_filter_is_union_of_list_types(self):
+        board = TrelloBoard(board_id='board1', client=None, api_key='key')
+        board.add_list(TrelloList(board_id='board1', list_id='list1', api_key='key',
+                                  filter=['createCard']))
+        board.add_list(TrelloList(board_id='board1', list_id='list2', api_key='key',
+                                  filter='updateCard,createCard'))
+        self.assertEqual(board.filter, 'createCard,updateCard')
+
+        board.add_list(TrelloList(board_id='board1', list_id='list3', api_key='key'))
+        self.assertEqual(board.filter, None)
+
+    def test_key_name_includes_credentials(self):
+        board = TrelloBoard(board_id='board1', client=None, api_key='key', token='token')
+        self.assertEqual(board.key_name, BOARD_KEY_NAME)
+
+        key_names = set([
+            board.key_name,
+            TrelloBoard(board_id='board1', client=None, api_key='key').key_name,
+            TrelloBoard(board_id='board1', client=None, api_key='key2', token='token').key_name,
+            TrelloBoard(board_id='board2', client=None, api_key='key', token='token').key_name
+        ])
+        self.assertEqual(len(key_names), 4)
+
+
+class TrelloListSensorTestCase(BaseSensorTestCase):
+    sensor_cls = TrelloListSensor
+
+    def setUp(self):
+        super(TrelloListSensorTestCase, self).setUp()
+        self.client = FakeClient()
+
+    def _get_sensor(self):
+        sensor = self.get_sensor_instance(config=CONFIG)
+        with mock.patch('list_actions_sensor.TrelloClient', mock.Mock(return_value=self.client)):
+            sensor.setup()
+        return sensor
+
+    def _get_dispatched_ids(self):
+        return [trigger['payload']['id'] for trigger in self.get_dispatched_triggers()]
+
+    def test_lists_on_same_board_are_polled_with_single_request(self):
+        self.client.actions = [
+            _get_action('create1', date=1, list='list1'),
+            _get_action('create2', date=2, list='list2'),
+            _get_action('update2', date=3, type='updateCard', list='list2')
+        ]
+
+        sensor = self._get_sensor()
+        sensor.poll()
+
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(self.client.requests[0][0], '/boards/board1/actions')
+        self.assertEqual(self._get_dispatched_ids(), ['create1', 'update2'])
+        self.assertEqual(self.sensor_service.get_value('board1.list1.date'),
+                         self.client.actions[0]['date'])
+        self.assertEqual(self.sensor_service.get_value('board1.list2.date'),
+                         self.client.actions[2]['date'])
+
+    def test_board_cursor_is_latest_action_on_board(self):
+        # list2 has not seen any action in a long time, it doesn't hold back the request
+        self.sensor_service.set_value('board1.list2.date', _get_action('old', date=0)['date'])
+        self.client.actions = [
+            _get_action('create1', date=1, list='list1'),
+            _get_action('create3', date=2, list='list3')
+        ]
+
+        sensor = self._get_sensor()
+        sensor.poll()
+        sensor.poll()
+
+        latest_date = self.client.actions[1]['date']
+        self.assertEqual(self.client.get_requested_since(), [None, latest_date])
+        self.assertEqual(self.sensor_service.get_value(BOARD_KEY_NAME), latest_date)
+        self.assertEqual(self.sensor_service.get_value('board1.list2.date'),
+                         _get_action('old', date=0)['date'])
+        self.assertEqual(self._get_dispatched_ids(), ['create1'])
+
+    def test_board_cursor_is_loaded_from_datastore(self):
+        self.sensor_service.set_value(BOARD_KEY_NAME, _get_action('old', date=1)['date'])
+        self.client.actions = [
+            _get_action('create1', date=1, list='list1'),
+            _get_action('update2', date=2, type='updateCard', list='list2')
+        ]
+
+        sensor = self._get_sensor()
+        sensor.poll()
+
+        self.assertEqual(self.client.get_requested_since(), [self.client.actions[0]['date']])
+        self.assertEqual(self._get_dispatched_ids(), ['update2'])
+
+    def test_board_cursor_is_not_updated_when_dispatching_fails(self):
+        self.client.actions = [_get_action('create1', date=1, list='list1')]
+        sensor = self._get_sensor()
+
+        with mock.patch.object(self.sensor_service, 'dispatch',
+                               mock.Mock(side_effect=Exception('dispatch failed'))):
+            self.assertRaises(Exception, sensor.poll)
+
+        self.assertEqual(self.sensor_service.get_value(BOARD_KEY_NAME), None)
+
+        sensor.poll()
+        self.assertEqual(self.client.get_requested_since(), [None, None])
+        self.assertEqual(self._get_dispatched_ids(), ['create1'])
@@ -15,6 +15,7 @@
 
 from pyVmomi import vim
 
+from vmwarelib import inventory
 from vmwarelib.actions import BaseAction
 
 
@@ -50,11 +51,8 @@ class GetVMs(BaseAction):
         # getting vms by their names
         vms_from_names = []
         if names:
-            container = self.si_content.viewManager.CreateContainerView(
-                self.si_content.rootFolder, [vim.VirtualMachine], True)
-            for vm in container.view:
-                if vm.name in names:
-                    vms_from_names.append(vm)
+            vms_from_names = inventory.get_virtualmachines_by_names(
+                self.si_content, names)
             GetVMs.__add_vm_properties_to_map_from_vm_array(
                 moid_to_vm, vms_from_names)
 
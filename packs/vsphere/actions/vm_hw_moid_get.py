@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from pyVmomi import vim
+
 from vmwarelib import inventory
 from vmwarelib.actions import BaseAction
 
@@ -33,13 +35,10 @@ class GetVMMoid(BaseAction):
         results = {}
         self.establish_connection(vsphere)
 
-        vmlist = inventory.get_virtualmachines(self.si_content)
+        index = inventory.get_index(self.si_content, vim.VirtualMachine)
 
-        for vm in vmlist.view:
-            if vm_names:
-                if vm.name in vm_names:
-                    results[vm.name] = str(vm).split(':')[-1].replace("'", "")
-            else:
-                results[vm.name] = str(vm).split(':')[-1].replace("'", "")
+        for entry in index.entries():
+            if not vm_names or entry['name'] in vm_names:
+                results[entry['name']] = entry['moid']
 
         return results
@@ -13,9 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import eventlet
-from pyVmomi import vim
-
 from vmwarelib import inventory
 from vmwarelib import checkinputs
 from vmwarelib.actions import BaseAction
@@ -50,6 +47,5 @@ class VMApplyPowerState(BaseAction):
             task = vm.PowerOffVM_Task()
         elif power_onoff == "poweron":
             task = vm.PowerOnVM_Task()
-        while task.info.state == vim.TaskInfo.State.running:
-            eventlet.sleep(1)
-        return {'state': str(task.info.state)}
+        status = self._wait_for_tasks([task])[task._GetMoId()]
+        return {'state': str(status['state'])}
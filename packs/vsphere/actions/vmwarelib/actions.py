@@ -14,14 +14,21 @@
 # limitations under the License.
 
 import atexit
-import eventlet
 
 from pyVim import connect
+from pyVmomi import SoapStubAdapter
 from pyVmomi import vim
 from st2actions.runners.pythonrunner import Action
 
+from vmwarelib.session import DEFAULT_SESSION_CACHE_PATH
+from vmwarelib.session import SessionCache
+from vmwarelib.tasks import TaskWaiter
+
 CONNECTION_ITEMS = ['host', 'port', 'user', 'passwd']
 
+# Name under which the session of the v0.3 style connection is cached
+DEFAULT_SESSION_NAME = 'default'
+
 
 class BaseAction(Action):
     def __init__(self, config):
@@ -41,8 +48,10 @@ class BaseAction(Action):
                     raise KeyError("Config.yaml Mising: %s" % (item))
 
     def establish_connection(self, vsphere):
+        self.si_content = None
         self.si = self._connect(vsphere)
-        self.si_content = self.si.RetrieveContent()
+        if not self.si_content:
+            self.si_content = self.si.RetrieveContent()
 
     def _connect(self, vsphere):
         if vsphere:
@@ -56,6 +65,11 @@ class BaseAction(Action):
         else:
             connection = self.config
 
+        if connection.get('session_cache',
+                          self.config.get('session_cache', False)):
+            return self._connect_cached(vsphere or DEFAULT_SESSION_NAME,
+                                        connection)
+
         try:
             si = connect.SmartConnect(host=connection['host'],
                                       port=connection['port'],
@@ -67,7 +81,64 @@ class BaseAction(Action):
         atexit.register(connect.Disconnect, si)
         return si
 
-    def _wait_for_task(self, task):
-        while task.info.state == vim.TaskInfo.State.running:
-            eventlet.sleep(1)
-        return task.info.state == vim.TaskInfo.State.success
+    def _connect_cached(self, name, connection):
+        """
+        Re-attach to the session which has been cached by a previous action
+        run and only log in if there is no cached session or it has expired.
+
+        Cached sessions are shared by action runs, so they are not logged out
+        when the action finishes.
+        """
+        cache = SessionCache(self.config.get('session_cache_path',
+                                             DEFAULT_SESSION_CACHE_PATH))
+
+        session = cache.get(name, connection)
+        if session:
+            stub = SoapStubAdapter(connection['host'], int(connection['port']),
+                                   version=session['version'])
+            stub.cookie = session['cookie']
+            si = vim.ServiceInstance('ServiceInstance', stub)
+
+            try:
+                self.si_content = si.RetrieveContent()
+                session_manager = self.si_content.sessionManager
+                if session_manager.currentSession:
+                    return si
+
+                # Session has expired, log in again re-using the connection
+                session_manager.Login(connection['user'],
+                                      connection['passwd'], None)
+            except vim.fault.InvalidLogin:
+                cache.remove(name)
+                raise
+            except Exception:
+                # Connection details might have changed (e.g. API version
+                # after an upgrade), start from scratch
+                cache.remove(name)
+                self.si_content = None
+                return self._connect_cached(name, connection)
+
+            cache.set(name, connection, stub.cookie, stub.version)
+            return si
+
+        try:
+            si = connect.SmartConnect(host=connection['host'],
+                                      port=connection['port'],
+                                      user=connection['user'],
+                                      pwd=connection['passwd'])
+        except Exception as e:
+            raise Exception(e)
+
+        cache.set(name, connection, si._stub.cookie, si._stub.version)
+        return si
+
+    def _wait_for_task(self, task, timeout=None):
+        statuses = self._wait_for_tasks([task], timeout=timeout)
+        return statuses[task._GetMoId()]['state'] == \
+            vim.TaskInfo.State.success
+
+    def _wait_for_tasks(self, tasks, timeout=None, on_progress=None,
+                        on_finished=None):
+        waiter = TaskWaiter(self.si_content)
+        return waiter.wait(tasks, timeout=timeout, on_progress=on_progress,
+                           on_finished=on_finished)
@@ -13,30 +13,186 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 from pyVmomi import vim
+from pyVmomi import vmodl
+
+# Number of seconds after which inventory indexes are rebuilt
+DEFAULT_INDEX_TTL = 60
+
+# Maximum number of objects retrieved with a single RetrievePropertiesEx call
+INDEX_PAGE_SIZE = 1000
+
+INDEX_PROPERTIES = ['name', 'parent']
+
+# (id of the service content, vimtype) -> InventoryIndex
+_indexes = {}
+
+
+class InventoryIndex(object):
+    """
+    Index of the name, moid and parent of all managed entities of a single type.
+
+    The properties of all the entities are retrieved with a single (paged)
+    RetrievePropertiesEx call instead of a property fetch per entity. The
+    index is only used for name lookups, entities with a known moid are
+    referenced directly.
+    """
+
+    def __init__(self, content, vimtype, ttl=DEFAULT_INDEX_TTL):
+        self.content = content
+        self.vimtype = vimtype
+        self.ttl = ttl
+
+        # moid -> entity
+        self._entities = {}
+        # moid -> {'moid', 'name', 'parent'}
+        self._entries = {}
+        # name -> list of moids
+        self._names = {}
+        self._expires = 0
+
+    @property
+    def expired(self):
+        return time.time() >= self._expires
+
+    def refresh(self):
+        entities, entries, names = {}, {}, {}
+
+        for obj, props in self._retrieve_properties():
+            moid = obj._GetMoId()
+            parent = props.get('parent', None)
+            entities[moid] = obj
+            entries[moid] = {
+                'moid': moid,
+                'name': props.get('name', None),
+                'parent': parent._GetMoId() if parent else None
+            }
+            names.setdefault(entries[moid]['name'], []).append(moid)
+
+        self._entities, self._entries, self._names = entities, entries, names
+        self._expires = time.time() + self.ttl
+
+    def entries(self):
+        self._refresh_if_expired()
+        return self._entries.values()
+
+    def get(self, name):
+        """
+        Return the entity with the given name (first one if multiple
+        entities have the same name) or None if it doesn't exist.
+        """
+        refreshed = self._refresh_if_expired()
+
+        result = self._get(name)
+        if not result and not refreshed:
+            # Entity might have been created after the index has been built
+            self.refresh()
+            result = self._get(name)
+        return result
+
+    def get_by_names(self, names):
+        """
+        Return all the entities which have one of the given names.
+        """
+        self._refresh_if_expired()
+
+        results = []
+        for name in set(names):
+            results.extend([self._entities[moid]
+                            for moid in self._names.get(name, [])])
+        return results
+
+    def _get(self, name):
+        moids = self._names.get(name, [])
+        return self._entities[moids[0]] if moids else None
+
+    def _refresh_if_expired(self):
+        if self.expired:
+            self.refresh()
+            return True
+        return False
+
+    def _retrieve_properties(self):
+        view = self.content.viewManager.CreateContainerView(
+            self.content.rootFolder, [self.vimtype], True)
+        try:
+            tSpec = vim.PropertyCollector.TraversalSpec(
+                name='tSpecName', path='view', skip=False,
+                type=vim.view.ContainerView)
+            pSpec = vim.PropertyCollector.PropertySpec(
+                all=False, pathSet=INDEX_PROPERTIES, type=self.vimtype)
+            oSpec = vim.PropertyCollector.ObjectSpec(
+                obj=view, selectSet=[tSpec], skip=True)
+            pfSpec = vim.PropertyCollector.FilterSpec(
+                objectSet=[oSpec], propSet=[pSpec],
+                reportMissingObjectsInResults=False)
+            retOptions = vim.PropertyCollector.RetrieveOptions(
+                maxObjects=INDEX_PAGE_SIZE)
+
+            collector = self.content.propertyCollector
+            retProps = collector.RetrievePropertiesEx(specSet=[pfSpec],
+                                                      options=retOptions)
+            while retProps:
+                for obj in retProps.objects:
+                    yield obj.obj, dict([(prop.name, prop.val)
+                                         for prop in obj.propSet])
+                if not retProps.token:
+                    break
+                retProps = collector.ContinueRetrievePropertiesEx(
+                    token=retProps.token)
+        finally:
+            view.Destroy()
+
+
+def get_index(content, vimtype, ttl=DEFAULT_INDEX_TTL):
+    """
+    Return the inventory index of the given type, indexes are cached per
+    connection (service content) and rebuilt after they expire.
+    """
+    key = (id(content), vimtype)
+    index = _indexes.get(key, None)
+    if not index or index.content is not content:
+        index = InventoryIndex(content, vimtype, ttl=ttl)
+        _indexes[key] = index
+    return index
+
+
+def get_entity_by_moid(content, vimtype, moid):
+    """
+    Return the entity with the given moid or None if it doesn't exist.
+
+    The entity is referenced directly and only its name is retrieved to
+    check that it exists.
+    """
+    entity = vimtype(moid, stub=content.propertyCollector._stub)
+
+    pSpec = vim.PropertyCollector.PropertySpec(
+        all=False, pathSet=['name'], type=vimtype)
+    oSpec = vim.PropertyCollector.ObjectSpec(obj=entity, skip=False)
+    pfSpec = vim.PropertyCollector.FilterSpec(
+        objectSet=[oSpec], propSet=[pSpec])
+
+    try:
+        retProps = content.propertyCollector.RetrieveProperties(
+            specSet=[pfSpec])
+    except vmodl.fault.ManagedObjectNotFound:
+        return None
+    return entity if retProps else None
 
 
 def get_managed_entity(content, vimtype, moid=None, name=None):
     if not name and not moid:
         return
-    container = content.viewManager.CreateContainerView(
-        content.rootFolder, [vimtype], True)
-    count = 0
-    for entity in container.view:
-        # Find matches in the results
-        if moid and entity._moId == moid:
-            results = entity
-            count += 1
-        elif name and entity.name == name:
-            results = entity
-            count += 1
-        # check to see if multiple matches were found
-        if count >= 2:
-            raise Exception("Multiple Managed Objects found,\
-                            Check Names or IDs provided are unique")
-        elif count == 1:
-            # Single Match found
-            return results
+
+    result = None
+    if moid:
+        result = get_entity_by_moid(content, vimtype, moid)
+    if not result and name:
+        result = get_index(content, vimtype).get(name)
+    if result:
+        return result
 
     # if this area is reached no object has been found
     # if a name was passed error
@@ -53,6 +209,10 @@ def get_managed_entity(content, vimtype, moid=None, name=None):
                         % vimtype)
 
 
+def get_managed_entities_by_names(content, vimtype, names):
+    return get_index(content, vimtype).get_by_names(names)
+
+
 def get_managed_entities(content, vimtype):
     container = content.viewManager.CreateContainerView(
         content.rootFolder, [vimtype], True)
@@ -102,6 +262,13 @@ def get_virtualmachines(content):
     return get_managed_entities(content, vim.VirtualMachine)
 
 
+def get_virtualmachines_by_names(content, names):
+    return get_managed_entities_by_names(content, vim.VirtualMachine, names)
+
+
 def get_task(content, moid=None):
-    return get_managed_entity(content, vim.Task,
-                              moid=moid, name=None)
+    # Tasks are not managed entities and can't be found in the inventory,
+    # they are referenced directly
+    if not moid:
+        return
+    return vim.Task(moid, stub=content.propertyCollector._stub)
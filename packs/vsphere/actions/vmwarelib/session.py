@@ -0,0 +1,91 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+
+__all__ = [
+    'SessionCache'
+]
+
+DEFAULT_SESSION_CACHE_PATH = os.path.join(tempfile.gettempdir(),
+                                          'st2-vsphere-sessions')
+
+
+class SessionCache(object):
+    """
+    On-disk cache of authenticated vSphere session cookies keyed by the name
+    of the vsphere connection, so following action runs can re-attach to an
+    existing session instead of logging in again.
+
+    Each session is stored in a separate file which is only readable by the
+    owner since the cookie grants access to the session.
+    """
+
+    def __init__(self, path=DEFAULT_SESSION_CACHE_PATH):
+        self.path = path
+
+    def get(self, name, connection):
+        """
+        Return the cached session (``cookie`` and API ``version``) or None if
+        there is no session for the given connection details.
+        """
+        try:
+            with open(self._get_session_path(name), 'r') as fp:
+                session = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if session.get('connection') != self._get_connection_key(connection):
+            # Connection details have changed since the session was stored
+            return None
+
+        return session
+
+    def set(self, name, connection, cookie, version):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path, 0o700)
+            except OSError:
+                # Created by a concurrent action run
+                if not os.path.isdir(self.path):
+                    raise
+
+        session = {
+            'connection': self._get_connection_key(connection),
+            'cookie': cookie,
+            'version': version
+        }
+
+        # mkstemp creates the file with 0600 permissions, it's renamed so
+        # other action runs never read a partially written session
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.session')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(session, fp)
+        os.rename(tmp_path, self._get_session_path(name))
+
+    def remove(self, name):
+        try:
+            os.remove(self._get_session_path(name))
+        except OSError:
+            pass
+
+    def _get_session_path(self, name):
+        return os.path.join(self.path, '%s.json' % (name.replace('/', '_')))
+
+    def _get_connection_key(self, connection):
+        return '%s:%s:%s' % (connection['host'], connection['port'],
+                             connection['user'])
@@ -0,0 +1,125 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from pyVmomi import vim
+
+__all__ = [
+    'TaskWaiter'
+]
+
+# Maximum number of seconds a single WaitForUpdatesEx call blocks for
+MAX_WAIT_SECONDS = 60
+
+TASK_PROPERTIES = ['info.state', 'info.progress', 'info.result',
+                   'info.error']
+
+FINISHED_STATES = [vim.TaskInfo.State.success, vim.TaskInfo.State.error]
+
+
+class TaskWaiter(object):
+    """
+    Wait for many tasks at once using a single property filter and
+    WaitForUpdatesEx long-polling instead of polling each task.
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+    def wait(self, tasks, timeout=None, on_progress=None, on_finished=None):
+        """
+        Wait until all the tasks have finished or the timeout has expired.
+
+        Args:
+        - tasks: list of vim.Task objects
+        - timeout: maximum number of seconds to wait (None to wait forever)
+        - on_progress: called with (task moid, progress) on progress updates
+        - on_finished: called with (task moid, task status) when a task
+          finishes
+
+        Returns:
+        - dict: task moid -> status (state, progress, result and error)
+        """
+        statuses = {}
+        for task in tasks:
+            statuses[task._GetMoId()] = {'state': None, 'progress': None,
+                                         'result': None, 'error': None}
+        if not statuses:
+            return statuses
+
+        deadline = time.time() + timeout if timeout is not None else None
+        # Separate collector so the filter doesn't interfere with other
+        # users of the session's property collector
+        collector = self.content.propertyCollector.CreatePropertyCollector()
+        try:
+            collector.CreateFilter(self._get_filter_spec(tasks),
+                                   partialUpdates=True)
+            pending = set(statuses.keys())
+            version = ''
+
+            while pending:
+                max_wait = MAX_WAIT_SECONDS
+                if deadline is not None:
+                    remaining = int(round(deadline - time.time()))
+                    if remaining <= 0:
+                        break
+                    max_wait = min(max_wait, remaining)
+
+                options = vim.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=max_wait)
+                update = collector.WaitForUpdatesEx(version, options)
+                if not update:
+                    # No changes before maxWaitSeconds expired
+                    continue
+                version = update.version
+
+                for filter_set in update.filterSet:
+                    for object_update in filter_set.objectSet:
+                        moid = object_update.obj._GetMoId()
+                        if moid not in pending:
+                            continue
+
+                        status = statuses[moid]
+                        changed = self._apply_changes(
+                            status, object_update.changeSet)
+
+                        if status['state'] in FINISHED_STATES:
+                            pending.discard(moid)
+                            if on_finished:
+                                on_finished(moid, status)
+                        elif on_progress and 'progress' in changed:
+                            on_progress(moid, status['progress'])
+        finally:
+            collector.Destroy()
+
+        return statuses
+
+    def _apply_changes(self, status, changes):
+        changed = set()
+        for change in changes:
+            name = change.name.split('.')[-1]
+            if name in status:
+                status[name] = change.val
+                changed.add(name)
+        return changed
+
+    def _get_filter_spec(self, tasks):
+        pSpec = vim.PropertyCollector.PropertySpec(
+            all=False, pathSet=TASK_PROPERTIES, type=vim.Task)
+        oSpecs = [vim.PropertyCollector.ObjectSpec(obj=task, skip=False)
+                  for task in tasks]
+        return vim.PropertyCollector.FilterSpec(objectSet=oSpecs,
+                                                propSet=[pSpec])
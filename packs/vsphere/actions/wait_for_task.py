@@ -13,8 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import eventlet
-
 from pyVmomi import vim
 
 from vmwarelib import inventory
@@ -23,15 +21,12 @@ from vmwarelib.actions import BaseAction
 
 class WaitTask(BaseAction):
 
-    def run(self, task_id, vsphere=None):
+    def run(self, task_id, timeout=None, vsphere=None):
         self.establish_connection(vsphere)
         # convert ids to stubs
         task = inventory.get_task(self.si_content, moid=task_id)
-        while task.info.state == vim.TaskInfo.State.running:
-            eventlet.sleep(1)
-        result, error = None, None
-        if task.info.state == vim.TaskInfo.State.success:
-            result = task.info.result
-        else:
-            error = task.info.error
-        return {'result': result, 'error': error}
+        status = self._wait_for_tasks([task], timeout=timeout)[task_id]
+        if status['state'] not in [vim.TaskInfo.State.success,
+                                   vim.TaskInfo.State.error]:
+            return {'result': None, 'error': 'Timed out waiting for task'}
+        return {'result': status['result'], 'error': status['error']}
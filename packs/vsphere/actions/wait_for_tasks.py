@@ -0,0 +1,61 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyVmomi import vim
+
+from vmwarelib import inventory
+from vmwarelib.actions import BaseAction
+
+
+class WaitTasks(BaseAction):
+
+    def run(self, task_ids, timeout=None, vsphere=None):
+        """
+        Wait for many Tasks at once and return their results.
+
+        Args:
+        - task_ids: Moids of the Tasks to wait for
+        - timeout: Maximum number of seconds to wait for
+        - vsphere: Pre-configured vsphere connection details (config.yaml)
+
+        Returns:
+        - dict: task moid -> state, result and error of the Task. Tasks which
+          haven't finished before the timeout expired have state 'running'
+          or 'queued'.
+        """
+        self.establish_connection(vsphere)
+        # convert ids to stubs
+        tasks = [inventory.get_task(self.si_content, moid=task_id)
+                 for task_id in set(task_ids)]
+
+        statuses = self._wait_for_tasks(tasks, timeout=timeout,
+                                        on_progress=self._on_progress,
+                                        on_finished=self._on_finished)
+
+        results = {}
+        for task_id, status in statuses.items():
+            results[task_id] = {'state': str(status['state']),
+                                'result': status['result'],
+                                'error': status['error']}
+            if status['state'] not in [vim.TaskInfo.State.success,
+                                       vim.TaskInfo.State.error]:
+                results[task_id]['error'] = 'Timed out waiting for task'
+        return results
+
+    def _on_progress(self, task_id, progress):
+        self.logger.info('Task %s: %s%%' % (task_id, progress))
+
+    def _on_finished(self, task_id, status):
+        self.logger.info('Task %s: %s' % (task_id, status['state']))
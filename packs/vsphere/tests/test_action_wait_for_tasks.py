@@ -0,0 +1,55 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+import mock
+
+from vsphere_base_action_test_case import VsphereBaseActionTestCase
+
+from wait_for_tasks import WaitTasks
+
+
+__all__ = [
+    'WaitTasksTestCase'
+]
+
+
+class WaitTasksTestCase(VsphereBaseActionTestCase):
+    __test__ = True
+    action_cls = WaitTasks
+
+    @mock.patch('vmwarelib.actions.TaskWaiter')
+    def test_run(self, task_waiter):
+        task_waiter.return_value.wait.return_value = {
+            'task-1': {'state': 'success', 'progress': None,
+                       'result': 'vm-1', 'error': None},
+            'task-2': {'state': 'running', 'progress': 40,
+                       'result': None, 'error': None}
+        }
+        action = self.get_action_instance(self.new_config)
+        action.establish_connection = mock.Mock()
+        action.si_content = mock.Mock()
+
+        result = action.run(task_ids=['task-1', 'task-2', 'task-1'],
+                            timeout=30, vsphere='default')
+
+        tasks = task_waiter.return_value.wait.call_args[0][0]
+        self.assertEqual(sorted([task._GetMoId() for task in tasks]),
+                         ['task-1', 'task-2'])
+        self.assertEqual(task_waiter.return_value.wait.call_args[1]['timeout'],
+                         30)
+        self.assertEqual(result['task-1'], {'state': 'success',
+                                            'result': 'vm-1', 'error': None})
+        self.assertEqual(result['task-2'],
+                         {'state': 'running', 'result': None,
+                          'error': 'Timed out waiting for task'})
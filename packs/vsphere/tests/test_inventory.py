@@ -0,0 +1,162 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+import mock
+import unittest2
+
+from pyVmomi import vim
+from pyVmomi import vmodl
+
+from vmwarelib import inventory
+
+
+__all__ = [
+    'InventoryIndexTestCase'
+]
+
+
+def make_content(pages):
+    """
+    Service content mock which returns the given pages of (moid, name)
+    tuples from RetrievePropertiesEx / ContinueRetrievePropertiesEx and
+    single objects from RetrieveProperties.
+    """
+    stub = mock.Mock()
+    content = mock.Mock()
+    content.propertyCollector._stub = stub
+    content.viewManager.CreateContainerView.return_value = \
+        vim.view.ContainerView('session[1]view-1', stub=stub)
+
+    results = []
+    for i, page in enumerate(pages):
+        objects = []
+        for moid, name in page:
+            objects.append(vim.ObjectContent(
+                obj=vim.VirtualMachine(moid, stub=stub),
+                propSet=[vim.DynamicProperty(name='name', val=name),
+                         vim.DynamicProperty(
+                             name='parent',
+                             val=vim.Folder('group-v1', stub=stub))]))
+        token = 'token-%d' % (i + 1) if i + 1 < len(pages) else None
+        results.append(vim.PropertyCollector.RetrieveResult(
+            objects=objects, token=token))
+
+    content.propertyCollector.RetrievePropertiesEx.return_value = results[0]
+    content.propertyCollector.ContinueRetrievePropertiesEx.side_effect = \
+        lambda token: results[int(token.split('-')[1])]
+
+    names = dict([item for page in pages for item in page])
+
+    def retrieve_properties(specSet):
+        obj = specSet[0].objectSet[0].obj
+        if obj._GetMoId() not in names:
+            raise vmodl.fault.ManagedObjectNotFound(obj=obj)
+        return [vim.ObjectContent(
+            obj=obj,
+            propSet=[vim.DynamicProperty(name='name',
+                                         val=names[obj._GetMoId()])])]
+
+    content.propertyCollector.RetrieveProperties.side_effect = \
+        retrieve_properties
+    return content
+
+
+class InventoryIndexTestCase(unittest2.TestCase):
+    def setUp(self):
+        super(InventoryIndexTestCase, self).setUp()
+        self.content = make_content([[('vm-1', 'web-1'), ('vm-2', 'web-2')],
+                                     [('vm-3', 'db-1'), ('vm-4', 'web-1')]])
+
+    def test_refresh_retrieves_all_pages(self):
+        index = inventory.InventoryIndex(self.content, vim.VirtualMachine)
+        entries = sorted(index.entries(), key=lambda entry: entry['moid'])
+
+        self.assertEqual([entry['moid'] for entry in entries],
+                         ['vm-1', 'vm-2', 'vm-3', 'vm-4'])
+        self.assertEqual(entries[2], {'moid': 'vm-3', 'name': 'db-1',
+                                      'parent': 'group-v1'})
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 1)
+        collector.ContinueRetrievePropertiesEx.assert_called_once_with(
+            token='token-1')
+
+    def test_get_by_name(self):
+        index = inventory.InventoryIndex(self.content, vim.VirtualMachine)
+
+        self.assertEqual(index.get(name='web-2')._GetMoId(), 'vm-2')
+        self.assertEqual(index.get(name='web-1')._GetMoId(), 'vm-1')
+
+    def test_get_by_names(self):
+        index = inventory.InventoryIndex(self.content, vim.VirtualMachine)
+
+        vms = index.get_by_names(['web-1', 'db-1', 'missing'])
+        self.assertEqual(sorted([vm._GetMoId() for vm in vms]),
+                         ['vm-1', 'vm-3', 'vm-4'])
+
+    def test_index_is_cached_per_connection(self):
+        vm = inventory.get_virtualmachine(self.content, name='db-1')
+        self.assertEqual(vm._GetMoId(), 'vm-3')
+        vm = inventory.get_virtualmachine(self.content, name='web-2')
+        self.assertEqual(vm._GetMoId(), 'vm-2')
+
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 1)
+
+        other_content = make_content([[('vm-5', 'db-1')]])
+        vm = inventory.get_virtualmachine(other_content, name='db-1')
+        self.assertEqual(vm._GetMoId(), 'vm-5')
+
+    def test_missing_entity_refreshes_index_and_raises(self):
+        inventory.get_virtualmachine(self.content, name='web-1')
+        self.assertRaises(Exception, inventory.get_virtualmachine,
+                          self.content, name='missing')
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 2)
+
+    def test_get_by_moid_does_not_build_index(self):
+        vm = inventory.get_virtualmachine(self.content, moid='vm-3')
+        self.assertIsInstance(vm, vim.VirtualMachine)
+        self.assertEqual(vm._GetMoId(), 'vm-3')
+
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrieveProperties.call_count, 1)
+        spec = collector.RetrieveProperties.call_args[1]['specSet'][0]
+        self.assertEqual(spec.objectSet[0].obj, vm)
+        self.assertEqual(spec.propSet[0].pathSet, ['name'])
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 0)
+        self.assertEqual(
+            self.content.viewManager.CreateContainerView.call_count, 0)
+
+    def test_missing_moid_raises(self):
+        self.assertRaises(Exception, inventory.get_virtualmachine,
+                          self.content, moid='vm-9')
+        self.assertEqual(inventory.get_entity_by_moid(
+            self.content, vim.VirtualMachine, 'vm-9'), None)
+
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 0)
+
+    def test_missing_moid_falls_back_to_name(self):
+        vm = inventory.get_virtualmachine(self.content, moid='vm-9',
+                                          name='db-1')
+        self.assertEqual(vm._GetMoId(), 'vm-3')
+
+    def test_expired_index_is_rebuilt(self):
+        index = inventory.InventoryIndex(self.content, vim.VirtualMachine,
+                                         ttl=0)
+        index.get(name='web-1')
+        index.get(name='web-1')
+
+        collector = self.content.propertyCollector
+        self.assertEqual(collector.RetrievePropertiesEx.call_count, 2)
@@ -0,0 +1,127 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+import shutil
+import tempfile
+
+import mock
+
+from vsphere_base_action_test_case import VsphereBaseActionTestCase
+
+from vm_hw_moid_get import GetVMMoid
+from vmwarelib.session import SessionCache
+
+
+__all__ = [
+    'SessionCacheTestCase'
+]
+
+
+class SessionCacheTestCase(VsphereBaseActionTestCase):
+    __test__ = True
+    action_cls = GetVMMoid
+
+    def setUp(self):
+        super(SessionCacheTestCase, self).setUp()
+
+        self.cache_path = tempfile.mkdtemp()
+        self.config = self.new_config
+        self.config['session_cache'] = True
+        self.config['session_cache_path'] = self.cache_path
+        self.connection = self.config['vsphere']['default']
+
+    def tearDown(self):
+        super(SessionCacheTestCase, self).tearDown()
+        shutil.rmtree(self.cache_path)
+
+    def _mock_si(self, current_session=True):
+        si = mock.Mock()
+        si._stub.cookie = 'vmware_soap_session="new"'
+        si._stub.version = 'vim.version.version9'
+        content = si.RetrieveContent.return_value
+        content.sessionManager.currentSession = current_session
+        return si
+
+    @mock.patch('vmwarelib.actions.connect.SmartConnect')
+    def test_connect_stores_session(self, smart_connect):
+        smart_connect.return_value = self._mock_si()
+        action = self.get_action_instance(self.config)
+
+        action.establish_connection(vsphere='default')
+
+        session = SessionCache(self.cache_path).get('default',
+                                                    self.connection)
+        self.assertEqual(session['cookie'], 'vmware_soap_session="new"')
+        self.assertEqual(session['version'], 'vim.version.version9')
+
+    @mock.patch('vmwarelib.actions.vim.ServiceInstance')
+    @mock.patch('vmwarelib.actions.SoapStubAdapter')
+    @mock.patch('vmwarelib.actions.connect.SmartConnect')
+    def test_connect_reattaches_to_cached_session(self, smart_connect,
+                                                  stub_adapter,
+                                                  service_instance):
+        SessionCache(self.cache_path).set('default', self.connection,
+                                          'vmware_soap_session="cached"',
+                                          'vim.version.version9')
+        si = self._mock_si()
+        service_instance.return_value = si
+        action = self.get_action_instance(self.config)
+
+        action.establish_connection(vsphere='default')
+
+        self.assertFalse(smart_connect.called)
+        stub_adapter.assert_called_once_with('192.168.0.1', 443,
+                                             version='vim.version.version9')
+        self.assertEqual(stub_adapter.return_value.cookie,
+                         'vmware_soap_session="cached"')
+        self.assertFalse(si.RetrieveContent().sessionManager.Login.called)
+        self.assertEqual(si.RetrieveContent.call_count, 2)
+        self.assertEqual(action.si, si)
+
+    @mock.patch('vmwarelib.actions.vim.ServiceInstance')
+    @mock.patch('vmwarelib.actions.SoapStubAdapter')
+    @mock.patch('vmwarelib.actions.connect.SmartConnect')
+    def test_connect_logs_in_when_cached_session_expired(self, smart_connect,
+                                                         stub_adapter,
+                                                         service_instance):
+        SessionCache(self.cache_path).set('default', self.connection,
+                                          'vmware_soap_session="expired"',
+                                          'vim.version.version9')
+        si = self._mock_si(current_session=None)
+        service_instance.return_value = si
+        stub = stub_adapter.return_value
+        stub.version = 'vim.version.version9'
+
+        def login(user, passwd, locale):
+            # Server sets a new session cookie
+            stub.cookie = 'vmware_soap_session="renewed"'
+        si.RetrieveContent().sessionManager.Login.side_effect = login
+        action = self.get_action_instance(self.config)
+
+        action.establish_connection(vsphere='default')
+
+        self.assertFalse(smart_connect.called)
+        session_manager = action.si_content.sessionManager
+        session_manager.Login.assert_called_once_with('Admin', 'password',
+                                                      None)
+        session = SessionCache(self.cache_path).get('default',
+                                                    self.connection)
+        self.assertEqual(session['cookie'], 'vmware_soap_session="renewed"')
+
+    def test_cached_session_of_other_connection_is_ignored(self):
+        cache = SessionCache(self.cache_path)
+        cache.set('default', self.connection, 'cookie', 'version')
+
+        connection = dict(self.connection, user='Other')
+        self.assertEqual(cache.get('default', connection), None)
@@ -0,0 +1,102 @@
+# Licensed to the StackStorm, Inc ('StackStorm') under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+import mock
+import unittest2
+
+from pyVmomi import vim
+
+from vmwarelib.tasks import TaskWaiter
+
+
+__all__ = [
+    'TaskWaiterTestCase'
+]
+
+
+def make_update(version, changes):
+    """
+    Build an UpdateSet from a list of (task, [(property, value)]) tuples.
+    """
+    object_updates = []
+    for task, properties in changes:
+        object_updates.append(vim.PropertyCollector.ObjectUpdate(
+            kind='modify', obj=task,
+            changeSet=[vim.PropertyCollector.Change(name=name, op='assign',
+                                                    val=val)
+                       for name, val in properties]))
+    return vim.PropertyCollector.UpdateSet(
+        version=version,
+        filterSet=[vim.PropertyCollector.FilterUpdate(
+            objectSet=object_updates)])
+
+
+class TaskWaiterTestCase(unittest2.TestCase):
+    def setUp(self):
+        super(TaskWaiterTestCase, self).setUp()
+
+        stub = mock.Mock()
+        self.tasks = [vim.Task('task-1', stub=stub),
+                      vim.Task('task-2', stub=stub)]
+        self.content = mock.Mock()
+        self.collector = \
+            self.content.propertyCollector.CreatePropertyCollector()
+
+    def test_wait_for_all_tasks_with_single_filter(self):
+        self.collector.WaitForUpdatesEx.side_effect = [
+            make_update('1', [(self.tasks[0], [('info.state', 'running'),
+                                               ('info.progress', 10)]),
+                              (self.tasks[1], [('info.state', 'running')])]),
+            None,
+            make_update('2', [(self.tasks[0], [('info.progress', 50)]),
+                              (self.tasks[1], [('info.state', 'success'),
+                                               ('info.result', 'vm-1')])]),
+            make_update('3', [(self.tasks[0], [('info.state', 'error'),
+                                               ('info.error', 'failed')])])
+        ]
+        on_progress = mock.Mock()
+        on_finished = mock.Mock()
+
+        statuses = TaskWaiter(self.content).wait(
+            self.tasks, on_progress=on_progress, on_finished=on_finished)
+
+        self.assertEqual(statuses['task-1']['state'], 'error')
+        self.assertEqual(statuses['task-1']['error'], 'failed')
+        self.assertEqual(statuses['task-2']['state'], 'success')
+        self.assertEqual(statuses['task-2']['result'], 'vm-1')
+
+        self.assertEqual(self.collector.CreateFilter.call_count, 1)
+        versions = [call[0][0] for call in
+                    self.collector.WaitForUpdatesEx.call_args_list]
+        self.assertEqual(versions, ['', '1', '1', '2'])
+        self.assertEqual(on_progress.call_args_list,
+                         [mock.call('task-1', 10), mock.call('task-1', 50)])
+        self.assertEqual([call[0][0] for call in on_finished.call_args_list],
+                         ['task-2', 'task-1'])
+        self.collector.Destroy.assert_called_once_with()
+
+    def test_wait_timeout(self):
+        self.collector.WaitForUpdatesEx.return_value = None
+
+        with mock.patch('vmwarelib.tasks.time.time') as mock_time:
+            mock_time.side_effect = [100, 100, 105, 110]
+            statuses = TaskWaiter(self.content).wait(self.tasks[:1],
+                                                     timeout=10)
+
+        self.assertEqual(statuses['task-1']['state'], None)
+        options = [call[0][1] for call in
+                   self.collector.WaitForUpdatesEx.call_args_list]
+        self.assertEqual([option.maxWaitSeconds for option in options],
+                         [10, 5])
+        self.collector.Destroy.assert_called_once_with()
@@ -1,3 +1,6 @@
+import json
+from collections import OrderedDict
+
 import xmltodict
 
 from st2actions.runners.pythonrunner import Action
@@ -8,6 +11,109 @@ __all__ = [
 
 
 class ParseXMLAction(Action):
-    def run(self, data):
-        result = xmltodict.parse(data)
+    def run(self, data=None, file_path=None, item_path=None, fields=None, limit=None,
+            output_file=None):
+        if not data and not file_path:
+            raise ValueError('Either "data" or "file_path" parameter needs to be provided')
+
+        if not item_path:
+            if file_path:
+                with open(file_path, 'rb') as fp:
+                    return xmltodict.parse(fp)
+
+            return xmltodict.parse(data)
+
+        if file_path:
+            with open(file_path, 'rb') as fp:
+                return self._parse_items(fp, item_path=item_path, fields=fields, limit=limit,
+                                         output_file=output_file)
+
+        return self._parse_items(data, item_path=item_path, fields=fields, limit=limit,
+                                 output_file=output_file)
+
+    def _parse_items(self, source, item_path, fields=None, limit=None, output_file=None):
+        """
+        Stream the document and only keep the elements which match ``item_path`` (e.g.
+        ``/inventory/host``). Each matching element is discarded by the parser as soon as it has
+        been handled so memory usage doesn't depend on the size of the document.
+        """
+        names = [name for name in item_path.split('/') if name]
+        if not names:
+            raise ValueError('Invalid item path: %s' % (item_path))
+
+        fields = [(field, [key for key in field.split('/') if key]) for field in (fields or [])]
+        items = []
+        output = open(output_file, 'w') if output_file else None
+        state = {'count': 0}
+
+        def handle_item(path, item):
+            if not self._path_matches(path, names):
+                return True
+
+            item = self._add_attributes(item, path[-1][1])
+
+            if fields:
+                item = dict((field, self._get_field(item, keys)) for field, keys in fields)
+
+            if output:
+                output.write(json.dumps(item, separators=(',', ':')))
+                output.write('\n')
+            else:
+                items.append(item)
+
+            state['count'] += 1
+            # Returning False stops the parser once the limit has been reached
+            return not limit or state['count'] < limit
+
+        try:
+            xmltodict.parse(source, item_depth=len(names), item_callback=handle_item)
+        except xmltodict.ParsingInterrupted:
+            pass
+        finally:
+            if output:
+                output.close()
+
+        if output_file:
+            return {
+                'output_file': output_file,
+                'item_count': state['count']
+            }
+
+        return items
+
+    @staticmethod
+    def _path_matches(path, names):
+        if len(path) != len(names):
+            return False
+
+        for (name, _), expected in zip(path, names):
+            if expected != '*' and name != expected:
+                return False
+
+        return True
+
+    @staticmethod
+    def _add_attributes(item, attributes):
+        # In streaming mode, xmltodict passes the attributes of the item element as part of the
+        # path so they need to be added back to match the output of the non-streaming mode
+        if not attributes:
+            return item
+
+        result = OrderedDict(('@' + name, value) for name, value in attributes.items())
+
+        if isinstance(item, dict):
+            result.update(item)
+        elif item is not None:
+            result['#text'] = item
+
         return result
+
+    @staticmethod
+    def _get_field(item, keys):
+        value = item
+        for key in keys:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key, None)
+
+        return value
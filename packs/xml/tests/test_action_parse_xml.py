@@ -1,3 +1,8 @@
+import json
+import os
+import shutil
+import tempfile
+
 from st2tests.base import BaseActionTestCase
 
 from parse_xml import ParseXMLAction
@@ -15,6 +20,17 @@ MOCK_DATA_1 = """
 </note>
 """.strip()
 
+MOCK_DATA_2 = """
+<inventory>
+<group name="web">
+<host id="1"><name>web1</name><ip>10.0.0.1</ip><os><family>linux</family></os></host>
+</group>
+<host id="2"><name>db1</name><ip>10.0.0.2</ip><os><family>linux</family></os></host>
+<host id="3"><name>db2</name><ip>10.0.0.3</ip><os><family>bsd</family></os></host>
+<host id="4"><name>db3</name><ip>10.0.0.4</ip></host>
+</inventory>
+""".strip()
+
 
 class ParseXMLActionTestCase(BaseActionTestCase):
     action_cls = ParseXMLAction
@@ -30,3 +46,51 @@ class ParseXMLActionTestCase(BaseActionTestCase):
             }
         }
         self.assertEqual(result, expected)
+
+    def test_run_item_path(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_2, item_path='/inventory/host')
+        self.assertEqual([item['name'] for item in result], ['db1', 'db2', 'db3'])
+        self.assertEqual(result[0]['@id'], '2')
+        self.assertEqual(result[0]['os'], {'family': 'linux'})
+
+    def test_run_item_path_fields_and_limit(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_2, item_path='/inventory/host',
+                                                fields=['@id', 'name', 'os/family'], limit=2)
+        expected = [
+            {'@id': '2', 'name': 'db1', 'os/family': 'linux'},
+            {'@id': '3', 'name': 'db2', 'os/family': 'bsd'}
+        ]
+        self.assertEqual(result, expected)
+
+    def test_run_item_path_wildcard(self):
+        result = self.get_action_instance().run(data=MOCK_DATA_2, item_path='/inventory/*/host',
+                                                fields=['name', 'os/family', 'missing'])
+        self.assertEqual(result, [{'name': 'web1', 'os/family': 'linux', 'missing': None}])
+
+    def test_run_file_path_and_output_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'inventory.xml')
+        output_file = os.path.join(temp_dir, 'hosts.json')
+        with open(file_path, 'w') as fp:
+            fp.write(MOCK_DATA_2)
+
+        result = self.get_action_instance().run(file_path=file_path, item_path='/inventory/host',
+                                                fields=['ip'], output_file=output_file)
+        self.assertEqual(result, {'output_file': output_file, 'item_count': 3})
+
+        with open(output_file) as fp:
+            items = [json.loads(line) for line in fp]
+        self.assertEqual(items, [{'ip': '10.0.0.2'}, {'ip': '10.0.0.3'}, {'ip': '10.0.0.4'}])
+
+    def test_run_file_path(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'note.xml')
+        with open(file_path, 'w') as fp:
+            fp.write(MOCK_DATA_1)
+
+        result = self.get_action_instance().run(file_path=file_path)
+        self.assertEqual(result['note']['to'], 'Tove')